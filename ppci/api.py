@@ -9,6 +9,7 @@ import os
 import stat
 import xml
 from .lang.c import preprocess, c_to_ir, COptions
+from .lang.c import CBuilder, CTokenPrinter
 from .lang.c3 import c3_to_ir
 from .lang.bf import bf_to_ir
 from .lang.fortran import fortran_to_ir
@@ -19,16 +20,21 @@ from .lang.python import python_to_ir, ir_to_python
 from .wasm import wasm_to_ir, read_wasm
 from .irutils import verify_module
 from .utils.reporting import DummyReportGenerator, HtmlReportGenerator
-from .opt.transform import DeleteUnusedInstructionsPass
 from .opt.transform import RemoveAddZeroPass
 from .opt import CommonSubexpressionEliminationPass
 from .opt import ConstantFolder
-from .opt import LoadAfterStorePass
+from .opt import LoadStoreEliminationPass
 from .opt import CleanPass
+from .opt import AggressiveDeadCodeEliminationPass
 from .opt.mem2reg import Mem2RegPromotor
+from .opt.sroa import ScalarReplacementPass
+from .opt.slp import SlpVectorizerPass
 from .opt.cjmp import CJumpPass
 from .opt.tailcall import TailCallOptimization
+from .opt.interprocedural import DeadFunctionEliminationPass
+from .opt.interprocedural import ConstantArgumentPropagationPass
 from .codegen import CodeGenerator
+from .codegen.layout import BlockLayoutPass
 from .binutils.linker import link
 from .binutils.archive import archive
 from .binutils.outstream import BinaryOutputStream, TextOutputStream
@@ -43,6 +49,7 @@ from .format import uboot_image
 from .format.ldb import write_ldb
 from .build.tasks import TaskError, TaskRunner
 from .build.recipe import RecipeLoader
+from .build.objectcache import get_object_cache, make_key
 from .common import CompilerError, DiagnosticsManager, get_file
 from .arch import get_arch, get_current_arch
 
@@ -181,22 +188,25 @@ def disasm(data, march):
     disassembler.disasm(data, ostream)
 
 
-OPT_LEVELS = ("0", "1", "2", "s")
+OPT_LEVELS = ("0", "1", "2", "3", "s")
 
 
-def optimize(ir_module, level=0, reporter=None):
+def optimize(ir_module, level=0, reporter=None, march=None):
     """ Run a bag of tricks against the :doc:`ir-code<ir/index>`.
 
     This is an in-place operation!
 
     Args:
         ir_module (ppci.ir.Module): The ir module to optimize.
-        level: The optimization level, 0 is default. Can be 0,1,2 or s
+        level: The optimization level, 0 is default. Can be 0,1,2,3 or s
             0: No optimization
             1: some optimization
             2: more optimization
+            3: level 2, and folding of constant conditional jumps
             s: optimize for size
         reporter: Report detailed log to this reporter
+        march: The target architecture. When given, levels 2 and 3 also pack
+            scalar operations into the vector operations of the target.
     """
     logger = logging.getLogger("optimize")
     level = str(level)
@@ -214,21 +224,43 @@ def optimize(ir_module, level=0, reporter=None):
 
     # TODO: differentiate between optimization levels!
 
-    # Optimization passes (bag of tricks) run them three times:
-    opt_passes = [
+    # Optimization passes (bag of tricks) run them twice. Dead code
+    # elimination removes whole chains of dead code at once, so two
+    # rounds are enough:
+    function_passes = [
+        ScalarReplacementPass(),
         Mem2RegPromotor(),
         RemoveAddZeroPass(),
         ConstantFolder(),
         CommonSubexpressionEliminationPass(),
         TailCallOptimization(),
-        LoadAfterStorePass(),
-        DeleteUnusedInstructionsPass(),
-        CleanPass(),
-    ] * 3
+        LoadStoreEliminationPass(),
+        AggressiveDeadCodeEliminationPass(),
+        CleanPass(tail_duplication=level != "s"),
+    ]
+
+    # In between, work on the module as a whole:
+    opt_passes = (
+        [DeadFunctionEliminationPass()]
+        + function_passes
+        + [ConstantArgumentPropagationPass(), DeadFunctionEliminationPass()]
+        + function_passes
+    )
 
     if level == "3":
         opt_passes.append(CJumpPass())
 
+    if level in ("2", "3") and march is not None:
+        march = get_arch(march)
+        operations = [p.tree.name for p in march.isa.patterns]
+        opt_passes.append(SlpVectorizerPass(operations))
+
+    # Order the blocks to make frequent branches fall through:
+    block_layout = None
+    if level != "s":
+        block_layout = BlockLayoutPass()
+        opt_passes.append(block_layout)
+
     # Run the passes over the module:
     verify_module(ir_module)
     for opt_pass in opt_passes:
@@ -238,6 +270,12 @@ def optimize(ir_module, level=0, reporter=None):
 
     if reporter:
         # Dump report:
+        if block_layout:
+            reporter.message(
+                "Block layout: taken branches {:.1f} -> {:.1f}".format(
+                    block_layout.before, block_layout.after
+                )
+            )
         reporter.message("{} after optimization:".format(ir_module))
         reporter.message("{} {}".format(ir_module, ir_module.stats()))
         reporter.dump_ir(ir_module)
@@ -335,6 +373,7 @@ def cc(
     opt_level=0,
     debug=False,
     reporter=None,
+    cache=None,
 ):
     """ C compiler. compiles a single source file into an object file.
 
@@ -343,6 +382,8 @@ def cc(
         march: The architecture for which to compile
         coptions: options for the C frontend
         debug: Create debug info when set to True
+        cache: an :class:`ppci.build.objectcache.ObjectCache`, or the
+            directory of one, in which compiled objects are kept.
 
     Returns:
         an object file
@@ -363,14 +404,80 @@ def cc(
     if not coptions:
         coptions = COptions()
 
-    ir_module = c_to_ir(source, march, coptions=coptions, reporter=reporter)
+    cache = get_object_cache(cache)
+    if cache:
+        # Preprocess once, for the key and for the compilation on a miss:
+        march = get_arch(march)
+        cbuilder = CBuilder(march.info, coptions)
+        name = getattr(source, "name", None)
+        text = source.read()
+        try:
+            preprocessed = cbuilder.preprocess(
+                named_text_file(text, name), name
+            )
+        except CompilerError:
+            # Report the error when compiling the source:
+            source, cache = named_text_file(text, name), None
+        else:
+            key = c_cache_key(
+                preprocessed, name, march, coptions, opt_level, debug
+            )
+            obj = cache.get(key)
+            if obj:
+                reporter.message("Using cached object {}".format(key))
+                return obj
+
+    if cache:
+        ir_module = cbuilder.build_preprocessed(
+            preprocessed, name, reporter=reporter
+        )
+    else:
+        ir_module = c_to_ir(
+            source, march, coptions=coptions, reporter=reporter
+        )
     reporter.message("{} {}".format(ir_module, ir_module.stats()))
     reporter.dump_ir(ir_module)
-    optimize(ir_module, level=opt_level, reporter=reporter)
-    return ir_to_object([ir_module], march, debug=debug, reporter=reporter)
+    optimize(ir_module, level=opt_level, reporter=reporter, march=march)
+    obj = ir_to_object([ir_module], march, debug=debug, reporter=reporter)
+    if cache:
+        cache.put(key, obj)
+    return obj
+
 
+def named_text_file(text, name):
+    """ Create a file like object with the given text and name """
+    f = io.StringIO(text)
+    if name is not None:
+        f.name = name
+    return f
 
-def wasmcompile(source: io.TextIOBase, march, opt_level=2, reporter=None):
+
+def c_cache_key(preprocessed, name, march, coptions, opt_level, debug):
+    """ Determine the key of a C source file in the object cache.
+
+    The key is based upon the preprocessed source, so that changes in
+    included headers are taken into account.
+    """
+    from .lang.c.pch import options_key, file_digest
+
+    text = io.StringIO()
+    CTokenPrinter().dump(preprocessed.tokens, file=text)
+    pch = coptions["include_pch"]
+    return make_key(
+        "c",
+        name,
+        text.getvalue(),
+        options_key(preprocessed.context),
+        file_digest(pch) if pch else None,
+        march.make_id_str(),
+        opt_level,
+        debug,
+    )
+
+
+def wasmcompile(
+    source: io.TextIOBase, march, opt_level=2, reporter=None, cache=None
+):
     """ Webassembly compile """
     march = get_arch(march)
 
@@ -378,14 +485,27 @@ def wasmcompile(source: io.TextIOBase, march, opt_level=2, reporter=None):
         reporter = DummyReportGenerator()
 
     wasm_module = read_wasm(source)
+
+    cache = get_object_cache(cache)
+    if cache:
+        key = make_key(
+            "wasm", wasm_module.to_bytes(), march.make_id_str(), opt_level
+        )
+        obj = cache.get(key)
+        if obj:
+            reporter.message("Using cached object {}".format(key))
+            return obj
+
     ir_module = wasm_to_ir(
         wasm_module, march.info.get_type_info("ptr"), reporter=reporter
     )
 
     # Optimize:
-    optimize(ir_module, level=opt_level)
+    optimize(ir_module, level=opt_level, march=march)
 
     obj = ir_to_object([ir_module], march, reporter=reporter)
+    if cache:
+        cache.put(key, obj)
     return obj
 
 
@@ -404,6 +524,8 @@ def c3c(
     reporter=None,
     debug=False,
     outstream=None,
+    cache=None,
+    interfaces=None,
 ):
     """ Compile a set of sources into binary format for the given target.
 
@@ -414,6 +536,12 @@ def c3c(
         march: the architecture for which to compile.
         reporter: reporter to write compilation report to
         debug: include debugging information
+        cache: an :class:`ppci.build.objectcache.ObjectCache`, or the
+            directory of one, in which compiled objects are kept. The
+            cache is not used when an outstream is given.
+        interfaces: a directory in which the interfaces of the modules
+            are stored. Includes with a stored interface are not parsed,
+            and no code is generated for the includes.
 
     Returns:
         An object file
@@ -429,12 +557,32 @@ def c3c(
     """
     reporter = get_reporter(reporter)
     march = get_arch(march)
-    ir_module = c3_to_ir(sources, includes, march, reporter=reporter)
 
-    optimize(ir_module, level=opt_level, reporter=reporter)
+    cache = None if outstream else get_object_cache(cache)
+    if cache:
+        sources = [read_named_text(source) for source in sources]
+        includes = [read_named_text(include) for include in includes]
+        key = make_key(
+            "c3",
+            tuple(map(named_text_key, sources)),
+            tuple(map(named_text_key, includes)),
+            march.make_id_str(),
+            opt_level,
+            debug,
+        )
+        obj = cache.get(key)
+        if obj:
+            reporter.message("Using cached object {}".format(key))
+            return obj
+
+    ir_module = c3_to_ir(
+        sources, includes, march, reporter=reporter, interfaces=interfaces
+    )
+
+    optimize(ir_module, level=opt_level, reporter=reporter, march=march)
 
     opt_cg = "size" if opt_level == "s" else "speed"
-    return ir_to_object(
+    obj = ir_to_object(
         [ir_module],
         march,
         debug=debug,
@@ -442,6 +590,24 @@ def c3c(
         opt=opt_cg,
         outstream=outstream,
     )
+    if cache:
+        cache.put(key, obj)
+    return obj
+
+
+def named_text_key(f):
+    """ Get the name and text of a named text file """
+    return getattr(f, "name", None), f.getvalue()
+
+
+def read_named_text(source):
+    """ Read a filename or file like object into a named text file """
+    f = get_file(source)
+    name = getattr(f, "name", None)
+    text = f.read()
+    if f is not source:
+        f.close()
+    return named_text_file(text, name)
 
 
 def pascal(sources, march, opt_level=0, reporter=None, debug=False):
@@ -6,6 +6,7 @@ The information present:
 - endianness
 - type sizes and alignment
 - int size for the machine
+- whether unaligned memory access is allowed
 
 """
 import enum
@@ -35,10 +36,12 @@ class ArchInfo:
         type_infos=None,
         endianness=Endianness.LITTLE,
         register_classes=(),
+        unaligned_access=False,
     ):
         self.type_infos = type_infos
         assert isinstance(endianness, Endianness)
         self.endianness = endianness
+        self.unaligned_access = unaligned_access
         self.register_classes = register_classes
         self._registers_by_name = {}
 
@@ -460,6 +460,20 @@ class Blx(ArmInstruction):
         return tokens.encode()
 
 
+class Bx(ArmInstruction):
+    """ Branch to the address in a register """
+
+    rm = Operand("rm", ArmRegister, read=True)
+    syntax = Syntax(["bx", " ", rm])
+    patterns = {"cond": AL, "rm": rm}
+
+    def encode(self):
+        tokens = self.get_tokens()
+        self.set_all_patterns(tokens)
+        tokens[0][4:28] = 0x12FFF1
+        return tokens.encode()
+
+
 def reg_list_to_mask(reg_list):
     mask = 0
     for reg in reg_list:
@@ -940,6 +954,11 @@ def pattern_jmp(context, tree):
     context.emit(B(tgt.name, jumps=[tgt]))
 
 
+@arm_isa.pattern("stm", "IJMP(reg)", size=4)
+def pattern_ijmp(context, tree, c0):
+    context.emit(Bx(c0, jumps=tree.value))
+
+
 @arm_isa.pattern("reg", "REGI32", size=0, cycles=0, energy=0)
 @arm_isa.pattern("reg", "REGU32", size=0, cycles=0, energy=0)
 def pattern_reg32(context, tree):
@@ -147,7 +147,7 @@ class U64DataRelocation(Relocation):
     field = "value"
 
     def calc(self, sym_value, reloc_value):
-        assert sym_value % 4 == 0
+        # The symbol may be a code label, for example in a jump table.
         assert reloc_value % 4 == 0
         return sym_value
 
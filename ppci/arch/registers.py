@@ -1,6 +1,10 @@
 class Register:
     """ Baseclass of all registers types """
 
+    # The ir type used to spill registers which hold values of several
+    # types, such as vectors:
+    spill_ty = None
+
     @classmethod
     def all_registers(cls):
         """ Return all possible instances for this class """
@@ -32,6 +32,13 @@ def generate_temps():
         n = n + 1
 
 
+def aliases(register, other):
+    """ Test if other is an alias, or an alias of an alias, of register """
+    return any(
+        a is other or aliases(a, other) for a in register.aliases
+    )
+
+
 class Frame:
     """
         Activation record abstraction. This class contains a flattened
@@ -58,6 +65,7 @@ class Frame:
 
         # Literal pool:
         self.constants = []
+        self.jump_tables = []
         self.literal_number = 0
 
     def __repr__(self):
@@ -115,11 +123,19 @@ class Frame:
         self.constants.append((lab_name, value))
         return lab_name
 
+    def add_jump_table(self, labels):
+        """ Add a table with the addresses of the given labels """
+        lab_name = self.new_name("jump_table")
+        self.jump_tables.append((lab_name, labels))
+        return lab_name
+
     def is_used(self, register):
         """ Check if a register or one of its aliases is used by this frame.
         """
-        return register in self.used_regs or any(
-            self.is_used(a) for a in register.aliases
+        return (
+            register in self.used_regs
+            or any(self.is_used(a) for a in register.aliases)
+            or any(aliases(r, register) for r in self.used_regs)
         )
 
     def live_ranges(self, vreg):
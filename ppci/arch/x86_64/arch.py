@@ -36,6 +36,7 @@ from .instructions import Call, Ret, bits16, RmReg16, bits32, RmReg32
 from .x87_instructions import x87_isa
 from .sse2_instructions import sse1_isa, sse2_isa, Movss, Movsd
 from .sse2_instructions import RmXmmRegSingle, RmXmmRegDouble
+from .sse2_instructions import Movups, RmXmmRegVector
 from .sse2_instructions import PushXmm, PopXmm
 from .registers import rax, rcx, rdi, rsi
 from .registers import register_classes, caller_save, callee_save
@@ -130,11 +131,18 @@ class X86_64Arch(Architecture):
                 ir.u64: TypeInfo(8, 8),
                 ir.f32: TypeInfo(4, 4),
                 ir.f64: TypeInfo(8, 8),
+                ir.f64x2: TypeInfo(16, 16),
+                ir.f32x4: TypeInfo(16, 16),
+                ir.i64x2: TypeInfo(16, 16),
+                ir.i32x4: TypeInfo(16, 16),
+                ir.i16x8: TypeInfo(16, 16),
+                ir.i8x16: TypeInfo(16, 16),
                 "int": ir.i64,
                 "ptr": ir.u64,
                 ir.ptr: ir.u64,
             },
             register_classes=register_classes,
+            unaligned_access=True,
         )
 
         self.isa = isa + data_isa + sse1_isa + sse2_isa
@@ -187,6 +195,10 @@ class X86_64Arch(Architecture):
             src, registers.XmmRegisterSingle
         ):
             return Movss(dst, RmXmmRegSingle(src), ismove=True)
+        elif isinstance(dst, registers.XmmRegisterVector) and isinstance(
+            src, registers.XmmRegisterVector
+        ):
+            return Movups(dst, RmXmmRegVector(src), ismove=True)
         else:  # pragma: no cover
             raise NotImplementedError(str(type(dst)) + str(type(src)))
 
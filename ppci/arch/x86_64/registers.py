@@ -111,6 +111,20 @@ class XmmRegisterSingle(Register):
             return self.name
 
 
+class XmmRegisterVector(Register):
+    """ Xmm register used to hold a 128-bit vector value. """
+    bitsize = 128
+
+    # Vector registers hold values of several types, spill them as one:
+    spill_ty = ir.i8x16
+
+    def __repr__(self):
+        if self.is_colored:
+            return get_xmm_reg(self.color).name
+        else:
+            return self.name
+
+
 # Calculation of the rexb bit:
 # rexbit = {'rax': 0, 'rcx':0, 'rdx':0, 'rbx': 0, 'rsp': 0, 'rbp': 0, 'rsi':0,
 # 'rdi':0,'r8':1,'r9':1,'r10':1,'r11':1,'r12':1,'r13':1,'r14':1,'r15':1}
@@ -305,13 +319,23 @@ XmmRegisterSingle.registers = [
 ]
 
 
+XmmRegisterVector.registers = [
+    XmmRegisterVector(r.name, r.num, aliases=(r,))
+    for r in XmmRegisterSingle.registers
+]
+
 xmm_mp = {r.num: r for r in XmmRegisterDouble.registers}
+xmm_vector_mp = {r.num: r for r in XmmRegisterVector.registers}
 
 
 def get_xmm_reg(num):
     return xmm_mp[num]
 
 
+def get_xmm_vector_reg(num):
+    return xmm_vector_mp[num]
+
+
 reg8_mp = {r.num: r for r in [al, bl, cl, dl]}
 
 
@@ -372,6 +396,12 @@ caller_save = (
 # Register classes:
 # TODO: should 16 and 32 bit values have its own class?
 register_classes = [
+    RegisterClass(
+        "regvec",
+        ir.vector_types,
+        XmmRegisterVector,
+        XmmRegisterVector.registers,
+    ),
     RegisterClass(
         "reg64",
         [ir.i64, ir.u64, ir.ptr],
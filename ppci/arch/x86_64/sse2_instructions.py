@@ -12,12 +12,10 @@ from .instructions import RmMem, RmMemDisp, RmReg32, RmReg64, RmAbs, MovAdr
 from .instructions import Jb, Jbe, Ja, Jae, Je, Jne, Js, NearJump
 from .instructions import SubImm, AddImm
 from .registers import XmmRegisterSingle, XmmRegisterDouble
+from .registers import XmmRegisterVector, get_xmm_vector_reg
 from .registers import Register64, Register32, rsp, eax, rax
 from ..generic_instructions import ArtificialInstruction, RegisterUseDef
 
-# TODO: make a new register class XmmRegister with 128 bits width?
-XmmRegister = XmmRegisterDouble
-
 sse1_isa = Isa()
 sse2_isa = Isa()
 
@@ -127,20 +125,43 @@ class RmXmmRegSingle(Constructor):
         tokens.set_field("rm", self.reg_rm.num & 0x7)
 
 
+class RmXmmRegVector(Constructor):
+    """ Xmm register access """
+
+    reg_rm = Operand("reg_rm", XmmRegisterVector, read=True)
+    syntax = Syntax([reg_rm])
+    patterns = {"mod": 3}
+
+    def set_user_patterns(self, tokens):
+        # TODO: Improve this way of setting 'r':
+        tokens.set_field("b", (self.reg_rm.num & 8) >> 3)
+        tokens.set_field("rm", self.reg_rm.num & 0x7)
+
+
 xmm_rm_modes = (RmXmmReg, RmMem, RmMemDisp, RmAbs)
 xmm_double_rm_modes = (RmXmmRegDouble, RmMem, RmMemDisp, RmAbs)
 xmm_single_rm_modes = (RmXmmRegSingle, RmMem, RmMemDisp, RmAbs)
+xmm_vector_rm_modes = (RmXmmRegVector, RmMem, RmMemDisp, RmAbs)
 
 
 class Movups(Sse1Instruction):
     """ Move unaligned packed single-fp values """
 
-    r = Operand("r", XmmRegister, write=True)
-    rm = Operand("rm", xmm_rm_modes)
+    r = Operand("r", XmmRegisterVector, write=True)
+    rm = Operand("rm", xmm_vector_rm_modes, read=True)
     syntax = Syntax(["movups", " ", r, ",", " ", rm])
     patterns = {"opcode": 0x10}
 
 
+class Movups2(Sse1Instruction):
+    """ Store unaligned packed single-fp values """
+
+    rm = Operand("rm", xmm_vector_rm_modes)
+    r = Operand("r", XmmRegisterVector, read=True)
+    syntax = Syntax(["movups", " ", rm, ",", " ", r], priority=1)
+    patterns = {"opcode": 0x11}
+
+
 class Movss(Sse1Instruction):
     """ Move scalar single-fp value """
 
@@ -153,12 +174,39 @@ class Movss(Sse1Instruction):
 class Movupd(Sse2Instruction):
     """ Move unaligned packed double-fp values """
 
-    r = Operand("r", XmmRegister, write=True)
-    rm = Operand("rm", xmm_rm_modes)
+    r = Operand("r", XmmRegisterVector, write=True)
+    rm = Operand("rm", xmm_vector_rm_modes, read=True)
     syntax = Syntax(["movupd", " ", r, ",", " ", rm])
     patterns = {"prefix": 0x66, "opcode": 0x10}
 
 
+class Movupd2(Sse2Instruction):
+    """ Store unaligned packed double-fp values """
+
+    rm = Operand("rm", xmm_vector_rm_modes)
+    r = Operand("r", XmmRegisterVector, read=True)
+    syntax = Syntax(["movupd", " ", rm, ",", " ", r], priority=1)
+    patterns = {"prefix": 0x66, "opcode": 0x11}
+
+
+class Movdqu(Sse2Instruction):
+    """ Move unaligned packed integer values """
+
+    r = Operand("r", XmmRegisterVector, write=True)
+    rm = Operand("rm", xmm_vector_rm_modes, read=True)
+    syntax = Syntax(["movdqu", " ", r, ",", " ", rm])
+    patterns = {"prefix": 0xF3, "opcode": 0x6F}
+
+
+class Movdqu2(Sse2Instruction):
+    """ Store unaligned packed integer values """
+
+    rm = Operand("rm", xmm_vector_rm_modes)
+    r = Operand("r", XmmRegisterVector, read=True)
+    syntax = Syntax(["movdqu", " ", rm, ",", " ", r], priority=1)
+    patterns = {"prefix": 0xF3, "opcode": 0x7F}
+
+
 class Movsd(Sse2Instruction):
     """ Move scalar double-fp value """
 
@@ -375,29 +423,70 @@ class Ucomisd(Sse2Instruction):
     patterns = {"prefix": 0x66, "opcode": 0x2E}
 
 
+def make_packed(mnemonic, opcode, prefix=None):
+    """ Create an instruction class operating on packed values """
+    r = Operand("r", XmmRegisterVector, read=True, write=True)
+    rm = Operand("rm", xmm_vector_rm_modes, read=True)
+    syntax = Syntax([mnemonic, " ", r, ",", " ", rm])
+    patterns = {"opcode": opcode}
+    if prefix is None:
+        base = Sse1Instruction
+    else:
+        base = Sse2Instruction
+        patterns["prefix"] = prefix
+    members = {"r": r, "rm": rm, "syntax": syntax, "patterns": patterns}
+    return type(mnemonic.title(), (base,), members)
+
+
+# Packed single-fp and double-fp arithmatic:
+Addps = make_packed("addps", 0x58)
+Subps = make_packed("subps", 0x5C)
+Mulps = make_packed("mulps", 0x59)
+Divps = make_packed("divps", 0x5E)
+Addpd = make_packed("addpd", 0x58, prefix=0x66)
+Subpd = make_packed("subpd", 0x5C, prefix=0x66)
+Mulpd = make_packed("mulpd", 0x59, prefix=0x66)
+Divpd = make_packed("divpd", 0x5E, prefix=0x66)
+
+# Packed integer arithmatic:
+Paddb = make_packed("paddb", 0xFC, prefix=0x66)
+Paddw = make_packed("paddw", 0xFD, prefix=0x66)
+Paddd = make_packed("paddd", 0xFE, prefix=0x66)
+Paddq = make_packed("paddq", 0xD4, prefix=0x66)
+Psubb = make_packed("psubb", 0xF8, prefix=0x66)
+Psubw = make_packed("psubw", 0xF9, prefix=0x66)
+Psubd = make_packed("psubd", 0xFA, prefix=0x66)
+Psubq = make_packed("psubq", 0xFB, prefix=0x66)
+Pmullw = make_packed("pmullw", 0xD5, prefix=0x66)
+Pand = make_packed("pand", 0xDB, prefix=0x66)
+Por = make_packed("por", 0xEB, prefix=0x66)
+Pxor = make_packed("pxor", 0xEF, prefix=0x66)
+
+
 class SsePseudoInstruction(ArtificialInstruction):
     isa = sse1_isa
 
 
 class PushXmm(SsePseudoInstruction):
-    r = Operand("r", XmmRegister, read=True)
+    r = Operand("r", XmmRegisterDouble, read=True)
     syntax = Syntax(["push", " ", r])
 
     def render(self):
         # sub rsp, 16
         yield SubImm(rsp, 16)
 
+        # Save all 128 bits, the register might hold a vector:
         # movdqu [rsp], r
-        yield Movsd2(RmMem(rsp), self.r)
+        yield Movdqu2(RmMem(rsp), get_xmm_vector_reg(self.r.num))
 
 
 class PopXmm(SsePseudoInstruction):
-    r = Operand("r", XmmRegister, write=True)
+    r = Operand("r", XmmRegisterDouble, write=True)
     syntax = Syntax(["pop", " ", r])
 
     def render(self):
-        # movdqu [rsp], r
-        yield Movsd(self.r, RmMem(rsp))
+        # movdqu r, [rsp]
+        yield Movdqu(get_xmm_vector_reg(self.r.num), RmMem(rsp))
 
         # add rsp, 16
         yield AddImm(rsp, 16)
@@ -735,6 +824,129 @@ def pattern_ldr_f64(context, tree, c0):
     return dst
 
 
+# Vectors:
+@sse2_isa.pattern("stm", "MOVF64X2(regvec)", size=3, cycles=1, energy=1)
+@sse1_isa.pattern("stm", "MOVF32X4(regvec)", size=3, cycles=1, energy=1)
+@sse2_isa.pattern("stm", "MOVI64X2(regvec)", size=3, cycles=1, energy=1)
+@sse2_isa.pattern("stm", "MOVI32X4(regvec)", size=3, cycles=1, energy=1)
+@sse2_isa.pattern("stm", "MOVI16X8(regvec)", size=3, cycles=1, energy=1)
+@sse2_isa.pattern("stm", "MOVI8X16(regvec)", size=3, cycles=1, energy=1)
+def pattern_mov_vector(context, tree, c0):
+    context.move(tree.value, c0)
+
+
+@sse2_isa.pattern("regvec", "REGF64X2", size=0, cycles=0, energy=0)
+@sse1_isa.pattern("regvec", "REGF32X4", size=0, cycles=0, energy=0)
+@sse2_isa.pattern("regvec", "REGI64X2", size=0, cycles=0, energy=0)
+@sse2_isa.pattern("regvec", "REGI32X4", size=0, cycles=0, energy=0)
+@sse2_isa.pattern("regvec", "REGI16X8", size=0, cycles=0, energy=0)
+@sse2_isa.pattern("regvec", "REGI8X16", size=0, cycles=0, energy=0)
+def pattern_reg_vector(context, tree):
+    return tree.value
+
+
+@sse2_isa.pattern("stm", "STRF64X2(reg64, regvec)", size=6, cycles=3, energy=3)
+@sse1_isa.pattern("stm", "STRF32X4(reg64, regvec)", size=6, cycles=3, energy=3)
+def pattern_str_vector_fp(context, tree, c0, c1):
+    context.emit(Movups2(RmMem(c0), c1))
+
+
+@sse2_isa.pattern("stm", "STRI64X2(reg64, regvec)", size=6, cycles=3, energy=3)
+@sse2_isa.pattern("stm", "STRI32X4(reg64, regvec)", size=6, cycles=3, energy=3)
+@sse2_isa.pattern("stm", "STRI16X8(reg64, regvec)", size=6, cycles=3, energy=3)
+@sse2_isa.pattern("stm", "STRI8X16(reg64, regvec)", size=6, cycles=3, energy=3)
+def pattern_str_vector(context, tree, c0, c1):
+    context.emit(Movdqu2(RmMem(c0), c1))
+
+
+@sse2_isa.pattern("regvec", "LDRF64X2(reg64)", size=6, cycles=3, energy=3)
+@sse1_isa.pattern("regvec", "LDRF32X4(reg64)", size=6, cycles=3, energy=3)
+def pattern_ldr_vector_fp(context, tree, c0):
+    dst = context.new_reg(XmmRegisterVector)
+    context.emit(Movups(dst, RmMem(c0)))
+    return dst
+
+
+@sse2_isa.pattern("regvec", "LDRI64X2(reg64)", size=6, cycles=3, energy=3)
+@sse2_isa.pattern("regvec", "LDRI32X4(reg64)", size=6, cycles=3, energy=3)
+@sse2_isa.pattern("regvec", "LDRI16X8(reg64)", size=6, cycles=3, energy=3)
+@sse2_isa.pattern("regvec", "LDRI8X16(reg64)", size=6, cycles=3, energy=3)
+def pattern_ldr_vector(context, tree, c0):
+    dst = context.new_reg(XmmRegisterVector)
+    context.emit(Movdqu(dst, RmMem(c0)))
+    return dst
+
+
+packed_instructions = {
+    "ADDF64X2": Addpd,
+    "SUBF64X2": Subpd,
+    "MULF64X2": Mulpd,
+    "DIVF64X2": Divpd,
+    "ADDF32X4": Addps,
+    "SUBF32X4": Subps,
+    "MULF32X4": Mulps,
+    "DIVF32X4": Divps,
+    "ADDI64X2": Paddq,
+    "SUBI64X2": Psubq,
+    "ADDI32X4": Paddd,
+    "SUBI32X4": Psubd,
+    "ADDI16X8": Paddw,
+    "SUBI16X8": Psubw,
+    "MULI16X8": Pmullw,
+    "ADDI8X16": Paddb,
+    "SUBI8X16": Psubb,
+    "ANDI64X2": Pand,
+    "ORI64X2": Por,
+    "XORI64X2": Pxor,
+    "ANDI32X4": Pand,
+    "ORI32X4": Por,
+    "XORI32X4": Pxor,
+    "ANDI16X8": Pand,
+    "ORI16X8": Por,
+    "XORI16X8": Pxor,
+    "ANDI8X16": Pand,
+    "ORI8X16": Por,
+    "XORI8X16": Pxor,
+}
+
+
+@sse2_isa.pattern("regvec", "ADDF64X2(regvec, regvec)", size=4, cycles=4)
+@sse2_isa.pattern("regvec", "SUBF64X2(regvec, regvec)", size=4, cycles=4)
+@sse2_isa.pattern("regvec", "MULF64X2(regvec, regvec)", size=4, cycles=4)
+@sse2_isa.pattern("regvec", "DIVF64X2(regvec, regvec)", size=4, cycles=14)
+@sse1_isa.pattern("regvec", "ADDF32X4(regvec, regvec)", size=3, cycles=4)
+@sse1_isa.pattern("regvec", "SUBF32X4(regvec, regvec)", size=3, cycles=4)
+@sse1_isa.pattern("regvec", "MULF32X4(regvec, regvec)", size=3, cycles=4)
+@sse1_isa.pattern("regvec", "DIVF32X4(regvec, regvec)", size=3, cycles=11)
+@sse2_isa.pattern("regvec", "ADDI64X2(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "SUBI64X2(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ANDI64X2(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ORI64X2(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "XORI64X2(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ADDI32X4(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "SUBI32X4(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ANDI32X4(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ORI32X4(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "XORI32X4(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ADDI16X8(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "SUBI16X8(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "MULI16X8(regvec, regvec)", size=4, cycles=5)
+@sse2_isa.pattern("regvec", "ANDI16X8(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ORI16X8(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "XORI16X8(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ADDI8X16(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "SUBI8X16(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ANDI8X16(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "ORI8X16(regvec, regvec)", size=4, cycles=1)
+@sse2_isa.pattern("regvec", "XORI8X16(regvec, regvec)", size=4, cycles=1)
+def pattern_packed(context, tree, c0, c1):
+    """ Operate on all lanes of two vectors at once """
+    dst = context.new_reg(XmmRegisterVector)
+    context.move(dst, c0)
+    context.emit(packed_instructions[tree.name](dst, RmXmmRegVector(c1)))
+    return dst
+
+
 jump_opnames = {"<": Jb, ">": Ja, "==": Je, "!=": Jne, ">=": Jae, "<=": Jbe}
 
 
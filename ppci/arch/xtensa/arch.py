@@ -116,7 +116,8 @@ class XtensaArch(Architecture):
             yield self.move(self.fp, registers.a1)
 
             size = -round_up(frame.stacksize)
-            yield instructions.Addi(registers.a1, registers.a1, size)
+            for instruction in adjust_stack(size):
+                yield instruction
 
         # Callee save registers:
         for reg in self.callee_save:
@@ -132,7 +133,8 @@ class XtensaArch(Architecture):
 
         if frame.stacksize > 0:
             size = round_up(frame.stacksize)
-            yield instructions.Addi(registers.a1, registers.a1, size)
+            for instruction in adjust_stack(size):
+                yield instruction
 
         yield instructions.Pop(self.fp)
 
@@ -197,3 +199,18 @@ def round_up(s):
         return s + (4 - s % 4)
     else:
         return s
+
+
+def adjust_stack(size):
+    """ Add a constant to the stack pointer.
+
+    addi takes a signed 8 bit constant, so larger sizes are added in
+    multiples of 256 with addmi first.
+    """
+    low = (size + 128) % 256 - 128
+    high = (size - low) // 256
+    assert high in range(-128, 128)
+    if high:
+        yield instructions.Addmi(registers.a1, registers.a1, high)
+    if low:
+        yield instructions.Addi(registers.a1, registers.a1, low)
@@ -1096,6 +1096,27 @@ def pattern_fprel(context, tree):
     return d
 
 
+@core_isa.pattern(
+    "reg",
+    "FPRELU32",
+    size=6,
+    cycles=2,
+    energy=2,
+    condition=lambda t: t.value.offset not in range(-128, 127),
+)
+def pattern_fprel_large(context, tree):
+    """ Frame relative address, with an offset too large for addi """
+    offset = tree.value.offset
+    c0 = context.new_reg(AddressRegister)
+    if offset in range(-2048, 2048):
+        context.emit(Movi(c0, offset))
+    else:
+        context.emit(L32r(c0, context.frame.add_constant(offset)))
+    d = context.new_reg(AddressRegister)
+    context.emit(Add(d, a15, c0))
+    return d
+
+
 @core_isa.pattern("reg", "SUBI32(reg,reg)", size=3, cycles=1, energy=1)
 @core_isa.pattern("reg", "SUBU32(reg,reg)", size=3, cycles=1, energy=1)
 def pattern_sub_i32(context, tree, c0, c1):
@@ -7,8 +7,10 @@ module
 """
 
 from .tasks import Task, TaskError, register_task
+from ..utils.parallel import run_jobs
 from ..utils.reporting import HtmlReportGenerator, DummyReportGenerator
 from .. import api
+from ..binutils.objectfile import deserialize
 from ..lang.tools.common import ParserException
 from ..common import CompilerError
 
@@ -114,7 +116,11 @@ class C3CompileTask(OutputtingTask):
 
 @register_task
 class CCompileTask(OutputtingTask):
-    """ Task that compiles C code for some target into an object file """
+    """ Task that compiles C code for some target into an object file.
+
+    With the jobs attribute, the sources are compiled by that many worker
+    processes, 0 means one per cpu.
+    """
     def run(self):
         arch = self.get_argument('arch')
         sources = self.open_file_set(self.arguments['sources'])
@@ -134,23 +140,44 @@ class CCompileTask(OutputtingTask):
         debug = bool(self.get_argument('debug', default=False))
         opt = int(self.get_argument('optimize', default='0'))
 
+        jobs = int(self.get_argument('jobs', default='1'))
+
         coptions = api.COptions()
         coptions.add_include_paths(includes)
 
         with reporter:
-            objs = []
-            for source in sources:
-                with open(source, 'r') as f:
-                    obj = api.cc(
-                        f, arch, coptions=coptions, opt_level=opt,
-                        reporter=reporter, debug=debug)
-                objs.append(obj)
+            if jobs == 1:
+                objs = []
+                for source in sources:
+                    with open(source, 'r') as f:
+                        obj = api.cc(
+                            f, arch, coptions=coptions, opt_level=opt,
+                            reporter=reporter, debug=debug)
+                    objs.append(obj)
+            else:
+                # Compile each source into an object in a worker process:
+                results = run_jobs(
+                    compile_c_source,
+                    [
+                        (source, arch, coptions, opt, debug)
+                        for source in sources
+                    ],
+                    jobs=jobs)
+                objs = [deserialize(data) for data in results]
             obj = api.link(
                 objs, partial_link=True, reporter=reporter, debug=debug)
 
         self.store_object(obj)
 
 
+def compile_c_source(filename, arch, coptions, opt_level, debug):
+    """ Compile a C source file into a serialized object file """
+    with open(filename, 'r') as f:
+        obj = api.cc(
+            f, arch, coptions=coptions, opt_level=opt_level, debug=debug)
+    return obj.serialize()
+
+
 @register_task
 class PascalCompileTask(OutputtingTask):
     """ Task that compiles pascal code for some target into an object file """
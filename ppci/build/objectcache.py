@@ -0,0 +1,206 @@
+""" A content addressed cache of object files.
+
+Compiling the same sources again, for example when rebuilding a library,
+gives the same object files. The object cache stores object files on disk
+under a hash of everything that determines the result: the (preprocessed)
+source text, the target architecture, the options, the optimization level
+and the version of ppci. When the same hash is requested again, the
+object file is loaded from the cache instead of compiling the sources.
+
+The size of the cache is limited. When the cache grows too large, the
+least recently used object files are removed.
+
+Example:
+
+.. doctest::
+
+    >>> import io, tempfile
+    >>> from ppci.api import cc
+    >>> from ppci.build.objectcache import ObjectCache
+    >>> cache = ObjectCache(tempfile.mkdtemp())
+    >>> src = "int add(int a, int b) { return a + b; }"
+    >>> obj = cc(io.StringIO(src), 'arm', cache=cache)
+    >>> obj = cc(io.StringIO(src), 'arm', cache=cache)
+    >>> cache.hits, cache.misses
+    (1, 1)
+
+"""
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+
+from .. import __version__
+from ..binutils.objectfile import ObjectFile
+
+# The default limit for the total size of the cached object files:
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+
+
+def make_key(*parts):
+    """ Create the key for a compilation from its inputs.
+
+    The parts must have a stable textual representation, like strings,
+    numbers and tuples of those. The version of ppci is part of the key.
+    """
+    digest = hashlib.sha256()
+    digest.update(__version__.encode("ascii"))
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf8")
+        elif not isinstance(part, bytes):
+            part = repr(part).encode("utf8")
+        digest.update(str(len(part)).encode("ascii"))
+        digest.update(b":")
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class ObjectCache:
+    """ A size bounded store of object files on disk.
+
+    Args:
+        directory: the directory in which the object files are stored.
+        max_size: the maximum total size of the object files in bytes.
+    """
+
+    logger = logging.getLogger("objectcache")
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # The total size of the object files, once known. Other processes
+        # may use the same directory, so the directory is scanned again
+        # before evicting entries:
+        self._size = None
+
+    def __repr__(self):
+        return "<ObjectCache {}>".format(self.directory)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key[:2], key[2:] + ".oj")
+
+    def get(self, key):
+        """ Get the object file stored under the key, or None """
+        filename = self._filename(key)
+        try:
+            with open(filename, "r") as f:
+                obj = ObjectFile.load(f)
+        except OSError:
+            self.misses += 1
+            self.logger.debug("Cache miss %s", key)
+            return None
+        except Exception:  # Any error of a damaged object file
+            self.misses += 1
+            self.logger.warning("Removing corrupt cache entry %s", key)
+            self._remove(filename)
+            return None
+
+        # Mark the entry as recently used:
+        os.utime(filename)
+        self.hits += 1
+        self.logger.debug("Cache hit %s", key)
+        return obj
+
+    def put(self, key, obj):
+        """ Store an object file under the given key """
+        filename = self._filename(key)
+        folder = os.path.dirname(filename)
+        os.makedirs(folder, exist_ok=True)
+
+        # Write into a temporary file first, so that no partial object
+        # files can be read:
+        f = io.StringIO()
+        obj.save(f)
+        if self._size is None:
+            self._size = self.size()
+        self._size -= self._file_size(filename)
+        handle, temp_filename = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(handle, "w") as output:
+            output.write(f.getvalue())
+        os.replace(temp_filename, filename)
+        self._size += self._file_size(filename)
+        if self._size > self.max_size:
+            self.evict()
+
+    @staticmethod
+    def _file_size(filename):
+        try:
+            return os.stat(filename).st_size
+        except OSError:
+            return 0
+
+    def _remove(self, filename):
+        size = self._file_size(filename)
+        try:
+            os.remove(filename)
+        except OSError:  # pragma: no cover
+            return False
+        if self._size is not None:
+            self._size -= size
+        return True
+
+    def entries(self):
+        """ Get the filename, size and time of use of the cached objects """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for folder in os.listdir(self.directory):
+            folder = os.path.join(self.directory, folder)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.endswith(".oj"):
+                    continue
+                filename = os.path.join(folder, name)
+                try:
+                    st = os.stat(filename)
+                except OSError:  # pragma: no cover
+                    continue
+                entries.append((filename, st.st_size, st.st_mtime_ns))
+        return entries
+
+    def size(self):
+        """ The total size of the cached object files """
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """ Remove the least recently used objects until the cache fits """
+        entries = self.entries()
+        self._size = sum(size for _, size, _ in entries)
+        if self._size <= self.max_size:
+            return
+        entries.sort(key=lambda e: e[2])
+        for filename, _, _ in entries:
+            if self._size <= self.max_size:
+                break
+            if self._remove(filename):
+                self.evictions += 1
+                self.logger.debug("Evicted %s", filename)
+
+    def clear(self):
+        """ Remove all cached objects """
+        for filename, _, _ in self.entries():
+            os.remove(filename)
+        self._size = 0
+
+    def statistics(self):
+        """ Get a summary of the cache hits and misses """
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits / lookups if lookups else 0
+        return "{} hits, {} misses ({:.0f}% hit rate), {} evictions".format(
+            self.hits, self.misses, rate, self.evictions
+        )
+
+
+def get_object_cache(cache):
+    """ Turn a directory name into an object cache """
+    if cache is None or isinstance(cache, ObjectCache):
+        return cache
+    return ObjectCache(cache)
@@ -10,6 +10,7 @@ from .. import __version__
 from ..arch.target_list import target_names, create_arch
 from ..build.tasks import TaskError
 from ..common import logformat, CompilerError
+from ..irutils import set_verify_level
 from ..utils.reporting import HtmlReportGenerator, DummyReportGenerator
 from ..utils.reporting import TextReportGenerator
 
@@ -152,6 +153,7 @@ class LogSetup:
         self.args = args
         self.console_handler = None
         self.file_handler = None
+        self.previous_verify_level = None
         self.logger = logging.getLogger()
         cgitb.enable(format="text")
 
@@ -187,6 +189,11 @@ class LogSetup:
         else:
             self.reporter = DummyReportGenerator()
         self.logger.debug("Reporting to %s", self.reporter)
+
+        # Some tools allow to tune the verification of ir-code:
+        if getattr(self.args, "verify", None):
+            self.previous_verify_level = set_verify_level(self.args.verify)
+
         self.logger.debug("Loggers attached")
         self.logger.info(version_text)
         return self
@@ -239,6 +246,9 @@ class LogSetup:
 
         self.logger.removeHandler(self.console_handler)
 
+        if self.previous_verify_level is not None:
+            set_verify_level(self.previous_verify_level)
+
         # exit code when error:
         if err:
             sys.exit(1)
@@ -26,6 +26,13 @@ parser.add_argument(
     help="include file",
     default=[],
 )
+parser.add_argument(
+    "--interfaces",
+    metavar="directory",
+    help="store module interfaces in this directory, and use them "
+    "instead of parsing the includes. The includes then only provide "
+    "declarations",
+)
 parser.add_argument("sources", metavar="source", help="source file", nargs="+")
 
 
@@ -37,7 +44,11 @@ def c3c(args=None):
         march = get_arch_from_args(args)
 
         ir_module = api.c3_to_ir(
-            args.sources, args.include, march, reporter=log_setup.reporter
+            args.sources,
+            args.include,
+            march,
+            reporter=log_setup.reporter,
+            interfaces=args.interfaces,
         )
 
         do_compile([ir_module], march, log_setup.reporter, log_setup.args)
@@ -6,12 +6,26 @@ computer architectures.
 
 
 import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
 from .base import base_parser, march_parser
 from .compile_base import compile_parser, do_compile
-from .base import LogSetup, get_arch_from_args
-from .. import api
-from ..lang.c import create_ast, CAstPrinter
+from .base import LogSetup, get_arch_from_args, ColoredFormatter
+from .. import api, ir
+from ..binutils.objectfile import deserialize
+from ..common import logformat
+from ..irutils import add_edge_counters, Profile
+from ..irutils import get_verify_level, set_verify_level
+from ..irutils.instrument import add_tracer
+from ..lang.c import create_ast, CAstPrinter, CContext
+from ..lang.c.api import list_dependencies
+from ..lang.c.utils import make_rule
+from ..lang.c.pch import create_pch
 from ..lang.c.options import COptions, coptions_parser
+from ..utils.parallel import run_jobs
 
 
 parser = argparse.ArgumentParser(
@@ -26,7 +40,43 @@ parser.add_argument(
     "-M",
     action="store_true",
     default=False,
-    help="Instead of preprocessing, emit a makefile rule with dependencies",
+    help="Instead of compiling, emit a makefile rule with dependencies",
+)
+parser.add_argument(
+    "-MM",
+    action="store_true",
+    default=False,
+    help="Like -M, but leave out headers included with #include <...>",
+)
+parser.add_argument(
+    "-MD",
+    action="store_true",
+    default=False,
+    help="Compile, and write a makefile rule with dependencies as well",
+)
+parser.add_argument(
+    "-MMD",
+    action="store_true",
+    default=False,
+    help="Like -MD, but leave out headers included with #include <...>",
+)
+parser.add_argument(
+    "-MF",
+    metavar="file",
+    help="Write the makefile rules to the given file. The default is "
+    "standard output with -M, and the output file with the .d extension "
+    "with -MD.",
+)
+parser.add_argument(
+    "-MT",
+    metavar="target",
+    help="The target of the makefile rules",
+)
+parser.add_argument(
+    "--emit-pch",
+    action="store_true",
+    default=False,
+    help="Precompile the given header, for use with -include-pch",
 )
 parser.add_argument(
     "--ast",
@@ -37,6 +87,27 @@ parser.add_argument(
 parser.add_argument(
     "-c", action="store_true", default=False, help="Compile, but do not link"
 )
+parser.add_argument(
+    "-j",
+    "--jobs",
+    type=int,
+    default=1,
+    metavar="N",
+    help="Compile the sources into object files with N processes, and link "
+    "them. 0 uses a process per cpu.",
+)
+parser.add_argument(
+    "--profile-generate",
+    metavar="profile-file",
+    help="Instrument the code with block and edge counters, and write the "
+    "description of the counters to the given profile file. After running "
+    "the code, the counts can be read into this profile.",
+)
+parser.add_argument(
+    "--profile-use",
+    metavar="profile-file",
+    help="Use the execution counts in the given profile file to optimize",
+)
 parser.add_argument(
     "sources",
     metavar="source",
@@ -49,6 +120,10 @@ parser.add_argument(
 def cc(args=None):
     """ Run c compile task """
     args = parser.parse_args(args)
+    if compiles_in_parallel(args) and (
+        args.report or args.html_report or args.text_report
+    ):
+        parser.error("reports cannot be written when compiling with --jobs")
     with LogSetup(args) as log_setup:
         # Compile sources:
         march = get_arch_from_args(args)
@@ -59,10 +134,23 @@ def cc(args=None):
             with open(args.output, "w") as output:
                 for src in args.sources:
                     api.preprocess(src, output, coptions)
-        elif args.M:  # Emit a makefile dep line.
-            dependencies = []
-            for filename in dependencies:
-                print(filename)
+        elif args.M or args.MM:  # Emit makefile rules.
+            rules = []
+            for src in args.sources:
+                dependencies = list_dependencies(src, coptions)
+                target = args.MT or object_name(src.name)
+                prerequisites = dependency_names(
+                    [src], dependencies, args.MM
+                )
+                rules.append(make_rule(target, prerequisites))
+            write_rules(args.MF, rules)
+        elif args.emit_pch:
+            if len(args.sources) != 1:
+                parser.error("--emit-pch requires a single header")
+            src = args.sources[0]
+            context = CContext(coptions, march.info)
+            with open(args.output, "wb") as output:
+                create_pch(src, src.name, context, output)
         elif args.ast:
             with open(args.output, "w") as output:
                 printer = CAstPrinter(file=output)
@@ -73,16 +161,199 @@ def cc(args=None):
                         src, march.info, filename=filename, coptions=coptions
                     )
                     printer.print(ast)
+        elif compiles_in_parallel(args):
+            compile_parallel(args, march, log_setup.reporter)
         else:
             ir_modules = []
+            dependencies = []
             for src in args.sources:
                 # Compile and optimize in any case:
                 ir_module = api.c_to_ir(
-                    src, march, coptions=coptions, reporter=log_setup.reporter
+                    src,
+                    march,
+                    coptions=coptions,
+                    reporter=log_setup.reporter,
+                    dependencies=dependencies,
                 )
                 ir_modules.append(ir_module)
 
+            handle_profile(args, march, ir_modules)
             do_compile(ir_modules, march, log_setup.reporter, log_setup.args)
+            write_dependency_file(args, dependencies)
+
+
+def compiles_in_parallel(args):
+    """ Check if the sources are compiled into objects by worker processes """
+    return args.jobs != 1 and not (
+        args.E
+        or args.M
+        or args.MM
+        or args.emit_pch
+        or args.ast
+        or args.ir
+        or args.S
+        or args.wasm
+        or args.pycode
+    )
+
+
+def object_name(filename):
+    """ The object file which make expects for a source """
+    return os.path.splitext(os.path.basename(filename))[0] + ".o"
+
+
+def dependency_names(sources, dependencies, skip_system):
+    """ Get the sources and the headers they include, without doubles """
+    names = [src.name for src in sources]
+    for filename, system in dependencies:
+        if not (skip_system and system) and filename not in names:
+            names.append(filename)
+    return names
+
+
+def write_rules(filename, rules):
+    """ Write makefile rules to a file, or to standard output """
+    if filename:
+        with open(filename, "w") as f:
+            f.write("".join(rules))
+    else:
+        sys.stdout.write("".join(rules))
+
+
+def write_dependency_file(args, dependencies):
+    """ Write a makefile rule for the output, when -MD is given """
+    if args.MD or args.MMD:
+        target = args.MT or args.output
+        prerequisites = dependency_names(args.sources, dependencies, args.MMD)
+        filename = args.MF or os.path.splitext(args.output)[0] + ".d"
+        write_rules(filename, [make_rule(target, prerequisites)])
+
+
+def compile_parallel(args, march, reporter):
+    """ Compile each source into an object in a separate process """
+    arch = march.make_id_str()
+    coptions = COptions()
+    coptions.process_args(args)
+    settings = {
+        "opt_level": args.O,
+        "debug": args.g,
+        "profile_use": args.profile_use,
+        "profile_generate": bool(args.profile_generate),
+        "instrument_functions": args.instrument_functions,
+    }
+    log_level = logging.DEBUG if args.verbose > 0 else args.log
+    results = run_jobs(
+        compile_source,
+        [
+            (src.name, profile_counters_name(src), arch, coptions, settings)
+            for src in args.sources
+        ],
+        jobs=args.jobs,
+        initializer=setup_worker,
+        initargs=(log_level, get_verify_level()),
+    )
+
+    # Link the objects in the order of the sources:
+    objs = []
+    profile = Profile()
+    dependencies = []
+    for data, module_profile, source_dependencies in results:
+        objs.append(deserialize(data))
+        if module_profile:
+            profile.merge(module_profile)
+        dependencies.extend(source_dependencies)
+    obj = api.link(objs, partial_link=True, reporter=reporter, debug=args.g)
+    with open(args.output, "w") as output:
+        obj.save(output)
+
+    if args.profile_generate:
+        with open(args.profile_generate, "w") as f:
+            profile.save(f)
+    write_dependency_file(args, dependencies)
+
+
+def setup_worker(log_level, verify_level):
+    """ Log and verify in a worker process like in the main process """
+    logger = logging.getLogger()
+    logger.setLevel(logging.DEBUG)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(ColoredFormatter(logformat))
+    console_handler.setLevel(log_level)
+    # Replace handlers which a forked worker inherits:
+    logger.handlers = [console_handler]
+    set_verify_level(verify_level)
+
+
+def compile_source(filename, counters_name, arch, coptions, settings):
+    """ Compile a single source into a serialized object file """
+    march = api.get_arch(arch)
+    dependencies = []
+    with open(filename, "r") as f:
+        ir_module = api.c_to_ir(
+            f, march, coptions=coptions, dependencies=dependencies
+        )
+
+    module_profile = None
+    if settings["profile_use"]:
+        with open(settings["profile_use"], "r") as f:
+            Profile.load(f).apply(ir_module, counters_name)
+    if settings["profile_generate"]:
+        module_profile = add_edge_counters(
+            ir_module, counters_name, profile_counter_type(march)
+        )
+
+    api.optimize(ir_module, level=settings["opt_level"], march=march)
+    if settings["instrument_functions"]:
+        add_tracer(ir_module)
+    obj = api.ir_to_object([ir_module], march, debug=settings["debug"])
+    return obj.serialize(), module_profile, dependencies
+
+
+def handle_profile(args, march, ir_modules):
+    """ Use a profile, or instrument the code to gather a profile """
+    modules = [
+        (ir_module, profile_counters_name(src))
+        for src, ir_module in zip(args.sources, ir_modules)
+    ]
+
+    if args.profile_use:
+        with open(args.profile_use, "r") as f:
+            profile = Profile.load(f)
+        for ir_module, counters_name in modules:
+            profile.apply(ir_module, counters_name)
+
+    if args.profile_generate:
+        counter_ty = profile_counter_type(march)
+        profile = Profile()
+        for ir_module, counters_name in modules:
+            profile.merge(
+                add_edge_counters(ir_module, counters_name, counter_ty)
+            )
+        with open(args.profile_generate, "w") as f:
+            profile.save(f)
+
+
+def profile_counter_type(march):
+    """ Use 64 bit counters when the target supports them """
+    if ir.i64 in march.info.value_classes:
+        return ir.i64
+    else:
+        return ir.i32
+
+
+def profile_counters_name(src):
+    """ Determine the name of the profile counters of a source file.
+
+    Sources with the same basename in different directories are told
+    apart by a hash of their path.
+    """
+    filename = src.name if hasattr(src, "name") else "source"
+    basename = os.path.splitext(os.path.basename(filename))[0]
+    path = os.path.normcase(os.path.normpath(filename))
+    digest = hashlib.sha1(path.encode("utf8")).hexdigest()[:8]
+    return "__profile_counters_{}_{}".format(
+        re.sub(r"\W", "_", basename), digest
+    )
 
 
 if __name__ == "__main__":
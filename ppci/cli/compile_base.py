@@ -39,6 +39,11 @@ compile_parser.add_argument(
 compile_parser.add_argument(
     "-O", help="optimize code", default="0", choices=api.OPT_LEVELS
 )
+compile_parser.add_argument(
+    "--verify",
+    help="How thoroughly to verify the ir-code",
+    choices=irutils.VERIFY_LEVELS,
+)
 compile_parser.add_argument(
     "--instrument-functions",
     help="Instrument given functions",
@@ -52,7 +57,7 @@ def do_compile(ir_modules, march, reporter, args):
 
     # Optimize:
     for ir_module in ir_modules:
-        api.optimize(ir_module, level=args.O, reporter=reporter)
+        api.optimize(ir_module, level=args.O, reporter=reporter, march=march)
 
     # Instrument:
     if args.instrument_functions:
@@ -8,6 +8,11 @@ from .. import api, irutils
 
 parser = argparse.ArgumentParser(description=__doc__, parents=[base_parser])
 parser.add_argument("-O", help="Optimization level", default=2, type=int)
+parser.add_argument(
+    "--verify",
+    help="How thoroughly to verify the ir-code",
+    choices=irutils.VERIFY_LEVELS,
+)
 parser.add_argument("input", help="input file", type=argparse.FileType("r"))
 parser.add_argument("output", help="output file", type=argparse.FileType("w"))
 
@@ -18,7 +23,7 @@ def opt(args=None):
     module = irutils.Reader().read(args.input)
     with LogSetup(args):
         api.optimize(module, level=args.O)
-    irutils.Writer(file=args.output).write(module)
+        irutils.Writer(file=args.output).write(module)
 
 
 if __name__ == "__main__":
@@ -22,6 +22,7 @@ from .instructionselector import InstructionSelector1
 from .instructionscheduler import InstructionScheduler
 from .registerallocator import GraphColoringRegisterAllocator
 from .peephole import PeepHoleStream
+from .switch import SwitchLowering
 
 
 class CodeGenerator:
@@ -34,6 +35,11 @@ class CodeGenerator:
         self.arch = arch
         self.verifier = Verifier()
         self.sgraph_builder = SelectionGraphBuilder(arch)
+
+        # Use jump tables if the target can jump indirectly:
+        self.switch_lowering = SwitchLowering(
+            use_tables=any(p.tree.name == "IJMP" for p in arch.isa.patterns)
+        )
         weights_map = {
             "size": (10, 1, 1),
             "speed": (3, 10, 1),
@@ -111,17 +117,7 @@ class CodeGenerator:
                     elif isinstance(part, tuple) and part[0] is ir.ptr:
                         # Emit reference to a label:
                         assert isinstance(part[1], str)
-                        labels_refs = {
-                            (2, Endianness.LITTLE): data_instructions.Dw2,
-                            (4, Endianness.LITTLE): data_instructions.Dcd2,
-                            (8, Endianness.LITTLE): data_instructions.Dq2,
-                        }
-                        key = (
-                            self.arch.info.get_size(part[0]),
-                            self.arch.info.endianness,
-                        )
-                        op_cls = labels_refs[key]
-                        output_stream.emit(op_cls(part[1]))
+                        output_stream.emit(self._label_reference(part[1]))
                     else:
                         raise NotImplementedError(str(part))
             else:
@@ -134,6 +130,17 @@ class CodeGenerator:
             dv.address = label.name
             output_stream.emit(DebugData(dv))
 
+    def _label_reference(self, name):
+        """ Create a data instruction holding the address of a label """
+        labels_refs = {
+            (2, Endianness.LITTLE): data_instructions.Dw2,
+            (4, Endianness.LITTLE): data_instructions.Dcd2,
+            (8, Endianness.LITTLE): data_instructions.Dq2,
+        }
+        key = (self.arch.info.get_size(ir.ptr), self.arch.info.endianness)
+        op_cls = labels_refs[key]
+        return op_cls(name)
+
     def generate_function(
         self, ir_function, output_stream, reporter, debug=False
     ):
@@ -147,6 +154,9 @@ class CodeGenerator:
         reporter.heading(3, "Log for {}".format(ir_function))
         reporter.dump_ir(ir_function)
 
+        # Lower switch statements into indexed branches or compare trees:
+        self.switch_lowering.run(ir_function)
+
         # Split too large basic blocks in smaller chunks (for literal pools):
         # TODO: fix arbitrary number of 500. This works for arm and thumb..
         split_block_nr = 1
@@ -205,6 +215,16 @@ class CodeGenerator:
             dd = DebugData(d)
             output_stream.emit(dd)
 
+        # Emit the address tables of indexed branches:
+        if frame.jump_tables:
+            output_stream.select_section("data")
+            output_stream.emit(Alignment(self.arch.info.get_size(ir.ptr)))
+            for table_name, labels in frame.jump_tables:
+                output_stream.emit(Label(table_name))
+                for label in labels:
+                    output_stream.emit(self._label_reference(label.name))
+            output_stream.select_section("code")
+
         reporter.dump_instructions(instruction_list, self.arch)
 
     def select_and_schedule(self, ir_function, frame, reporter):
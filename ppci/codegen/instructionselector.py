@@ -43,6 +43,9 @@ operations are listed in the below table:
 +---------------+---------+-----------------------------------------+
 | CJMP          | I,U     | Conditional jump to a label             |
 +---------------+---------+-----------------------------------------+
+| IJMP(c0)      |         | Jump to the address c0, one of a list   |
+|               |         | of labels                               |
++---------------+---------+-----------------------------------------+
 
 ...
 
@@ -108,6 +111,7 @@ terminals = tuple(x + y for x in ops for y in data_types) + (
     "LABEL",
     "MOVB",  # Attempts at blob data copies
     "JMP",
+    "IJMP",  # Indirect jump through a jump table
     "EXIT",
     "ENTRY",
     "ALLOCA",
@@ -17,8 +17,13 @@ from .. import ir
 from ..arch.generic_instructions import Label
 from ..arch.stack import StackLocation
 from ..binutils.debuginfo import FpOffsetAddress
+from ..utils.collections import OrderedSet
 from .selectiongraph import SGNode, SGValue, SelectionGraph
 
+# The maximum amount of loads and stores to copy or clear a block of
+# memory inline. Larger blocks are copied with a memcpy action or call:
+INLINE_MEMORY_LIMIT = 8
+
 
 def prepare_function_info(arch, function_info, ir_function):
     """ Fill function info with labels for all basic blocks """
@@ -66,6 +71,28 @@ def prepare_function_info(arch, function_info, ir_function):
             function_info.rv_vreg = None
 
 
+def known_alignment(address):
+    """ Determine the alignment in bytes of the given address value """
+    if isinstance(address, ir.AddressOf):
+        address = address.src
+    if isinstance(address, (ir.Alloc, ir.Variable)):
+        return address.alignment
+    return 1
+
+
+def constant_value(value):
+    """ Get the integer value of a constant, possibly casted, or None """
+    while (
+        isinstance(value, ir.Cast)
+        and value.ty.is_integer
+        and value.src.ty.is_integer
+        and value.ty.bits >= value.src.ty.bits
+    ):
+        value = value.src
+    if isinstance(value, ir.Const) and isinstance(value.value, int):
+        return value.value
+
+
 class FunctionInfo:
     """ Keeps track of global function data when generating code for part
     of a functions. """
@@ -136,6 +163,23 @@ class SelectionGraphBuilder:
         # size_map = {8: ir.i8, 16: ir.i16, 32: ir.i32, 64: ir.i64}
         self.ptr_ty = arch.info.type_infos["ptr"]
 
+        # Determine the types which can be used to copy memory, largest
+        # first:
+        if hasattr(arch, "isa"):
+            tree_names = {pattern.tree.name for pattern in arch.isa.patterns}
+        else:
+            tree_names = set()
+        self.has_movb = "MOVB" in tree_names
+        self.word_types = [
+            ty
+            for ty in (ir.i64, ir.i32, ir.i16, ir.i8)
+            if ty in arch.info.value_classes
+            and ty.size <= self.ptr_ty.size
+            and arch.info.get_size(ty) == ty.size
+            and "LDR{}".format(ty).upper() in tree_names
+            and "STR{}".format(ty).upper() in tree_names
+        ]
+
     def build(self, ir_function: ir.SubRoutine, function_info, debug_db):
         """ Create a selection graph for the given function.
 
@@ -286,6 +330,40 @@ class SelectionGraphBuilder:
         self.chain(sgnode)
         self.debug_db.map(node, sgnode)
 
+    def do_jump_table(self, node):
+        """ Process lowered jump table into an indexed branch.
+
+        The index is zero based and checked to be in range already, see
+        :class:`ppci.codegen.switch.SwitchLowering`.
+        """
+        assert node.v.ty is ir.ptr
+        labels = []
+        for index, (value, block) in enumerate(node.table):
+            assert index == value
+            labels.append(self.function_info.label_map[block])
+        table_label = self.function_info.frame.add_jump_table(labels)
+
+        # Load the address from the table, and jump to it:
+        index = self.get_value(node.v)
+        table = self.new_node("LABEL", ir.ptr, value=table_label)
+        size = self.new_node(
+            "CONST", ir.ptr, value=self.arch.info.get_size(ir.ptr)
+        ).new_output("size")
+        size.wants_vreg = False
+        offset = self.new_node("MUL", ir.ptr, index, size)
+        address = self.new_node(
+            "ADD",
+            ir.ptr,
+            table.new_output("table"),
+            offset.new_output("offset"),
+        )
+        target = self.new_node("LDR", ir.ptr, address.new_output("address"))
+        self.chain(target)
+        sgnode = self.new_node("IJMP", None, target.new_output("target"))
+        sgnode.value = list(OrderedSet(labels))
+        self.chain(sgnode)
+        self.debug_db.map(node, sgnode)
+
     def do_exit(self, node):
         # Jump to epilog:
         sgnode = self.new_node("JMP", None)
@@ -319,10 +397,109 @@ class SelectionGraphBuilder:
         # self.debug_db.map(node, sgnode)
 
     def do_copy_blob(self, node):
-        """ Create a memcpy node. """
+        """ Copy a block of memory.
+
+        Small blocks are copied inline, larger blocks with a memcpy
+        action when the target has one, or a call to memcpy otherwise.
+        """
+        alignment = max(
+            node.alignment,
+            min(known_alignment(node.dst), known_alignment(node.src)),
+        )
         dst = self.get_address(node.dst)
         src = self.get_address(node.src)
-        sgnode = self.new_node("MOVB", None, dst, src, value=node.amount)
+        self.copy_memory(dst, src, node.amount, alignment)
+
+    def copy_memory(self, dst, src, size, alignment):
+        """ Copy size bytes from address src to address dst """
+        parts = self.split_memory(size, alignment)
+        if parts is not None:
+            for offset, ty in parts:
+                load = self.new_node(
+                    "LDR", ty, self.offset_address(src, offset)
+                )
+                self.chain(load)
+                value = load.new_output("copy")
+                store = self.new_node(
+                    "STR", ty, self.offset_address(dst, offset), value
+                )
+                self.chain(store)
+        elif self.has_movb:
+            sgnode = self.new_node("MOVB", None, dst, src, value=size)
+            self.chain(sgnode)
+        else:
+            size = self.new_node("CONST", ir.ptr, value=size)
+            self.call_runtime("memcpy", [dst, src, size.new_output("size")])
+
+    def fill_memory(self, dst, byte, size, alignment):
+        """ Fill size bytes at address dst with the given byte inline.
+
+        Returns False if the amount of stores exceeds the limit.
+        """
+        parts = self.split_memory(size, alignment)
+        if parts is None:
+            return False
+        for offset, ty in parts:
+            # Repeat the byte, and interpret the pattern as signed value:
+            value = int.from_bytes(bytes([byte]) * ty.size, "little")
+            if value >= 1 << (ty.bits - 1):
+                value -= 1 << ty.bits
+            const = self.new_node("CONST", ty, value=value)
+            store = self.new_node(
+                "STR",
+                ty,
+                self.offset_address(dst, offset),
+                const.new_output("fill"),
+            )
+            self.chain(store)
+        return True
+
+    def split_memory(self, size, alignment):
+        """ Split a block of memory into word sized parts.
+
+        Returns a list of offsets and types, or None when the block is
+        too large to be handled inline. Parts are aligned to their size,
+        unless the target allows unaligned memory access.
+        """
+        parts = []
+        offset = 0
+        while offset < size:
+            for ty in self.word_types:
+                if ty.size > size - offset:
+                    continue
+                if not self.arch.info.unaligned_access and (
+                    alignment % ty.size or offset % ty.size
+                ):
+                    continue
+                parts.append((offset, ty))
+                offset += ty.size
+                break
+            else:
+                return
+
+            if len(parts) > INLINE_MEMORY_LIMIT:
+                return
+        return parts
+
+    def offset_address(self, address, offset):
+        """ Create the address at an offset from the given address """
+        if offset == 0:
+            return address
+        const = self.new_node("CONST", ir.ptr, value=offset)
+        const_output = const.new_output("offset")
+        const_output.wants_vreg = False
+        sgnode = self.new_node("ADD", ir.ptr, address, const_output)
+        return sgnode.new_output("address")
+
+    def call_runtime(self, name, values):
+        """ Call a runtime function with pointer sized arguments """
+        args = []
+        for value in values:
+            loc = self.new_vreg(ir.ptr)
+            args.append((ir.ptr, loc))
+            self.chain(self.new_node("MOV", ir.ptr, value, value=loc))
+        sgnode = self.new_node("CALL", None)
+        sgnode.value = (name, args, None)
         self.chain(sgnode)
 
     def get_address(self, ir_address):
@@ -351,12 +528,16 @@ class SelectionGraphBuilder:
         address = self.get_address(node.address)
         value = self.get_value(node.value)
         if node.value.ty.is_blob:
-            size = node.value.ty.size
-            sgnode = self.new_node("MOVB", None, address, value, value=size)
+            self.copy_memory(
+                address,
+                value,
+                node.value.ty.size,
+                node.value.ty.alignment,
+            )
         else:
             sgnode = self.new_node("STR", node.value.ty, address, value)
-        self.chain(sgnode)
-        self.debug_db.map(node, sgnode)
+            self.chain(sgnode)
+            self.debug_db.map(node, sgnode)
 
     def do_inline_asm(self, node):
         """ Create selection graph node for inline asm code.
@@ -513,13 +694,52 @@ class SelectionGraphBuilder:
         #    sgnode.add_input(i)
         self.chain(sgnode)
 
+    def inline_memory_call(self, node):
+        """ Try to inline a call to memcpy or memset with a small size.
+
+        Returns True if the call is replaced by loads and stores.
+        """
+        if not isinstance(node.callee, ir.ExternalSubRoutine):
+            return False
+        name = node.callee.name
+        arguments = node.arguments
+        if name not in ("memcpy", "memset") or len(arguments) != 3:
+            return False
+        size = constant_value(arguments[2])
+        if size is None or size < 0:
+            return False
+
+        dst = self.get_value(arguments[0])
+        alignment = known_alignment(arguments[0])
+        if name == "memcpy":
+            alignment = min(alignment, known_alignment(arguments[1]))
+            if self.split_memory(size, alignment) is None:
+                return False
+            src = self.get_value(arguments[1])
+            self.copy_memory(dst, src, size, alignment)
+        else:
+            byte = constant_value(arguments[1])
+            if byte is None:
+                return False
+            if not self.fill_memory(dst, byte & 0xFF, size, alignment):
+                return False
+
+        # Both functions return the destination:
+        if isinstance(node, ir.FunctionCall):
+            self.add_map(node, dst)
+        return True
+
     def do_procedure_call(self, node):
         """ Transform a procedure call """
+        if self.inline_memory_call(node):
+            return
         args = self._prep_call_arguments(node)
         self._make_call(node, args, None)
 
     def do_function_call(self, node):
         """ Transform a function call """
+        if self.inline_memory_call(node):
+            return
         args = self._prep_call_arguments(node)
 
         # New register for copy of result:
@@ -0,0 +1,384 @@
+""" Placement of basic blocks.
+
+The blocks of a function are emitted in the order of its list of
+blocks. A jump to the block directly after it falls through, all other
+branches cost a taken jump. This pass reorders the blocks of a function
+before instruction selection, such that frequently taken edges fall
+through, and rarely executed blocks end up at the end of the function.
+
+The frequency of the edges is taken from a profile, when counts are
+attached to the blocks (see :mod:`ppci.irutils.profile`). Otherwise the
+frequencies are estimated with static heuristics:
+
+- Branches to loop back edges and branches which stay inside a loop
+  are likely taken.
+- Branches to blocks which return from the function, such as early
+  returns and error handling, are unlikely taken.
+
+Blocks are chained along the heaviest edges first, as described by
+Pettis and Hansen. The chain of the entry block is placed first,
+followed by the chains which are most strongly connected to the
+already placed blocks. Cold chains are placed at the end.
+
+Finally, conditional jumps whose yes-target is placed directly after
+the jump are inverted, so that this block is reached by falling through.
+
+The placement is an optimization, :func:`ppci.api.optimize` runs it as
+the last pass, except when optimizing for size. The estimated amount of
+taken branches before and after the placement is written to the report.
+"""
+
+import heapq
+import logging
+from .. import ir
+from ..graph.cfg import ir_function_to_graph
+from ..opt.transform import FunctionPass
+from ..utils.collections import OrderedSet
+
+# Probability of staying inside a loop:
+LOOP_BRANCH_PROBABILITY = 0.88
+
+# Probability of branching to a block that returns:
+RETURN_BRANCH_PROBABILITY = 0.2
+
+# The times a loop is expected to run per entry:
+LOOP_SCALE = 8
+
+# Blocks executed less often than this fraction of the entry are cold:
+COLD_FRACTION = 0.25
+
+negated_conditions = {
+    "==": "!=",
+    "!=": "==",
+    "<": ">=",
+    ">=": "<",
+    ">": "<=",
+    "<=": ">",
+}
+
+
+def can_invert(cjump):
+    """ Test if the condition of the jump can be negated.
+
+    Floating point comparisons cannot be inverted, since any comparison
+    with a NaN is false.
+    """
+    return cjump.a.ty.is_integer or cjump.a.ty is ir.ptr
+
+
+def falls_through(block, successor, invert=False):
+    """ Test if the given block can fall through into the successor """
+    jump = block.last_instruction
+    if isinstance(jump, ir.Jump):
+        return jump.target is successor
+    elif isinstance(jump, ir.CJump):
+        if jump.lab_yes is jump.lab_no:
+            return False
+        if jump.lab_no is successor:
+            return True
+        return invert and jump.lab_yes is successor and can_invert(jump)
+    else:
+        return False
+
+
+def count_taken_branches(function, weights):
+    """ Count the weighted amount of taken branches of the block order.
+
+    Returns after the last block fall through into the epilogue, every
+    other edge is a taken branch, unless it falls through into the next
+    block.
+    """
+    blocks = function.blocks
+    taken = 0
+    for index, block in enumerate(blocks):
+        next_block = blocks[index + 1] if index + 1 < len(blocks) else None
+        if isinstance(block.last_instruction, (ir.Return, ir.Exit)):
+            if next_block is not None:
+                taken += weights.get((block, None), 0)
+        for successor in set(block.successors):
+            if successor is next_block and falls_through(block, successor):
+                continue
+            taken += weights.get((block, successor), 0)
+    return taken
+
+
+class BlockLayout:
+    """ Order the blocks of a function to maximize fall through """
+
+    logger = logging.getLogger("block-layout")
+
+    def run(self, function):
+        """ Reorder the blocks of the given function.
+
+        Returns the estimated amount of taken branches before and after
+        the placement.
+        """
+        frequencies, weights = self.estimate_frequencies(function)
+        before = count_taken_branches(function, weights)
+
+        cold_blocks = self.find_cold_blocks(function, frequencies)
+        chains = self.make_chains(function, weights, cold_blocks)
+        function.blocks = self.place_chains(
+            function, chains, weights, cold_blocks
+        )
+        self.invert_branches(function)
+
+        after = count_taken_branches(function, weights)
+        self.logger.debug(
+            "Placed %s blocks of %s, %s cold, taken branches %.1f -> %.1f",
+            len(function.blocks),
+            function.name,
+            len(cold_blocks),
+            before,
+            after,
+        )
+        return before, after
+
+    def estimate_frequencies(self, function):
+        """ Determine the frequency of each block and edge.
+
+        Use profile counts when present, and branch probabilities
+        otherwise. The blocks are visited in reverse post order, so that
+        the frequency of a block is the sum of its incoming forward
+        edges.
+        """
+        cfg, block_map = ir_function_to_graph(function)
+        node_map = {node: block for block, node in block_map.items()}
+        use_profile = function.entry.execution_count is not None
+
+        # Determine the innermost loop of each block:
+        loop_headers = set()
+        loops = {}
+        for loop in cfg.calculate_loops():
+            header = node_map[loop.header]
+            loop_headers.add(header)
+            loop_blocks = loops.setdefault(header, {header})
+            loop_blocks.update(node_map[n] for n in loop.rest)
+        innermost = {}
+        for loop_blocks in sorted(loops.values(), key=len, reverse=True):
+            for block in loop_blocks:
+                innermost[block] = loop_blocks
+
+        frequencies = {}
+        weights = {}
+        for block in self.reverse_post_order(function):
+            if use_profile and block.execution_count is not None:
+                frequency = block.execution_count
+            elif block is function.entry:
+                frequency = 1
+            else:
+                frequency = sum(
+                    weights.get((predecessor, block), 0)
+                    for predecessor in block.predecessors
+                )
+                if not use_profile and block in loop_headers:
+                    frequency *= LOOP_SCALE
+            frequencies[block] = frequency
+
+            probabilities = self.branch_probabilities(
+                block, innermost.get(block)
+            )
+            for successor, probability in probabilities.items():
+                if (
+                    use_profile
+                    and block.edge_counts
+                    and successor in block.edge_counts
+                ):
+                    weight = block.edge_counts[successor]
+                else:
+                    weight = frequency * probability
+                weights[(block, successor)] = weight
+
+            # Jump to the epilogue:
+            if isinstance(block.last_instruction, (ir.Return, ir.Exit)):
+                weights[(block, None)] = frequency
+        return frequencies, weights
+
+    @staticmethod
+    def reverse_post_order(function):
+        """ Get the reachable blocks of a function in reverse post order """
+        visited = {function.entry}
+        order = []
+        stack = [(function.entry, iter(function.entry.successors))]
+        while stack:
+            block, successors = stack[-1]
+            for successor in successors:
+                if successor not in visited:
+                    visited.add(successor)
+                    stack.append((successor, iter(successor.successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    @staticmethod
+    def branch_probabilities(block, loop_blocks):
+        """ Estimate the probability of each outgoing edge of a block """
+        successors = list(OrderedSet(block.successors))
+        if len(successors) != 2:
+            return {s: 1 / len(successors) for s in successors}
+
+        yes, no = successors
+
+        # Loop heuristic: prefer staying inside the loop:
+        if loop_blocks is not None and (yes in loop_blocks) != (
+            no in loop_blocks
+        ):
+            if yes in loop_blocks:
+                probability = LOOP_BRANCH_PROBABILITY
+            else:
+                probability = 1 - LOOP_BRANCH_PROBABILITY
+            return {yes: probability, no: 1 - probability}
+
+        # Return heuristic: early returns and error paths are unlikely:
+        def returns(b):
+            return isinstance(b.last_instruction, (ir.Return, ir.Exit))
+
+        if returns(yes) != returns(no):
+            if returns(yes):
+                probability = RETURN_BRANCH_PROBABILITY
+            else:
+                probability = 1 - RETURN_BRANCH_PROBABILITY
+            return {yes: probability, no: 1 - probability}
+
+        return {yes: 0.5, no: 0.5}
+
+    @staticmethod
+    def find_cold_blocks(function, frequencies):
+        """ Find the blocks which are executed rarely """
+        entry_frequency = frequencies[function.entry]
+        if function.entry.execution_count is not None:
+            threshold = 0
+        else:
+            threshold = entry_frequency * COLD_FRACTION
+        return {
+            block
+            for block in function
+            if block is not function.entry
+            and frequencies.get(block, 0) <= threshold
+        }
+
+    def make_chains(self, function, weights, cold_blocks):
+        """ Chain blocks together along the heaviest edges.
+
+        Hot and cold blocks are never chained together, so that cold
+        blocks can be moved out of the way.
+        """
+        positions = {block: index for index, block in enumerate(function)}
+        chain_map = {block: [block] for block in function}
+        edges = sorted(
+            (
+                (weight, block, successor)
+                for (block, successor), weight in weights.items()
+                if successor is not None
+            ),
+            key=lambda e: (-e[0], positions[e[1]], positions[e[2]]),
+        )
+        for _, block, successor in edges:
+            if successor is function.entry or block is successor:
+                continue
+            if (block in cold_blocks) != (successor in cold_blocks):
+                continue
+            chain = chain_map[block]
+            other_chain = chain_map[successor]
+            if (
+                chain is other_chain
+                or chain[-1] is not block
+                or other_chain[0] is not successor
+            ):
+                continue
+            if not falls_through(block, successor, invert=True):
+                continue
+            chain.extend(other_chain)
+            for other in other_chain:
+                chain_map[other] = chain
+
+        # Unique chains, in order of their first block:
+        chains = []
+        for block in function:
+            chain = chain_map[block]
+            if chain[0] is block:
+                chains.append(chain)
+        return chains
+
+    def place_chains(self, function, chains, weights, cold_blocks):
+        """ Order the chains, starting with the chain of the entry.
+
+        Then repeatedly place the chain with the heaviest edges from the
+        already placed blocks. Cold chains go last, in their original
+        order.
+        """
+        chain_index = {}
+        for index, chain in enumerate(chains):
+            for block in chain:
+                chain_index[block] = index
+        hot_chains = set()
+        cold_chains = []
+        for index, chain in enumerate(chains):
+            if chain[0] is function.entry:
+                entry_index = index
+            elif all(block in cold_blocks for block in chain):
+                cold_chains.append(chain)
+            else:
+                hot_chains.add(index)
+
+        # Keep the hot chains in a heap, on connection and then on index.
+        # Entries with an old connection are skipped when popped:
+        order = []
+        connection = [0] * len(chains)
+        heap = [(0, index) for index in sorted(hot_chains)]
+        index = entry_index
+        while index is not None:
+            order.extend(chains[index])
+            for block in chains[index]:
+                for successor in set(block.successors):
+                    other = chain_index[successor]
+                    weight = weights.get((block, successor), 0)
+                    connection[other] += weight
+                    if weight and other in hot_chains:
+                        heapq.heappush(heap, (-connection[other], other))
+
+            index = None
+            while heap:
+                key, other = heapq.heappop(heap)
+                if other in hot_chains and -key == connection[other]:
+                    index = other
+                    hot_chains.discard(index)
+                    break
+
+        for chain in cold_chains:
+            order.extend(chain)
+        return order
+
+    def invert_branches(self, function):
+        """ Invert conditional jumps whose yes-target follows directly """
+        blocks = function.blocks
+        for block, next_block in zip(blocks[:-1], blocks[1:]):
+            jump = block.last_instruction
+            if (
+                isinstance(jump, ir.CJump)
+                and jump.lab_yes is next_block
+                and jump.lab_no is not next_block
+                and can_invert(jump)
+            ):
+                jump.cond = negated_conditions[jump.cond]
+                jump.lab_yes, jump.lab_no = jump.lab_no, jump.lab_yes
+
+
+class BlockLayoutPass(FunctionPass):
+    """ Place the blocks of every function in a module.
+
+    The estimated taken branches of all functions, before and after the
+    placement, are added up in the before and after attributes.
+    """
+
+    def prepare(self):
+        self.before = 0
+        self.after = 0
+
+    def on_function(self, function):
+        before, after = BlockLayout().run(function)
+        self.before += before
+        self.after += after
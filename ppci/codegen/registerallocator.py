@@ -181,6 +181,11 @@ class MiniGen:
     def make_fmt(self, vreg):
         """ Determine the type suffix, such as I32 or F64.
         """
+        # Registers holding values of several types, such as vectors,
+        # tell which type to use:
+        if vreg.spill_ty is not None:
+            return str(vreg.spill_ty).upper()
+
         # TODO: hack to retrieve register type (U, I or F):
         ty = getattr(vreg, 'ty', 'I')
         fmt = '{}{}'.format(ty, vreg.bitsize)
@@ -252,6 +257,7 @@ class GraphColoringRegisterAllocator:
             frame: The frame to perform register allocation on.
         """
         self.spill_rounds = 0
+        self.spill_temps = set()
         self.init_data(frame)
         self.logger.debug("Starting iterative coloring")
         while True:
@@ -613,12 +619,20 @@ class GraphColoringRegisterAllocator:
         self.spill_rounds += 1
         if self.spill_rounds > 30:
             raise RuntimeError("Give up: more than 10 spill rounds done!")
-        # TODO: select a node which is certainly not a node that was
-        # introduced during spilling?
+        # Do not select a node which was introduced during spilling, since
+        # spilling it again does not lower the register pressure:
+        candidates = [
+            n
+            for n in self.spill_worklist
+            if not all(t in self.spill_temps for t in n.temps)
+        ]
+        if not candidates:
+            candidates = self.spill_worklist
+
         # Select to be spilled variable:
         # Select node with the lowest priority:
         p = []
-        for n in self.spill_worklist:
+        for n in candidates:
             assert not n.is_colored
             d = sum(len(self.frame.ig.defs(t)) for t in n.temps)
             u = sum(len(self.frame.ig.uses(t)) for t in n.temps)
@@ -645,6 +659,7 @@ class GraphColoringRegisterAllocator:
             )
             for instruction in instructions:
                 vreg2 = self.frame.new_reg(type(tmp))
+                self.spill_temps.add(vreg2)
                 self.logger.debug("tmp: %s, new: %s", tmp, vreg2)
                 instruction.replace_register(tmp, vreg2)
                 if instruction.reads_register(vreg2):
@@ -0,0 +1,165 @@
+""" Lowering of jump tables.
+
+A :class:`ppci.ir.JumpTable` is lowered before instruction selection.
+When the case values are dense, and the target supports indirect
+jumps, the jump table is lowered into a range check followed by an
+indexed branch through a table of addresses. Other cases are
+dispatched by a balanced binary search tree of conditional jumps, so
+that dispatch takes logarithmic instead of linear time.
+"""
+
+import logging
+from .. import ir
+from ..irutils import Builder
+
+# Minimum number of cases before a table is used:
+MIN_TABLE_CASES = 4
+
+# Minimum fraction of table entries which are not the default case:
+MIN_TABLE_DENSITY = 0.4
+
+# Below this number of cases, a chain of equality tests is used:
+MAX_LINEAR_CASES = 3
+
+unsigned_types = {8: ir.u8, 16: ir.u16, 32: ir.u32, 64: ir.u64}
+
+
+def normalize(value, ty):
+    """ Wrap a case value into the value range of the given type """
+    if not ty.is_integer:
+        return value
+    value &= (1 << ty.bits) - 1
+    if ty.is_signed and value >> (ty.bits - 1):
+        value -= 1 << ty.bits
+    return value
+
+
+def is_dense(cases):
+    """ Test if the sorted cases are worth an indexed branch """
+    span = cases[-1][0] - cases[0][0] + 1
+    return (
+        len(cases) >= MIN_TABLE_CASES
+        and len(cases) >= span * MIN_TABLE_DENSITY
+    )
+
+
+class SwitchLowering:
+    """ Lower the jump tables of a function.
+
+    If use_tables is False, all jump tables are turned into conditional
+    jumps. Otherwise, dense ranges of cases are lowered into a range check
+    and a jump table indexed from zero with a value of pointer type. This
+    is the form of jump table handled by instruction selection.
+    """
+
+    logger = logging.getLogger("switch-lowering")
+
+    def __init__(self, use_tables=True):
+        self.use_tables = use_tables
+        self.builder = Builder()
+
+    def run(self, function):
+        """ Lower all jump tables in the given function """
+        for block in list(function):
+            jump_table = block.last_instruction
+            if isinstance(jump_table, ir.JumpTable):
+                self.lower(jump_table)
+
+    def lower(self, jump_table):
+        """ Replace a single jump table by simpler instructions """
+        block = jump_table.block
+        value = jump_table.v
+        default = jump_table.lab_default
+        successors = block.successors
+        cases = sorted(
+            (
+                (normalize(case_value, value.ty), target)
+                for case_value, target in jump_table.table
+            ),
+            key=lambda case: case[0],
+        )
+        self.logger.debug(
+            "Lowering jump table with %s cases in %s", len(cases), block
+        )
+
+        jump_table.remove_from_block()
+        jump_table.delete()
+
+        self.builder.set_function(block.function)
+        self.builder.set_block(block)
+        self.new_blocks = [block]
+        if cases:
+            self.emit_cases(value, cases, default)
+        else:
+            self.builder.emit_jump(default)
+
+        # Phi nodes in the successors now have different predecessors:
+        for successor in successors:
+            predecessors = [
+                b for b in self.new_blocks if successor in b.successors
+            ]
+            successor.replace_incoming(block, predecessors)
+
+    def new_block(self):
+        block = self.builder.new_block(
+            "{}_switch".format(self.new_blocks[0].name)
+        )
+        self.new_blocks.append(block)
+        return block
+
+    def emit_cases(self, value, cases, default):
+        """ Dispatch value over the sorted cases """
+        if self.use_tables and is_dense(cases):
+            self.emit_table(value, cases, default)
+        elif len(cases) <= MAX_LINEAR_CASES:
+            for index, (case_value, target) in enumerate(cases):
+                if index == len(cases) - 1:
+                    no_block = default
+                else:
+                    no_block = self.new_block()
+                constant = self.builder.emit_const(case_value, value.ty)
+                self.builder.emit(
+                    ir.CJump(value, "==", constant, target, no_block)
+                )
+                self.builder.set_block(no_block)
+        else:
+            middle = len(cases) // 2
+            lower_block = self.new_block()
+            upper_block = self.new_block()
+            pivot = self.builder.emit_const(cases[middle][0], value.ty)
+            self.builder.emit(
+                ir.CJump(value, "<", pivot, lower_block, upper_block)
+            )
+            self.builder.set_block(lower_block)
+            self.emit_cases(value, cases[:middle], default)
+            self.builder.set_block(upper_block)
+            self.emit_cases(value, cases[middle:], default)
+
+    def emit_table(self, value, cases, default):
+        """ Emit a range check followed by an indexed branch """
+        low = cases[0][0]
+        high = cases[-1][0]
+        offset = value
+        if low != 0:
+            offset = self.builder.emit_sub(offset, low, value.ty)
+
+        # Out of range values wrap around to large unsigned values:
+        if value.ty.is_signed:
+            offset = self.builder.emit_cast(
+                offset, unsigned_types[value.ty.bits]
+            )
+        bound = self.builder.emit_const(high - low, offset.ty)
+        dispatch_block = self.new_block()
+        self.builder.emit(
+            ir.CJump(offset, ">", bound, default, dispatch_block)
+        )
+
+        self.builder.set_block(dispatch_block)
+        if offset.ty is not ir.ptr:
+            offset = self.builder.emit_cast(offset, ir.ptr)
+        targets = dict(cases)
+        table = [
+            (index, targets.get(low + index, default))
+            for index in range(high - low + 1)
+        ]
+        self.builder.emit(ir.JumpTable(offset, table, default))
@@ -7,6 +7,7 @@
 
 import logging
 from .lang.common import SourceLocation
+from .utils.sourcecache import source_cache, SourceText
 
 
 logformat = '%(asctime)s | %(levelname)8s | %(name)10.10s | %(message)s'
@@ -91,7 +92,7 @@ class DiagnosticsManager:
     def add_source(self, name, src):
         """ Add a source for error reporting """
         self.logger.debug('Adding source, filename="%s"', name)
-        self.sources[name] = src
+        self.sources[name] = SourceText(name, src)
 
     def add_diag(self, d):
         """ Add a diagnostic message """
@@ -125,12 +126,15 @@ class DiagnosticsManager:
         """ Print a single error in a nice formatted way """
         print('==============')
         if e.loc:
-            if e.loc.filename not in self.sources:
+            if e.loc.filename in self.sources:
+                source = self.sources[e.loc.filename]
+            else:
+                source = source_cache.get(e.loc.filename)
+            if source is None:
                 print('Error: {0}'.format(e))
                 return
             print("File: {}".format(e.loc.filename))
-            source = self.sources[e.loc.filename]
-            lines = source.split('\n')
+            lines = source.text.split('\n')
             e.render(lines)
         else:
             print('Error: {0}'.format(e))
@@ -7,7 +7,42 @@ from .. import ir
 
 
 class CallGraph(DiGraph):
-    pass
+    """ Graph with a node per routine, and an edge for each direct call.
+
+    Calls through function pointers cannot be resolved, routines which
+    perform such calls are recorded in the indirect_callers set.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.node_map = {}
+        self.indirect_callers = set()
+
+    def get_node(self, routine):
+        """ Get the call graph node for the given routine """
+        return self.node_map[routine]
+
+    def callees(self, routine):
+        """ Get the routines called directly by the given routine """
+        return [n.routine for n in self.successors(self.node_map[routine])]
+
+    def callers(self, routine):
+        """ Get the routines directly calling the given routine """
+        return [n.routine for n in self.predecessors(self.node_map[routine])]
+
+
+class CallGraphNode(DiNode):
+    """ A routine in the call graph """
+
+    __slots__ = ("routine",)
+
+    def __init__(self, graph, routine):
+        super().__init__(graph)
+        self.routine = routine
+        graph.node_map[routine] = self
+
+    def __repr__(self):
+        return "CG-node({})".format(self.routine.name)
 
 
 def mod_to_call_graph(ir_module) -> CallGraph:
@@ -15,20 +50,22 @@ def mod_to_call_graph(ir_module) -> CallGraph:
     cg = CallGraph()
 
     # Create call graph nodes:
-    node_map = {}
     for routine in ir_module.functions:
-        node_map[routine] = DiNode(cg)
+        CallGraphNode(cg, routine)
     for routine in ir_module.externals:
         if isinstance(routine, ir.ExternalSubRoutine):
-            node_map[routine] = DiNode(cg)
+            CallGraphNode(cg, routine)
 
     # Add call graph edges:
     for routine in ir_module.functions:
-        n1 = node_map[routine]
+        n1 = cg.node_map[routine]
         for instruction in routine.get_instructions():
             if isinstance(instruction, (ir.FunctionCall, ir.ProcedureCall)):
                 routine2 = instruction.callee
-                n2 = node_map[routine2]
-                cg.add_edge(n1, n2)
+                if routine2 in cg.node_map:
+                    n2 = cg.node_map[routine2]
+                    cg.add_edge(n1, n2)
+                else:
+                    cg.indirect_callers.add(routine)
 
     return cg
@@ -15,11 +15,7 @@ import logging
 # TODO: this is possibly the third edition of flow graph code.. Merge at will!
 from .digraph import DiGraph, DiNode
 from . import lt
-from .algorithm.fixed_point_dominator import calculate_dominators
-from .algorithm.fixed_point_dominator import calculate_post_dominators
-from .algorithm.fixed_point_dominator import (
-    calculate_immediate_post_dominators,
-)
+from .. import ir
 from collections import namedtuple
 
 
@@ -92,7 +88,7 @@ def ir_function_to_graph(ir_function):
                 node.add_edge(successor_node)
 
             # TODO: hack to store yes and no blocks:
-            if len(block.successors) == 2:
+            if isinstance(block.last_instruction, ir.CJump):
                 node.yes = block_map[block.last_instruction.lab_yes]
                 node.no = block_map[block.last_instruction.lab_no]
 
@@ -127,10 +123,14 @@ class ControlFlowGraph(DiGraph):
         self._idom = None  # immediate_dominators
 
         # Post dominator info:
-        self._pdom = None  # post dominators
-        self._spdom = None  # Strict post dominators
-        self._ipdom = None  # post dominators
-        self._reach = None  # Reach map
+        self._ipdom = None  # immediate post dominators
+        self.post_tree_map = None
+        self.post_root_tree = None
+
+        # Reachability info:
+        self._scc_map = None  # Node to strongly connected component
+        self._scc_nodes = None  # Nodes per strongly connected component
+        self._reach = None  # Bitset of reachable components per component
         self.root_tree = None
 
     def validate(self):
@@ -156,10 +156,21 @@ class ControlFlowGraph(DiGraph):
         return self.tree_map[other].below(self.tree_map[one])
 
     def post_dominates(self, one, other):
-        """ Test whether a node post dominates another node """
-        if self._pdom is None:
+        """ Test whether a node post dominates another node.
+
+        Like dominance, this is a constant time check on the intervals
+        of the post dominator tree. Nodes which cannot reach the exit
+        node are only post dominated by themselves.
+        """
+        if self._ipdom is None:
             self._calculate_post_dominator_info()
-        return one in self._pdom[other]
+        if one is other:
+            return True
+        if one not in self.post_tree_map or other not in self.post_tree_map:
+            return False
+        return self.post_tree_map[other].below_or_same(
+            self.post_tree_map[one]
+        )
 
     def get_immediate_dominator(self, node):
         """ Retrieve a nodes immediate dominator """
@@ -171,12 +182,27 @@ class ControlFlowGraph(DiGraph):
         """ Retrieve a nodes immediate post dominator """
         if self._ipdom is None:
             self._calculate_post_dominator_info()
-        return self._ipdom[node]
+        return self._ipdom.get(node, None)
 
     def can_reach(self, one, other):
+        """ Test whether there is a non-empty path from one to other """
+        if self._reach is None:
+            self.calculate_reach()
+        reach = self._reach[self._scc_map[one]]
+        return bool(reach >> self._scc_map[other] & 1)
+
+    def reachable_nodes(self, node):
+        """ Get all nodes which can be reached from node by a non-empty path
+        """
         if self._reach is None:
             self.calculate_reach()
-        return other in self._reach[one]
+        reach = self._reach[self._scc_map[node]]
+        nodes = []
+        while reach:
+            lowest = reach & -reach
+            nodes.extend(self._scc_nodes[lowest.bit_length() - 1])
+            reach ^= lowest
+        return nodes
 
     def _calculate_dominator_info(self):
         """ Calculate dominator information """
@@ -215,24 +241,27 @@ class ControlFlowGraph(DiGraph):
 
     def _calculate_dominator_tree(self):
         """ Create a dominator tree. """
+        self.tree_map = self._build_tree(self.nodes, self._idom)
+        self.root_tree = self.tree_map[self.entry_node]
+        self._number_dominator_tree(self.root_tree)
 
-        self.tree_map = {}
-        for node in self.nodes:
-            self.tree_map[node] = DomTreeNode(node, list(), None)
+    @staticmethod
+    def _build_tree(nodes, idom):
+        """ Create a tree from the given immediate dominator map """
+        tree_map = {}
+        for node in nodes:
+            tree_map[node] = DomTreeNode(node, list(), None)
 
         # Add all nodes except for the root node into the tree:
-        for node in self.nodes:
-            idom_node = self.get_immediate_dominator(node)
+        for node in nodes:
+            idom_node = idom.get(node, None)
             if idom_node:
-                parent = self.tree_map[idom_node]
-                node = self.tree_map[node]
-                parent.children.append(node)
-
-        self.root_tree = self.tree_map[self.entry_node]
-
-        self._number_dominator_tree()
+                parent = tree_map[idom_node]
+                parent.children.append(tree_map[node])
+        return tree_map
 
-    def _number_dominator_tree(self):
+    @staticmethod
+    def _number_dominator_tree(root_tree):
         """ Assign intervals to the dominator tree.
 
         Very cool idea to check if one node dominates
@@ -250,7 +279,7 @@ class ControlFlowGraph(DiGraph):
 
         t = 0
 
-        worklist = [self.root_tree]
+        worklist = [root_tree]
         discovered = {}  # when the node was discovered
         while worklist:
             node = worklist[-1]
@@ -266,47 +295,49 @@ class ControlFlowGraph(DiGraph):
             t += 1
 
     def _calculate_post_dominator_info(self):
-        """ Calculate the post dominator sets iteratively.
+        """ Calculate the post dominator tree.
 
         Post domination is the same as domination, but then starting at
-        the exit node.
+        the exit node. So run the Lengauer Tarjan algorithm over
+        the reversed graph.
         """
         self.validate()
 
-        self._pdom = calculate_post_dominators(self.nodes, self.exit_node)
-
-        # Determine strict post dominators:
-        self._spdom = {}
-        for node in self.nodes:
-            self._spdom[node] = self._pdom[node] - {node}
-
-        self._ipdom = calculate_immediate_post_dominators(
-            self.nodes, self._pdom, self._spdom
-        )
+        self._ipdom = lt.calculate_idom(self, self.exit_node, reverse=True)
+        nodes = [self.exit_node] + list(self._ipdom)
+        self.post_tree_map = self._build_tree(nodes, self._ipdom)
+        self.post_root_tree = self.post_tree_map[self.exit_node]
+        self._number_dominator_tree(self.post_root_tree)
 
     def calculate_reach(self):
-        """ Calculate which nodes can reach what other nodes """
-        self.validate()
-
-        # Initialize reach map:
-        self._reach = {}
-        for node in self.nodes:
-            self._reach[node] = self.successors(node)
-
-        # Run fixed point iteration:
-        change = True
-        while change:
-            change = False
-            for node in self.nodes:
+        """ Calculate which nodes can reach what other nodes.
 
-                # Fill reachable condition:
-                new_reach = set(self._reach[node])  # Take the old reach
-                for m in node.successors:
-                    new_reach |= self._reach[m]
+        The strongly connected components of the graph are determined
+        first. A node can reach all nodes in its own component if
+        the component contains a cycle. Reachability of components is
+        determined in reverse topological order, using integers as
+        bitsets.
+        """
+        self.validate()
 
-                if new_reach != self._reach[node]:
-                    change = True
-                    self._reach[node] = new_reach
+        self._scc_nodes = strongly_connected_components(self)
+        self._scc_map = {}
+        for index, component in enumerate(self._scc_nodes):
+            for node in component:
+                self._scc_map[node] = index
+
+        # Components are found in reverse topological order, so all
+        # successors of a component are handled before the component.
+        self._reach = []
+        for index, component in enumerate(self._scc_nodes):
+            reach = 0
+            for node in component:
+                for successor in self.successors(node):
+                    other = self._scc_map[successor]
+                    if other != index:
+                        reach |= self._reach[other]
+                    reach |= 1 << other
+            self._reach.append(reach)
 
     def calculate_loops(self):
         """ Calculate loops by use of the dominator info """
@@ -321,7 +352,7 @@ class ControlFlowGraph(DiGraph):
                     # Determine the other nodes in the loop:
                     loop_nodes = [
                         ln
-                        for ln in self._reach[header]
+                        for ln in self.reachable_nodes(header)
                         if (
                             header.dominates(ln)
                             and ln.can_reach(header)
@@ -371,6 +402,59 @@ class ControlFlowGraph(DiGraph):
             yield c.node
 
 
+def strongly_connected_components(graph):
+    """ Determine the strongly connected components of a graph.
+
+    This is Tarjan's algorithm, rewritten to prevent hitting the
+    recursion limit for large graphs. The components are returned in
+    reverse topological order.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in graph.nodes:
+        if root in index:
+            continue
+
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        worklist = [(root, iter(graph.successors(root)))]
+        while worklist:
+            node, successors = worklist[-1]
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    worklist.append(
+                        (successor, iter(graph.successors(successor)))
+                    )
+                    break
+                elif successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            else:
+                # All successors visited
+                worklist.pop()
+                if worklist:
+                    parent = worklist[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member is node:
+                            break
+                    components.append(component)
+    return components
+
+
 def bottom_up_recursive(tree):
     """ Generator that yields all nodes in bottom up way """
     for c in tree.children:
@@ -422,8 +506,8 @@ class ControlFlowNode(DiNode):
         return self.graph.can_reach(self, other)
 
     def reached(self):
-        """ Test if this node is reached """
-        return self.graph._reach[self]
+        """ Get the nodes which can be reached from this node """
+        return set(self.graph.reachable_nodes(self))
 
     def __repr__(self):
         value = self.name if self.name else id(self)
@@ -15,6 +15,12 @@ logger = logging.getLogger("lt")
 
 
 def calculate_idom(graph, entry, reverse=False):
+    """ Calculate the immediate dominators of the nodes in the graph.
+
+    When reverse is True, the edges are traversed backwards, which
+    yields the immediate post dominators when entry is the exit node.
+    Nodes which cannot be reached from the entry are left out.
+    """
     x = LengauerTarjan(reverse)
     return x.compute(graph, entry)
 
@@ -55,7 +61,10 @@ class LengauerTarjan:
 
             # Determine semi dominator for n:
             s = p
-            for v in n.predecessors:
+            for v in self.predecessors(n):
+                if v not in self.dfnum:
+                    # Unreachable node
+                    continue
                 if self.dfnum[v] <= self.dfnum[n]:
                     s2 = v
                 else:
@@ -87,9 +96,16 @@ class LengauerTarjan:
                 assert n in idom
         return idom
 
+    def predecessors(self, node):
+        """ Get the predecessors of a node, taking direction into account """
+        if self._reverse:
+            return node.successors
+        else:
+            return node.predecessors
+
     def dfs(self, start_node):
         """ Depth first search nodes """
-        for dfnum, pair in enumerate(dfs(start_node)):
+        for dfnum, pair in enumerate(dfs(start_node, reverse=self._reverse)):
             parent, node = pair
             assert node not in self.dfnum
             self.dfnum[node] = dfnum
@@ -45,6 +45,11 @@ class Typ:
         """ Test if this type is bytes blob """
         return isinstance(self, BlobDataTyp)
 
+    @property
+    def is_vector(self) -> bool:
+        """ Test if this type is a vector of several values """
+        return isinstance(self, VectorTyp)
+
     def __repr__(self):
         return "ir-typ {}".format(str(self))
 
@@ -135,6 +140,33 @@ class BlobDataTyp(Typ):
         return "blob<{}:{}>".format(self.size, self.alignment)
 
 
+class VectorTyp(Typ):
+    """ A vector of several elements of the same basic type.
+
+    Vector types are used for SIMD operations, which operate on all
+    elements, or lanes, of a vector at once. Like blob types, vector
+    types can be compared by using the is operator.
+    """
+
+    _cache = {}
+
+    def __new__(cls, element_ty, lanes):
+        key = (element_ty, lanes)
+        if key in cls._cache:
+            obj = cls._cache[key]
+        else:
+            obj = super().__new__(cls)
+            cls._cache[key] = obj
+        return obj
+
+    def __init__(self, element_ty: BasicTyp, lanes: int):
+        super().__init__("{}x{}".format(element_ty.name, lanes))
+        self.element_ty = element_ty
+        self.lanes = lanes
+        self.bits = element_ty.bits * lanes
+        self.size = self.bits // 8
+
+
 # The builtin types:
 f64 = FloatingPointTyp("f64", 64)  #: 64-bit floating point type
 f32 = FloatingPointTyp("f32", 32)  #: 32-bit floating point type
@@ -148,9 +180,18 @@ u16 = UnsignedIntegerTyp("u16", 16)  #: Unsigned 16-bit type
 u8 = UnsignedIntegerTyp("u8", 8)  #: Unsigned 8-bit type
 ptr = PointerTyp("ptr")  #: Pointer type
 
+# The 128-bit vector types:
+f64x2 = VectorTyp(f64, 2)  #: Two 64-bit floating point values
+f32x4 = VectorTyp(f32, 4)  #: Four 32-bit floating point values
+i64x2 = VectorTyp(i64, 2)  #: Two 64-bit integers
+i32x4 = VectorTyp(i32, 4)  #: Four 32-bit integers
+i16x8 = VectorTyp(i16, 8)  #: Eight 16-bit integers
+i8x16 = VectorTyp(i8, 16)  #: Sixteen 8-bit integers
+
 value_types = [f64, f32, i64, i32, i16, i8, u64, u32, u16, u8]
-all_types = value_types + [ptr]
-type_name_map = {t.name.lower(): t for t in value_types}
+vector_types = [f64x2, f32x4, i64x2, i32x4, i16x8, i8x16]
+all_types = value_types + vector_types + [ptr]
+type_name_map = {t.name.lower(): t for t in value_types + vector_types}
 
 
 def get_ty(name):
@@ -232,6 +273,8 @@ class Module:
 class Value:
     """ Base of all values """
 
+    __slots__ = ()
+
     def __init__(self, name: str, ty: Typ):
         # Has a name and a type?
         super().__init__()
@@ -529,19 +572,94 @@ class Function(SubRoutine):
         return "{} function {} {}({})".format(self.binding, ret_typ, self.name, args)
 
 
+class InstructionList:
+    """ Read only sequence view on the instructions of a block.
+
+    Iteration, length, membership and access to the first and last
+    instructions are cheap. Indexing in the middle walks the list.
+    """
+
+    __slots__ = ("_block",)
+
+    def __init__(self, block):
+        self._block = block
+
+    def __iter__(self):
+        return iter(self._block)
+
+    def __reversed__(self):
+        instruction = self._block._last
+        while instruction is not None:
+            previous = instruction._prev
+            yield instruction
+            instruction = previous
+
+    def __len__(self):
+        return self._block._count
+
+    def __contains__(self, instruction):
+        return (
+            isinstance(instruction, Instruction)
+            and instruction.block is self._block
+        )
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return list(self)[key]
+
+        count = self._block._count
+        if key < 0:
+            key += count
+        if not 0 <= key < count:
+            raise IndexError("instruction index out of range")
+
+        if key < count // 2:
+            instruction = self._block._first
+            for _ in range(key):
+                instruction = instruction._next
+        else:
+            instruction = self._block._last
+            for _ in range(count - 1 - key):
+                instruction = instruction._prev
+        return instruction
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def index(self, instruction):
+        """ Get the position of the instruction in the block """
+        if instruction not in self:
+            raise ValueError("{} is not in the block".format(instruction))
+        return instruction.position
+
+
 class Block:
     """ Uninterrupted sequence of instructions.
 
     A block is properly terminated if its last instruction is a
     :class:`FinalInstruction`.
+
+    The instructions are kept in an intrusive doubly linked list, so
+    insertion and removal are constant time operations. The position of
+    instructions is numbered lazily, after a modification of the block
+    the first position query renumbers all instructions.
     """
 
     def __init__(self, name):
         self.name = name
         self.function = None
-        self.instructions = list()
+        self._first = None
+        self._last = None
+        self._count = 0
+        self._order_valid = True
         self.references = OrderedSet()
 
+        # Profile information, if any. The number of times this block
+        # was executed and a map from successor block to the number of
+        # times that edge was taken:
+        self.execution_count = None
+        self.edge_counts = None
+
     def dump(self):
         print("  ", self)
         for instruction in self:
@@ -554,25 +672,66 @@ class Block:
         return str(self)
 
     def __iter__(self):
-        for instruction in self.instructions:
+        instruction = self._first
+        while instruction is not None:
+            # Fetch the next one first, so that the current
+            # instruction can be removed while iterating.
+            following = instruction._next
             yield instruction
+            instruction = following
 
     def __len__(self):
-        return len(self.instructions)
+        return self._count
 
     def __getitem__(self, key):
-        return self.instructions.__getitem__(key)
+        return self.instructions[key]
+
+    @property
+    def instructions(self):
+        """ The instructions of this block as a sequence """
+        return InstructionList(self)
+
+    def _link(self, instruction, before_instruction):
+        """ Link instruction into the list before the given instruction """
+        if instruction.block is not None:
+            instruction.block.remove_instruction(instruction)
+        instruction.block = self
+        if before_instruction is None:
+            # Append at the end:
+            instruction._prev = self._last
+            instruction._next = None
+            if self._last is None:
+                self._first = instruction
+                instruction._order = 0
+            else:
+                self._last._next = instruction
+                instruction._order = self._last._order + 1
+            self._last = instruction
+        else:
+            instruction._prev = before_instruction._prev
+            instruction._next = before_instruction
+            if before_instruction._prev is None:
+                self._first = instruction
+            else:
+                before_instruction._prev._next = instruction
+            before_instruction._prev = instruction
+            self._order_valid = False
+        self._count += 1
+
+    def _renumber(self):
+        """ Assign an order number to each instruction """
+        for order, instruction in enumerate(self):
+            instruction._order = order
+        self._order_valid = True
 
     def insert_instruction(self, instruction, before_instruction=None):
         """ Insert an instruction at the front of the block """
         if before_instruction is not None:
             assert self == before_instruction.block
-            pos = before_instruction.position
         else:
-            pos = 0
+            before_instruction = self._first
         assert isinstance(instruction, Instruction)
-        instruction.block = self
-        self.instructions.insert(pos, instruction)
+        self._link(instruction, before_instruction)
         if isinstance(instruction, Value):
             self.function.make_unique_name(instruction)
 
@@ -580,22 +739,32 @@ class Block:
         """ Add an instruction to the end of this block """
         assert isinstance(instruction, Instruction)
         assert not self.is_closed
-        instruction.block = self
-        self.instructions.append(instruction)
+        self._link(instruction, None)
         if isinstance(instruction, Value):
             self.function.make_unique_name(instruction)
 
     def remove_instruction(self, instruction):
         """ Remove instruction from block """
+        if instruction.block is not self:
+            raise ValueError("{} is not in {}".format(instruction, self))
+        if instruction._prev is None:
+            self._first = instruction._next
+        else:
+            instruction._prev._next = instruction._next
+        if instruction._next is None:
+            self._last = instruction._prev
+        else:
+            instruction._next._prev = instruction._prev
+            self._order_valid = False
+        instruction._prev = instruction._next = None
         instruction.block = None
-        self.instructions.remove(instruction)
+        self._count -= 1
         return instruction
 
     @property
     def last_instruction(self):
         """ Gets the last instruction from the block """
-        if not self.is_empty:
-            return self.instructions[-1]
+        return self._last
 
     @property
     def is_empty(self):
@@ -615,12 +784,12 @@ class Block:
     @property
     def first_instruction(self):
         """ Return this blocks first instruction """
-        return self.instructions[0]
+        return self._first
 
     @property
     def phis(self):
         """ Return all :class:`Phi` instructions of this block """
-        return [i for i in self.instructions if isinstance(i, Phi)]
+        return [i for i in self if isinstance(i, Phi)]
 
     @property
     def successors(self):
@@ -666,45 +835,87 @@ class Block:
                 phi.set_incoming(b2, value)
 
 
-def value_use(name):
-    """ Creates a property that also keeps track of usage """
+class InstructionMeta(type):
+    """ Meta class which numbers the value operands of an instruction.
 
-    def getter(self):
-        """ Gets the value """
-        if name in self._var_map:
-            return self._var_map[name]
-        else:  # pragma: no cover
-            raise KeyError(name)
+    The values used by an instruction are kept in a small list, and each
+    :func:`value_use` property accesses its own entry of that list.
+    """
+
+    def __init__(cls, name, bases, attrs):
+        super().__init__(name, bases, attrs)
+        operands = []
+        for base in bases:
+            for operand in getattr(base, "operand_names", ()):
+                if operand not in operands:
+                    operands.append(operand)
+        for attr in attrs.values():
+            if isinstance(attr, ValueUse) and attr.name not in operands:
+                attr.index = len(operands)
+                operands.append(attr.name)
+        cls.operand_names = tuple(operands)
+
+
+class ValueUse:
+    """ Property of an instruction which also keeps track of usage """
+
+    __slots__ = ("name", "index")
+
+    def __init__(self, name):
+        self.name = name
+        self.index = None
 
-    def setter(self, value):
+    def __get__(self, instruction, owner):
+        """ Gets the value """
+        if instruction is None:
+            return self
+        value = instruction._operands[self.index]
+        if value is None:  # pragma: no cover
+            raise KeyError(self.name)
+        return value
+
+    def __set__(self, instruction, value):
         """ Sets the value """
         if not isinstance(value, Value):
             raise TypeError(
                 "Expecting a Value instance, but got {}".format(value)
             )
+        operands = instruction._operands
         # If value was already set, remove usage
-        if name in self._var_map:
-            self.del_use(self._var_map[name])
+        old = operands[self.index]
+        if old is not None:
+            operands[self.index] = None
+            if old not in operands:
+                instruction.del_use(old)
 
-        # Place the value in the var map:
-        self._var_map[name] = value
+        # Place the value in the operand list and add usage:
+        operands[self.index] = value
+        instruction.add_use(value)
 
-        # Add usage:
-        self.add_use(value)
 
-    return property(getter, setter)
+def value_use(name):
+    """ Creates a property that also keeps track of usage """
+    return ValueUse(name)
 
 
-class Instruction:
+class Instruction(metaclass=InstructionMeta):
     """ Base class for all instructions that go into a basic block """
 
+    __slots__ = ("_operands", "block", "uses", "_prev", "_next", "_order")
+
     def __init__(self):
-        # Create a collection to store the values this value uses.
-        # TODO: think of better naming..
-        self._var_map = {}
+        # The values referred to by the value_use properties:
+        self._operands = [None] * len(self.operand_names)
         self.block = None
+
+        # Create a collection to store the values this value uses.
         self.uses = OrderedSet()
 
+        # Links and order number within the block:
+        self._prev = None
+        self._next = None
+        self._order = 0
+
     @property
     def function(self):
         """ Return the function this instruction is part of """
@@ -737,13 +948,13 @@ class Instruction:
         """ replace value usage 'old' with new value, updating the def-use
             information.
         """
-        # TODO: update reference
-        # assert old in self._var_map.values()
-        for name in self._var_map:
-            if self._var_map[name] is old:
-                self.del_use(old)
-                self._var_map[name] = new
-                self.add_use(new)
+        operands = self._operands
+        if old in operands:
+            self.del_use(old)
+            for index, value in enumerate(operands):
+                if value is old:
+                    operands[index] = new
+            self.add_use(new)
 
     def remove_from_block(self):
         for use in list(self.uses):
@@ -753,7 +964,25 @@ class Instruction:
     @property
     def position(self):
         """ Return numerical position in block """
-        return self.block.instructions.index(self)
+        block = self.block
+        if not block._order_valid:
+            block._renumber()
+        return self._order
+
+    def comes_before(self, other):
+        """ Test if this instruction is before other in the same block """
+        assert self.block is other.block
+        return self.position < other.position
+
+    @property
+    def previous_instruction(self):
+        """ The instruction before this one in the block, if any """
+        return self._prev
+
+    @property
+    def next_instruction(self):
+        """ The instruction after this one in the block, if any """
+        return self._next
 
     @property
     def is_terminator(self):
@@ -765,6 +994,8 @@ class Instruction:
 class LocalValue(Value, Instruction):
     """ An instruction that results in a value has a type and a name """
 
+    __slots__ = ("name", "ty", "used_by")
+
     def __init__(self, name: str, ty: Typ):
         super().__init__(name, ty)
 
@@ -799,6 +1030,8 @@ class LocalValue(Value, Instruction):
 class AddressOf(LocalValue):
     """ This instruction takes the address of a block of data """
 
+    __slots__ = ()
+
     src = value_use("src")
 
     def __init__(self, src, name: str):
@@ -816,6 +1049,8 @@ class AddressOf(LocalValue):
 class Cast(LocalValue):
     """ Base type conversion instruction """
 
+    __slots__ = ()
+
     src = value_use("src")
 
     def __init__(self, value, name, ty):
@@ -829,6 +1064,8 @@ class Cast(LocalValue):
 class Undefined(LocalValue):
     """ Undefined value, this value must never be used. """
 
+    __slots__ = ()
+
     def __str__(self):
         return "{} = undefined".format(self.name)
 
@@ -836,6 +1073,8 @@ class Undefined(LocalValue):
 class Const(LocalValue):
     """ Represents a constant value """
 
+    __slots__ = ("value",)
+
     def __init__(self, value, name, ty):
         super().__init__(name, ty)
         self.value = value
@@ -850,6 +1089,8 @@ class LiteralData(LocalValue):
         instruction, a label and its data is emitted in the literal area
     """
 
+    __slots__ = ("data",)
+
     def __init__(self, data, name):
         super().__init__(name, BlobDataTyp(len(data), 1))
         self.data = data
@@ -863,6 +1104,8 @@ class LiteralData(LocalValue):
 class FunctionCall(LocalValue):
     """ Call a function with some arguments and a return value """
 
+    __slots__ = ("arguments",)
+
     callee = value_use("callee")
 
     def __init__(self, callee, arguments, name, ty):
@@ -900,6 +1143,8 @@ class FunctionCall(LocalValue):
 class ProcedureCall(Instruction):
     """ Call a procedure with some arguments """
 
+    __slots__ = ("arguments",)
+
     callee = value_use("callee")
 
     def __init__(self, callee, arguments):
@@ -933,6 +1178,8 @@ class ProcedureCall(Instruction):
 class Unop(LocalValue):
     """ Generic unary operation """
 
+    __slots__ = ("operation",)
+
     ops = ["-", "~"]  # someday perhaps: 'floor', 'sqrt'
     a = value_use("a")
 
@@ -956,6 +1203,8 @@ class Unop(LocalValue):
 class Binop(LocalValue):
     """ Generic binary operation """
 
+    __slots__ = ("operation",)
+
     ops = ["+", "-", "*", "/", "%", "|", "&", "^", "<<", ">>", "rol", "ror"]
     a = value_use("a")
     b = value_use("b")
@@ -1007,6 +1256,8 @@ class Phi(LocalValue):
     the IR-code to be in SSA form.
     """
 
+    __slots__ = ("inputs",)
+
     def __init__(self, name, ty):
         super().__init__(name, ty)
         self.inputs = {}
@@ -1028,9 +1279,9 @@ class Phi(LocalValue):
         assert old in self.inputs.values()
         for inp in self.inputs:
             if self.inputs[inp] == old:
-                self.del_use(old)
                 self.inputs[inp] = new
-                self.add_use(new)
+        self.del_use(old)
+        self.add_use(new)
 
     def set_incoming(self, block, value):
         """ Set the value for the phi node when entering through block """
@@ -1040,11 +1291,14 @@ class Phi(LocalValue):
                     value.ty, self.ty
                 )
             )
-        if block in self.inputs:
-            self.del_use(self.inputs[block])
+        old_value = self.inputs.get(block, None)
         self.inputs[block] = value
         self.add_use(value)
 
+        # The same value can enter through several blocks:
+        if old_value is not None and old_value not in self.inputs.values():
+            self.del_use(old_value)
+
     def get_value(self, block):
         """ Get the value for the incoming branch """
         return self.inputs[block]
@@ -1052,12 +1306,15 @@ class Phi(LocalValue):
     def del_incoming(self, block):
         """ Remove incoming branch from this phi node and delete the usage """
         value = self.inputs.pop(block)
-        self.del_use(value)
+        if value not in self.inputs.values():
+            self.del_use(value)
 
 
 class Alloc(LocalValue):
     """ Allocates space on the stack. The type of this value is a ptr """
 
+    __slots__ = ("amount", "alignment")
+
     def __init__(self, name: str, amount: int, alignment: int):
         super().__init__(name, BlobDataTyp(amount, alignment))
 
@@ -1085,23 +1342,37 @@ class Alloc(LocalValue):
 
 
 class CopyBlob(Instruction):
-    """ Sort of memcpy operation. """
+    """ Sort of memcpy operation.
+
+    The alignment is the alignment in bytes which both the source and the
+    destination are known to have.
+    """
+
+    __slots__ = ("amount", "alignment")
 
     dst = value_use("dst")
     src = value_use("src")
 
-    def __init__(self, dst, src, amount: int):
+    def __init__(self, dst, src, amount: int, alignment: int = 1):
         super().__init__()
         self.dst = dst
         self.src = src
         if not isinstance(amount, int):
             raise TypeError("amount must be int, not {}".format(type(amount)))
         self.amount = amount
+        if not isinstance(alignment, int):
+            raise TypeError(
+                "alignment must be int, not {}".format(type(alignment))
+            )
+        self.alignment = alignment
 
     def __str__(self):
-        return "memcpy({}, {}, {})".format(
+        text = "memcpy({}, {}, {})".format(
             self.dst.name, self.src.name, self.amount
         )
+        if self.alignment > 1:
+            text += " aligned at {}".format(self.alignment)
+        return text
 
 
 class Variable(GlobalValue):
@@ -1141,6 +1412,8 @@ class Variable(GlobalValue):
 class Parameter(LocalValue):
     """ Parameter of a :class:`SubRoutine`. """
 
+    __slots__ = ("num",)
+
     def __init__(self, name, ty):
         super().__init__(name, ty)
 
@@ -1158,12 +1431,14 @@ class Load(LocalValue):
         volatile: whether or not this memory access is volatile.
     """
 
+    __slots__ = ("volatile",)
+
     address = value_use("address")
 
     def __init__(self, address, name, ty, volatile=False):
         super().__init__(name, ty)
         assert address.ty is ptr
-        if not isinstance(ty, (BasicTyp, PointerTyp)):
+        if not isinstance(ty, (BasicTyp, PointerTyp, VectorTyp)):
             raise ValueError("Can only load basic types, not {}".format(ty))
         self.address = address
         self.volatile = volatile
@@ -1175,6 +1450,8 @@ class Load(LocalValue):
 class Store(Instruction):
     """ Store a value into memory """
 
+    __slots__ = ("volatile",)
+
     address = value_use("address")
     value = value_use("value")
 
@@ -1204,6 +1481,9 @@ class Store(Instruction):
 
 class InlineAsm(Instruction):
     """ Inline assembly code. """
+
+    __slots__ = ("template", "clobbers", "input_values")
+
     def __init__(self, template, clobbers):
         super().__init__()
         self.template = template
@@ -1235,7 +1515,7 @@ class FinalInstruction(Instruction):
     instruction.
     """
 
-    pass
+    __slots__ = ()
 
 
 class Exit(FinalInstruction):
@@ -1245,6 +1525,8 @@ class Exit(FinalInstruction):
     in a :class:`Procedure`.
     """
 
+    __slots__ = ("targets",)
+
     def __init__(self):
         super().__init__()
         self.targets = []
@@ -1259,6 +1541,8 @@ class Return(FinalInstruction):
     This instruction is only legal in a :class:`Function`.
     """
 
+    __slots__ = ("targets",)
+
     result = value_use("result")
 
     def __init__(self, result):
@@ -1291,6 +1575,8 @@ def block_use(name):
 class JumpBase(FinalInstruction):
     """ Base of all jumping instructions """
 
+    __slots__ = ("_block_map",)
+
     def __init__(self):
         super().__init__()
         self._block_map = {}
@@ -1314,7 +1600,8 @@ class JumpBase(FinalInstruction):
         """ Clear references """
         while self._block_map:
             _, block = self._block_map.popitem()
-            block.references.remove(self)
+            # A block can be the target multiple times:
+            block.references.discard(self)
 
     @property
     def targets(self):
@@ -1331,6 +1618,8 @@ class JumpBase(FinalInstruction):
 class Jump(JumpBase):
     """ Jump statement to another :class:`Block` within the same function """
 
+    __slots__ = ()
+
     target = block_use("target")
 
     def __init__(self, target):
@@ -1344,6 +1633,8 @@ class Jump(JumpBase):
 class CJump(JumpBase):
     """ Conditional jump to true or false labels. """
 
+    __slots__ = ("cond",)
+
     conditions = ["==", "<", ">", ">=", "<=", "!="]
     a = value_use("a")
     b = value_use("b")
@@ -1371,20 +1662,50 @@ class CJump(JumpBase):
 
 
 class JumpTable(JumpBase):
-    """ Jump table.
+    """ Multiway branch on an integer value.
+
+    The table is a list of (value, block) pairs. When v equals one of the
+    values, control transfers to the corresponding block, otherwise to
+    the default block.
 
-    In the worst case, this is expanded to a whole bunch of CJump statements.
+    The backend lowers this into an indexed branch through a table of
+    addresses when the values are dense, or else into a balanced tree of
+    CJump statements.
     """
 
+    __slots__ = ("_values",)
+
     v = value_use("v")
     lab_default = block_use("lab_default")
 
     def __init__(self, v, table, default):
         super().__init__()
         self.v = v
-        self.table = table
+        values = [value for value, _ in table]
+        if len(set(values)) != len(values):
+            raise ValueError("Duplicate values in jump table")
+        self._values = values
+        for index, (_, block) in enumerate(table):
+            self.set_target_block("table_{}".format(index), block)
         self.lab_default = default
-        raise NotImplementedError("TODO")
+
+    @property
+    def table(self):
+        """ The list of (value, block) pairs of this jump table """
+        return [
+            (value, self._block_map["table_{}".format(index)])
+            for index, value in enumerate(self._values)
+        ]
+
+    @property
+    def targets(self):
+        """ Gets the distinct blocks that this instruction jumps to """
+        return list(OrderedSet(self._block_map.values()))
 
     def __str__(self):
-        return "jmp_table {}".format(self.v.name)
+        table = ", ".join(
+            "{}: {}".format(value, block.name) for value, block in self.table
+        )
+        return "jmp_table {} [{}] default {}".format(
+            self.v.name, table, self.lab_default.name
+        )
@@ -2,12 +2,14 @@
 """
 
 from .verify import verify_module, Verifier
+from .verify import VERIFY_LEVELS, get_verify_level, set_verify_level
 from .writer import Writer, print_module
 from .reader import Reader, read_module
 from .builder import Builder, split_block
 from .link import ir_link
 from .io import to_json, from_json
-from .instrument import add_tracer
+from .instrument import add_tracer, add_edge_counters
+from .profile import Profile
 
 __all__ = [
     "Builder",
@@ -18,8 +20,13 @@ __all__ = [
     "split_block",
     "Verifier",
     "verify_module",
+    "VERIFY_LEVELS",
+    "get_verify_level",
+    "set_verify_level",
     "Writer",
     "to_json",
     "from_json",
     "add_tracer",
+    "add_edge_counters",
+    "Profile",
 ]
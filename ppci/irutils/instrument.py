@@ -3,6 +3,7 @@
 
 import logging
 from .. import ir
+from ..utils.collections import OrderedSet
 
 
 def add_tracer(ir_module, trace_function_name="trace"):
@@ -21,3 +22,73 @@ def add_tracer(ir_module, trace_function_name="trace"):
         entry.insert_instruction(trace_call)
         entry.insert_instruction(name_ptr)
         entry.insert_instruction(name_literal)
+
+
+def add_edge_counters(
+    ir_module, counters_name="__profile_counters", counter_ty=ir.i64
+):
+    """ Instrument the given ir-module with block and edge counters.
+
+    Each block increments its own counter when it is entered. The edges
+    leaving a block with multiple successors are split by a new block
+    which increments the counter of that edge. The counters are
+    integers in a single global variable.
+
+    Args:
+        ir_module: The ir-module to instrument.
+        counters_name: The name of the global variable with the counters.
+        counter_ty: The integer type of the counters. Use a smaller type
+            for targets without 64 bit integers.
+
+    Returns:
+        A :class:`ppci.irutils.profile.Profile` with all counts set to
+        zero, which describes the counters.
+    """
+    from .profile import Profile
+
+    logger = logging.getLogger("instrument")
+    keys = []
+    size = counter_ty.size
+    counters = ir.Variable(counters_name, ir.Binding.GLOBAL, size, size)
+    ir_module.add_variable(counters)
+
+    for function in ir_module.functions:
+        for block in list(function):
+            keys.append((function.name, block.name, None))
+            _add_increment(block, counters, counter_ty, len(keys) - 1)
+
+            # Count each edge of multiway branches on a block of its own:
+            successors = block.successors
+            if len(set(successors)) < 2:
+                continue
+            for successor in list(OrderedSet(successors)):
+                keys.append((function.name, block.name, successor.name))
+                edge_block = ir.Block(
+                    "{}_to_{}".format(block.name, successor.name)
+                )
+                function.add_block(edge_block)
+                edge_block.add_instruction(ir.Jump(successor))
+                block.change_target(successor, edge_block)
+                successor.replace_incoming(block, [edge_block])
+                _add_increment(edge_block, counters, counter_ty, len(keys) - 1)
+
+    counters.amount = size * len(keys)
+    logger.info("Added %s profile counters to %s", len(keys), ir_module)
+    profile = Profile()
+    profile.add_counters(counters_name, keys, size=size)
+    return profile
+
+
+def _add_increment(block, counters, ty, index):
+    """ Increment a counter at the start of a block, after the phis """
+    before = block.first_instruction
+    while isinstance(before, ir.Phi):
+        before = before.next_instruction
+    offset = ir.Const(ty.size * index, "counter_offset", ir.ptr)
+    address = ir.add(counters, offset, "counter_address", ir.ptr)
+    old_count = ir.Load(address, "count", ty)
+    one = ir.Const(1, "one", ty)
+    new_count = ir.add(old_count, one, "new_count", ty)
+    store = ir.Store(new_count, address)
+    for instruction in (offset, address, old_count, one, new_count, store):
+        block.insert_instruction(instruction, before_instruction=before)
@@ -252,6 +252,18 @@ class DictWriter:
                 "yes_block": self.write_block_ref(instruction.lab_yes),
                 "no_block": self.write_block_ref(instruction.lab_no),
             }
+        elif isinstance(instruction, ir.JumpTable):
+            json_instruction = {
+                "kind": "jumptable",
+                "value": self.write_value_ref(instruction.v),
+                "table": [
+                    {"value": value, "block": self.write_block_ref(block)}
+                    for value, block in instruction.table
+                ],
+                "default_block": self.write_block_ref(
+                    instruction.lab_default
+                ),
+            }
         elif isinstance(instruction, ir.Cast):
             json_instruction = {
                 "kind": "cast",
@@ -294,6 +306,24 @@ class DictWriter:
                 "callee": self.write_value_ref(instruction.callee),
                 "arguments": json_arguments,
             }
+        elif isinstance(instruction, ir.CopyBlob):
+            json_instruction = {
+                "kind": "copyblob",
+                "dst": self.write_value_ref(instruction.dst),
+                "src": self.write_value_ref(instruction.src),
+                "amount": instruction.amount,
+                "alignment": instruction.alignment,
+            }
+        elif isinstance(instruction, ir.InlineAsm):
+            json_instruction = {
+                "kind": "inlineasm",
+                "template": instruction.template,
+                "clobbers": list(instruction.clobbers),
+                "inputs": [
+                    self.write_value_ref(value)
+                    for value in instruction.input_values
+                ],
+            }
         elif isinstance(instruction, ir.Phi):
             json_phi_inputs = []
             for phi_input_block, phi_input_value in instruction.inputs.items():
@@ -314,7 +344,7 @@ class DictWriter:
         return json_instruction
 
     def write_type(self, ty):
-        if isinstance(ty, (ir.BasicTyp, ir.PointerTyp)):
+        if isinstance(ty, (ir.BasicTyp, ir.PointerTyp, ir.VectorTyp)):
             json_type = {
                 "kind": "basic",
                 "name": ty.name,
@@ -419,9 +449,14 @@ class DictReader:
         return variable
 
     def construct_subroutine(self, json_subroutine):
+        subroutine = self.new_subroutine(json_subroutine)
+        self.register_value(subroutine)
+        self.construct_subroutine_body(subroutine, json_subroutine)
+        return subroutine
+
+    def new_subroutine(self, json_subroutine):
+        """ Create an empty function or procedure """
         name = json_subroutine["name"]
-        json_blocks = json_subroutine["blocks"]
-        json_parameters = json_subroutine["parameters"]
         binding = self.construct_binding(json_subroutine["binding"])
         stype = json_subroutine["kind"]
 
@@ -432,7 +467,15 @@ class DictReader:
             subroutine = ir.Procedure(name, binding)
         else:  # pragma: no cover
             raise NotImplementedError(stype)
-        self.register_value(subroutine)
+        return subroutine
+
+    def construct_subroutine_body(self, subroutine, json_subroutine):
+        """ Add the parameters and blocks to the given subroutine.
+
+        Global values used by the subroutine must already be registered.
+        """
+        json_blocks = json_subroutine["blocks"]
+        json_parameters = json_subroutine["parameters"]
 
         # self.subroutines.append(subroutine)
         self.enter_scope()
@@ -450,7 +493,6 @@ class DictReader:
             subroutine.add_block(block)
         self.leave_scope()
         # self.subroutines.pop()
-        return subroutine
 
     def construct_block(self, json_block, subroutine):
         name = json_block["name"]
@@ -467,12 +509,26 @@ class DictReader:
             name = json_instruction["name"]
             ty = self.get_type(json_instruction["type"])
             address = self.get_value_ref(json_instruction["address"])
-            instruction = ir.Load(address, name, ty)
+            volatile = json_instruction.get("volatile", False)
+            instruction = ir.Load(address, name, ty, volatile=volatile)
             self.register_value(instruction)
         elif itype == "store":
             value = self.get_value_ref(json_instruction["value"])
             address = self.get_value_ref(json_instruction["address"])
-            instruction = ir.Store(value, address)
+            volatile = json_instruction.get("volatile", False)
+            instruction = ir.Store(value, address, volatile=volatile)
+        elif itype == "copyblob":
+            dst = self.get_value_ref(json_instruction["dst"])
+            src = self.get_value_ref(json_instruction["src"])
+            amount = json_instruction["amount"]
+            alignment = json_instruction["alignment"]
+            instruction = ir.CopyBlob(dst, src, amount, alignment)
+        elif itype == "inlineasm":
+            template = json_instruction["template"]
+            clobbers = json_instruction["clobbers"]
+            instruction = ir.InlineAsm(template, clobbers)
+            for json_input in json_instruction["inputs"]:
+                instruction.add_input_variable(self.get_value_ref(json_input))
         elif itype == "alloc":
             name = json_instruction["name"]
             amount = json_instruction["size"]
@@ -537,6 +593,14 @@ class DictReader:
             lab_yes = self.get_block_ref(json_instruction["yes_block"])
             lab_no = self.get_block_ref(json_instruction["no_block"])
             instruction = ir.CJump(a, cond, b, lab_yes, lab_no)
+        elif itype == "jumptable":
+            v = self.get_value_ref(json_instruction["value"])
+            table = [
+                (json_entry["value"], self.get_block_ref(json_entry["block"]))
+                for json_entry in json_instruction["table"]
+            ]
+            default = self.get_block_ref(json_instruction["default_block"])
+            instruction = ir.JumpTable(v, table, default)
         elif itype == "procedurecall":
             callee = self.get_value_ref(json_instruction["callee"])
             arguments = []
@@ -0,0 +1,144 @@
+""" Execution profiles for profile guided optimization.
+
+A profile is gathered in these steps:
+
+1. Instrument the ir-code with :func:`ppci.irutils.add_edge_counters`,
+   and keep the returned :class:`Profile`, which describes the counters.
+2. Compile and run the instrumented code.
+3. Read the counters from the running program, for example with
+   :meth:`Profile.read_from_codepage`, and save the profile to file.
+
+When compiling the same source code again, the profile can be loaded
+and applied to the ir-code. This attaches the counts to the blocks,
+as :attr:`ppci.ir.Block.execution_count` and
+:attr:`ppci.ir.Block.edge_counts`, for use by the optimizer and the
+code generator.
+
+The profile file is a json file with the keys of the counters, and
+their values.
+"""
+
+import ctypes
+import json
+import logging
+import struct
+from collections import OrderedDict
+
+
+class Profile:
+    """ Block and edge execution counts of one or more ir-modules.
+
+    The counters are grouped by the name of the global variable that
+    holds them. Each counter belongs to a block, given by function and
+    block name, or to an edge, given by function, block and target
+    block name. The size is the size in bytes of a single counter.
+    """
+
+    logger = logging.getLogger("profile")
+    formats = {2: "H", 4: "I", 8: "Q"}
+
+    def __init__(self):
+        self.counters = OrderedDict()
+
+    def add_counters(self, counters_name, keys, counts=None, size=8):
+        """ Add a set of counters with the given keys """
+        if counters_name in self.counters:
+            raise ValueError("Duplicate counters {}".format(counters_name))
+        keys = [tuple(key) for key in keys]
+        if counts is None:
+            counts = [0] * len(keys)
+        if len(counts) != len(keys):
+            raise ValueError("Expected {} counts".format(len(keys)))
+        if size not in self.formats:
+            raise ValueError("Invalid counter size {}".format(size))
+        self.counters[counters_name] = (keys, list(counts), size)
+
+    def merge(self, other):
+        """ Add the counters of another profile to this profile """
+        for counters_name, (keys, counts, size) in other.counters.items():
+            self.add_counters(counters_name, keys, counts, size)
+
+    def set_counts(self, counters_name, data):
+        """ Add the counts of a run, given as raw bytes of the counters """
+        keys, counts, size = self.counters[counters_name]
+        values = struct.unpack(
+            "<{}{}".format(len(keys), self.formats[size]), data
+        )
+        for index, value in enumerate(values):
+            counts[index] += value
+
+    def read_from_codepage(self, module):
+        """ Read the counters from code loaded by :mod:`ppci.utils.codepage`
+        """
+        for counters_name, (keys, _, size) in self.counters.items():
+            address = module.get_symbol_address(counters_name)
+            data = ctypes.string_at(address, size * len(keys))
+            self.set_counts(counters_name, data)
+
+    def save(self, f):
+        """ Write this profile as json to the given file """
+        data = {"counters": []}
+        for counters_name, (keys, counts, size) in self.counters.items():
+            data["counters"].append(
+                {
+                    "name": counters_name,
+                    "keys": keys,
+                    "counts": counts,
+                    "size": size,
+                }
+            )
+        json.dump(data, f, indent=2)
+
+    @classmethod
+    def load(cls, f):
+        """ Read a profile from a json file """
+        data = json.load(f)
+        profile = cls()
+        for counters in data["counters"]:
+            profile.add_counters(
+                counters["name"],
+                counters["keys"],
+                counters["counts"],
+                counters.get("size", 8),
+            )
+        return profile
+
+    def apply(self, ir_module, counters_name="__profile_counters"):
+        """ Attach the counts to the blocks of the given ir-module.
+
+        The ir-module must be constructed in the same way as the module
+        which was instrumented, otherwise the names do not match.
+        """
+        keys, counts, _ = self.counters[counters_name]
+        block_counts = {}
+        edge_counts = {}
+        for (function_name, block_name, target_name), count in zip(
+            keys, counts
+        ):
+            if target_name is None:
+                block_counts[(function_name, block_name)] = count
+            else:
+                edge_counts[(function_name, block_name, target_name)] = count
+
+        matched = 0
+        for function in ir_module.functions:
+            for block in function:
+                key = (function.name, block.name)
+                if key not in block_counts:
+                    continue
+                matched += 1
+                block.execution_count = block_counts[key]
+                block.edge_counts = {}
+                successors = block.successors
+                for successor in successors:
+                    if len(set(successors)) == 1:
+                        count = block.execution_count
+                    else:
+                        count = edge_counts.get(key + (successor.name,), 0)
+                    block.edge_counts[successor] = count
+        self.logger.debug(
+            "Applied %s of %s block counts to %s",
+            matched,
+            len(block_counts),
+            ir_module,
+        )
@@ -2,22 +2,64 @@
 
 This is a very useful module since it allows to isolate
 bugs in the compiler itself.
+
+Verification can be tuned with a level. The 'full' level checks
+everything, including that every value dominates its uses. The 'cheap'
+level only checks the structure of the ir code and the types of values,
+and the 'off' level skips verification altogether. The default level is
+changed with :func:`set_verify_level`.
 """
 
 import logging
 from collections import defaultdict
-from ..graph.domtree import CfgInfo
+from ..graph.cfg import ir_function_to_graph
 from ..common import IrFormError
 from .. import ir
 
+# Verification levels:
+# - off: do not verify at all
+# - cheap: check structure and types, but not dominance of uses
+# - full: perform all checks
+VERIFY_LEVELS = ("off", "cheap", "full")
+
+_verify_level = "full"
+
+
+def get_verify_level():
+    """ Get the default verification level """
+    return _verify_level
+
+
+def set_verify_level(level):
+    """ Set the default verification level.
+
+    This level is used when no level is given to :func:`verify_module`
+    or the :class:`Verifier`. The previous level is returned, so that
+    it can be restored later.
 
-def verify_module(module: ir.Module):
+    Args:
+        level: One of 'off', 'cheap' or 'full'.
+    """
+    global _verify_level
+    if level not in VERIFY_LEVELS:
+        raise ValueError(
+            "Verify level must be one of {}, not {}".format(
+                VERIFY_LEVELS, level
+            )
+        )
+    previous, _verify_level = _verify_level, level
+    return previous
+
+
+def verify_module(module: ir.Module, level=None):
     """ Check if the module is properly constructed
 
     Args:
         module: The module to verify.
+        level: The verification level, one of 'off', 'cheap' or 'full'.
+            When not given, the default verification level is used.
     """
-    Verifier().verify(module)
+    Verifier(level=level).verify(module)
 
 
 class Verifier:
@@ -25,20 +67,50 @@ class Verifier:
 
     logger = logging.getLogger("verifier")
 
-    def __init__(self):
+    def __init__(self, level=None):
+        if level is not None and level not in VERIFY_LEVELS:
+            raise ValueError("Invalid verify level {}".format(level))
+        self.level = level
         self.name_map = {}
+        self.cfg = None
+        self.block_map = None
 
     def verify(self, module):
         """ Verifies a module for some sanity """
+        level = get_verify_level() if self.level is None else self.level
+        if level == "off":
+            return
         self.logger.debug("Verifying %s", module)
         assert isinstance(module, ir.Module)
         for function in module.functions:
-            self.verify_function(function)
+            self.verify_function(function, full=level == "full")
 
-    def verify_function(self, function):
-        """ Verify all blocks in the function """
+    def verify_function(self, function, full=True):
+        """ Verify all blocks in the function.
+
+        When full is False, the dominance of uses is not checked.
+        """
         self.name_map = {}
+
+        # Verify the entry is in this function and is the first block:
+        assert function.entry is function.blocks[0]
+        assert isinstance(function.entry, ir.Block)
+
+        # Determine predecessors from sucessors:
+        reachable_blocks = function.calc_reachable_blocks()
+        predecessor_map = defaultdict(set)
+        for block in function:
+            for block2 in block.successors:
+                predecessor_map[block2].add(block)
+
+        # Now we can build a dominator tree:
+        if full:
+            self.cfg, self.block_map = ir_function_to_graph(function)
+        else:
+            self.cfg = self.block_map = None
+
         for block in function:
+            assert block.function is function
             assert block.name not in self.name_map
             self.name_map[block.name] = block
             self.verify_block_termination(block)
@@ -56,42 +128,19 @@ class Verifier:
             elif isinstance(block.last_instruction, ir.Exit):
                 assert isinstance(function, ir.Procedure)
 
-        # Verify the entry is in this function and is the first block:
-        assert function.entry is function.blocks[0]
-        assert isinstance(function.entry, ir.Block)
-
-        # Verify all blocks are reachable:
-        reachable_blocks = function.calc_reachable_blocks()
-        for block in function:
+            # Verify all blocks are reachable:
             assert block in reachable_blocks
 
-        # Determine predecessors from sucessors:
-        predecessor_map = defaultdict(set)
-        for block in function:
-            for block2 in block.successors:
-                predecessor_map[block2].add(block)
-
-        # Verify predecessor and successor:
-        for block in function:
-            preds = predecessor_map[block]
-            assert preds == set(block.predecessors)
+            # Verify predecessor and successor:
+            assert predecessor_map[block] == set(block.predecessors)
 
-        # Check that phi's have inputs for each predecessor:
-        for block in function:
+            # Check that phi's have inputs for each predecessor:
             for phi in block.phis:
                 for predecessor in block.predecessors:
                     used_value = phi.get_value(predecessor)
                     # Check that phi 'use' info is good:
                     assert used_value in phi.uses
 
-        # Now we can build a dominator tree
-        self.cfg_info = CfgInfo(function)
-        if len(self.cfg_info.cfg) > 2000:
-            self.logger.error("Skipping verify of more than 2000 cfg nodes")
-            return
-
-        for block in function:
-            assert block.function is function
             self.verify_block(block)
 
     def verify_block_termination(self, block):
@@ -117,8 +166,7 @@ class Verifier:
             are preceeded by defs """
 
         # Check that instruction is contained in block:
-        assert instruction.block == block
-        assert instruction in block.instructions
+        assert instruction.block is block
 
         # Check if value has unique name string:
         if isinstance(instruction, ir.Value):
@@ -163,6 +211,13 @@ class Verifier:
                         instruction.a.ty, instruction.b.ty, instruction
                     )
                 )
+        elif isinstance(instruction, ir.JumpTable):
+            if not (instruction.v.ty.is_integer or instruction.v.ty is ir.ptr):
+                raise IrFormError(
+                    "Jump table on non integer {} in {}".format(
+                        instruction.v.ty, instruction
+                    )
+                )
         elif isinstance(instruction, (ir.FunctionCall, ir.ProcedureCall)):
             if isinstance(
                 instruction.callee, (ir.SubRoutine, ir.ExternalSubRoutine)
@@ -171,9 +226,10 @@ class Verifier:
 
         # Verify that all uses are defined before this instruction.
         for value in instruction.uses:
-            assert self.instruction_dominates(
-                value, instruction
-            ), "{} does not dominate {}".format(value, instruction)
+            if self.cfg is not None:
+                assert self.instruction_dominates(
+                    value, instruction
+                ), "{} does not dominate {}".format(value, instruction)
             # Check that a value is not undefined:
             if isinstance(value, ir.Undefined):
                 raise IrFormError("{} is used".format(value))
@@ -239,7 +295,6 @@ class Verifier:
         # All other instructions must have a containing block:
         if one.block is None:
             raise ValueError("{} has no block".format(one))
-        assert one in one.block.instructions
 
         # Phis are special case:
         if isinstance(another, ir.Phi):
@@ -263,7 +318,7 @@ class Verifier:
 
     def block_dominates(self, one: ir.Block, another: ir.Block):
         """ Check if this block dominates other block """
-        assert one in one.function
-        one_node = self.cfg_info.get_node(one)
-        another_node = self.cfg_info.get_node(another)
-        return self.cfg_info.cfg.strictly_dominates(one_node, another_node)
+        assert one.function is another.function
+        one_node = self.block_map[one]
+        another_node = self.block_map[another]
+        return self.cfg.strictly_dominates(one_node, another_node)
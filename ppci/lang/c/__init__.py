@@ -2,6 +2,7 @@
 
 from .context import CContext
 from .builder import CBuilder, create_ast, parse_text, parse_type
+from .incremental import IncrementalCBuilder
 from .lexer import CLexer
 from .parser import CParser
 from .semantics import CSemantics
@@ -11,19 +12,21 @@ from .utils import CAstPrinter, print_ast
 from .printer import CPrinter, render_ast
 from .options import COptions
 from .token import CTokenPrinter
-from .api import preprocess, c_to_ir
+from .api import preprocess, c_to_ir, list_dependencies
 
 
 __all__ = [
     "create_ast",
     "preprocess",
     "c_to_ir",
+    "list_dependencies",
     "print_ast",
     "parse_text",
     "render_ast",
     "parse_type",
     "CBuilder",
     "CContext",
+    "IncrementalCBuilder",
     "CLexer",
     "COptions",
     "CPreProcessor",
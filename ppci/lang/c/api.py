@@ -16,13 +16,45 @@ def preprocess(f, output_file, coptions=None):
     CTokenPrinter().dump(tokens, file=output_file)
 
 
-def c_to_ir(source: io.TextIOBase, march, coptions=None, reporter=None):
+def list_dependencies(f, coptions=None):
+    """ Pre-process a file, and list the files it includes.
+
+    Returns:
+        A list with a tuple of the filename and whether it is a system
+        header, for each included file.
+    """
+    if coptions is None:
+        coptions = COptions()
+    preprocessor = CPreProcessor(coptions)
+    filename = f.name if hasattr(f, "name") else None
+    for _ in preprocessor.process_file(f, filename=filename):
+        pass
+    return _dependency_list(preprocessor)
+
+
+def _dependency_list(preprocessor):
+    return [
+        (filename, filename in preprocessor.system_headers)
+        for filename in preprocessor.dependencies
+    ]
+
+
+def c_to_ir(
+    source: io.TextIOBase,
+    march,
+    coptions=None,
+    reporter=None,
+    dependencies=None,
+):
     """ C to ir translation.
 
     Args:
         source (file-like object): The C source to compile.
         march (str): The targetted architecture.
         coptions: C specific compilation options.
+        dependencies: an optional list, which is extended with the files
+            included by the source, like the result of
+            :func:`list_dependencies`.
 
     Returns:
         An :class:`ppci.ir.Module`.
@@ -45,4 +77,6 @@ def c_to_ir(source: io.TextIOBase, march, coptions=None, reporter=None):
         filename = None
 
     ir_module = cbuilder.build(source, filename, reporter=reporter)
+    if dependencies is not None:
+        dependencies.extend(_dependency_list(cbuilder))
     return ir_module
@@ -1,13 +1,21 @@
 import logging
 import io
+from collections import namedtuple
 from .options import COptions
 from .context import CContext
 from .parser import CParser
 from .semantics import CSemantics
 from .preprocessor import CPreProcessor, prepare_for_parsing
 from .codegenerator import CCodeGenerator
+from .pch import load_pch
 from .utils import print_ast
 
+# A preprocessed source, with the typedef names and top level scope of the
+# precompiled header, if any:
+PreprocessedSource = namedtuple(
+    "PreprocessedSource", ["context", "tokens", "typedefs", "scope"]
+)
+
 
 class CBuilder:
     """ C builder that converts C code into ir-code """
@@ -18,8 +26,42 @@ class CBuilder:
         self.arch_info = arch_info
         self.coptions = coptions
         self.cgen = None
+        self.dependencies = []  # The files included by the last source
+        self.system_headers = set()
 
     def build(self, src: io.TextIOBase, filename: str, reporter=None):
+        self._start(filename, reporter)
+        context = CContext(self.coptions, self.arch_info)
+        preprocessor = CPreProcessor(self.coptions)
+        compile_unit = _parse(src, filename, context, preprocessor)
+        self.dependencies = preprocessor.dependencies
+        self.system_headers = preprocessor.system_headers
+        return self._generate(context, compile_unit, reporter)
+
+    def preprocess(self, src: io.TextIOBase, filename: str):
+        """ Preprocess a source into a list of tokens.
+
+        The result can be built later on with :meth:`build_preprocessed`.
+        """
+        context = CContext(self.coptions, self.arch_info)
+        preprocessor = CPreProcessor(self.coptions)
+        tokens, typedefs, scope = _preprocess(
+            src, filename, context, preprocessor
+        )
+        tokens = list(tokens)
+        self.dependencies = preprocessor.dependencies
+        self.system_headers = preprocessor.system_headers
+        return PreprocessedSource(context, tokens, typedefs, scope)
+
+    def build_preprocessed(self, source, filename: str, reporter=None):
+        """ Build a source which was preprocessed by :meth:`preprocess` """
+        self._start(filename, reporter)
+        compile_unit = _parse_tokens(
+            source.context, source.tokens, source.typedefs, source.scope
+        )
+        return self._generate(source.context, compile_unit, reporter)
+
+    def _start(self, filename, reporter):
         if reporter:
             reporter.heading(2, "C builder")
             reporter.message(
@@ -28,9 +70,7 @@ class CBuilder:
         cdialect = self.coptions["std"]
         self.logger.info("Starting C compilation (%s)", cdialect)
 
-        context = CContext(self.coptions, self.arch_info)
-        compile_unit = _parse(src, filename, context)
-
+    def _generate(self, context, compile_unit, reporter):
         if reporter:
             f = io.StringIO()
             print_ast(compile_unit, file=f)
@@ -63,16 +103,37 @@ def create_ast(src, arch_info, filename="<snippet>", coptions=None):
     return _parse(src, filename, context)
 
 
-def _parse(src, filename, context):
-    preprocessor = CPreProcessor(context.coptions)
-    tokens = preprocessor.process_file(src, filename)
+def _parse(src, filename, context, preprocessor=None):
+    if preprocessor is None:
+        preprocessor = CPreProcessor(context.coptions)
+    tokens, typedefs, scope = _preprocess(src, filename, context, preprocessor)
+    return _parse_tokens(context, tokens, typedefs, scope)
+
+
+def _parse_tokens(context, tokens, typedefs, scope):
     semantics = CSemantics(context)
     parser = CParser(context.coptions, semantics)
     tokens = prepare_for_parsing(tokens, parser.keywords)
-    ast = parser.parse(tokens)
+    ast = parser.parse(tokens, typedefs=typedefs, scope=scope)
     return ast
 
 
+def _preprocess(src, filename, context, preprocessor):
+    """ Preprocess a source, starting from the precompiled header if any.
+
+    Returns the tokens, and the typedef names and top level scope to
+    start parsing with.
+    """
+    typedefs, scope = (), None
+    if context.coptions["include_pch"]:
+        pch_filename = context.coptions["include_pch"]
+        pch = load_pch(pch_filename, context)
+        typedefs, scope = pch.restore(preprocessor)
+        preprocessor.dependencies.append(pch_filename)
+    tokens = preprocessor.process_file(src, filename)
+    return tokens, typedefs, scope
+
+
 def parse_type(text, context, filename="foo.c"):
     """ Parse given C-type AST.
 
@@ -424,18 +424,7 @@ class CCodeGenerator:
             self._varargz_ptr = ir_argument
 
         # Generate debug info for function:
-        dbg_args = [
-            debuginfo.DebugParameter(a.name, self.get_debug_type(a.typ))
-            for a in function.typ.arguments
-        ]
-        dfi = debuginfo.DebugFunction(
-            function.name,
-            function.location,
-            self.get_debug_type(function.typ.return_type),
-            dbg_args,
-        )
-
-        self.debug_db.enter(ir_function, dfi)
+        self.gen_function_debug_info(function, ir_function)
 
         # Generate code for body:
         assert isinstance(function.body, statements.Compound)
@@ -467,6 +456,20 @@ class CCodeGenerator:
         assert not self.break_block_stack
         assert not self.continue_block_stack
 
+    def gen_function_debug_info(self, function, ir_function):
+        """ Generate debug info for a function """
+        dbg_args = [
+            debuginfo.DebugParameter(a.name, self.get_debug_type(a.typ))
+            for a in function.typ.arguments
+        ]
+        dfi = debuginfo.DebugFunction(
+            function.name,
+            function.location,
+            self.get_debug_type(function.typ.return_type),
+            dbg_args,
+        )
+        self.debug_db.enter(ir_function, dfi)
+
     def gen_stmt(self, statement):
         """ Generate code for the given statement """
         fn_map = {
@@ -557,7 +560,9 @@ class CCodeGenerator:
             https://www.codeproject.com/Articles/100473/
             Something-You-May-Not-Know-About-the-Switch-Statem
 
-        For now, implemented as a gigantic if-then forest.
+        The switch is implemented as a jump table instruction, which
+        is lowered by the backend into an indexed branch or a tree of
+        compares.
         """
         backup = self.switch_options
         self.switch_options = {}
@@ -576,24 +581,20 @@ class CCodeGenerator:
         self.break_block_stack.pop(-1)
 
         # Implement switching logic, now that we have the branches:
-        # TODO: implement jump tables and other performance related stuff.
         self.builder.set_block(test_block)
         test_value = self.gen_expr(stmt.expression, rvalue=True)
-        switch_ir_typ = self.get_ir_type(stmt.expression.typ)
-        for option, target_block in self.switch_options.items():
-            if option != "default":
-                option = self.builder.emit_const(option, switch_ir_typ)
-                next_test_block = self.builder.new_block()
-                self.emit(
-                    ir.CJump(
-                        test_value, "==", option, target_block, next_test_block
-                    )
-                )
-                self.builder.set_block(next_test_block)
+        table = [
+            (option, target_block)
+            for option, target_block in self.switch_options.items()
+            if option != "default"
+        ]
 
         # If all else fails, jump to the default case if we have it.
-        target_block = self.switch_options.get("default", final_block)
-        self.builder.emit_jump(target_block)
+        default_block = self.switch_options.get("default", final_block)
+        if table:
+            self.emit(ir.JumpTable(test_value, table, default_block))
+        else:
+            self.builder.emit_jump(default_block)
 
         # Set continuation point:
         self.builder.set_block(final_block)
@@ -1021,7 +1022,9 @@ class CCodeGenerator:
                         ir.Alloc("load_blob", ir_typ.size, ir_typ.alignment)
                     )
                     value_ptr = self.emit(ir.AddressOf(value, "value_ptr"))
-                    self.gen_copy_struct(value_ptr, lvalue, ir_typ.size)
+                    self.gen_copy_struct(
+                        value_ptr, lvalue, ir_typ.size, ir_typ.alignment
+                    )
             elif isinstance(lvalue, BitFieldAccess):
                 value = self._load_bitfield(lvalue, ir_typ)
             else:
@@ -1237,7 +1240,8 @@ class CCodeGenerator:
                 lhs = self.gen_expr(expr.a, rvalue=False)
                 rhs = self.gen_expr(expr.b, rvalue=False)
                 amount = self.context.sizeof(expr.a.typ)
-                self.gen_copy_struct(lhs, rhs, amount)
+                alignment = self.context.alignment(expr.a.typ)
+                self.gen_copy_struct(lhs, rhs, amount, alignment)
                 value = None
             else:
                 lhs = self.gen_expr(expr.a, rvalue=False)
@@ -1256,9 +1260,9 @@ class CCodeGenerator:
             raise NotImplementedError(str(expr.op))
         return value
 
-    def gen_copy_struct(self, dst, src, amount):
+    def gen_copy_struct(self, dst, src, amount, alignment=1):
         """ Generate a copy struct action. """
-        self.emit(ir.CopyBlob(dst, src, amount))
+        self.emit(ir.CopyBlob(dst, src, amount, alignment))
 
     def gen_ternop(self, expr: expressions.TernaryOperator):
         """ Generate code for ternary operator a ? b : c """
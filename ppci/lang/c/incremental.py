@@ -0,0 +1,438 @@
+""" Incremental compilation of C sources.
+
+A long running process, such as an editor or a build daemon, compiles the
+same source files over and over again, while only a few functions change
+in between. The incremental builder splits the tokens of a translation
+unit into its top level declarations. The IR-code of each function
+definition is kept under a hash of the tokens of the function and of all
+the top level declarations before it. When the source is built again, the
+bodies of unchanged functions are neither parsed nor lowered to IR-code,
+their IR-code is taken from the cache instead.
+
+Example:
+
+.. doctest::
+
+    >>> import io
+    >>> from ppci.api import get_arch
+    >>> from ppci.lang.c import COptions, IncrementalCBuilder
+    >>> builder = IncrementalCBuilder(get_arch('arm').info, COptions())
+    >>> src = "int a(void) { return 1; }\\nint b(void) { return 2; }\\n"
+    >>> ir_module = builder.build(io.StringIO(src), 'main.c')
+    >>> builder.reused, builder.compiled
+    (0, 2)
+    >>> src = src.replace('2', '3')
+    >>> ir_module = builder.build(io.StringIO(src), 'main.c')
+    >>> builder.reused, builder.compiled
+    (1, 1)
+
+"""
+
+import hashlib
+import io
+import logging
+from itertools import chain
+
+from ... import ir
+from ...binutils.debuginfo import DebugLocation
+from ...common import CompilerError
+from ...irutils.io import DictReader, DictWriter
+from ..common import SourceLocation
+from .builder import _preprocess
+from .codegenerator import CCodeGenerator
+from .context import CContext
+from .parser import CParser
+from .preprocessor import CPreProcessor, prepare_for_parsing
+from .semantics import CSemantics
+from .token import CToken
+
+# Matching closing brackets:
+BRACKETS = {"(": ")", "[": "]", "{": "}"}
+
+# Keywords followed by a parenthesized group which is no parameter list:
+ATTRIBUTE_KEYWORDS = ("__attribute__", "__declspec", "asm", "__asm__")
+
+
+def split_declarations(tokens):
+    """ Split a list of tokens into top level declarations.
+
+    Returns a list of (begin, body, end) tuples. For a function definition
+    body is the index of the opening brace of the function body, for
+    other declarations it is None. When the brackets are not balanced,
+    None is returned.
+    """
+    chunks = []
+    stack = []
+    begin = 0
+    body = None
+    group = None  # The start of the last parenthesized group at level 0
+    initializer = False
+    for index, token in enumerate(tokens):
+        typ = token.typ
+        if typ in BRACKETS:
+            if not stack:
+                if typ == "(":
+                    group = index
+                elif typ == "{" and _is_function_body(
+                    tokens, begin, index, group, initializer
+                ):
+                    body = index
+            stack.append(BRACKETS[typ])
+        elif typ in (")", "]", "}"):
+            if not stack or stack.pop() != typ:
+                return
+            if not stack and body is not None:
+                chunks.append((begin, body, index + 1))
+                begin, body, initializer = index + 1, None, False
+        elif not stack:
+            if typ == ";":
+                chunks.append((begin, None, index + 1))
+                begin, initializer = index + 1, False
+            elif typ == "=":
+                initializer = True
+
+    if stack:
+        return
+    if begin < len(tokens):
+        chunks.append((begin, None, len(tokens)))
+    return chunks
+
+
+def _is_function_body(tokens, begin, index, group, initializer):
+    """ Test if the brace at index starts a function body """
+    if initializer or index == begin or tokens[index - 1].typ != ")":
+        return False
+    return group == begin or tokens[group - 1].val not in ATTRIBUTE_KEYWORDS
+
+
+def _token_text(tokens):
+    return repr([(token.typ, token.val) for token in tokens]).encode("utf8")
+
+
+def _function_key(digest, tokens, filename, row):
+    """ Hash the tokens of a function after the given digest """
+    digest = digest.copy()
+    text = repr(
+        [(t.typ, t.val, _position(t.loc, filename, row)) for t in tokens]
+    )
+    digest.update(text.encode("utf8"))
+    return digest.hexdigest()
+
+
+def _position(loc, filename, row):
+    """ Get the position of a location relative to the given row """
+    if loc is None:
+        return
+    elif loc.filename == filename:
+        return (None, loc.row - row, loc.col, loc.length)
+    else:
+        return (loc.filename, loc.row, loc.col, loc.length)
+
+
+class FunctionSnapshot:
+    """ The IR-code of a function definition, detached from its module.
+
+    Args:
+        name: the name of the function.
+        subroutine: the function in the dictionary format of
+            :class:`ppci.irutils.io.DictWriter`.
+        variables: the private variables created for the function, such
+            as string literals, as (name, binding, amount, alignment,
+            value) tuples.
+        used_globals: the names of the other global values used.
+        locations: the source positions of the instructions, relative to
+            the start of the function.
+    """
+
+    def __init__(self, name, subroutine, variables, used_globals, locations):
+        self.name = name
+        self.subroutine = subroutine
+        self.variables = variables
+        self.used_globals = used_globals
+        self.locations = locations
+
+
+def make_snapshot(ir_function, variables, debug_db, filename, row):
+    """ Create a snapshot of a function which was just generated.
+
+    Returns None when the function cannot be restored by name from the
+    snapshot, for example when a local value has the same name as a
+    global value.
+    """
+    private_names = [variable.name for variable in variables]
+    local_names = [argument.name for argument in ir_function.arguments]
+    used = {}
+    locations = []
+    for block in ir_function.blocks:
+        for instruction in block:
+            if isinstance(instruction, ir.LocalValue):
+                local_names.append(instruction.name)
+            for value in instruction.uses:
+                if isinstance(value, ir.GlobalValue):
+                    if used.setdefault(value.name, value) is not value:
+                        return
+            info = debug_db.mappings.get(instruction)
+            if isinstance(info, DebugLocation):
+                locations.append(_position(info.loc, filename, row))
+            else:
+                locations.append(None)
+
+    names = set(local_names)
+    if len(names) != len(local_names) or names & set(used):
+        return
+    if len(set(private_names)) != len(private_names):
+        return
+
+    try:
+        subroutine = DictWriter().write_subroutine(ir_function)
+    except NotImplementedError:
+        return
+
+    used_globals = [name for name in used if name not in private_names]
+    variables = [
+        (v.name, v.binding, v.amount, v.alignment, v.value) for v in variables
+    ]
+    return FunctionSnapshot(
+        ir_function.name, subroutine, variables, used_globals, locations
+    )
+
+
+class StaleCacheError(Exception):
+    """ Raised when cached functions do not fit into the new source """
+
+
+class IncrementalCodeGenerator(CCodeGenerator):
+    """ Code generator which restores some functions from snapshots.
+
+    The functions which are generated are recorded, together with the
+    private variables created for them.
+    """
+
+    def __init__(self, context, snapshots):
+        super().__init__(context)
+        self.snapshots = snapshots  # name -> (snapshot, filename, row)
+        self.restored = set()
+        self.generated = []  # (declaration, ir function, variables)
+        self._global_values = None
+
+    def create_function(self, function):
+        if function.name not in self.snapshots:
+            super().create_function(function)
+        elif function.body:
+            raise StaleCacheError("{} is defined again".format(function.name))
+        else:
+            snapshot = self.snapshots[function.name][0]
+            ir_function = DictReader().new_subroutine(snapshot.subroutine)
+            self.builder.module.add_function(ir_function)
+            self.ir_var_map[function] = ir_function
+
+    def gen_function(self, function):
+        if function.name in self.snapshots:
+            self.restore_function(function)
+        elif function.body:
+            variables = self.builder.module.variables
+            first = len(variables)
+            self.gen_function_def(function)
+            ir_function = self.ir_var_map[function]
+            self.generated.append((function, ir_function, variables[first:]))
+
+    def restore_function(self, function):
+        """ Fill a function with the IR-code from its snapshot """
+        snapshot, filename, row = self.snapshots[function.name]
+        ir_function = self.ir_var_map[function]
+        module = self.builder.module
+        if self._global_values is None:
+            self._global_values = {
+                value.name: value
+                for value in chain(
+                    module.externals, module.variables, module.functions
+                )
+            }
+
+        reader = DictReader()
+        reader.enter_scope()
+        for name in snapshot.used_globals:
+            if name not in self._global_values:
+                raise StaleCacheError("{} is not defined".format(name))
+            reader.register_value(self._global_values[name])
+
+        # Private variables get a fresh number, like in a full build:
+        renames = {}
+        for name, _, _, _, _ in snapshot.variables:
+            prefix = name.rsplit("_", 1)[0]
+            renames[name] = "{}_{}".format(prefix, self.static_counter)
+            self.static_counter += 1
+
+        variables = []
+        for name, binding, amount, alignment, value in snapshot.variables:
+            if value is not None:
+                value = tuple(_rename(part, renames) for part in value)
+            variable = ir.Variable(name, binding, amount, alignment, value)
+            reader.register_value(variable)
+            variables.append(variable)
+
+        reader.construct_subroutine_body(ir_function, snapshot.subroutine)
+        if reader.undefined_values:
+            raise StaleCacheError(
+                "Undefined values in {}".format(function.name)
+            )
+
+        for variable in variables:
+            variable.name = renames[variable.name]
+            module.add_variable(variable)
+
+        # Move the debug locations along with the function:
+        self.gen_function_debug_info(function, ir_function)
+        instructions = chain.from_iterable(ir_function.blocks)
+        for instruction, position in zip(instructions, snapshot.locations):
+            if position is not None:
+                loc_filename, loc_row, col, length = position
+                if loc_filename is None:
+                    loc_filename, loc_row = filename, loc_row + row
+                loc = SourceLocation(loc_filename, loc_row, col, length)
+                self.debug_db.enter(instruction, DebugLocation(loc))
+        self.restored.add(function.name)
+
+
+def _rename(part, renames):
+    if isinstance(part, tuple) and part[1] in renames:
+        return (part[0], renames[part[1]])
+    return part
+
+
+class IncrementalCBuilder:
+    """ C builder which reuses the IR-code of unchanged functions.
+
+    The builder is meant to live as long as the process which uses it.
+    For each source file, the IR-code of the functions of the latest build
+    is kept. A function is taken from the cache when its tokens, and the
+    tokens of all top level declarations before it, did not change.
+
+    Args:
+        arch_info: the architecture info of the target.
+        coptions: the C options, which must not change between builds.
+    """
+
+    logger = logging.getLogger("cbuilder")
+
+    def __init__(self, arch_info, coptions):
+        self.arch_info = arch_info
+        self.coptions = coptions
+        self.cache = {}  # filename -> {key: snapshot}
+        self.dependencies = []  # The files included by the last source
+        self.system_headers = set()
+        self.reused = 0  # The number of functions taken from the cache
+        self.compiled = 0  # The number of functions parsed and generated
+
+    def build(self, src: io.TextIOBase, filename: str, reporter=None):
+        """ Build the given source into an IR-module """
+        if reporter:
+            reporter.heading(2, "Incremental C builder")
+        self.logger.info("Starting incremental C compilation")
+        self.reused = self.compiled = 0
+        text = src.read()
+        cache = self.cache.get(filename, {})
+        try:
+            ir_module, entries = self._build(text, filename, cache)
+        except (CompilerError, StaleCacheError) as ex:
+            if not self.reused:
+                raise
+            # Build from scratch, which reports errors in the same way
+            # as the normal builder:
+            self.logger.info("Not using the cache: %s", ex)
+            ir_module, entries = self._build(text, filename, {})
+        self.cache[filename] = entries
+
+        self.logger.info(
+            "Reused %s functions, compiled %s functions",
+            self.reused,
+            self.compiled,
+        )
+        if reporter:
+            reporter.message(
+                "Reused {} functions, compiled {} functions".format(
+                    self.reused, self.compiled
+                )
+            )
+        return ir_module
+
+    def _build(self, text, filename, cache):
+        context = CContext(self.coptions, self.arch_info)
+        preprocessor = CPreProcessor(self.coptions)
+        tokens, typedefs, scope = _preprocess(
+            io.StringIO(text), filename, context, preprocessor
+        )
+        self.dependencies = preprocessor.dependencies
+        self.system_headers = preprocessor.system_headers
+        parser = CParser(self.coptions, CSemantics(context))
+        tokens = list(prepare_for_parsing(tokens, parser.keywords))
+        chunks = split_declarations(tokens)
+        if chunks is None:
+            chunks = [(0, None, len(tokens))]
+
+        # Determine the key of each function, and replace the bodies of
+        # cached functions by a semicolon, leaving a prototype:
+        digest = hashlib.sha256()
+        pch_filename = self.coptions["include_pch"]
+        if pch_filename:
+            with open(pch_filename, "rb") as f:
+                digest.update(f.read())
+        snapshots = {}
+        entries = {}  # The cache for the next build
+        fresh = []  # (key, begin, body, filename, row)
+        parse_tokens = []
+        for begin, body, end in chunks:
+            if body is None:
+                digest.update(_token_text(tokens[begin:end]))
+                parse_tokens.extend(tokens[begin:end])
+                continue
+
+            loc = tokens[begin].loc
+            base_filename, row = (loc.filename, loc.row) if loc else (None, 0)
+            key = _function_key(digest, tokens[begin:end], base_filename, row)
+            digest.update(_token_text(tokens[begin:body]))
+            snapshot = cache.get(key)
+            if snapshot and snapshot.name not in snapshots:
+                snapshots[snapshot.name] = (snapshot, base_filename, row)
+                entries[key] = snapshot
+                parse_tokens.extend(tokens[begin:body])
+                semicolon = CToken(";", ";", "", False, tokens[body].loc)
+                parse_tokens.append(semicolon)
+            else:
+                fresh.append((key, begin, body, base_filename, row))
+                parse_tokens.extend(tokens[begin:end])
+        self.reused = len(snapshots)
+
+        compile_unit = parser.parse(
+            iter(parse_tokens), typedefs=typedefs, scope=scope
+        )
+        cgen = IncrementalCodeGenerator(context, snapshots)
+        ir_module = cgen.gen_code(compile_unit)
+        if cgen.restored != set(snapshots):
+            raise StaleCacheError("Cached functions are not declared")
+        self.compiled = len(cgen.generated)
+
+        # Find the function definition at the location of the name of
+        # each generated function:
+        positions = {}
+        for entry in fresh:
+            _, begin, body, _, _ = entry
+            for token in tokens[begin:body]:
+                loc = token.loc
+                if loc:
+                    position = (loc.filename, loc.row, loc.col)
+                    if positions.setdefault(position, entry) is not entry:
+                        positions[position] = None
+
+        for function, ir_function, variables in cgen.generated:
+            loc = function.location
+            entry = positions.get((loc.filename, loc.row, loc.col))
+            if entry is None:
+                continue
+            key, _, _, base_filename, row = entry
+            snapshot = make_snapshot(
+                ir_function, variables, cgen.debug_db, base_filename, row
+            )
+            if snapshot:
+                entries[key] = snapshot
+        return ir_module, entries
@@ -1,12 +1,75 @@
 """ C Language lexer """
 
+import bisect
 import logging
 import io
+import re
 
+from ...common import CompilerError
 from ..common import SourceLocation
 from .token import CToken
 from ..tools.handlexer import HandLexerBase, Char
 
+TRIGRAPHS = {
+    "=": "#",
+    "(": "[",
+    ")": "]",
+    "<": "{",
+    ">": "}",
+    "-": "~",
+    "!": "|",
+    "/": "\\",
+    "'": "^",
+}
+TRIGRAPH_PATTERN = re.compile(r"\?\?([=()<>\-!/'])")
+
+# A backslash pairs up with the character after it. A backslash before a
+# newline, or at the end of the file, is removed together with the newline:
+BACKSLASH_PATTERN = re.compile(r"\\[\s\S]?")
+
+ESCAPE = (
+    r"\\(?:['\"?\\abfnrtve]|[0-7]{1,3}"
+    r"|x[0-9a-fA-F]{0,2}|[uU][0-9a-fA-F]{0,4})"
+)
+
+# The tokens of the C language, in the order in which lex_c tries them.
+# Numbers are lexed like lex_number does, for example '1e5' is the number
+# '1' followed by identifier 'e5'. Comments, form feeds and the end of the
+# text are matched as well, and any other character is an error.
+TOKEN_KINDS = [
+    ("BOL", r"\n"),
+    ("SKIP", r"\f|/\*[\s\S]*?\*/"),
+    ("LINECOMMENT", r"//[^\n]*"),
+    ("CHAR", r"L?'(?:" + ESCAPE + r"|[^\\])'"),
+    ("ERROR", r"/\*|L'"),
+    ("ID", r"[A-Za-z_][A-Za-z0-9_]*"),
+    (
+        "NUMBER",
+        r"(?:0(?:[xX][0-9a-fA-F]*|[bB][01]*|[0-7]*)|[0-9]+)"
+        r"(?:\.[0-9]*(?:[eEpP][+-]?[0-9]*)?|[LlUu]{0,3})"
+        r"|\.[0-9]+(?:[eEpP][+-]?[0-9]*)?",
+    ),
+    ("STRING", r'"(?:[^"\\]|' + ESCAPE + r')*"'),
+    (
+        "OP",
+        r"<<=|>>=|\.\.\.|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\|"
+        r"|[-+*/%&|^~]=|##|[-+*/%<>=!&|^~#.;{}()\[\],?:\\]",
+    ),
+    ("EOF", r"\Z"),
+    ("ERROR", r"[\s\S]"),
+]
+
+# Whitespace before a token is the first group, the token kinds follow:
+TOKEN_PATTERN = re.compile(
+    "([ \t]*)(?:"
+    + "|".join("({})".format(pattern) for _, pattern in TOKEN_KINDS)
+    + ")"
+)
+TOKEN_KINDS = (None, None) + tuple(kind for kind, _ in TOKEN_KINDS)
+
+# Token types which differ from the token text:
+OPERATOR_TYPES = {"<<=": "<<"}
+
 
 class SourceFile:
     """ Presents the current file. """
@@ -31,17 +94,7 @@ def create_characters(f, source_file):
 
 def trigraph_filter(characters):
     """ Replace trigraphs in a character sequence """
-    tri_map = {
-        "=": "#",
-        "(": "[",
-        ")": "]",
-        "<": "{",
-        ">": "}",
-        "-": "~",
-        "!": "|",
-        "/": "\\",
-        "'": "^",
-    }
+    tri_map = TRIGRAPHS
     buf = []
     for char in characters:
         buf.append(char)
@@ -80,6 +133,71 @@ def continued_lines_filter(characters):
                 yield char
 
 
+def substitute(text, pattern, replace):
+    """ Substitute matches of a pattern in a text.
+
+    Returns the new text, and the offsets in the new text from where on
+    the characters have moved, together with how far they moved. This
+    allows to find the original position of the characters.
+    """
+    parts = []
+    starts = [0]
+    shifts = [0]
+    position = 0
+    size = 0
+    for match in pattern.finditer(text):
+        replacement = replace(match)
+        if replacement == match.group():
+            continue
+        parts.append(text[position : match.start()])
+        parts.append(replacement)
+        size += match.start() - position + len(replacement)
+        position = match.end()
+        starts.append(size)
+        shifts.append(position - size)
+
+    if len(starts) == 1:
+        return text, None
+    parts.append(text[position:])
+    return "".join(parts), (starts, shifts)
+
+
+def glue_lines(text):
+    """ Remove a backslash before a newline or at the end of the file """
+    return "" if text in ("\\", "\\\n", "\\\r") else text
+
+
+def splice_text(text, trigraphs):
+    """ Replace trigraphs and glue continued lines in a whole text.
+
+    This does what trigraph_filter and continued_lines_filter do on
+    characters. Returns the text, and the maps to find back the original
+    position of the characters.
+    """
+    maps = []
+    if trigraphs and "??" in text:
+        text, offset_map = substitute(
+            text, TRIGRAPH_PATTERN, lambda m: TRIGRAPHS[m.group(1)]
+        )
+        if offset_map:
+            maps.append(offset_map)
+
+    if "\\" in text:
+        text, offset_map = substitute(
+            text, BACKSLASH_PATTERN, lambda m: glue_lines(m.group())
+        )
+        if offset_map:
+            maps.insert(0, offset_map)
+    return text, maps
+
+
+def original_offset(maps, offset):
+    """ Find the position of a character before splice_text """
+    for starts, shifts in maps:
+        offset += shifts[bisect.bisect_right(starts, offset) - 1]
+    return offset
+
+
 def lex_text(text, coptions):
     """ Lex a piece of text """
     lexer = CLexer(coptions)
@@ -104,26 +222,129 @@ class CLexer(HandLexerBase):
     def lex(self, src, source_file):
         """ Read a source and generate a series of tokens """
         self.logger.debug("Lexing %s", source_file.filename)
-
-        characters = create_characters(src, source_file)
-        if self.coptions["trigraphs"]:
-            characters = trigraph_filter(characters)
-        characters = continued_lines_filter(characters)
-        # print('=== lex ')
-        # print(s)
-        # print('=== end lex ')
-
-        # s = '\n'.join(r)
-        return self.tokenize(characters)
+        lines = [line.expandtabs() for line in src]
+        return self.scan(lines, source_file, True)
 
     def lex_text(self, txt):
         """ Create tokens from the given text """
         f = io.StringIO(txt)
         filename = None
         source_file = SourceFile(filename)
-        characters = characters = create_characters(f, source_file)
+        lines = [line.expandtabs() for line in f]
+        return self.scan(lines, source_file, False)
+
+    def lex_characters(self, src, source_file):
+        """ Lex a source character by character.
+
+        This is the reference for the scan method, and is used to report
+        lexical errors.
+        """
+        characters = create_characters(src, source_file)
+        if self.coptions["trigraphs"]:
+            characters = trigraph_filter(characters)
+        characters = continued_lines_filter(characters)
         return self.tokenize(characters)
 
+    def scan(self, lines, source_file, splice):
+        """ Generate tokens from lines of text.
+
+        The whole text is matched with a single regular expression. A
+        source location is only created for the tokens. The row of the
+        source file is updated when a token on a next line is produced,
+        so that the #line directive works as with lex_characters.
+        """
+        text = "".join(lines)
+        if splice:
+            text, maps = splice_text(text, self.coptions["trigraphs"])
+        else:
+            maps = []
+        line_ends = []
+        end = 0
+        for line in lines:
+            end += len(line)
+            line_ends.append(end)
+        line_ends.append(end + 1)
+
+        allow_line_comments = self.coptions["std"] != "c89"
+        kinds = TOKEN_KINDS
+        special_kinds = ("SKIP", "LINECOMMENT", "EOF", "ERROR")
+        first_row = source_file.row
+        line = 0
+        line_start = 0
+        line_end = line_ends[0]
+        space = ""
+        first = True
+        last = None
+        for mo in TOKEN_PATTERN.finditer(text):
+            index = mo.lastindex
+            kind = kinds[index]
+            spaces = mo.group(1)
+            if spaces:
+                space += spaces
+                last = mo.start()
+            if kind in special_kinds:
+                if kind == "SKIP" or (
+                    kind == "LINECOMMENT" and allow_line_comments
+                ):
+                    continue
+                break
+
+            # Determine the location of the token:
+            position = mo.start(index)
+            offset = original_offset(maps, position) if maps else position
+            if offset >= line_end:
+                old_line = line
+                while offset >= line_ends[line]:
+                    line += 1
+                line_start = line_ends[line - 1]
+                line_end = line_ends[line]
+                source_file.row += line - old_line
+            col = offset - line_start + 1
+            loc = SourceLocation(source_file.filename, source_file.row, col, 1)
+
+            if kind == "BOL":
+                if first:
+                    # Yield an extra start of line
+                    yield CToken("BOL", "", "", first, loc)
+                first = True
+                space = ""
+            else:
+                val = mo.group(index)
+                if kind == "OP":
+                    kind = OPERATOR_TYPES.get(val, val)
+                yield CToken(kind, val, space, first, loc)
+                space = ""
+                first = False
+            last = position
+
+        if kind != "EOF":
+            # Let the character based lexer report the error:
+            source_file = SourceFile(source_file.filename)
+            source_file.row = first_row
+            lexer = CLexer(self.coptions)
+            if splice:
+                tokens = lexer.lex_characters(lines, source_file)
+            else:
+                tokens = lexer.tokenize(create_characters(lines, source_file))
+            for _ in tokens:
+                pass
+            raise CompilerError("Unexpected character")  # pragma: no cover
+
+        # Emit last newline:
+        if first and last is not None:
+            offset = original_offset(maps, last)
+            last_line = bisect.bisect_right(line_ends, offset)
+            source_file.row += last_line - line
+            line = last_line
+            if line:
+                offset -= line_ends[line - 1]
+            loc = SourceLocation(
+                source_file.filename, source_file.row, offset + 1, 1
+            )
+            # Yield an extra start of line
+            yield CToken("BOL", "", "", first, loc)
+        source_file.row += len(lines) - line
+
     def tokenize(self, characters):
         """ Generate tokens from characters """
         space = ""
@@ -21,6 +21,10 @@ class Macro(BaseMacro):
         self.args = args
         self.variadic = variadic
 
+        # The replacement list of a function like macro, split into
+        # tokens and parameter uses at its first expansion:
+        self.replacement = None
+
 
 class FunctionMacro(BaseMacro):
     """ Special macro, like __FILE__ """
@@ -15,6 +15,7 @@ class COptions:
         self.set("std", "c99")
         self.disable("verbose")
         self.disable("freestanding")
+        self.set("include_pch", None)
 
         # TODO: temporal default paths:
         # self.add_include_path('/usr/include')
@@ -47,6 +48,7 @@ class COptions:
         self.set("trigraphs", args.trigraphs)
         self.set("std", args.std)
         self.set("freestanding", args.freestanding)
+        self.set("include_pch", args.include_pch)
 
         for path in args.I:
             self.add_include_path(path)
@@ -106,6 +108,12 @@ coptions_parser.add_argument(
     metavar="file",
     help="Include a file before all other sources",
 )
+coptions_parser.add_argument(
+    "-include-pch",
+    "--include-pch",
+    metavar="file",
+    help="Start from the state in the given precompiled header",
+)
 coptions_parser.add_argument(
     "--trigraphs",
     action="store_true",
@@ -0,0 +1,192 @@
+""" Precompiled headers.
+
+Large headers are preprocessed and parsed again for every source file
+which includes them. A precompiled header holds the state of the C
+front-end after processing a header: the macros of the preprocessor,
+the typedef names known to the parser, and the top level scope with its
+declarations, types and tags. Restoring this state replaces processing
+the header.
+
+The state is stored with pickle. The files the header depends on, and
+the options which were used, are stored as well, so that a precompiled
+header which is out of date is detected.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+
+from ...common import CompilerError
+from .macro import Macro
+from .parser import CParser
+from .preprocessor import CPreProcessor, prepare_for_parsing
+from .semantics import CSemantics
+
+logger = logging.getLogger("pch")
+
+PCH_MAGIC = b"PPCIPCH2"
+
+# Settings which do not influence the result of processing a header:
+IGNORED_SETTINGS = ("verbose", "include_pch")
+
+
+def file_digest(filename):
+    """ Calculate a hash of the contents of a file """
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def options_key(context):
+    """ Get the options and target properties a header depends on """
+    coptions = context.coptions
+    arch_info = context.arch_info
+    settings = tuple(
+        sorted(
+            (name, value)
+            for name, value in coptions.settings.items()
+            if name not in IGNORED_SETTINGS
+        )
+    )
+    type_infos = []
+    for name, info in arch_info.type_infos.items():
+        # Type names can refer to other types:
+        while info in arch_info.type_infos:
+            info = arch_info.type_infos[info]
+        type_infos.append((str(name), info.size, info.alignment))
+    return (
+        settings,
+        tuple(coptions.include_directories),
+        tuple(coptions.macros),
+        tuple(coptions.undefine_macros),
+        arch_info.endianness.name,
+        tuple(sorted(type_infos)),
+    )
+
+
+class PrecompiledHeader:
+    """ The state of the C front-end after processing a header """
+
+    def __init__(self, filename, key, dependencies, state):
+        self.filename = filename
+        self.key = key
+        self.dependencies = dependencies
+        self.state = state
+
+    @classmethod
+    def from_header(cls, f, filename, context):
+        """ Preprocess and parse a header, and capture the result """
+        preprocessor = CPreProcessor(context.coptions)
+        semantics = CSemantics(context)
+        parser = CParser(context.coptions, semantics)
+        tokens = preprocessor.process_file(f, filename)
+        tokens = prepare_for_parsing(tokens, parser.keywords)
+        parser.parse(tokens)
+
+        # Record all files, to detect changes later on:
+        filenames = [filename] + preprocessor.dependencies
+        dependencies = []
+        for dependency in filenames:
+            dependency = os.path.realpath(dependency)
+            dependencies.append(
+                (
+                    dependency,
+                    os.path.getmtime(dependency),
+                    file_digest(dependency),
+                )
+            )
+
+        # Builtin macros are defined by the preprocessor already:
+        macros = {
+            name: macro
+            for name, macro in preprocessor.macros.items()
+            if isinstance(macro, Macro) and not macro.protected
+        }
+        state = (
+            macros,
+            preprocessor.include_guards,
+            preprocessor.once_files,
+            parser.typedefs,
+            semantics.scope,
+        )
+        return cls(filename, options_key(context), dependencies, state)
+
+    def save(self, f):
+        """ Write the precompiled header to a binary file """
+        f.write(PCH_MAGIC)
+        pickle.dump(
+            (self.filename, self.key, self.dependencies),
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        pickle.dump(self.state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, f):
+        """ Read a precompiled header from a binary file """
+        if f.read(len(PCH_MAGIC)) != PCH_MAGIC:
+            raise CompilerError("Not a precompiled header")
+        filename, key, dependencies = pickle.load(f)
+        state = pickle.load(f)
+        return cls(filename, key, dependencies, state)
+
+    def check(self, context):
+        """ Check that the header can be used in the given context.
+
+        The options must be the same, and the header and the files it
+        includes must not have changed.
+        """
+        if self.key != options_key(context):
+            raise CompilerError(
+                "Precompiled header for {} was created with other "
+                "options".format(self.filename)
+            )
+
+        for filename, mtime, digest in self.dependencies:
+            if not os.path.exists(filename):
+                raise CompilerError(
+                    "{} used by precompiled header is gone".format(filename)
+                )
+            if os.path.getmtime(filename) == mtime:
+                continue
+            if file_digest(filename) != digest:
+                raise CompilerError(
+                    "Precompiled header is out of date, {} changed".format(
+                        filename
+                    )
+                )
+
+    def restore(self, preprocessor):
+        """ Load the macros into a fresh preprocessor.
+
+        The files the header was made from become dependencies of the
+        preprocessor. Returns the typedef names and the top level scope
+        which the parser must continue with.
+        """
+        macros, include_guards, once_files, typedefs, scope = self.state
+        for filename, _, _ in self.dependencies:
+            if filename not in preprocessor.dependencies:
+                preprocessor.dependencies.append(filename)
+        for name in list(preprocessor.macros):
+            if not preprocessor.macros[name].protected:
+                preprocessor.undefine(name)
+        preprocessor.macros.update(macros)
+        preprocessor.include_guards.update(include_guards)
+        preprocessor.once_files.update(once_files)
+        return typedefs, scope
+
+
+def create_pch(f, filename, context, output):
+    """ Create a precompiled header from the header in f """
+    logger.info("Precompiling %s", filename)
+    pch = PrecompiledHeader.from_header(f, filename, context)
+    pch.save(output)
+
+
+def load_pch(filename, context):
+    """ Load a precompiled header, and check that it is still valid """
+    logger.debug("Loading precompiled header %s", filename)
+    with open(filename, "rb") as f:
+        pch = PrecompiledHeader.load(f)
+    pch.check(context)
+    return pch
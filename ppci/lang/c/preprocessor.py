@@ -18,6 +18,7 @@ import os
 import logging
 import operator
 import time
+from collections import deque
 
 from ...common import CompilerError
 from .lexer import CLexer, CToken, lex_text, SourceFile
@@ -36,6 +37,17 @@ class CPreProcessor:
         self.macros = {}  # A mapping of macros
         self.files = []  # Stack of included files.
         self.counter = 0  # For the __COUNTER__ macro
+        self.dependencies = []  # All included files
+        # Interned hidesets, by the hideset they extend and the new name:
+        self.hidesets = {}
+        # Files only included with '#include <...>', or from such files:
+        self.system_headers = set()
+
+        # Multiple include optimization. The macro which guards a whole
+        # file, and the files with '#pragma once', by resolved path:
+        self.include_guards = {}
+        self.once_files = set()
+        self.skipped_includes = 0
 
         self.predefine_builtin_macros()
 
@@ -162,13 +174,36 @@ class CPreProcessor:
         else:
             return False
 
-    def process_file(self, f, filename=None):
+    def current_hideset(self):
+        """ Get the hideset of the innermost macro expansion """
+        if self.files[-1].macro_expansions:
+            return self.files[-1].macro_expansions[-1].hideset
+        else:
+            return EMPTY_HIDESET
+
+    def add_to_hideset(self, hideset, name):
+        """ Get the hideset with an extra name.
+
+        Hidesets are immutable and interned, so that expanding the same
+        macros again reuses the same hideset.
+        """
+        key = (hideset, name)
+        new_hideset = self.hidesets.get(key, None)
+        if new_hideset is None:
+            new_hideset = hideset | {name}
+            self.hidesets[key] = new_hideset
+        return new_hideset
+
+    def process_file(self, f, filename=None, system=False):
         """ Process the given open file into tokens. """
         self.logger.debug("Processing %s", filename)
         source_file = SourceFile(filename)
         clexer = CLexer(self.coptions)
         tokens = clexer.lex(f, source_file)
         ex = FileExpander(source_file, tokens)
+        ex.system = system
+        if filename:
+            ex.path = os.path.realpath(filename)
         self.files.append(ex)
         yield LineInfo(1, source_file.filename)
         for token in self.process_tokens():
@@ -186,9 +221,20 @@ class CPreProcessor:
                 loc=self.files[-1].if_stack[-1].location,
             )
 
+        if ex.guard_state == "closed" and ex.path:
+            self.logger.debug(
+                "%s is guarded by %s", source_file.filename, ex.guard
+            )
+            self.include_guards[ex.path] = ex.guard
+
         self.logger.debug("Finished %s", source_file.filename)
         self.files.pop()
 
+        if not self.files:
+            self.logger.debug(
+                "Skipped %s includes of guarded files", self.skipped_includes
+            )
+
     def locate_include(
         self, filename, loc, use_current_dir: bool, include_next
     ):
@@ -242,13 +288,59 @@ class CPreProcessor:
         full_path = self.locate_include(
             filename, loc, use_current_dir, include_next
         )
-        self.logger.debug("Including %s", full_path)
         source_file = SourceFile(full_path)
         self.files[-1].dependencies.append(source_file)
+        system = self.files[-1].system or not use_current_dir
+        if full_path not in self.dependencies:
+            self.dependencies.append(full_path)
+            if system:
+                self.system_headers.add(full_path)
+        elif not system:
+            self.system_headers.discard(full_path)
+        if self.is_guarded(os.path.realpath(full_path)):
+            self.logger.debug("Skipping %s", full_path)
+            self.skipped_includes += 1
+            return
+
+        self.logger.debug("Including %s", full_path)
         with open(full_path, "r") as f:
-            for token in self.process_file(f, full_path):
+            for token in self.process_file(f, full_path, system=system):
                 yield token
 
+    def is_guarded(self, path):
+        """ Test if including the file at the given path has no effect.
+
+        This is the case for files with '#pragma once', and for files
+        wrapped in '#ifndef X ... #endif' while X is defined.
+        """
+        if path in self.once_files:
+            return True
+        guard = self.include_guards.get(path, None)
+        return guard is not None and self.is_defined(guard)
+
+    def detect_include_guard(self, directive):
+        """ Follow the directives at the outer level of the current file,
+        to see if the whole file is wrapped in '#ifndef X ... #endif'.
+        """
+        expander = self.files[-1]
+        depth = len(expander.if_stack)
+        if depth == 0:
+            if (
+                expander.guard_state == "start"
+                and directive == "ifndef"
+                and self.token
+                and self.token.typ == "ID"
+            ):
+                expander.guard = self.token.val
+                expander.guard_state = "open"
+            else:
+                expander.guard_state = "none"
+        elif depth == 1 and expander.guard_state == "open":
+            if directive == "endif":
+                expander.guard_state = "closed"
+            elif directive in ["else", "elif"]:
+                expander.guard_state = "none"
+
     # Token consume / peeking:
     @property
     def token(self):
@@ -357,6 +449,8 @@ class CPreProcessor:
                     self.error("Expected end of line", loc=self.token.loc)
             else:
                 # This is not a directive, but normal text:
+                if token.typ != "BOL" and not self.files[-1].if_stack:
+                    self.files[-1].guard_state = "none"
                 yield token
             token = self.next_token()
 
@@ -383,17 +477,15 @@ class CPreProcessor:
                 self.logger.debug("Not expanding function macro %s", name)
                 return False
             else:
-                if self.files[-1].macro_expansions:
-                    hideset = self.files[-1].macro_expansions[-1].hideset
-                else:
-                    hideset = set()
-                hideset = hideset | {macro.name}
+                hideset = self.add_to_hideset(
+                    self.current_hideset(), macro.name
+                )
 
                 if self.verbose:
                     self.logger.debug("%s expanded into %s", name, expansion)
 
                 self.copy_leading_space(macro_token, expansion)
-                self.push_expansion(MacroExpansion(iter(expansion), hideset))
+                self.push_expansion(MacroExpansion(expansion, hideset))
                 return True
         else:
             return False
@@ -404,7 +496,7 @@ class CPreProcessor:
             expansion = macro.function(macro_token)
         else:  # Normal macro:
             if macro.args is None:  # Macro without arguments
-                expansion = macro.value
+                expansion = list(macro.value)
             else:  # This macro requires arguments
                 token = self.next_token()
                 if not token or token.typ != "(":
@@ -413,16 +505,24 @@ class CPreProcessor:
                 args = self.gatherargs(macro)
                 expansion = self.substitute_arguments(macro, args)
 
-            expansion = self.concatenate(expansion)
+            for token in expansion:
+                if token.typ == "##":
+                    expansion = self.concatenate(expansion)
+                    break
         return expansion
 
     def copy_leading_space(self, macro_token, expansion):
         # Adjust token spacings of first token to adhere spacing of
         # the macro token:
         if expansion:
-            expansion[0] = expansion[0].copy(
-                first=macro_token.first, space=macro_token.space
-            )
+            token = expansion[0]
+            if (
+                token.first != macro_token.first
+                or token.space != macro_token.space
+            ):
+                expansion[0] = token.copy(
+                    first=macro_token.first, space=macro_token.space
+                )
 
     def gatherargs(self, macro):
         """ Collect expanded arguments for macro """
@@ -478,12 +578,13 @@ class CPreProcessor:
     def normalize_space(self, args):
         """ Normalize spaces in macro expansions.
 
-        If we have space, it will be a single space.
+        If we have space, it will be a single space. Tokens are shared
+        between expansions, so they are replaced instead of modified.
         """
         for arg in args:
-            for token in arg:
-                if token.space:
-                    token.space = " "
+            for index, token in enumerate(arg):
+                if token.space and token.space != " ":
+                    arg[index] = token.copy(space=" ")
 
     def parse_arguments(self):
         """ Parse arguments for a function like macro.
@@ -535,19 +636,50 @@ class CPreProcessor:
         Pay special care to # and ## operators, When an argument is used
         in # or ##, it is not macro expanded.
         """
-        new_line = []
-        # print(args)
-        # expanded_args = [self.expand_token_sequence(a) for a in args]
-        # Create two variants: expanded and not expanded:
         repl_map = {fp: a for fp, a in zip(macro.args, args)}
 
         # Spiffy variadic macro!
         if macro.variadic:
             repl_map["__VA_ARGS__"] = args[-1]
 
-        # print(repl_map)
         if self.verbose:
             self.logger.debug("replacement map: %s", repl_map)
+
+        if macro.replacement is None:
+            macro.replacement = self.split_replacement(macro, repl_map)
+
+        # Each argument is macro expanded at most once:
+        expanded_args = {}
+        new_line = []
+        for kind, token, name in macro.replacement:
+            if kind == REPLACE_TOKEN:
+                new_line.append(token)
+            elif kind == REPLACE_STRINGIFY:
+                new_line.append(
+                    self.stringify(token, repl_map[name.val], name.loc)
+                )
+            else:
+                if kind == REPLACE_EXPANDED:
+                    replacement = expanded_args.get(name, None)
+                    if replacement is None:
+                        replacement = self.expand_token_sequence(
+                            repl_map[name]
+                        )
+                        expanded_args[name] = replacement
+                else:
+                    replacement = repl_map[name]
+                self.copy_tokens(replacement, token.space, new_line)
+
+        return new_line
+
+    def split_replacement(self, macro, repl_map):
+        """ Split the replacement list of a macro into parts.
+
+        Each part is a tuple of the kind of part, a token and the
+        parameter name, if any. Parameters which are used with '##' are
+        not macro expanded.
+        """
+        parts = []
         sle = LineParser(macro.value)
         while not sle.at_end:
             token = sle.consume()
@@ -556,11 +688,7 @@ class CPreProcessor:
                 # Use the unexpanded version for this one
                 arg_name = sle.consume("ID")
                 if arg_name.val in repl_map:
-                    new_line.append(
-                        self.stringify(
-                            token, repl_map[arg_name.val], arg_name.loc
-                        )
-                    )
+                    parts.append((REPLACE_STRINGIFY, token, arg_name))
                 else:
                     self.error(
                         "{} does not refer a macro argument".format(
@@ -569,31 +697,30 @@ class CPreProcessor:
                     )
             elif token.typ == "ID" and token.val in repl_map:
                 # TODO: maybe figure out a better way for this peaking at '##'
-                replacement = repl_map[token.val]
                 # Test use in '##' construction:
                 used_in_concat = sle.previous == "##" or sle.peak == "##"
-                if not used_in_concat:
-                    # Do macro expansion on the argument:
-                    replacement = self.expand_token_sequence(replacement)
-                replacement = self.copy_tokens(replacement, token.space)
-                new_line.extend(replacement)
+                if used_in_concat:
+                    parts.append((REPLACE_ARGUMENT, token, token.val))
+                else:
+                    parts.append((REPLACE_EXPANDED, token, token.val))
             else:
-                new_line.append(token)
+                parts.append((REPLACE_TOKEN, token, None))
+        return parts
 
-        return new_line
+    def copy_tokens(self, tokens, first_space, new_line=None):
+        """ Copy a series of tokens, with the given space before the first.
 
-    def copy_tokens(self, tokens, first_space):
-        """ Copy a series of tokens.
+        Tokens are not modified, so only the first token is copied, and
+        only when its space is different.
         """
-        new_line = []
-        first = True
-        for token in tokens:
-            if first:
-                rt2 = token.copy(space=first_space)
-            else:
-                rt2 = token.copy()
-            new_line.append(rt2)
-            first = False
+        if new_line is None:
+            new_line = []
+        if tokens:
+            token = tokens[0]
+            if token.space != first_space:
+                token = token.copy(space=first_space)
+            new_line.append(token)
+            new_line.extend(tokens[1:])
         return new_line
 
     def stringify(self, hash_token, snippet, loc):
@@ -654,6 +781,7 @@ class CPreProcessor:
             directive = directive_token.val
             if self.verbose:
                 self.logger.debug("Handing #%s directive", directive)
+            self.detect_include_guard(directive)
 
             if directive == "ifdef":
                 yield from self.handle_ifdef_directive(directive_token)
@@ -682,7 +810,7 @@ class CPreProcessor:
             elif directive == "warning":
                 yield from self.handle_warning_directive(directive_token)
             elif directive == "pragma":
-                yield from self.handle_warning_directive(directive_token)
+                yield from self.handle_pragma_directive(directive_token)
             else:  # pragma: no cover
                 self.error(
                     "not implemented: {}".format(directive),
@@ -945,8 +1073,12 @@ class CPreProcessor:
     def handle_pragma_directive(self, directive_token):
         """ Process `#pragma` directive. """
         # Pragma's must be handled, or ignored.
-        message = self.tokens_to_string(self.eat_line())
-        self.logger.warning("Ignoring pragma: %s", message)
+        tokens = self.eat_line()
+        message = self.tokens_to_string(tokens)
+        if message == "once":
+            self.once_files.add(self.files[-1].path)
+        else:
+            self.logger.warning("Ignoring pragma: %s", message)
         new_line_token = CToken("WS", "", "", True, directive_token.loc)
         yield new_line_token
 
@@ -1119,6 +1251,16 @@ class CPreProcessor:
         return value
 
 
+# Hidesets are frozen sets of macro names:
+EMPTY_HIDESET = frozenset()
+
+# The kinds of parts of the replacement list of a function like macro:
+REPLACE_TOKEN = 0  # A token which is copied
+REPLACE_STRINGIFY = 1  # An argument used with the '#' operator
+REPLACE_ARGUMENT = 2  # An argument used with the '##' operator
+REPLACE_EXPANDED = 3  # Any other use of an argument
+
+
 class FileExpander:
     """ Per source or header file an expander class is created
 
@@ -1131,14 +1273,22 @@ class FileExpander:
 
     def __init__(self, source_file, tokens):
         self.source_file = source_file
+        self.path = None  # The resolved path of the file
         self.dependencies = []  # List of dependent files.
+        self.system = False  # Whether this is a system header
         self.if_stack = []  # If-def stack
-        self.token_buffer = []  # Token undo stack
+        self.token_buffer = deque()  # Token undo stack
         self.tokens = tokens  # Base context iterator.
         self.macro_expansions = []  # A stack of macro expansions
         self.in_directive = False
         self.paren_level = 0  # Nesting of parenthesis in #if expression.
 
+        # Include guard detection. The state goes from 'start' to 'open'
+        # at the first '#ifndef X', to 'closed' at its '#endif', or to
+        # 'none' when anything else is found outside of it:
+        self.guard = None
+        self.guard_state = "start"
+
     def __repr__(self):
         return "<File expander source={}, macro={}>".format(
             self.source_file, self.macro_expansions
@@ -1179,7 +1329,7 @@ class FileExpander:
 
         # Try token buffer:
         if self.token_buffer:
-            token = self.token_buffer.pop(0)
+            token = self.token_buffer.popleft()
 
         # Try expansion stack:
         while token is None and self.macro_expansions:
@@ -1204,39 +1354,43 @@ class FileExpander:
         return token
 
     def unget(self, token):
-        self.token_buffer.insert(0, token)
+        self.token_buffer.appendleft(token)
 
 
 class MacroExpansion:
     """ Macro expansion.
 
     Contains:
-    - a token iterator (tokens)
-    - a hideset
+    - a list of tokens, with the position of the next token
+    - an immutable hideset
     """
 
+    __slots__ = ["tokens", "position", "hideset"]
+
     def __init__(self, tokens, hideset):
         self.tokens = tokens
-        self.token_buffer = []
+        self.position = 0
         self.hideset = hideset
 
     @property
     def peek(self):
         """ Take a sneak peek at the next token. """
-        if not self.token_buffer:
-            self.token_buffer.append(next(self.tokens, None))
-        return self.token_buffer[0]
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
 
     def next_token(self):
         """ Pop the next token into picture. """
-        if self.token_buffer:
-            return self.token_buffer.pop(0)
-        else:
-            return next(self.tokens, None)
+        if self.position < len(self.tokens):
+            token = self.tokens[self.position]
+            self.position += 1
+            return token
 
     def unget(self, token):
         """ Push back a single token. """
-        self.token_buffer.insert(0, token)
+        if self.position > 0 and self.tokens[self.position - 1] is token:
+            self.position -= 1
+        else:
+            self.tokens.insert(self.position, token)
 
 
 class LineEater:
@@ -1350,15 +1504,21 @@ def string_convert(tokens):
     Tasks:
     - Strip quotes.
     - Process escaped string constants into unicode.
+
+    Tokens can be shared by several macro expansions, so new tokens
+    are created instead of modifying them.
     """
 
     for token in tokens:
-        # Strip double quotes from string:
-        if token.typ == "STRING":
-            token.val = token.val[1:-1]
-
         if token.typ in ["STRING", "CHAR"]:
-            token.val = replace_escape_codes(token.val)
+            value = token.val
+            if token.typ == "STRING":
+                # Strip double quotes from string:
+                value = value[1:-1]
+            value = replace_escape_codes(value)
+            token = CToken(
+                token.typ, value, token.space, token.first, token.loc
+            )
 
         yield token
 
@@ -1371,7 +1531,13 @@ def string_concat(tokens):
     for token in tokens:
         if token.typ == "STRING":
             if string_token:
-                string_token.val = string_token.val + token.val
+                string_token = CToken(
+                    "STRING",
+                    string_token.val + token.val,
+                    string_token.space,
+                    string_token.first,
+                    string_token.loc,
+                )
             else:
                 string_token = token
         else:
@@ -1398,7 +1564,9 @@ def prepare_for_parsing(tokens, keywords):
     for token in string_concat(string_convert(skip_ws(tokens))):
         if token.typ == "ID":
             if token.val in keywords:
-                token.typ = token.val
+                token = CToken(
+                    token.val, token.val, token.space, token.first, token.loc
+                )
             yield token
         else:
             yield token
@@ -48,6 +48,14 @@ class CSemantics:
         """ Enter a new file / compilation unit. """
         self.scope = Scope()
 
+    def resume(self, scope):
+        """ Continue a compilation unit in the given top scope.
+
+        This is used to start from a precompiled header.
+        """
+        assert scope.parent is None
+        self.scope = scope
+
     def finish_compilation_unit(self):
         """ Called at the end of a file / compilation unit. """
         assert self.scope.parent is None  # Must be the topscope now.
@@ -6,6 +6,8 @@ from .utils import LineInfo
 class CToken(Token):
     """ C token (including optional preceeding spaces) """
 
+    __slots__ = ["space", "first"]
+
     def __init__(self, typ, val, space, first, loc):
         super().__init__(typ, val, loc)
         self.space = space
@@ -63,6 +63,25 @@ class LineInfo:
         return '# {} "{}"{}'.format(self.line, self.filename, flags)
 
 
+def make_escape(filename):
+    """ Escape a filename for use in a makefile rule """
+    filename = filename.replace("$", "$$").replace("#", "\\#")
+    return filename.replace(" ", "\\ ")
+
+
+def make_rule(target, prerequisites):
+    """ Format a makefile rule, with a prerequisite on each line.
+
+    >>> print(make_rule('main.o', ['main.c', 'my header.h']), end='')
+    main.o: main.c \\
+     my\\ header.h
+    """
+    rule = "{}:".format(make_escape(target))
+    if prerequisites:
+        rule += " " + " \\\n ".join(map(make_escape, prerequisites))
+    return rule + "\n"
+
+
 def cnum(txt: str):
     """ Convert C number to integer """
     assert isinstance(txt, str)
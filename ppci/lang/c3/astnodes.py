@@ -30,6 +30,10 @@ class Module(Symbol):
         self.imports = []
         self.inner_scope = inner_scope
 
+        # An external module only declares symbols, which are defined
+        # elsewhere:
+        self.external = False
+
     @property
     def types(self):
         """ Get the types in this module """
@@ -1,7 +1,6 @@
 """ Entry point when building c3 sources. """
 
 import logging
-import itertools
 import io
 from ...arch.arch_info import ArchInfo
 from ...arch import get_arch
@@ -15,10 +14,17 @@ from .typechecker import TypeChecker
 from .codegenerator import CodeGenerator
 from .scope import SemanticError
 from .context import Context
+from .interface import get_interface_cache, interface_key
+from .interface import save_interface, strip_module
 
 
-def c3_to_ir(sources, includes, march, reporter=None):
-    """ Compile c3 sources to ir-code for the given architecture. """
+def c3_to_ir(sources, includes, march, reporter=None, interfaces=None):
+    """ Compile c3 sources to ir-code for the given architecture.
+
+    When an interfaces directory is given, the interfaces of the modules
+    are stored there, and used instead of parsing the includes. The
+    includes then only provide declarations.
+    """
     logger = logging.getLogger("c3c")
     march = get_arch(march)
     if not reporter:  # pragma: no cover
@@ -29,7 +35,7 @@ def c3_to_ir(sources, includes, march, reporter=None):
     sources = [get_file(fn) for fn in sources]
     includes = [get_file(fn) for fn in includes]
     diag = DiagnosticsManager()
-    c3b = C3Builder(diag, march.info)
+    c3b = C3Builder(diag, march.info, interfaces=interfaces)
 
     try:
         _, ir_module = c3b.build(sources, includes)
@@ -53,7 +59,7 @@ class C3Builder:
 
     logger = logging.getLogger("c3")
 
-    def __init__(self, diag, arch_info):
+    def __init__(self, diag, arch_info, interfaces=None):
         assert isinstance(arch_info, ArchInfo)
         self.diag = diag
         self.lexer = Lexer(diag)
@@ -61,10 +67,15 @@ class C3Builder:
         self.codegen = CodeGenerator(diag)
         self.verifier = Verifier()
         self.arch_info = arch_info
+        self.interfaces = get_interface_cache(interfaces)
 
     def build(self, sources, imps=()):
         """ Create IR-code from sources.
 
+        When an interfaces directory is used, the includes only provide
+        declarations: their functions and variables are external, like
+        those of a loaded interface.
+
         Returns:
             A context where modules are living in and an
             ir-module.
@@ -80,9 +91,22 @@ class C3Builder:
         # Create a context where the modules can live:
         context = Context(self.arch_info)
 
+        # The interface keys of the files which make up each module:
+        origins = {}
+
         # Phase 1: Lexing and parsing stage
-        for src in itertools.chain(sources, imps):
-            self.do_parse(src, context)
+        for src in sources:
+            self.parse_file(src, context, origins)
+        source_modules = set(context.module_map)
+        for src in imps:
+            self.include_file(src, context, origins)
+
+        if self.interfaces:
+            for name, module in context.module_map.items():
+                if name not in source_modules:
+                    strip_module(module)
+
+        interfaces = self.save_interfaces(context, origins)
 
         # Phase 1.8: Handle imports:
         try:
@@ -100,13 +124,52 @@ class C3Builder:
         # Check modules
         self.verifier.verify(ir_module)
 
+        for key, data in interfaces:
+            self.interfaces.put(key, data)
+
         self.logger.debug("C3 build complete!")
         return context, ir_module
 
+    def parse_file(self, src, context, origins):
+        """ Parse a file, and note which module it belongs to """
+        key = None
+        if self.interfaces:
+            src, key = interface_key(src)
+        module = self.do_parse(src, context)
+        origins.setdefault(module.name, []).append(key)
+
+    def include_file(self, src, context, origins):
+        """ Load the interface of an include, or else parse it """
+        if self.interfaces:
+            src, key = interface_key(src)
+            module = self.interfaces.get(key, context)
+            if module and not context.has_module(module.name):
+                self.logger.debug("Using interface of %s", module.name)
+                context.module_map[module.name] = module
+                origins[module.name] = [None]
+                return
+        self.parse_file(src, context, origins)
+
+    def save_interfaces(self, context, origins):
+        """ Save the interfaces of modules parsed from a single file.
+
+        This is done before the imports are linked, so that the
+        interfaces do not contain other modules.
+        """
+        interfaces = []
+        if self.interfaces:
+            for name, keys in origins.items():
+                if len(keys) != 1 or not keys[0] or keys[0] in self.interfaces:
+                    continue
+                f = io.BytesIO()
+                save_interface(context.get_module(name), context, f)
+                interfaces.append((keys[0], f.getvalue()))
+        return interfaces
+
     def do_parse(self, src, context):
         """ Lexing and parsing stage (phase 1) """
         tokens = self.lexer.lex(src)
-        self.parser.parse_source(tokens, context)
+        return self.parser.parse_source(tokens, context)
 
 
 class C3ExprParser:
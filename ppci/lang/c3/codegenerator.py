@@ -104,13 +104,19 @@ class CodeGenerator:
         """ Generate global variables and modules """
         for var in module.inner_scope.variables:
             assert not var.isLocal
+            var_name = "{}_{}".format(module.name, var.name)
+            if module.external:
+                ir_var = ir.ExternalVariable(var_name)
+                self.context.var_map[var] = ir_var
+                self.builder.module.add_external(ir_var)
+                continue
+
             if var.ival:
                 cval = self.gen_global_ival(var.ival, var.typ)
                 cval = (cval,)
             else:
                 cval = None
 
-            var_name = "{}_{}".format(module.name, var.name)
             binding = ir.Binding.GLOBAL
             size = self.context.size_of(var.typ)
             alignment = 4
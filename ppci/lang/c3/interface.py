@@ -0,0 +1,169 @@
+""" Module interfaces.
+
+Included c3 modules, like the io and bsp modules of librt, only provide
+declarations to the modules which are compiled. Still, they are lexed
+and parsed on every compilation. A module interface holds the part of a
+module which other modules can use: the types, the constants, the
+variables and the signatures of the public functions. Loading the
+interface replaces parsing the module.
+
+Interfaces are stored with pickle, in a directory. They are stored under
+a hash of the name and text of the source file and the version of ppci,
+so an interface is only used when the source did not change.
+"""
+
+import copy
+import io
+import logging
+import os
+import pickle
+import tempfile
+
+from ...build.objectcache import make_key
+from ...common import CompilerError, get_file
+from . import astnodes as ast
+
+INTERFACE_MAGIC = b"PPCIC3I1"
+
+
+def strip_module(module):
+    """ Reduce a module to its interface.
+
+    Function bodies, private functions and initial values of variables
+    are removed. What remains only results in external symbols.
+    """
+    scope = module.inner_scope
+    for function in module.functions:
+        if function.public:
+            function.body = None
+            function.inner_scope.symbols = {
+                parameter.name: parameter for parameter in function.parameters
+            }
+        else:
+            del scope.symbols[function.name]
+    for variable in module.variables:
+        variable.ival = None
+    module.external = True
+
+
+def _builtins(context):
+    """ Get the objects of the top scope, which are not stored """
+    builtins = {id(context.scope): ("scope", None)}
+    for name, symbol in context.scope.symbols.items():
+        builtins[id(symbol)] = ("symbol", name)
+    return builtins
+
+
+class _InterfacePickler(pickle.Pickler):
+    def __init__(self, f, context):
+        super().__init__(f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.builtins = _builtins(context)
+
+    def persistent_id(self, obj):
+        return self.builtins.get(id(obj))
+
+
+class _InterfaceUnpickler(pickle.Unpickler):
+    def __init__(self, f, context):
+        super().__init__(f)
+        self.context = context
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if kind == "scope":
+            return self.context.scope
+        return self.context.scope.symbols[name]
+
+
+def save_interface(module, context, f):
+    """ Write the interface of a parsed module to a binary file.
+
+    The module itself is left as it is.
+    """
+    # The copy shares the top scope with the module:
+    memo = {id(symbol): symbol for symbol in context.scope.symbols.values()}
+    memo[id(context.scope)] = context.scope
+    module = copy.deepcopy(module, memo)
+    strip_module(module)
+    f.write(INTERFACE_MAGIC)
+    _InterfacePickler(f, context).dump(module)
+
+
+def load_interface(f, context):
+    """ Read a module interface from a binary file.
+
+    The module is not yet added to the context.
+    """
+    if f.read(len(INTERFACE_MAGIC)) != INTERFACE_MAGIC:
+        raise CompilerError("Not a c3 module interface")
+    module = _InterfaceUnpickler(f, context).load()
+    if not isinstance(module, ast.Module):
+        raise CompilerError("Not a c3 module interface")
+    return module
+
+
+def interface_key(source):
+    """ Read a source file and determine the key of its interface.
+
+    Returns a file with the same text and name, and the key.
+    """
+    f = get_file(source)
+    name = getattr(f, "name", "")
+    text = f.read()
+    f.close()
+    f = io.StringIO(text)
+    f.name = name
+    return f, make_key("c3 interface", name, text)
+
+
+class InterfaceCache:
+    """ A directory in which module interfaces are stored """
+
+    logger = logging.getLogger("c3interfaces")
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "<InterfaceCache {}>".format(self.directory)
+
+    def _filename(self, key):
+        return os.path.join(self.directory, key[:2], key[2:] + ".c3i")
+
+    def __contains__(self, key):
+        return os.path.exists(self._filename(key))
+
+    def get(self, key, context):
+        """ Load the module interface stored under the key, or None """
+        try:
+            with open(self._filename(key), "rb") as f:
+                module = load_interface(f, context)
+        except (OSError, EOFError, pickle.UnpicklingError, CompilerError):
+            self.misses += 1
+            self.logger.debug("Interface miss %s", key)
+            return None
+        self.hits += 1
+        self.logger.debug("Interface hit %s", key)
+        return module
+
+    def put(self, key, data):
+        """ Store a saved module interface under the key """
+        filename = self._filename(key)
+        folder = os.path.dirname(filename)
+        os.makedirs(folder, exist_ok=True)
+
+        # Write into a temporary file first, so that no partial interfaces
+        # can be read:
+        handle, temp_filename = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(handle, "wb") as output:
+            output.write(data)
+        os.replace(temp_filename, filename)
+
+
+def get_interface_cache(interfaces):
+    """ Turn a directory name into an interface cache """
+    if interfaces is None or isinstance(interfaces, InterfaceCache):
+        return interfaces
+    return InterfaceCache(interfaces)
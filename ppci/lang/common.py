@@ -1,5 +1,5 @@
 from collections import namedtuple
-import os
+from ..utils.sourcecache import source_cache
 
 
 class Token:
@@ -21,39 +21,38 @@ class Token:
 
 
 class SourceLocation:
-    """ A location that refers to a position in a source file """
+    """ A location that refers to a position in a source file.
 
-    __slots__ = ["filename", "row", "col", "length", "source"]
+    The text of the source file is not stored in the location, it is looked
+    up in the shared source cache.
+    """
+
+    __slots__ = ["filename", "row", "col", "length"]
 
-    def __init__(self, filename, row, col, ln, source=None):
+    def __init__(self, filename, row, col, ln):
         self.filename = filename
         self.row = row
         self.col = col
         self.length = ln
-        self.source = source
 
     def __repr__(self):
         return "({}, {}, {})".format(self.filename, self.row, self.col)
 
     def get_source_line(self):
         """ Return the source line indicated by this location """
-        if not self.source and self.filename:
-            if os.path.exists(self.filename):
-                with open(self.filename, "r") as f:
-                    self.source = f.read()
-
-        if self.source:
-            lines = self.source.split("\n")
-            return lines[self.row - 1]
+        source = source_cache.get(self.filename) if self.filename else None
+        if source:
+            return source.get_line(self.row)
         else:
             return "Could not load source"
 
     def print_message(self, message, lines=None, filename=None, file=None):
         """ Print a message at this location in the given source lines """
         if lines is None:
-            with open(self.filename, "r") as f:
-                src = f.read()
-            lines = src.splitlines()
+            source = source_cache.get(self.filename)
+            if source is None:
+                raise FileNotFoundError(self.filename)
+            lines = source.lines()
 
         # Print filename:
         if filename is None:
@@ -351,6 +351,19 @@ class IrToPythonCompiler:
                 self.emit("else:")
                 with self.indented():
                     self.emit_jump(ins.lab_no)
+        elif isinstance(ins, ir.JumpTable):
+            assert not self._shape_style
+            v = self.fetch_value(ins.v)
+            table = ", ".join(
+                '{}: "{}"'.format(value, target.name)
+                for value, target in ins.table
+            )
+            self.emit("_irpy_prev_block = _irpy_current_block")
+            self.emit(
+                '_irpy_current_block = {{{}}}.get({}, "{}")'.format(
+                    table, v, ins.lab_default.name
+                )
+            )
         elif isinstance(ins, ir.Jump):
             if self._shape_style:
                 self.fill_phis(block)
@@ -1,8 +1,14 @@
+from .adce import AggressiveDeadCodeEliminationPass
 from .clean import CleanPass
 from .mem2reg import Mem2RegPromotor
 from .cse import CommonSubexpressionEliminationPass
 from .constantfolding import ConstantFolder
+from .interprocedural import DeadFunctionEliminationPass
+from .interprocedural import ConstantArgumentPropagationPass
 from .load_after_store import LoadAfterStorePass
+from .sroa import ScalarReplacementPass
+from .slp import SlpVectorizerPass
+from .load_store_elimination import LoadStoreEliminationPass
 from .transform import RemoveAddZeroPass
 from .transform import DeleteUnusedInstructionsPass
 from .transform import ModulePass, FunctionPass, BlockPass, InstructionPass
@@ -13,11 +19,17 @@ __all__ = [
     "FunctionPass",
     "BlockPass",
     "InstructionPass",
+    "AggressiveDeadCodeEliminationPass",
     "CleanPass",
     "CommonSubexpressionEliminationPass",
+    "ConstantArgumentPropagationPass",
     "ConstantFolder",
+    "DeadFunctionEliminationPass",
     "DeleteUnusedInstructionsPass",
     "LoadAfterStorePass",
+    "LoadStoreEliminationPass",
     "Mem2RegPromotor",
     "RemoveAddZeroPass",
+    "ScalarReplacementPass",
+    "SlpVectorizerPass",
 ]
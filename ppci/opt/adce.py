@@ -0,0 +1,166 @@
+""" Aggressive dead code elimination.
+
+Instead of removing instructions which are unused, this pass assumes that
+every instruction is dead, unless proven otherwise. Instructions with side
+effects are live, and liveness is propagated to the operands of live
+instructions and to the branches on which live instructions are control
+dependent.
+
+Since dead instructions are removed in one sweep, chains of dead code and
+whole dead branches and loops vanish in a single run.
+"""
+
+from .transform import FunctionPass
+from .. import ir
+from ..graph.cfg import ir_function_to_graph
+
+
+def has_side_effect(instruction):
+    """ Test if an instruction must be kept, regardless of its use """
+    if isinstance(instruction, ir.Load):
+        return instruction.volatile
+    return isinstance(
+        instruction,
+        (
+            ir.Store,
+            ir.FunctionCall,
+            ir.ProcedureCall,
+            ir.CopyBlob,
+            ir.InlineAsm,
+            ir.Return,
+            ir.Exit,
+        ),
+    )
+
+
+class AggressiveDeadCodeEliminationPass(FunctionPass):
+    """ Mark and sweep dead code elimination using control dependence.
+
+    Loops which do not terminate are always kept.
+    """
+
+    def on_function(self, function):
+        cfg, block_map = ir_function_to_graph(function)
+        node_map = {n: b for b, n in block_map.items()}
+        reaches_exit = self.reaches_exit(cfg)
+        control_dependence = self.control_dependence(
+            cfg, block_map, node_map, reaches_exit
+        )
+
+        # Mark phase:
+        live = set()
+        live_blocks = set()
+        worklist = []
+
+        def mark(instruction):
+            if instruction not in live:
+                live.add(instruction)
+                worklist.append(instruction)
+
+        for block in function:
+            if block_map[block] not in reaches_exit:
+                # Infinite loop, keep it:
+                mark(block.last_instruction)
+            for instruction in block:
+                if has_side_effect(instruction):
+                    mark(instruction)
+
+        while worklist:
+            instruction = worklist.pop()
+            for value in instruction.uses:
+                if isinstance(value, ir.Instruction) and value.block:
+                    mark(value)
+
+            if isinstance(instruction, ir.Phi):
+                for block in instruction.inputs:
+                    mark(block.last_instruction)
+
+            block = instruction.block
+            if block not in live_blocks:
+                live_blocks.add(block)
+                for cd_block in control_dependence[block]:
+                    mark(cd_block.last_instruction)
+
+        # Sweep phase:
+        removed = 0
+        for block in function:
+            for instruction in list(block):
+                if instruction in live or instruction.is_terminator:
+                    continue
+                for value in list(instruction.uses):
+                    instruction.del_use(value)
+                block.remove_instruction(instruction)
+                removed += 1
+
+        # Reroute dead branches to the nearest live post dominator:
+        rerouted = 0
+        for block in function:
+            terminator = block.last_instruction
+            if terminator in live:
+                continue
+            target = self.live_post_dominator(
+                cfg, block_map[block], node_map, live_blocks
+            )
+            if isinstance(terminator, ir.Jump) and terminator.target is target:
+                continue
+            block.remove_instruction(terminator)
+            for value in list(terminator.uses):
+                terminator.del_use(value)
+            terminator.delete()
+            block.add_instruction(ir.Jump(target))
+            rerouted += 1
+
+        if rerouted:
+            function.delete_unreachable()
+
+        if removed or rerouted:
+            self.logger.debug(
+                "Removed %s instructions and rerouted %s branches in %s",
+                removed,
+                rerouted,
+                function.name,
+            )
+
+    @staticmethod
+    def reaches_exit(cfg):
+        """ Determine which nodes can reach the exit of the function """
+        reached = {cfg.exit_node}
+        worklist = [cfg.exit_node]
+        while worklist:
+            node = worklist.pop()
+            for predecessor in cfg.predecessors(node):
+                if predecessor not in reached:
+                    reached.add(predecessor)
+                    worklist.append(predecessor)
+        return reached
+
+    @staticmethod
+    def control_dependence(cfg, block_map, node_map, reaches_exit):
+        """ Determine for each block on which blocks it is control dependent.
+
+        For each edge a -> b, where b does not post dominate a, walk up the
+        post dominator tree from b until the immediate post dominator
+        of a. All nodes visited are control dependent on a.
+        """
+        dependence = {block: set() for block in block_map}
+        for node in cfg.nodes:
+            if node not in reaches_exit or node not in node_map:
+                continue
+            block = node_map[node]
+            ipdom = cfg.get_immediate_post_dominator(node)
+            for successor in cfg.successors(node):
+                runner = successor
+                while runner is not ipdom and runner in node_map:
+                    dependence[node_map[runner]].add(block)
+                    if runner not in reaches_exit:
+                        break
+                    runner = cfg.get_immediate_post_dominator(runner)
+        return dependence
+
+    @staticmethod
+    def live_post_dominator(cfg, node, node_map, live_blocks):
+        """ Find the nearest post dominator with live code in it """
+        node = cfg.get_immediate_post_dominator(node)
+        while node_map[node] not in live_blocks:
+            node = cfg.get_immediate_post_dominator(node)
+        return node_map[node]
@@ -0,0 +1,172 @@
+""" Simple alias analysis for memory operations.
+
+The analysis splits an address into a base object and a constant offset.
+Two memory accesses can be disambiguated when:
+
+- their bases are distinct identified objects (distinct allocs or globals),
+- they share a base but access non-overlapping constant offsets,
+- one of them accesses an alloc whose address never escapes.
+
+"""
+
+from collections import namedtuple
+from .. import ir
+
+
+MemoryLocation = namedtuple("MemoryLocation", ["base", "offset", "size"])
+
+
+def constant_value(value):
+    """ Try to evaluate a value to a python integer.
+
+    Returns None if the value is not a (simple) integer constant.
+    """
+    if isinstance(value, ir.Const):
+        if isinstance(value.value, int):
+            return value.value
+    elif isinstance(value, ir.Cast):
+        return constant_value(value.src)
+    elif isinstance(value, ir.Binop) and value.operation in "+-*":
+        a = constant_value(value.a)
+        b = constant_value(value.b)
+        if a is not None and b is not None:
+            if value.operation == "+":
+                return a + b
+            elif value.operation == "-":
+                return a - b
+            else:
+                return a * b
+    return None
+
+
+def split_address(address):
+    """ Split an address into a base value and a constant offset. """
+    offset = 0
+    while True:
+        if isinstance(address, ir.AddressOf):
+            return address.src, offset
+        elif isinstance(address, ir.Binop) and address.operation in "+-":
+            b = constant_value(address.b)
+            if b is not None:
+                offset += b if address.operation == "+" else -b
+                address = address.a
+                continue
+            a = constant_value(address.a)
+            if a is not None and address.operation == "+":
+                offset += a
+                address = address.b
+                continue
+        return address, offset
+
+
+def type_size(ty):
+    """ Get the size of a type in bytes, or None when unknown. """
+    return getattr(ty, "size", None)
+
+
+def get_memory_location(address, size=None):
+    """ Determine the memory location accessed through the given address """
+    base, offset = split_address(address)
+    return MemoryLocation(base, offset, size)
+
+
+def is_identified_object(value):
+    """ Test if the value is a distinct memory object.
+
+    Distinct identified objects never overlap each other.
+    """
+    return isinstance(value, (ir.Alloc, ir.GlobalValue))
+
+
+def alloc_escapes(alloc: ir.Alloc):
+    """ Check if the address of an alloc can leak to unknown code.
+
+    The alloc does not escape when its address, possibly with constant
+    offsets added, is only used as the address of loads and stores.
+    """
+    worklist = list(alloc.used_by)
+    visited = set()
+    while worklist:
+        user = worklist.pop()
+        if user in visited:
+            continue
+        visited.add(user)
+
+        if isinstance(user, ir.AddressOf):
+            derived = user
+        elif isinstance(user, ir.Binop) and user.operation in "+-":
+            if constant_value(user.a) is None and constant_value(
+                user.b
+            ) is None:
+                return True
+            derived = user
+        else:
+            return True
+
+        for use in derived.used_by:
+            if isinstance(use, ir.Load):
+                continue
+            elif isinstance(use, ir.Store):
+                if use.value is derived:
+                    return True
+            else:
+                worklist.append(use)
+    return False
+
+
+class AliasAnalysis:
+    """ Answer may-alias queries between memory locations.
+
+    Escape information of allocs is cached, so create a new instance
+    when the function is modified in a way that changes address uses.
+    """
+
+    def __init__(self):
+        self._escapes = {}
+
+    def is_local(self, base):
+        """ Check if the base is only accessible to the current function """
+        if isinstance(base, ir.Alloc):
+            if base not in self._escapes:
+                self._escapes[base] = alloc_escapes(base)
+            return not self._escapes[base]
+        return False
+
+    def may_alias(self, loc1, loc2):
+        """ Test if two memory locations may refer to overlapping memory """
+        if loc1.base is loc2.base:
+            return overlaps(loc1, loc2)
+
+        if is_identified_object(loc1.base) and is_identified_object(
+            loc2.base
+        ):
+            return False
+
+        if self.is_local(loc1.base) or self.is_local(loc2.base):
+            return False
+
+        return True
+
+    def must_alias(self, loc1, loc2):
+        """ Test if two memory locations refer to exactly the same memory """
+        return (
+            loc1.base is loc2.base
+            and loc1.offset == loc2.offset
+            and loc1.size is not None
+            and loc1.size == loc2.size
+        )
+
+    def may_be_clobbered_by_call(self, location):
+        """ Check if a call to an unknown routine can access the location """
+        return not self.is_local(location.base)
+
+
+def overlaps(loc1, loc2):
+    """ Test if two locations with the same base overlap """
+    assert loc1.base is loc2.base
+    if loc1.size is None or loc2.size is None:
+        return True
+    return (
+        loc1.offset < loc2.offset + loc2.size
+        and loc2.offset < loc1.offset + loc1.size
+    )
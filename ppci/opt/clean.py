@@ -1,5 +1,154 @@
+import operator
 from .transform import FunctionPass
 from .. import ir
+from ..graph.cfg import ir_function_to_graph
+from ..utils.collections import OrderedSet
+
+# The largest block, in instructions, which is duplicated into one of its
+# predecessors:
+TAIL_DUPLICATION_SIZE = 4
+
+# The amount of instructions by which a function may grow due to tail
+# duplication, as a fraction of its size:
+TAIL_DUPLICATION_GROWTH = 0.1
+
+# How far to look upwards along unconditional jumps for a branch:
+CONDITION_SEARCH_DEPTH = 4
+
+comparisons = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+negated_conditions = {
+    "==": "!=",
+    "!=": "==",
+    "<": ">=",
+    ">=": "<",
+    ">": "<=",
+    "<=": ">",
+}
+
+swapped_conditions = {
+    "==": "==",
+    "!=": "!=",
+    "<": ">",
+    ">": "<",
+    "<=": ">=",
+    ">=": "<=",
+}
+
+# The outcome of comparisons, when a relation between the same two values
+# is known to hold:
+implied_conditions = {
+    "==": {
+        "==": True,
+        "!=": False,
+        "<": False,
+        ">": False,
+        "<=": True,
+        ">=": True,
+    },
+    "!=": {"==": False, "!=": True},
+    "<": {
+        "==": False,
+        "!=": True,
+        "<": True,
+        ">": False,
+        "<=": True,
+        ">=": False,
+    },
+    ">": {
+        "==": False,
+        "!=": True,
+        "<": False,
+        ">": True,
+        "<=": False,
+        ">=": True,
+    },
+    "<=": {">": False, "<=": True},
+    ">=": {"<": False, ">=": True},
+}
+
+# Instructions which can be copied by tail duplication:
+copyable_instructions = (
+    ir.Const,
+    ir.Binop,
+    ir.Unop,
+    ir.Cast,
+    ir.Load,
+    ir.Store,
+    ir.AddressOf,
+)
+
+
+def is_integer_comparison(cjump):
+    """ Test if a conditional jump compares integers.
+
+    Floating point comparisons are not reasoned about, since any
+    comparison with a NaN is false.
+    """
+    return cjump.a.ty.is_integer or cjump.a.ty is ir.ptr
+
+
+def same_value(value1, value2):
+    """ Test if two values are the same value, or equal constants """
+    if value1 is value2:
+        return True
+    return (
+        isinstance(value1, ir.Const)
+        and isinstance(value2, ir.Const)
+        and value1.ty is value2.ty
+        and value1.value == value2.value
+    )
+
+
+def copy_instruction(instruction, value_map):
+    """ Create a copy of an instruction, using the mapped operands """
+
+    def get(value):
+        return value_map.get(value, value)
+
+    if isinstance(instruction, ir.Const):
+        return ir.Const(instruction.value, instruction.name, instruction.ty)
+    elif isinstance(instruction, ir.Binop):
+        return ir.Binop(
+            get(instruction.a),
+            instruction.operation,
+            get(instruction.b),
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.Unop):
+        return ir.Unop(
+            instruction.operation,
+            get(instruction.a),
+            instruction.name,
+            instruction.ty,
+        )
+    elif isinstance(instruction, ir.Cast):
+        return ir.Cast(get(instruction.src), instruction.name, instruction.ty)
+    elif isinstance(instruction, ir.Load):
+        return ir.Load(
+            get(instruction.address),
+            instruction.name,
+            instruction.ty,
+            volatile=instruction.volatile,
+        )
+    elif isinstance(instruction, ir.Store):
+        return ir.Store(
+            get(instruction.value),
+            get(instruction.address),
+            volatile=instruction.volatile,
+        )
+    elif isinstance(instruction, ir.AddressOf):
+        return ir.AddressOf(get(instruction.src), instruction.name)
+    else:  # pragma: no cover
+        raise NotImplementedError(str(instruction))
 
 
 class CleanPass(FunctionPass):
@@ -22,12 +171,53 @@ class CleanPass(FunctionPass):
             jump B
             B:
 
+        Thread jumps over blocks whose branch outcome is known on an
+        incoming edge. This is the case when the compared value is a phi
+        with a constant incoming value, or when the same comparison was
+        made by a branch leading to the block:
+
+            .. code::
+
+            A:
+            if x == 0 then B else C
+            B:
+            if x == 0 then D else E
+
+            Transforms into:
+
+            .. code::
+
+            A:
+            if x == 0 then D else C
+
+        Small blocks which end in a conditional jump are duplicated into
+        predecessors which jump to them, as long as the function does
+        not grow too much. This removes a jump, and often makes the
+        outcome of the branch known.
+
+    Args:
+        tail_duplication: Set to False to disable tail duplication, for
+            example when optimizing for size.
     """
 
+    def __init__(self, tail_duplication=True):
+        super().__init__()
+        self.tail_duplication = tail_duplication
+
     def on_function(self, function):
         self.remove_empty_blocks(function)
         self.remove_one_preds(function)
 
+        changed = self.thread_jumps(function)
+        if self.tail_duplication and self.duplicate_tails(function):
+            self.thread_jumps(function)
+            changed = True
+
+        if changed:
+            function.delete_unreachable()
+            self.remove_empty_blocks(function)
+            self.remove_one_preds(function)
+
     def find_empty_blocks(self, function):
         """ Look for all blocks containing only a jump in it """
         empty_blocks = []
@@ -106,13 +296,354 @@ class CleanPass(FunctionPass):
         block1.remove_instruction(last_jump)
         last_jump.delete()
 
-        # Copy all instructions to block1:
+        # Phis of block2 can only have the value coming from block1:
+        for phi in block2.phis:
+            phi.replace_by(phi.get_value(block1))
+            block2.remove_instruction(phi)
+            phi.delete()
+
+        # Move all instructions to block1:
+        successors = block2.successors
         for instruction in block2:
+            block2.remove_instruction(instruction)
             block1.add_instruction(instruction)
 
         # Replace incoming info:
-        for successor in block2.successors:
+        for successor in successors:
             successor.replace_incoming(block2, [block1])
 
         # Remove block from function:
         block1.function.remove_block(block2)
+
+    def thread_jumps(self, function):
+        """ Let predecessors jump directly to the known target of a block.
+
+        This is done for blocks with only phis, constants and a
+        conditional jump, so no code needs to be copied.
+        """
+        stat = 0
+        for block in list(function):
+            if not isinstance(block.last_instruction, ir.CJump):
+                continue
+            if not all(
+                isinstance(instruction, (ir.Phi, ir.Const))
+                for instruction in block.instructions[:-1]
+            ):
+                continue
+            if not self.has_local_values(block):
+                continue
+
+            for pred in list(OrderedSet(block.predecessors)):
+                if pred is block:
+                    continue
+                target = self.known_target(pred, block)
+                if target is None or target in pred.successors:
+                    continue
+                self.logger.debug(
+                    "Threading %s over %s to %s",
+                    pred.name,
+                    block.name,
+                    target.name,
+                )
+                self.add_incoming(target, block, pred, {})
+                for phi in block.phis:
+                    phi.del_incoming(pred)
+                pred.change_target(block, target)
+                stat += 1
+        if stat > 0:
+            self.logger.debug("Threaded %s jumps", stat)
+        return stat > 0
+
+    def duplicate_tails(self, function):
+        """ Copy small blocks ending in a conditional jump into the
+        predecessors which jump to them unconditionally.
+        """
+        size = sum(len(block.instructions) for block in function)
+        budget = max(
+            TAIL_DUPLICATION_SIZE, int(size * TAIL_DUPLICATION_GROWTH)
+        )
+        stat = 0
+        for block in list(function):
+            if not isinstance(block.last_instruction, ir.CJump):
+                continue
+            cjump = block.last_instruction
+            if cjump.lab_yes is cjump.lab_no:
+                continue
+            instructions = [
+                instruction
+                for instruction in block.instructions[:-1]
+                if not isinstance(instruction, ir.Phi)
+            ]
+            if len(instructions) > TAIL_DUPLICATION_SIZE:
+                continue
+            if not all(
+                isinstance(instruction, copyable_instructions)
+                for instruction in instructions
+            ):
+                continue
+
+            for pred in list(OrderedSet(block.predecessors)):
+                if pred is block or not isinstance(
+                    pred.last_instruction, ir.Jump
+                ):
+                    continue
+                if len(instructions) > budget:
+                    break
+                uses = self.find_escaping_uses(function, block, pred)
+                if uses is None:
+                    continue
+                budget -= len(instructions)
+                self.duplicate_tail(pred, block, instructions, uses)
+                stat += 1
+        if stat > 0:
+            self.logger.debug("Duplicated %s blocks", stat)
+        return stat > 0
+
+    def find_escaping_uses(self, function, block, pred):
+        """ Find the uses of the values of block outside of block.
+
+        When block is copied into pred, the successors of block are also
+        reached from pred, and the values used after block must be merged
+        by new phis in the successors. This is possible when each use is
+        dominated by a single successor, which is only reached from
+        block.
+
+        Returns a list of uses with the dominating successor, or None
+        when the block cannot be copied.
+        """
+        values = self.escaping_values(block)
+        if not values:
+            return []
+
+        successors = block.successors
+        for successor in successors:
+            if successor is block or successor is pred:
+                return
+            if set(successor.predecessors) != {block}:
+                return
+
+        cfg, block_map = ir_function_to_graph(function)
+
+        def dominating_successor(use_block):
+            if use_block not in block_map:
+                return
+            dominators = [
+                successor
+                for successor in successors
+                if cfg.dominates(block_map[successor], block_map[use_block])
+            ]
+            if len(dominators) == 1:
+                return dominators[0]
+
+        # A value of block which is passed around a loop back into block
+        # would need a phi in pred as well:
+        for phi in block.phis:
+            value = phi.get_value(pred)
+            if isinstance(value, ir.Instruction) and value.block is block:
+                return
+
+        uses = []
+        for value in values:
+            for user in value.used_by:
+                if isinstance(user, ir.Phi):
+                    use_blocks = [
+                        incoming
+                        for incoming, v in user.inputs.items()
+                        if v is value
+                    ]
+                else:
+                    use_blocks = [user.block]
+                for use_block in use_blocks:
+                    if use_block is block:
+                        continue
+                    successor = dominating_successor(use_block)
+                    if successor is None:
+                        return
+                    uses.append((user, use_block, successor))
+        return uses
+
+    @staticmethod
+    def escaping_values(block):
+        """ Get the values of block which are used outside of block.
+
+        Uses by phis of successors, for the edges coming from block, do
+        not count.
+        """
+        values = OrderedSet()
+        for instruction in block:
+            if not isinstance(instruction, ir.Value):
+                continue
+            for user in instruction.used_by:
+                if user.block is block:
+                    continue
+                if isinstance(user, ir.Phi) and all(
+                    incoming is block
+                    for incoming, value in user.inputs.items()
+                    if value is instruction
+                ):
+                    continue
+                values.add(instruction)
+        return values
+
+    def duplicate_tail(self, pred, block, instructions, uses):
+        """ Replace the jump at the end of pred by a copy of block """
+        self.logger.debug("Duplicating %s into %s", block.name, pred.name)
+        cjump = block.last_instruction
+        target = self.known_target(pred, block)
+        values = self.escaping_values(block)
+
+        # Map phis to their incoming value, and copy the instructions:
+        jump = pred.last_instruction
+        value_map = {phi: phi.get_value(pred) for phi in block.phis}
+        for instruction in instructions:
+            new_instruction = copy_instruction(instruction, value_map)
+            pred.insert_instruction(new_instruction, before_instruction=jump)
+            value_map[instruction] = new_instruction
+        pred.remove_instruction(jump)
+        jump.delete()
+
+        if target is None:
+            pred.add_instruction(
+                ir.CJump(
+                    value_map.get(cjump.a, cjump.a),
+                    cjump.cond,
+                    value_map.get(cjump.b, cjump.b),
+                    cjump.lab_yes,
+                    cjump.lab_no,
+                )
+            )
+            targets = [cjump.lab_yes, cjump.lab_no]
+        else:
+            pred.add_instruction(ir.Jump(target))
+            targets = [target]
+
+        for target in targets:
+            self.add_incoming(target, block, pred, value_map)
+
+        # Merge the values used after the block with new phis:
+        phis = {}
+
+        def merge(value, successor):
+            if (value, successor) not in phis:
+                phi = ir.Phi(value.name, value.ty)
+                phi.set_incoming(block, value)
+                phi.set_incoming(pred, value_map[value])
+                successor.insert_instruction(phi)
+                phis[(value, successor)] = phi
+            return phis[(value, successor)]
+
+        for user, use_block, successor in uses:
+            if successor not in targets:
+                continue
+            if isinstance(user, ir.Phi):
+                for incoming, value in list(user.inputs.items()):
+                    if incoming is use_block and value in values:
+                        user.set_incoming(incoming, merge(value, successor))
+            else:
+                for value in values:
+                    if value in user.uses:
+                        user.replace_use(value, merge(value, successor))
+
+        for phi in block.phis:
+            phi.del_incoming(pred)
+
+    @staticmethod
+    def add_incoming(target, block, pred, value_map):
+        """ Let the phis of target take the value from block also from pred
+        """
+        for phi in target.phis:
+            value = phi.get_value(block)
+            if isinstance(value, ir.Phi) and value.block is block:
+                value = value.get_value(pred)
+            else:
+                value = value_map.get(value, value)
+            phi.set_incoming(pred, value)
+
+    @staticmethod
+    def has_local_values(block):
+        """ Test if the values of a block are used only in the block itself,
+        and by phis of its successors, for the edges coming from the block.
+
+        Only then the block can be bypassed without adding phis. Constants
+        passed to phis of the successors are not available when bypassing
+        the block, so these are not allowed either.
+        """
+        successors = block.successors
+        for instruction in block:
+            if not isinstance(instruction, ir.Value):
+                continue
+            for user in instruction.used_by:
+                if user.block is block:
+                    continue
+                if not isinstance(user, ir.Phi):
+                    return False
+                if user.block not in successors:
+                    return False
+                if isinstance(instruction, ir.Const):
+                    return False
+                if any(
+                    value is instruction and incoming is not block
+                    for incoming, value in user.inputs.items()
+                ):
+                    return False
+        return True
+
+    def known_target(self, pred, block):
+        """ Determine where the conditional jump at the end of block goes
+        to, when coming from pred. Returns None if this is not known.
+        """
+        cjump = block.last_instruction
+        if not is_integer_comparison(cjump):
+            return
+
+        # Use the incoming values of phis:
+        a, b = cjump.a, cjump.b
+        if isinstance(a, ir.Phi) and a.block is block:
+            a = a.get_value(pred)
+        if isinstance(b, ir.Phi) and b.block is block:
+            b = b.get_value(pred)
+
+        if isinstance(a, ir.Const) and isinstance(b, ir.Const):
+            result = comparisons[cjump.cond](a.value, b.value)
+        else:
+            condition = self.known_condition(pred, block)
+            if condition is None:
+                return
+            a2, cond, b2 = condition
+            if same_value(a, a2) and same_value(b, b2):
+                pass
+            elif same_value(a, b2) and same_value(b, a2):
+                cond = swapped_conditions[cond]
+            else:
+                return
+            result = implied_conditions[cond].get(cjump.cond)
+            if result is None:
+                return
+
+        return cjump.lab_yes if result else cjump.lab_no
+
+    @staticmethod
+    def known_condition(pred, block):
+        """ Find a comparison which holds when going from pred to block.
+
+        This is the condition of the conditional jump leading to block,
+        possibly via a chain of unconditional jumps.
+        """
+        for _ in range(CONDITION_SEARCH_DEPTH):
+            jump = pred.last_instruction
+            if isinstance(jump, ir.CJump):
+                if jump.lab_yes is jump.lab_no:
+                    return
+                if not is_integer_comparison(jump):
+                    return
+                if jump.lab_yes is block:
+                    return jump.a, jump.cond, jump.b
+                else:
+                    return jump.a, negated_conditions[jump.cond], jump.b
+            elif isinstance(jump, ir.Jump):
+                predecessors = pred.predecessors
+                if len(predecessors) != 1 or predecessors[0] is pred:
+                    return
+                block, pred = pred, predecessors[0]
+            else:
+                return
@@ -0,0 +1,179 @@
+""" Optimizations which work on a module as a whole.
+
+These passes remove functions which are never called, and specialize
+function arguments.
+"""
+
+from itertools import chain
+from .transform import ModulePass
+from .. import ir
+
+
+def referenced_names(variable):
+    """ Get the names of globals referred to in the value of a variable """
+    if variable.value:
+        for part in variable.value:
+            if isinstance(part, tuple):
+                yield part[1]
+
+
+def referenced_values(value, name_map):
+    """ Get all global values referred to by the given global value. """
+    if isinstance(value, ir.SubRoutine):
+        for instruction in value.get_instructions():
+            for used_value in instruction.uses:
+                if isinstance(used_value, ir.GlobalValue):
+                    yield used_value
+    elif isinstance(value, ir.Variable):
+        # Variables refer to other globals by name in their initial value:
+        for name in referenced_names(value):
+            if name in name_map:
+                yield name_map[name]
+
+
+class DeadFunctionEliminationPass(ModulePass):
+    """ Remove local functions and variables which are never referred to.
+
+    Globally visible functions and variables are the roots, from which
+    all referred values are marked. Everything with local binding which
+    is not marked, is removed from the module.
+    """
+
+    def run(self, ir_module):
+        roots = [
+            value
+            for value in ir_module.functions + ir_module.variables
+            if value.binding != ir.Binding.LOCAL
+        ]
+        name_map = {
+            value.name: value
+            for value in chain(
+                ir_module.functions, ir_module.variables, ir_module.externals
+            )
+        }
+        reachable = set(roots)
+        worklist = list(roots)
+        while worklist:
+            value = worklist.pop()
+            for referred in referenced_values(value, name_map):
+                if referred not in reachable:
+                    reachable.add(referred)
+                    worklist.append(referred)
+
+        dead_functions = [
+            f for f in ir_module.functions if f not in reachable
+        ]
+        dead_variables = [
+            v for v in ir_module.variables if v not in reachable
+        ]
+
+        # Drop all uses of dead functions, since they may refer to each
+        # other:
+        for function in dead_functions:
+            for instruction in function.get_instructions():
+                for value in list(instruction.uses):
+                    instruction.del_use(value)
+                if isinstance(instruction, ir.JumpBase):
+                    instruction.delete()
+
+        for function in dead_functions:
+            ir_module.functions.remove(function)
+            function.module = None
+
+        for variable in dead_variables:
+            ir_module.variables.remove(variable)
+            variable.module = None
+
+        if dead_functions or dead_variables:
+            self.logger.debug(
+                "Removed %s functions and %s variables",
+                len(dead_functions),
+                len(dead_variables),
+            )
+
+
+def _only_called_directly(function, taken_names):
+    """ Test if a function is only used as callee of direct calls """
+    if function.binding != ir.Binding.LOCAL or function.name in taken_names:
+        return False
+    for user in function.used_by:
+        if not isinstance(user, (ir.FunctionCall, ir.ProcedureCall)):
+            return False
+        if function in user.arguments:
+            return False
+    return True
+
+
+def _remove_argument(call, index):
+    """ Remove an argument from a call, updating the use information """
+    value = call.arguments.pop(index)
+    if value is not call.callee and value not in call.arguments:
+        call.del_use(value)
+
+
+class ConstantArgumentPropagationPass(ModulePass):
+    """ Specialize arguments which are the same constant at all call sites.
+
+    This only works for local functions of which the address is never
+    taken, since all calls to them are known. The constant is
+    materialized inside the function, and the argument is removed from
+    the function and from all calls.
+    """
+
+    def run(self, ir_module):
+        taken_names = set()
+        for variable in ir_module.variables:
+            taken_names.update(referenced_names(variable))
+
+        count = 0
+        for function in ir_module.functions:
+            if not function.arguments or not function.used_by:
+                continue
+            if not _only_called_directly(function, taken_names):
+                continue
+            count += self.specialize(function)
+
+        if count:
+            self.logger.debug("Propagated %s constant arguments", count)
+
+    def specialize(self, function):
+        """ Find and propagate constant arguments of a single function """
+        calls = list(function.used_by)
+        count = 0
+        for index in reversed(range(len(function.arguments))):
+            parameter = function.arguments[index]
+            values = [call.arguments[index] for call in calls]
+            first = values[0]
+            if isinstance(first, ir.Const):
+                if not all(
+                    isinstance(v, ir.Const)
+                    and v.value == first.value
+                    and v.ty is first.ty
+                    for v in values
+                ):
+                    continue
+                replacement = ir.Const(first.value, parameter.name, first.ty)
+                function.entry.insert_instruction(replacement)
+            elif isinstance(first, ir.GlobalValue):
+                if not all(v is first for v in values):
+                    continue
+                replacement = first
+            else:
+                continue
+
+            self.logger.debug(
+                "Argument %s of %s is always %s",
+                parameter.name,
+                function.name,
+                replacement,
+            )
+            parameter.replace_by(replacement)
+            function.arguments.pop(index)
+            for call in calls:
+                _remove_argument(call, index)
+            count += 1
+
+        # Renumber the parameters:
+        for num, parameter in enumerate(function.arguments):
+            parameter.num = num
+        return count
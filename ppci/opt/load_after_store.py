@@ -23,11 +23,8 @@ class LoadAfterStorePass(BlockPass):
         self, i, ty, stop_on=(ir.FunctionCall, ir.ProcedureCall, ir.Store)
     ):
         """ Go back from this instruction to beginning """
-        block = i.block
-        instructions = block.instructions
-        pos = instructions.index(i)
-        for x in range(pos - 1, 0, -1):
-            i2 = instructions[x]
+        i2 = i.previous_instruction
+        while i2 is not None:
             if isinstance(i2, ir.Store) and ty is i2.value.ty:
                 # Got first store!
                 if i2.address is i.address:
@@ -37,6 +34,7 @@ class LoadAfterStorePass(BlockPass):
             elif isinstance(i2, stop_on):
                 # A call can change memory, store not found..
                 return None
+            i2 = i2.previous_instruction
         return None
 
     def on_block(self, block):
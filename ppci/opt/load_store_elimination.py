@@ -0,0 +1,262 @@
+""" Redundant load and dead store elimination.
+
+This pass walks the dominator tree of a function and keeps track of the
+contents of memory, in the spirit of memory SSA. Facts about memory flow
+from a block into a dominated block when that block can only be entered
+from its immediate dominator. When a block has multiple predecessors, no
+memory facts are assumed at its start.
+
+Each instruction is visited once, and each memory operation only touches
+the facts of the memory objects it may alias, so the pass runs in
+(near) linear time per function. Calls and stores through unknown
+pointers are the exception: they touch the facts of all memory which
+is visible to other functions.
+"""
+
+from .transform import FunctionPass
+from .alias import AliasAnalysis, is_identified_object
+from .alias import get_memory_location, type_size, overlaps
+from .. import ir
+from ..graph.domtree import CfgInfo
+
+
+class ScopedMemoryTable:
+    """ Memory facts grouped per base object.
+
+    Only bases with facts are kept. Bases which other functions or
+    unknown pointers can access are indexed as well, so that a store or
+    a call only visits the bases it may alias.
+
+    All changes are journaled, so that the table can be rolled back to
+    an earlier state when leaving a subtree of the dominator tree.
+    """
+
+    _missing = object()
+
+    def __init__(self, alias_analysis):
+        self.alias_analysis = alias_analysis
+        self._facts = {}
+        self._journal = []
+
+        # Escaping identified objects, and bases which are not
+        # identified objects:
+        self._escaped = {}
+        self._unknown = {}
+
+    def mark(self):
+        """ Get a marker to roll back to later on """
+        return len(self._journal)
+
+    def rollback(self, marker):
+        """ Undo all changes made since marker was taken """
+        while len(self._journal) > marker:
+            base, old = self._journal.pop()
+            self._store(base, () if old is self._missing else old)
+
+    def _set(self, base, facts):
+        self._journal.append((base, self._facts.get(base, self._missing)))
+        self._store(base, facts)
+
+    def _store(self, base, facts):
+        index = self._index(base)
+        if facts:
+            self._facts[base] = facts
+            if index is not None:
+                index[base] = True
+        else:
+            self._facts.pop(base, None)
+            if index is not None:
+                index.pop(base, None)
+
+    def _index(self, base):
+        """ Get the index of non-local bases the base belongs in """
+        if not is_identified_object(base):
+            return self._unknown
+        elif self.alias_analysis.is_local(base):
+            return None
+        else:
+            return self._escaped
+
+    def get(self, location):
+        """ Get all facts about the base object of the given location """
+        return self._facts.get(location.base, ())
+
+    def add(self, location, *fact):
+        """ Add a fact for the given location """
+        facts = self.get(location) + ((location,) + fact,)
+        self._set(location.base, facts)
+
+    def kill_aliasing(self, location):
+        """ Remove all facts that may alias the given location """
+        base = location.base
+        facts = self._facts.get(base, ())
+        remaining = tuple(f for f in facts if not overlaps(f[0], location))
+        if len(remaining) != len(facts):
+            self._set(base, remaining)
+
+        # Other bases can only alias through unknown pointers:
+        index = self._index(base)
+        if index is None:
+            return
+        others = list(self._unknown)
+        if index is self._unknown:
+            others.extend(self._escaped)
+        for other in others:
+            if other is not base:
+                self._set(other, ())
+
+    def kill_escaping(self):
+        """ Remove facts about memory visible to other functions """
+        for base in list(self._escaped) + list(self._unknown):
+            self._set(base, ())
+
+    def clear(self):
+        """ Forget everything """
+        for base in list(self._facts):
+            self._set(base, ())
+
+
+class LoadStoreEliminationPass(FunctionPass):
+    """ Forward stored values to loads, and remove dead stores.
+
+    This works across blocks, and uses alias analysis to look past
+    stores and calls which cannot touch the memory in question.
+
+    .. code::
+
+        [x] = a
+        [y] = 2     // y is a different alloc
+        b = [x]
+        c = b + 2
+        [x] = c
+
+    transforms into:
+
+    .. code::
+
+        [y] = 2
+        c = a + 2
+        [x] = c
+
+    """
+
+    def on_function(self, function):
+        self.alias_analysis = AliasAnalysis()
+        self.available = ScopedMemoryTable(self.alias_analysis)
+        self.pending = ScopedMemoryTable(self.alias_analysis)
+        self.loads_removed = 0
+        self.stores_removed = 0
+
+        cfg_info = CfgInfo(function)
+
+        # Iterative pre-order walk over the dominator tree:
+        worklist = [(cfg_info.cfg.root_tree, None, None)]
+        while worklist:
+            tree_node, parent, markers = worklist.pop()
+            if markers is not None:
+                # Leaving a subtree
+                self.available.rollback(markers[0])
+                self.pending.rollback(markers[1])
+                continue
+
+            if not cfg_info.has_block(tree_node.node):
+                continue
+
+            block = cfg_info.get_block(tree_node.node)
+            markers = (self.available.mark(), self.pending.mark())
+            worklist.append((tree_node, parent, markers))
+            self.enter_block(block, parent)
+            self.on_block(block)
+
+            for child in reversed(tree_node.children):
+                worklist.append((child, block, None))
+
+        if self.loads_removed or self.stores_removed:
+            self.logger.debug(
+                "Removed %s loads and %s stores in %s",
+                self.loads_removed,
+                self.stores_removed,
+                function.name,
+            )
+
+    def enter_block(self, block, parent):
+        """ Determine which memory facts still hold at the start of block """
+        predecessors = block.predecessors
+        if len(predecessors) != 1 or predecessors[0] is not parent:
+            self.available.clear()
+            self.pending.clear()
+        elif len(set(parent.successors)) != 1:
+            # Stores in the parent are still visible through another path.
+            self.pending.clear()
+
+    def on_block(self, block):
+        for instruction in list(block):
+            if isinstance(instruction, ir.Load):
+                self.on_load(instruction)
+            elif isinstance(instruction, ir.Store):
+                self.on_store(instruction)
+            elif isinstance(instruction, (ir.FunctionCall, ir.ProcedureCall)):
+                self.available.kill_escaping()
+                self.pending.kill_escaping()
+            elif isinstance(instruction, ir.CopyBlob):
+                src = get_memory_location(instruction.src, instruction.amount)
+                dst = get_memory_location(instruction.dst, instruction.amount)
+                self.pending.kill_aliasing(src)
+                self.pending.kill_aliasing(dst)
+                self.available.kill_aliasing(dst)
+            elif isinstance(instruction, ir.InlineAsm):
+                self.available.clear()
+                self.pending.clear()
+
+    def on_load(self, load):
+        location = get_memory_location(load.address, type_size(load.ty))
+
+        # The load reads memory, so earlier stores are not dead:
+        self.pending.kill_aliasing(location)
+
+        if load.volatile:
+            return
+
+        value = self.lookup(location, load.ty)
+        if value is None:
+            self.available.add(location, load.ty, load)
+        else:
+            load.replace_by(value)
+            load.remove_from_block()
+            self.loads_removed += 1
+
+    def on_store(self, store):
+        ty = store.value.ty
+        location = get_memory_location(store.address, type_size(ty))
+
+        if store.volatile:
+            self.available.kill_aliasing(location)
+            self.pending.kill_aliasing(location)
+            return
+
+        # Storing the value which is already in memory is useless:
+        if self.lookup(location, ty) is store.value:
+            store.remove_from_block()
+            self.stores_removed += 1
+            return
+
+        # A previous store to the same location was never read:
+        for fact in self.pending.get(location):
+            previous = fact[1]
+            if (
+                fact[0].offset == location.offset
+                and previous.value.ty is ty
+            ):
+                previous.remove_from_block()
+                self.stores_removed += 1
+
+        self.available.kill_aliasing(location)
+        self.pending.kill_aliasing(location)
+        self.available.add(location, ty, store.value)
+        self.pending.add(location, store)
+
+    def lookup(self, location, ty):
+        """ Lookup the known value at the given location """
+        for fact in self.available.get(location):
+            if fact[0].offset == location.offset and fact[1] is ty:
+                return fact[2]
@@ -57,72 +57,118 @@ def is_alloc_promotable(alloc_inst: ir.Alloc):
     return True
 
 
+class PromotedVariable:
+    """ Book keeping of a single alloc which is being promoted """
+
+    def __init__(self, alloc):
+        self.alloc = alloc
+        self.name = alloc.name
+        self.addr = list(alloc.used_by)[0]
+        self.loads = [i for i in self.addr.used_by if isinstance(i, ir.Load)]
+        self.stores = [
+            i for i in self.addr.used_by if isinstance(i, ir.Store)
+        ]
+
+        # Determine the type of the phi node:
+        load_types = [load.ty for load in self.loads]
+        store_types = [store.value.ty for store in self.stores]
+        all_types = load_types + store_types
+        assert all_types
+        self.ty = all_types[0]
+        self.phis = []
+        self.initial_value = None
+
+
 class Mem2RegPromotor(FunctionPass):
     """ Tries to find alloc instructions only used by load and store
-    instructions and replace them with values and phi nodes """
+    instructions and replace them with values and phi nodes.
 
-    def place_phi_nodes(self, stores, phi_ty, name, cfg_info):
+    All promotable allocs of a function are promoted at once. Phi nodes
+    are placed at the iterated dominance frontiers of the blocks storing
+    to a variable, after which a single walk over the dominator tree
+    renames the loads of all variables.
+    """
+
+    def place_phi_nodes(self, variable, cfg_info, block_order):
         """
          Step 1: place phi-functions where required:
          Each node in the df(x) requires a phi function,
          where x is a block where the variable is defined.
         """
-        defining_blocks = set(st.block for st in stores)
-
         # Create worklist:
-        block_backlog = set(defining_blocks)
+        block_backlog = []
+        for store in variable.stores:
+            if store.block not in block_backlog:
+                block_backlog.append(store.block)
 
         has_phi = set()
-
-        phis = list()
-        idx = 0
         while block_backlog:
             defining_block = block_backlog.pop()
-            for frontier_block in cfg_info.df[defining_block]:
+            frontier = sorted(
+                cfg_info.df[defining_block], key=block_order.__getitem__
+            )
+            for frontier_block in frontier:
                 if frontier_block not in has_phi:
                     has_phi.add(frontier_block)
-                    block_backlog.add(frontier_block)
-                    phi_name = "phi_{}_{}".format(name, idx)
-                    idx += 1
-                    phi = ir.Phi(phi_name, phi_ty)
-                    phis.append(phi)
+                    block_backlog.append(frontier_block)
+                    phi_name = "phi_{}_{}".format(
+                        variable.name, len(variable.phis)
+                    )
+                    phi = ir.Phi(phi_name, variable.ty)
+                    variable.phis.append(phi)
                     frontier_block.insert_instruction(phi)
-        return phis
 
-    def rename(self, initial_value, phis, loads, stores, cfg_info):
+    def rename(self, variables, cfg_info):
         """
         Step 2: renaming:
 
-        Start a top down sweep over the dominator tree to visit all
-        statements
+        Walk top down over the dominator tree to visit all
+        statements. Each variable has a stack with its current value.
         """
-        stack = [initial_value]
+        stacks = {}
+        variable_of = {}
+        phis_per_block = {}
+        for variable in variables:
+            stacks[variable] = [variable.initial_value]
+            for instruction in variable.loads + variable.stores:
+                variable_of[instruction] = variable
+            for phi in variable.phis:
+                variable_of[phi] = variable
+                phis_per_block.setdefault(phi.block, []).append(phi)
+
+        # Use an explicit stack, dominator trees can be deep:
+        worklist = [(cfg_info.cfg.root_tree, None)]
+        while worklist:
+            tree_node, defs = worklist.pop()
+            if defs is not None:
+                # Leaving this node, cleanup stacks:
+                for variable in defs:
+                    stacks[variable].pop(-1)
+                continue
 
-        def search(tree_node):
             # Get the cfg node and block from the dominator tree node
             cfg_node = tree_node.node
             if not cfg_info.has_block(cfg_node):
-                return
+                continue
 
             block = cfg_info.get_block(cfg_node)
 
             # Crawl down block:
-            defs = 0
+            defs = []
             for instruction in block:
-                if instruction in phis:
-                    stack.append(instruction)
-                    defs += 1
-
-                if instruction in stores:
-                    stack.append(instruction.value)
-                    defs += 1
+                variable = variable_of.get(instruction, None)
+                if variable is None:
+                    continue
 
-                if instruction in loads:
-                    # Replace all uses of a with cur_V
-                    instruction.replace_by(stack[-1])
-                    alloc = instruction.address
-                    assert isinstance(alloc, ir.AddressOf)
-                    # self.debug_db.map(aloc, stack[-1])
+                if isinstance(instruction, ir.Phi):
+                    stacks[variable].append(instruction)
+                    defs.append(variable)
+                elif isinstance(instruction, ir.Store):
+                    stacks[variable].append(instruction.value)
+                    defs.append(variable)
+                else:
+                    # Replace all uses of the load with the current value
+                    instruction.replace_by(stacks[variable][-1])
 
             # At the end of the block
             # For all successors with phi functions, insert the proper
@@ -131,97 +177,95 @@ class Mem2RegPromotor(FunctionPass):
                 if not cfg_info.has_block(successor_node):
                     continue
                 successor_block = cfg_info.get_block(successor_node)
-                for phi in (p for p in phis if p.block == successor_block):
-                    phi.set_incoming(block, stack[-1])
-
-            # Recurse into children:
-            for child_tree_node in tree_node.children:
-                search(child_tree_node)
+                for phi in phis_per_block.get(successor_block, ()):
+                    phi.set_incoming(block, stacks[variable_of[phi]][-1])
 
-            # Cleanup stack:
-            for _ in range(defs):
-                stack.pop(-1)
+            # Recurse into children, and cleanup afterwards:
+            worklist.append((tree_node, defs))
+            for child_tree_node in reversed(tree_node.children):
+                worklist.append((child_tree_node, None))
 
-        search(cfg_info.cfg.root_tree)
-
-    def promote(self, alloc: ir.Alloc, cfg_info):
-        """ Promote a single alloc instruction.
+    def promote(self, variables, cfg_info):
+        """ Promote the given allocs at once.
 
         Find load operations and replace them with assignments.
         """
-        name = alloc.name
-        addr = list(alloc.used_by)[0]
-
-        loads = [i for i in addr.used_by if isinstance(i, ir.Load)]
-        stores = [i for i in addr.used_by if isinstance(i, ir.Store)]
-
-        self.logger.debug(
-            "Promoting alloc %s used by %s load and %s stores",
-            alloc,
-            len(loads),
-            len(stores),
-        )
-
-        # Determine the type of the phi node:
-        load_types = [load.ty for load in loads]
-        store_types = [store.value.ty for store in stores]
-        all_types = load_types + store_types
-        assert all_types
-        phi_ty = all_types[0]
-
-        # If loads are found, we need phi nodes:
-        if loads:
-            phis = self.place_phi_nodes(stores, phi_ty, name, cfg_info)
-
-            # Preserve debug info:
-            for phi in phis:
-                self.debug_db.map(alloc, phi)
-
-            # Create undefined value at start:
-            initial_value = ir.Undefined("und_{}".format(name), phi_ty)
-            alloc.function.entry.insert_instruction(initial_value)
+        function = cfg_info.function
+        block_order = {block: index for index, block in enumerate(function)}
+
+        new_values = []
+        for variable in variables:
+            self.logger.debug(
+                "Promoting alloc %s used by %s load and %s stores",
+                variable.alloc,
+                len(variable.loads),
+                len(variable.stores),
+            )
+
+            # If loads are found, we need phi nodes:
+            if variable.loads:
+                self.place_phi_nodes(variable, cfg_info, block_order)
+
+                # Preserve debug info:
+                for phi in variable.phis:
+                    self.debug_db.map(variable.alloc, phi)
+
+                # Create undefined value at start:
+                variable.initial_value = ir.Undefined(
+                    "und_{}".format(variable.name), variable.ty
+                )
+                function.entry.insert_instruction(variable.initial_value)
+                new_values.append(variable.initial_value)
+                new_values.extend(variable.phis)
 
-            self.rename(initial_value, phis, loads, stores, cfg_info)
+        self.rename([v for v in variables if v.loads], cfg_info)
 
-            # Check that all phis have the proper number of inputs.
-            for phi in phis:
+        # Check that all phis have the proper number of inputs.
+        for variable in variables:
+            for phi in variable.phis:
                 assert len(phi.inputs) == len(
                     cfg_info.cfg.predecessors(cfg_info.get_node(phi.block))
                 )
 
-            # Remove unused instructions:
-            new_instructions = [initial_value] + phis
-            while True:
-                change = False
-                for i in new_instructions:
-                    if not i.is_used:
-                        i.remove_from_block()
-                        new_instructions.remove(i)
-                        change = True
-                if not change:
-                    break
-
-        # Each store instruction can be removed.
-        for store in stores:
-            store.remove_from_block()
-
-        # Remove all load instructions:
-        for load in loads:
-            assert not load.is_used, str(load.used_by) + str(load)
-            load.remove_from_block()
-
-        # Finally the addr instruction can be deleted:
-        assert not addr.is_used
-        addr.remove_from_block()
-
-        # Remove alloc from block:
-        assert not alloc.is_used
-        alloc.remove_from_block()
+        # Remove unused instructions:
+        candidates = set(new_values)
+        worklist = [v for v in new_values if not v.is_used]
+        while worklist:
+            value = worklist.pop()
+            if value.block is None or value.is_used:
+                continue
+            inputs = list(value.uses)
+            value.remove_from_block()
+            worklist.extend(
+                i for i in inputs if i in candidates and not i.is_used
+            )
+
+        for variable in variables:
+            # Each store instruction can be removed.
+            for store in variable.stores:
+                store.remove_from_block()
+
+            # Remove all load instructions:
+            for load in variable.loads:
+                assert not load.is_used, str(load.used_by) + str(load)
+                load.remove_from_block()
+
+            # Finally the addr instruction can be deleted:
+            assert not variable.addr.is_used
+            variable.addr.remove_from_block()
+
+            # Remove alloc from block:
+            assert not variable.alloc.is_used
+            variable.alloc.remove_from_block()
 
     def on_function(self, function):
-        cfg_info = CfgInfo(function)
-        for block in function.blocks:
-            allocs = [i for i in block if isinstance(i, ir.Alloc)]
-            for alloc in allocs:
-                if is_alloc_promotable(alloc):
-                    self.promote(alloc, cfg_info)
+        variables = [
+            PromotedVariable(instruction)
+            for block in function
+            for instruction in block
+            if isinstance(instruction, ir.Alloc)
+            and is_alloc_promotable(instruction)
+        ]
+        if variables:
+            cfg_info = CfgInfo(function)
+            self.promote(variables, cfg_info)
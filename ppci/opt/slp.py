@@ -0,0 +1,423 @@
+""" Superword level parallelism (SLP) vectorizer.
+
+Straight line code often applies the same operations to neighbouring
+memory locations, for example in manually unrolled loops, or when
+working on the elements of small arrays and structs. This pass packs
+such isomorphic scalar instructions into vector instructions, as
+described by Larsen and Amarasinghe.
+
+Packing starts at groups of stores to consecutive addresses within a
+basic block. The stored values are followed upwards while they are of
+the same kind in every lane: binary operations with the same operator,
+and loads from consecutive addresses. Each group of scalar instructions
+is replaced by a single vector instruction. The vector instructions are
+placed at the last store of the group, so the memory accesses of the
+group must be allowed to move there.
+
+Only vector operations supported by the target are created, so the
+pass must be given the names of the supported operations, such as
+``ADDI32X4``.
+"""
+
+import logging
+from collections import namedtuple, OrderedDict
+from .. import ir
+from .alias import AliasAnalysis, constant_value, type_size
+from .transform import BlockPass
+
+
+Location = namedtuple("Location", ["terms", "offset", "size", "base"])
+
+binop_names = {
+    "+": "ADD",
+    "-": "SUB",
+    "*": "MUL",
+    "/": "DIV",
+    "&": "AND",
+    "|": "OR",
+    "^": "XOR",
+}
+
+memory_instructions = (
+    ir.Load,
+    ir.Store,
+    ir.CopyBlob,
+    ir.FunctionCall,
+    ir.ProcedureCall,
+    ir.InlineAsm,
+)
+
+
+def vector_type(ty):
+    """ Get the vector type to hold values of the given scalar type.
+
+    Unsigned integers use the signed vector type of the same size, since
+    the supported operations do not depend on the signedness.
+    """
+    if isinstance(ty, (ir.IntegerTyp, ir.FloatingPointTyp)):
+        for vector_ty in ir.vector_types:
+            element_ty = vector_ty.element_ty
+            if (
+                element_ty.bits == ty.bits
+                and element_ty.is_integer == ty.is_integer
+            ):
+                return vector_ty
+
+
+def linear_address(address):
+    """ Split an address into a sum of scaled values and a constant.
+
+    Returns the terms as a frozenset of value and factor pairs, and the
+    constant offset. Sign extending casts are looked through, assuming
+    that signed integers do not overflow.
+    """
+    terms = {}
+    offset = 0
+    worklist = [(address, 1)]
+    while worklist:
+        value, factor = worklist.pop()
+        const = constant_value(value)
+        if const is not None:
+            offset += factor * const
+        elif isinstance(value, ir.Binop) and value.operation in "+-":
+            worklist.append((value.a, factor))
+            if value.operation == "+":
+                worklist.append((value.b, factor))
+            else:
+                worklist.append((value.b, -factor))
+        elif (
+            isinstance(value, ir.Binop)
+            and value.operation == "*"
+            and constant_value(value.b) is not None
+        ):
+            worklist.append((value.a, factor * constant_value(value.b)))
+        elif (
+            isinstance(value, ir.Binop)
+            and value.operation == "*"
+            and constant_value(value.a) is not None
+        ):
+            worklist.append((value.b, factor * constant_value(value.a)))
+        elif isinstance(value, ir.Cast) and (
+            value.src.ty is ir.ptr
+            or (
+                value.src.ty.is_signed
+                and (value.ty is ir.ptr or value.ty.bits >= value.src.ty.bits)
+            )
+        ):
+            worklist.append((value.src, factor))
+        else:
+            if isinstance(value, ir.AddressOf):
+                value = value.src
+            terms[value] = terms.get(value, 0) + factor
+    terms = frozenset(
+        (value, factor) for value, factor in terms.items() if factor != 0
+    )
+    return terms, offset
+
+
+class Pack:
+    """ A group of isomorphic scalar instructions, one for each lane """
+
+    def __init__(self, instructions, operands=()):
+        self.instructions = instructions
+        self.operands = operands
+
+    def __iter__(self):
+        """ Iterate over this pack and all packs it uses """
+        yield self
+        for operand in self.operands:
+            for pack in operand:
+                yield pack
+
+
+class SlpVectorizerPass(BlockPass):
+    """ Pack isomorphic scalar instructions into vector instructions.
+
+    Args:
+        operations: The names of the supported vector operations, such as
+            LDRF32X4 or ADDI32X4.
+    """
+
+    logger = logging.getLogger("slp")
+
+    def __init__(self, operations):
+        super().__init__()
+        self.operations = set(operations)
+        self.alias_analysis = None
+        self._locations = {}
+        self._packs = {}
+
+    def on_function(self, function):
+        self.alias_analysis = AliasAnalysis()
+        self._locations = {}
+        super().on_function(function)
+
+    def on_block(self, block):
+        for stores in self.find_store_groups(block):
+            self.vectorize(block, stores)
+
+    def supports(self, operation, vector_ty):
+        return "{}{}".format(operation, vector_ty).upper() in self.operations
+
+    def location(self, instruction):
+        """ Get the accessed memory location of a load or store """
+        if instruction not in self._locations:
+            if isinstance(instruction, ir.Load):
+                size = type_size(instruction.ty)
+            else:
+                size = type_size(instruction.value.ty)
+            terms, offset = linear_address(instruction.address)
+
+            # The identified object, if any, which is accessed:
+            bases = [
+                value
+                for value, factor in terms
+                if factor == 1
+                and isinstance(value, (ir.Alloc, ir.GlobalValue))
+            ]
+            base = bases[0] if len(bases) == 1 else None
+            self._locations[instruction] = Location(
+                terms, offset, size, base
+            )
+        return self._locations[instruction]
+
+    def may_alias(self, instruction1, instruction2):
+        """ Test if two memory accesses can access the same memory """
+        loc1 = self.location(instruction1)
+        loc2 = self.location(instruction2)
+        if loc1.terms == loc2.terms:
+            if loc1.size is None or loc2.size is None:
+                return True
+            return (
+                loc1.offset < loc2.offset + loc2.size
+                and loc2.offset < loc1.offset + loc1.size
+            )
+
+        if loc1.base is not None and loc1.base is not loc2.base:
+            if loc2.base is not None or self.alias_analysis.is_local(
+                loc1.base
+            ):
+                return False
+        if loc2.base is not None and loc1.base is None:
+            if self.alias_analysis.is_local(loc2.base):
+                return False
+        return True
+
+    def is_consecutive(self, accesses, size):
+        """ Test if the memory accesses are adjacent, in lane order """
+        first = self.location(accesses[0])
+        for lane, access in enumerate(accesses):
+            location = self.location(access)
+            if (
+                location.terms != first.terms
+                or location.offset != first.offset + lane * size
+            ):
+                return False
+        return True
+
+    def find_store_groups(self, block):
+        """ Find groups of stores to consecutive memory locations """
+        candidates = OrderedDict()
+        for instruction in block:
+            if not isinstance(instruction, ir.Store) or instruction.volatile:
+                continue
+            vector_ty = vector_type(instruction.value.ty)
+            if vector_ty is None or not self.supports("STR", vector_ty):
+                continue
+            location = self.location(instruction)
+            key = (location.terms, instruction.value.ty)
+            candidates.setdefault(key, []).append(instruction)
+
+        groups = []
+        for stores in candidates.values():
+            vector_ty = vector_type(stores[0].value.ty)
+            size = vector_ty.element_ty.size
+            by_offset = {}
+            for store in stores:
+                offset = self.location(store).offset
+                by_offset.setdefault(offset, []).append(store)
+
+            # Take consecutive runs, each offset stored to only once:
+            used = set()
+            for offset in sorted(by_offset):
+                offsets = [
+                    offset + lane * size for lane in range(vector_ty.lanes)
+                ]
+                if any(
+                    o in used or len(by_offset.get(o, ())) != 1
+                    for o in offsets
+                ):
+                    continue
+                used.update(offsets)
+                groups.append([by_offset[o][0] for o in offsets])
+        return groups
+
+    def build_pack(self, values, block):
+        """ Try to pack the given values, one for each lane.
+
+        The same values may be used more than once, but a value can be
+        part of a single pack only.
+        """
+        key = tuple(values)
+        if key in self._packs:
+            return self._packs[key]
+        pack = self._build_pack(values, block)
+        if pack is not None:
+            if any(
+                value in pack_values
+                for pack_values in self._packs
+                for value in values
+            ):
+                return
+            self._packs[key] = pack
+        return pack
+
+    def _build_pack(self, values, block):
+        if len(set(values)) != len(values):
+            return
+        if not all(
+            isinstance(value, ir.Instruction) and value.block is block
+            for value in values
+        ):
+            return
+        first = values[0]
+        vector_ty = vector_type(first.ty)
+        if vector_ty is None or any(
+            value.ty is not first.ty for value in values
+        ):
+            return
+
+        if all(isinstance(value, ir.Load) for value in values):
+            if any(value.volatile for value in values):
+                return
+            if not self.supports("LDR", vector_ty):
+                return
+            if not self.is_consecutive(values, vector_ty.element_ty.size):
+                return
+            return Pack(values)
+        elif all(isinstance(value, ir.Binop) for value in values):
+            operation = first.operation
+            if any(value.operation != operation for value in values):
+                return
+            if operation not in binop_names:
+                return
+            if not self.supports(binop_names[operation], vector_ty):
+                return
+            a = self.build_pack([value.a for value in values], block)
+            if a is None:
+                return
+            b = self.build_pack([value.b for value in values], block)
+            if b is None:
+                return
+            return Pack(values, (a, b))
+
+    def can_move_accesses(self, block, stores, packs):
+        """ Check if the packed memory accesses can move to the last store.
+
+        In the vector code, all loads are done before the stores of the
+        group. A packed access must not be moved across other accesses to
+        the same memory, or across calls.
+        """
+        instructions = list(block)
+        index = {ins: i for i, ins in enumerate(instructions)}
+        last = max(index[store] for store in stores)
+        members = set(stores)
+        accesses = list(stores)
+        for pack in packs:
+            members.update(pack.instructions)
+            if isinstance(pack.instructions[0], ir.Load):
+                accesses.extend(pack.instructions)
+
+        for access in accesses:
+            for other in instructions[index[access] + 1 : last]:
+                if not isinstance(other, memory_instructions):
+                    continue
+                if isinstance(other, (ir.Load, ir.Store)):
+                    if other in members and not (
+                        isinstance(access, ir.Store)
+                        and isinstance(other, ir.Load)
+                    ):
+                        continue
+                    if isinstance(access, ir.Load) and isinstance(
+                        other, ir.Load
+                    ):
+                        continue
+                    if not self.may_alias(access, other):
+                        continue
+                return False
+        return True
+
+    def vectorize(self, block, stores):
+        """ Try to replace the group of stores by a vector store """
+        self._packs = {}
+        tree = self.build_pack([store.value for store in stores], block)
+        if tree is None:
+            return
+        packs = []
+        for pack in tree:
+            if pack not in packs:
+                packs.append(pack)
+
+        # Scalar instructions which are only used within the packs can be
+        # removed, the others remain:
+        removable = set(stores)
+        for pack in packs:
+            for instruction in pack.instructions:
+                if all(user in removable for user in instruction.used_by):
+                    removable.add(instruction)
+        if len(removable) <= len(packs) + 1:
+            return
+
+        if not self.can_move_accesses(block, stores, packs):
+            return
+
+        # Create the vector code in front of the last store:
+        last_store = max(stores, key=lambda store: store.position)
+        vector_value = self.emit(tree, block, last_store, {})
+        vector_store = ir.Store(vector_value, stores[0].address)
+        block.insert_instruction(vector_store, before_instruction=last_store)
+        self.logger.debug(
+            "Packed %s stores into %s", len(stores), vector_value.ty
+        )
+
+        # Remove the scalar code, users before the values they use:
+        operands = []
+        scalars = list(stores)
+        for pack in packs:
+            scalars.extend(pack.instructions)
+        for instruction in scalars:
+            if instruction in removable:
+                operands.extend(instruction.uses)
+                instruction.remove_from_block()
+        self.remove_unused(operands)
+
+    def emit(self, pack, block, before, emitted):
+        """ Create the vector instruction for a pack and its operands """
+        if pack in emitted:
+            return emitted[pack]
+        first = pack.instructions[0]
+        vector_ty = vector_type(first.ty)
+        name = "{}_{}".format(first.name, vector_ty)
+        if isinstance(first, ir.Load):
+            instruction = ir.Load(first.address, name, vector_ty)
+        else:
+            a = self.emit(pack.operands[0], block, before, emitted)
+            b = self.emit(pack.operands[1], block, before, emitted)
+            instruction = ir.Binop(a, first.operation, b, name, vector_ty)
+        block.insert_instruction(instruction, before_instruction=before)
+        emitted[pack] = instruction
+        return instruction
+
+    @staticmethod
+    def remove_unused(values):
+        """ Remove address calculations which are no longer used """
+        worklist = list(values)
+        while worklist:
+            value = worklist.pop()
+            if (
+                isinstance(value, (ir.Binop, ir.Cast, ir.Const))
+                and value.block is not None
+                and not value.is_used
+            ):
+                worklist.extend(value.uses)
+                value.remove_from_block()
@@ -0,0 +1,159 @@
+""" Scalar replacement of aggregates.
+
+Stack allocated structs and arrays which are only accessed at constant
+offsets are split into one alloc per accessed field. Each of those
+allocs is then only accessed with loads and stores of a single type,
+so that :class:`ppci.opt.Mem2RegPromotor` can promote them to registers.
+"""
+
+from .transform import FunctionPass
+from .alias import constant_value
+from .. import ir
+
+# The largest pointer size of all targets. The size of a pointer is not
+# known at the ir level, so this is used to check for overlapping fields.
+MAX_POINTER_SIZE = 8
+
+
+def find_accesses(address, offset, accesses, derived):
+    """ Collect all loads and stores at constant offsets from address.
+
+    Returns False if the address is used in any other way.
+    """
+    for use in address.used_by:
+        if isinstance(use, ir.Load):
+            accesses.append((offset, use.ty, use))
+        elif isinstance(use, ir.Store):
+            if use.value is address:
+                return False
+            accesses.append((offset, use.value.ty, use))
+        elif isinstance(use, ir.Binop) and use.operation in "+-":
+            if use.a is address:
+                delta = constant_value(use.b)
+                if delta is not None and use.operation == "-":
+                    delta = -delta
+            elif use.operation == "+":
+                delta = constant_value(use.a)
+            else:
+                delta = None
+            if delta is None:
+                return False
+            derived.append(use)
+            if not find_accesses(use, offset + delta, accesses, derived):
+                return False
+        else:
+            return False
+    return True
+
+
+def split_fields(alloc: ir.Alloc):
+    """ Determine the fields into which an alloc can be split.
+
+    Returns a dictionary with the accesses per (offset, type) pair, or
+    None when the alloc cannot be split.
+    """
+    accesses = []
+    derived = []
+    for use in alloc.used_by:
+        if not isinstance(use, ir.AddressOf):
+            return None
+        if not find_accesses(use, 0, accesses, derived):
+            return None
+
+    if not accesses:
+        return None
+
+    fields = {}
+    for offset, ty, access in accesses:
+        if access.volatile:
+            return None
+        fields.setdefault(offset, (ty, []))
+        if fields[offset][0] is not ty:
+            return None
+        fields[offset][1].append(access)
+
+    # Fields must not overlap:
+    offsets = sorted(fields)
+    ends = offsets[1:] + [alloc.amount]
+    for offset, end in zip(offsets, ends):
+        ty = fields[offset][0]
+        if offset < 0 or offset >= alloc.amount:
+            return None
+        if isinstance(ty, ir.PointerTyp):
+            if end != alloc.amount and end - offset < MAX_POINTER_SIZE:
+                return None
+        elif not isinstance(ty, ir.BasicTyp) or offset + ty.size > end:
+            return None
+
+    # Splitting a single field at offset 0 has no use:
+    if offsets == [0] and len(alloc.used_by) == 1 and not derived:
+        return None
+
+    return fields
+
+
+class ScalarReplacementPass(FunctionPass):
+    """ Split allocs which are accessed at constant offsets into fields.
+
+    .. code::
+
+        blob<8:4> s = alloc 8 bytes aligned at 4
+        ptr s_addr = &s
+        ptr y_addr = s_addr + 4
+        store a, s_addr
+        store b, y_addr
+
+    transforms into:
+
+    .. code::
+
+        blob<4:4> s_0 = alloc 4 bytes aligned at 4
+        ptr s_0_addr = &s_0
+        blob<4:4> s_4 = alloc 4 bytes aligned at 4
+        ptr s_4_addr = &s_4
+        store a, s_0_addr
+        store b, s_4_addr
+
+    """
+
+    def on_function(self, function):
+        count = 0
+        for block in function:
+            for alloc in [i for i in block if isinstance(i, ir.Alloc)]:
+                fields = split_fields(alloc)
+                if fields is not None:
+                    self.split(alloc, fields)
+                    count += 1
+        if count:
+            self.logger.debug("Split %s allocs in %s", count, function.name)
+
+    def split(self, alloc, fields):
+        """ Replace alloc by one alloc per field """
+        block = alloc.block
+        offsets = sorted(fields)
+        ends = offsets[1:] + [alloc.amount]
+        for offset, end in zip(offsets, ends):
+            ty, accesses = fields[offset]
+            size = ty.size if isinstance(ty, ir.BasicTyp) else end - offset
+            alignment = alloc.alignment
+            while offset % alignment:
+                alignment //= 2
+            name = "{}_{}".format(alloc.name, offset)
+            field = ir.Alloc(name, size, alignment)
+            block.insert_instruction(field, before_instruction=alloc)
+            address = ir.AddressOf(field, name + "_addr")
+            block.insert_instruction(address, before_instruction=alloc)
+            for access in accesses:
+                access.address = address
+
+        # Remove the now unused address computations and the alloc:
+        worklist = list(alloc.used_by)
+        removed = []
+        while worklist:
+            instruction = worklist.pop()
+            worklist.extend(instruction.used_by)
+            removed.append(instruction)
+        for instruction in reversed(removed):
+            assert not instruction.is_used
+            instruction.remove_from_block()
+        alloc.remove_from_block()
@@ -236,6 +236,11 @@ class Mod:
         """ Get the memory address of a symbol """
         return self._obj.get_symbol(name).value
 
+    def get_symbol_address(self, name):
+        """ Get the absolute memory address of a symbol """
+        symbol = self._obj.get_symbol(name)
+        return self._obj.get_symbol_id_value(symbol.id)
+
 
 def load_code_as_module(source_file, reporter=None):
     """ Load c3 code as a module """
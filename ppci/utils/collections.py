@@ -14,34 +14,47 @@ from collections import OrderedDict
 
 
 class OrderedSet(MutableSet):
-    """ Set which retains order of elements """
+    """ Set which retains order of elements.
+
+    Most sets are small, for example the users of a value. Small sets keep
+    their elements in a list, larger sets use the keys of a dictionary,
+    which retains the insertion order as well.
+    """
+
+    __slots__ = ("_items",)
+
+    # Sets with more elements than this are converted to a dictionary:
+    max_list_size = 8
 
     def __init__(self, iterable=None):
-        end = []
-        end += [None, end, end]
-        self._end = end
-        self._map = {}  # key -> [key, prev, next]
+        self._items = []
         if iterable is not None:
             self |= iterable
 
     def __len__(self):
-        return len(self._map)
+        return len(self._items)
 
     def __contains__(self, key):
-        return key in self._map
+        return key in self._items
 
     def add(self, value):
-        if value not in self._map:
-            end = self._end
-            curr = end[1]
-            curr[2] = end[1] = self._map[value] = [value, curr, end]
+        items = self._items
+        if value not in items:
+            if isinstance(items, list):
+                if len(items) < self.max_list_size:
+                    items.append(value)
+                    return
+                items = self._items = dict.fromkeys(items)
+            items[value] = None
 
     def discard(self, value):
         """ Remove element from set """
-        if value in self._map:
-            value, prev_item, next_item = self._map.pop(value)
-            prev_item[2] = next_item
-            next_item[1] = prev_item
+        items = self._items
+        if isinstance(items, list):
+            if value in items:
+                items.remove(value)
+        else:
+            items.pop(value, None)
 
     def __getitem__(self, index):
         """ O(n) implementation for lookups """
@@ -50,18 +63,10 @@ class OrderedSet(MutableSet):
                 return key
 
     def __iter__(self):
-        end = self._end
-        curr = end[2]
-        while curr is not end:
-            yield curr[0]
-            curr = curr[2]
+        return iter(self._items)
 
     def __reversed__(self):
-        end = self._end
-        curr = end[2]
-        while curr is not end:
-            yield curr[0]
-            curr = curr[1]
+        return reversed(list(self._items))
 
     def __repr__(self):
         return "%s(%r)" % (self.__class__.__name__, list(self))
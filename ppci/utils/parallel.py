@@ -0,0 +1,62 @@
+""" Run independent jobs in a pool of worker processes.
+
+Compiling a translation unit is CPU bound, and python code runs on a
+single core. Independent jobs, such as the compilation of several source
+files, can be run in separate processes instead.
+
+The results are returned in the order of the jobs, and not in the order
+in which the jobs complete. This keeps the output of a build the same,
+no matter how many jobs run in parallel.
+
+Example:
+
+.. doctest::
+
+    >>> from ppci.utils.parallel import run_jobs
+    >>> run_jobs(pow, [(2, 3), (3, 2)], jobs=2)
+    [8, 9]
+
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger("parallel")
+
+
+def job_count(jobs):
+    """ Determine the number of processes, 0 means one per cpu """
+    if not jobs:
+        jobs = os.cpu_count() or 1
+    return jobs
+
+
+def run_jobs(function, arguments, jobs=1, initializer=None, initargs=()):
+    """ Call a function for each tuple of arguments.
+
+    The function and its arguments must be picklable when more than one
+    job runs at the same time. Exceptions raised by a job are raised again.
+
+    Args:
+        function: a module level function.
+        arguments: a list with a tuple of arguments for each call.
+        jobs: the number of processes to use, 0 means one per cpu.
+        initializer: a module level function which is called with initargs
+            in each worker process, before it runs any job. It is not
+            called when the jobs run in the current process.
+
+    Returns:
+        The results of the calls, in the order of the arguments.
+    """
+    arguments = list(arguments)
+    jobs = min(job_count(jobs), len(arguments))
+    if jobs <= 1:
+        return [function(*args) for args in arguments]
+
+    logger.debug("Running %s jobs in %s processes", len(arguments), jobs)
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=initializer, initargs=initargs
+    ) as executor:
+        futures = [executor.submit(function, *args) for args in arguments]
+        return [future.result() for future in futures]
@@ -0,0 +1,119 @@
+""" A process wide cache of source files.
+
+Source lines are needed to print diagnostics, and as comments in the
+generated assembly when compiling with debug information. Instead of
+reading a source file again for each source location, the text of the
+file is read once and kept in a cache. The cache is keyed by the filename
+and the modification time of the file, so a changed file is read again.
+Only a limited number of files is kept, the least recently used file is
+evicted first. The cache only holds files; sources which are not read from
+a file, such as sources given to a diagnostics manager, are kept by their
+owner.
+
+Example:
+
+.. doctest::
+
+    >>> from ppci.utils.sourcecache import SourceText
+    >>> source = SourceText('main.c', 'int a;\\nint b;\\n')
+    >>> source.get_line(2)
+    'int b;'
+
+"""
+
+from collections import OrderedDict
+import os
+
+
+class SourceText:
+    """ The text of a source file, with the offsets of its lines """
+
+    __slots__ = ["name", "text", "_line_starts"]
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self._line_starts = None
+
+    def __repr__(self):
+        return "<SourceText {}>".format(self.name)
+
+    @property
+    def line_starts(self):
+        """ The offsets at which the lines start """
+        if self._line_starts is None:
+            starts = [0]
+            position = self.text.find("\n")
+            while position >= 0:
+                starts.append(position + 1)
+                position = self.text.find("\n", position + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def get_line(self, row):
+        """ Get a single line, rows start at 1 """
+        starts = self.line_starts
+        start = starts[row - 1]
+        if row < len(starts):
+            return self.text[start : starts[row] - 1]
+        else:
+            return self.text[start:]
+
+    def lines(self):
+        """ Get all lines of the text """
+        return self.text.splitlines()
+
+
+class SourceCache:
+    """ A least recently used cache of source files """
+
+    def __init__(self, max_files=32):
+        self.max_files = max_files
+        self._files = OrderedDict()
+        self.reads = 0
+
+    def get(self, filename):
+        """ Get the source text of a file, or None if it cannot be read """
+        source, mtime = self._files.get(filename, (None, None))
+
+        try:
+            new_mtime = os.stat(filename).st_mtime_ns
+        except (OSError, TypeError, ValueError):
+            return None
+
+        if source is None or mtime != new_mtime:
+            try:
+                with open(filename, "r") as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError):
+                return None
+            self.reads += 1
+            source = SourceText(filename, text)
+            self._store(filename, source, new_mtime)
+        else:
+            self._files.move_to_end(filename)
+        return source
+
+    def get_line(self, filename, row):
+        """ Get a line of a source file, or None if it cannot be read """
+        source = self.get(filename)
+        if source is None:
+            return None
+        return source.get_line(row)
+
+    def _store(self, name, source, mtime):
+        self._files[name] = (source, mtime)
+        self._files.move_to_end(name)
+        while len(self._files) > self.max_files:
+            self._files.popitem(last=False)
+
+    def clear(self):
+        """ Forget all sources """
+        self._files.clear()
+
+    def __len__(self):
+        return len(self._files)
+
+
+# The cache used by source locations and the diagnostics manager:
+source_cache = SourceCache()
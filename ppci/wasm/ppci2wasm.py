@@ -22,6 +22,7 @@ from . import components
 from ..codegen.irdag import SelectionGraphBuilder, prepare_function_info
 from ..codegen.irdag import FunctionInfo
 from ..codegen.dagsplit import DagSplitter
+from ..codegen.switch import SwitchLowering
 from ..binutils import debuginfo
 from .arch import WasmArchitecture
 from .arch import I32Register, I64Register, F32Register, F64Register
@@ -247,6 +248,10 @@ class IrToWasmCompiler:
         self.stack = 0
         self.logger.debug("Generating wasm for %s", ir_function)
 
+        # Structured control flow has no multiway branches, so turn
+        # jump tables into conditional jumps:
+        SwitchLowering(use_tables=False).run(ir_function)
+
         # Generate function code:
         # Create a selection graph, so that we have expression trees
         arch = WasmArchitecture()
@@ -1481,33 +1481,21 @@ class WasmToIrCompiler:
 
     def gen_br_table_instruction(self, instruction):
         """ Generate code for br_table instruction.
-        This is a sort of switch case.
-
-        This is called a jump table. Implement for now by chain of
-        if else.
+        This is a sort of switch case, which maps onto an ir jump table.
         """
-
-        # TODO: when ir supports jump table, use it!
         test_value = self.pop_value()
         assert test_value.ty in [ir.i32, ir.i64]
-        ir_typ = test_value.ty
         option_labels = instruction.args[0]
         default_label = option_labels.pop(-1)
+        table = []
         for i, option_label in enumerate(option_labels):
             # Figure which block we must jump to:
-            depth = option_label
-            target_block = self.get_jump_target_block(depth)
-            ja_block = target_block
-            nein_block = self.new_block()
-            c = self.emit(ir.Const(i, "label", ir_typ))
-            self.emit(ir.CJump(test_value, "==", c, ja_block, nein_block))
-            self.builder.set_block(nein_block)
+            target_block = self.get_jump_target_block(option_label)
+            table.append((i, target_block))
 
         # Determine default block:
-        depth = default_label
-        target_block = self.get_jump_target_block(depth)
-        default_block = target_block
-        self.emit(ir.Jump(default_block))
+        default_block = self.get_jump_target_block(default_label)
+        self.emit(ir.JumpTable(test_value, table, default_block))
         self.builder.set_block(None)
 
     def get_jump_target_block(self, depth):
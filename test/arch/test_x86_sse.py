@@ -114,6 +114,24 @@ class Sse2TestCase(AsmTestCaseBase):
         self.feed('cvtss2sd xmm2, [rcx]')
         self.check('f30f5a33 f30f5a11')
 
+    def test_movdqu(self):
+        """ Test move unaligned packed integers """
+        self.feed('movdqu xmm4, [rax]')
+        self.feed('movdqu [rax, 16], xmm9')
+        self.check('f30f6f20 f3440f7f4810')
+
+    def test_packed_integer(self):
+        """ Test arithmatic on packed integers """
+        self.feed('paddd xmm1, xmm10')
+        self.feed('pmullw xmm3, [rcx]')
+        self.check('66410ffeca 660fd519')
+
+    def test_packed_float(self):
+        """ Test arithmatic on packed floating point values """
+        self.feed('addps xmm0, xmm1')
+        self.feed('mulpd xmm2, xmm3')
+        self.check('0f58c1 660f59d3')
+
 
 if __name__ == '__main__':
     unittest.main()
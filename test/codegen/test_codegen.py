@@ -2,14 +2,18 @@
 
 import unittest
 import io
+from unittest.mock import MagicMock
 from ppci import ir
 from ppci.irutils import Builder, Writer
 from ppci.codegen.dagsplit import DagSplitter
 from ppci.codegen.irdag import SelectionGraphBuilder
 from ppci.codegen.irdag import FunctionInfo, prepare_function_info
+from ppci.codegen.switch import SwitchLowering
+from ppci.codegen.layout import BlockLayout
+from ppci.irutils import verify_module
 from ppci.arch.example import ExampleArch
 from ppci.binutils.debuginfo import DebugDb
-from ppci.api import get_arch
+from ppci.api import get_arch, optimize, ir_to_assembly
 
 
 def print_module(m):
@@ -189,5 +193,245 @@ class IrDagTestCase(unittest.TestCase):
         # self.assertTrue(sg_value.vreg)
 
 
+class MemoryLoweringTestCase(unittest.TestCase):
+    """ Test the inline lowering of small memory copies and clears """
+    def make_function(self, emit):
+        """ Create a procedure with two local arrays and the given code """
+        module = ir.Module('memory')
+        builder = Builder()
+        builder.set_module(module)
+        function = builder.new_procedure('f', ir.Binding.GLOBAL)
+        builder.set_function(function)
+        entry = builder.new_block()
+        function.entry = entry
+        builder.set_block(entry)
+        a = builder.emit(ir.Alloc('a', 200, 4))
+        b = builder.emit(ir.Alloc('b', 200, 4))
+        emit(module, builder, a, b)
+        builder.emit(ir.Exit())
+        verify_module(module)
+        return function
+
+    def operations(self, function, arch='arm'):
+        """ Get the names of the selection graph nodes of a function """
+        target = get_arch(arch)
+        frame = target.new_frame('a', function)
+        function_info = FunctionInfo(frame)
+        prepare_function_info(target, function_info, function)
+        dag_builder = SelectionGraphBuilder(target)
+        sgraph = dag_builder.build(function, function_info, DebugDb())
+        return [str(node.name) for node in sgraph.nodes]
+
+    def test_copy_blob(self):
+        def emit(module, builder, a, b):
+            builder.emit(ir.CopyBlob(a, b, 11, 4))
+        operations = self.operations(self.make_function(emit))
+        self.assertEqual(
+            ['LDRI32', 'LDRI32', 'LDRI16', 'LDRI8'],
+            [o for o in operations if o.startswith('LDR')])
+        self.assertEqual(
+            ['STRI32', 'STRI32', 'STRI16', 'STRI8'],
+            [o for o in operations if o.startswith('STR')])
+        self.assertNotIn('MOVB', operations)
+
+    def test_unaligned(self):
+        """ Unaligned copies use smaller parts, unless allowed """
+        def emit(module, builder, a, b):
+            c = builder.emit(ir.Alloc('c', 12, 1))
+            builder.emit(ir.CopyBlob(c, b, 12))
+        function = self.make_function(emit)
+        self.assertIn('MOVB', self.operations(function))
+        self.assertEqual(
+            ['LDRI64', 'LDRI32'],
+            [o for o in self.operations(function, 'x86_64')
+             if o.startswith('LDR')])
+
+    def test_large_copy(self):
+        def emit(module, builder, a, b):
+            builder.emit(ir.CopyBlob(a, b, 200, 4))
+        self.assertIn('MOVB', self.operations(self.make_function(emit)))
+
+    def test_memset(self):
+        def emit(module, builder, a, b):
+            memset = ir.ExternalProcedure('memset', [ir.ptr, ir.i32, ir.i32])
+            module.add_external(memset)
+            value = builder.emit_const(1, ir.i32)
+            size = builder.emit_const(6, ir.i32)
+            address = builder.emit(ir.AddressOf(a, 'address'))
+            builder.emit(ir.ProcedureCall(memset, [address, value, size]))
+        operations = self.operations(self.make_function(emit))
+        self.assertNotIn('CALL', operations)
+        self.assertEqual(
+            ['STRI32', 'STRI16'],
+            [o for o in operations if o.startswith('STR')])
+
+    def test_memcpy_call(self):
+        """ Without a memcpy action, large copies call memcpy """
+        def emit(module, builder, a, b):
+            builder.emit(ir.CopyBlob(a, b, 200, 4))
+        operations = self.operations(self.make_function(emit), 'msp430')
+        self.assertNotIn('MOVB', operations)
+        self.assertIn('CALL', operations)
+
+
+class SwitchLoweringTestCase(unittest.TestCase):
+    """ Test the lowering of jump tables """
+    def make_switch(self, values):
+        """ Create a function which switches over the given values """
+        module = ir.Module('switch')
+        builder = Builder()
+        builder.set_module(module)
+        function = builder.new_function('f', ir.Binding.GLOBAL, ir.i32)
+        builder.set_function(function)
+        entry = builder.new_block()
+        function.entry = entry
+        parameter = ir.Parameter('x', ir.i32)
+        function.add_parameter(parameter)
+        blocks = [builder.new_block() for _ in values]
+        default = builder.new_block()
+        builder.set_block(entry)
+        builder.emit(
+            ir.JumpTable(parameter, list(zip(values, blocks)), default))
+        for number, block in enumerate(blocks + [default]):
+            builder.set_block(block)
+            builder.emit_return(builder.emit_const(number, ir.i32))
+        return module, function
+
+    def jump_tables(self, function):
+        return [
+            i for i in function.get_instructions()
+            if isinstance(i, ir.JumpTable)
+        ]
+
+    def test_dense(self):
+        module, function = self.make_switch([3, 4, 5, 7, 8])
+        SwitchLowering(use_tables=True).run(function)
+        verify_module(module)
+        jump_tables = self.jump_tables(function)
+        self.assertEqual(1, len(jump_tables))
+        self.assertIs(ir.ptr, jump_tables[0].v.ty)
+        self.assertEqual(
+            list(range(6)), [value for value, _ in jump_tables[0].table])
+
+    def test_sparse(self):
+        module, function = self.make_switch([-100, 5, 1000, 7000, 12345])
+        SwitchLowering(use_tables=True).run(function)
+        verify_module(module)
+        self.assertFalse(self.jump_tables(function))
+        cjumps = [
+            i for i in function.get_instructions()
+            if isinstance(i, ir.CJump)
+        ]
+        self.assertEqual('<', cjumps[0].cond)
+
+    def test_no_tables(self):
+        module, function = self.make_switch([1, 2, 3, 4, 5])
+        SwitchLowering(use_tables=False).run(function)
+        verify_module(module)
+        self.assertFalse(self.jump_tables(function))
+
+    def test_indexed_branch(self):
+        """ Targets with an IJMP pattern branch through a jump table """
+        for march, branch in [
+                ('x86_64', 'jmp rax'), ('arm', 'bx R'), ('riscv', 'jalr x0')]:
+            module, _ = self.make_switch([1, 2, 3, 4, 5])
+            text = ir_to_assembly([module], march)
+            self.assertIn('f_jump_table_0:', text)
+            self.assertIn(branch, text)
+
+
+class BlockLayoutTestCase(unittest.TestCase):
+    """ Test the placement of basic blocks """
+    def make_function(self):
+        """ Create a function with an early return and a loop:
+
+        entry: if x == 0 goto error else header
+        header: i = phi(0, i + 1); if i < x goto body else done
+        body: goto header
+        done: return i
+        error: return 0
+        """
+        module = ir.Module('layout')
+        builder = Builder()
+        builder.set_module(module)
+        function = builder.new_function('f', ir.Binding.GLOBAL, ir.i32)
+        builder.set_function(function)
+        parameter = ir.Parameter('x', ir.i32)
+        function.add_parameter(parameter)
+        entry = builder.new_block()
+        function.entry = entry
+        error = builder.new_block()
+        done = builder.new_block()
+        body = builder.new_block()
+        header = builder.new_block()
+
+        builder.set_block(entry)
+        zero = builder.emit_const(0, ir.i32)
+        builder.emit(ir.CJump(parameter, '==', zero, error, header))
+        builder.set_block(header)
+        phi = builder.emit(ir.Phi('i', ir.i32))
+        builder.emit(ir.CJump(phi, '<', parameter, body, done))
+        builder.set_block(body)
+        one = builder.emit_const(1, ir.i32)
+        increment = builder.emit_add(phi, one, ir.i32)
+        builder.emit_jump(header)
+        phi.set_incoming(entry, zero)
+        phi.set_incoming(body, increment)
+        builder.set_block(done)
+        builder.emit_return(phi)
+        builder.set_block(error)
+        builder.emit_return(zero)
+        verify_module(module)
+        self.blocks = [entry, error, done, body, header]
+        return module, function
+
+    def test_heuristics(self):
+        module, function = self.make_function()
+        before, after = BlockLayout().run(function)
+        verify_module(module)
+        self.assertLess(after, before)
+        entry, error, done, body, header = self.blocks
+
+        # The loop is rotated, and the error path is moved to the end:
+        self.assertEqual([entry, body, header, done, error], function.blocks)
+
+    def test_profile(self):
+        """ The error path is hot according to the profile """
+        module, function = self.make_function()
+        entry, error, done, body, header = self.blocks
+        counts = {entry: 10, error: 9, header: 1, body: 0, done: 1}
+        for block, count in counts.items():
+            block.execution_count = count
+        entry.edge_counts = {error: 9, header: 1}
+        header.edge_counts = {body: 0, done: 1}
+        BlockLayout().run(function)
+        verify_module(module)
+        self.assertEqual(
+            [entry, error, header, done, body], function.blocks)
+
+        # The entry branch is inverted, so that the error path falls through:
+        cjump = entry.last_instruction
+        self.assertEqual('!=', cjump.cond)
+        self.assertIs(error, cjump.lab_no)
+
+    def test_optimization_levels(self):
+        """ Blocks are only placed when optimizing for speed """
+        for level in (0, 's'):
+            module, function = self.make_function()
+            optimize(module, level=level)
+            self.assertEqual(self.blocks, function.blocks)
+        module, function = self.make_function()
+        optimize(module, level=2)
+        self.assertIs(self.blocks[1], function.blocks[-1])
+
+    def test_report(self):
+        """ The reduction of taken branches is reported """
+        module, _ = self.make_function()
+        reporter = MagicMock()
+        optimize(module, level=2, reporter=reporter)
+        messages = [c[0][0] for c in reporter.message.call_args_list]
+        self.assertIn("Block layout: taken branches 8.4 -> 7.4", messages)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,5 +1,7 @@
+import io
 import unittest
 from unittest.mock import MagicMock
+from ppci import api
 from ppci.codegen.registerallocator import GraphColoringRegisterAllocator
 from ppci.api import get_arch
 from ppci.arch.arch import Frame
@@ -151,5 +153,48 @@ class GraphColoringRegisterAllocatorTestCase(unittest.TestCase):
         # self.register_allocator.coalesc()
 
 
+class SpillTestCase(unittest.TestCase):
+    """ Test spilling on a real target """
+    def test_byte_values_across_calls(self):
+        """ Many byte values live across calls exhaust the byte registers.
+
+        This used to spill the temporaries introduced by spilling over
+        and over again.
+        """
+        source = io.StringIO("""
+        void putc(char c);
+        void itoa(int v, char *buffer, int base);
+        int printf(const char* txt, ...) {
+          int* args;
+          __builtin_va_start(args);
+          char buffer[20];
+          while (*txt != 0) {
+            if (*txt == '%') {
+              txt++;
+              if (*txt == 'd') {
+                txt++;
+                itoa(__builtin_va_arg(args, int), buffer, 10);
+                printf(buffer);
+              } else if (*txt == 'c') {
+                txt++;
+                putc(__builtin_va_arg(args, char));
+              } else {
+                txt--;
+                putc(*txt);
+                txt++;
+                putc(*txt);
+              }
+            } else {
+              putc(*txt);
+              txt++;
+            }
+          }
+        }
+        """)
+        ir_module = api.c_to_ir(source, 'x86_64')
+        api.optimize(ir_module, level=2)
+        api.ir_to_assembly([ir_module], 'x86_64')
+
+
 if __name__ == '__main__':
     unittest.main()
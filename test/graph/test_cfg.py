@@ -0,0 +1,93 @@
+""" Test the control flow graph queries """
+
+import unittest
+from ppci.graph.cfg import ControlFlowGraph, ControlFlowNode
+from ppci.graph.algorithm.fixed_point_dominator import (
+    calculate_post_dominators,
+)
+
+
+class ControlFlowGraphTestCase(unittest.TestCase):
+    """ Test post dominators and reachability """
+
+    def setUp(self):
+        """ Create a graph with a loop, a diamond and an endless loop:
+
+        entry -> a -> b -> c -> exit
+        b -> a
+        entry -> d -> e -> exit
+        d -> f -> e
+        d -> g -> g
+        """
+        self.cfg = ControlFlowGraph()
+        self.nodes = {}
+        for name in ("entry", "a", "b", "c", "d", "e", "f", "g", "exit"):
+            self.nodes[name] = ControlFlowNode(self.cfg, name=name)
+        self.cfg.entry_node = self.nodes["entry"]
+        self.cfg.exit_node = self.nodes["exit"]
+        edges = [
+            ("entry", "a"),
+            ("a", "b"),
+            ("b", "c"),
+            ("c", "exit"),
+            ("b", "a"),
+            ("entry", "d"),
+            ("d", "e"),
+            ("e", "exit"),
+            ("d", "f"),
+            ("f", "e"),
+            ("d", "g"),
+            ("g", "g"),
+        ]
+        for src, dst in edges:
+            self.nodes[src].add_edge(self.nodes[dst])
+
+    def test_immediate_post_dominators(self):
+        n = self.nodes
+        ipdom = self.cfg.get_immediate_post_dominator
+        self.assertIs(n["exit"], ipdom(n["entry"]))
+        self.assertIs(n["b"], ipdom(n["a"]))
+        self.assertIs(n["c"], ipdom(n["b"]))
+        self.assertIs(n["e"], ipdom(n["f"]))
+        self.assertIsNone(ipdom(n["exit"]))
+        self.assertIsNone(ipdom(n["g"]))
+
+    def test_post_dominates(self):
+        """ Compare against the fixed point post dominator sets """
+        n = self.nodes
+        reaching = [node for name, node in n.items() if name != "g"]
+        pdom = calculate_post_dominators(list(n.values()), n["exit"])
+        for one in reaching:
+            for other in reaching:
+                self.assertEqual(
+                    one in pdom[other], self.cfg.post_dominates(one, other)
+                )
+        self.assertTrue(n["g"].post_dominates(n["g"]))
+        self.assertFalse(n["exit"].post_dominates(n["g"]))
+
+    def test_reach(self):
+        n = self.nodes
+        self.assertTrue(self.cfg.can_reach(n["a"], n["a"]))
+        self.assertTrue(self.cfg.can_reach(n["b"], n["exit"]))
+        self.assertFalse(self.cfg.can_reach(n["c"], n["c"]))
+        self.assertFalse(self.cfg.can_reach(n["exit"], n["entry"]))
+        self.assertTrue(self.cfg.can_reach(n["g"], n["g"]))
+        self.assertFalse(self.cfg.can_reach(n["g"], n["exit"]))
+        self.assertEqual(
+            {n["a"], n["b"], n["c"], n["exit"]},
+            set(self.cfg.reachable_nodes(n["a"])),
+        )
+        self.assertEqual({n["g"]}, n["g"].reached())
+        self.assertEqual(set(), n["exit"].reached())
+
+    def test_loops(self):
+        n = self.nodes
+        loops = self.cfg.calculate_loops()
+        self.assertEqual(
+            {(n["a"], (n["b"],)), (n["g"], ())},
+            {(loop.header, tuple(loop.rest)) for loop in loops},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
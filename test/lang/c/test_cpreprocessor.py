@@ -1,10 +1,14 @@
 import unittest
 import io
+import os
+import shutil
+import tempfile
 from unittest import mock
 from ppci.common import CompilerError
 from ppci.lang.c import CPreProcessor
 from ppci.lang.c import COptions
 from ppci.lang.c import CTokenPrinter
+from ppci.lang.c.preprocessor import prepare_for_parsing
 
 
 class CPreProcessorTestCase(unittest.TestCase):
@@ -519,6 +523,32 @@ class CPreProcessorTestCase(unittest.TestCase):
         X_w1024"""
         self.preprocess(src, expected)
 
+    def test_argument_expanded_once(self):
+        """ An argument used twice is macro expanded only once """
+        src = r"""#define TWICE(x) x x
+        TWICE(__COUNTER__) __COUNTER__"""
+        expected = """# 1 "dummy.t"
+
+        0 0 1"""
+        self.preprocess(src, expected)
+
+    def test_hidesets_are_interned(self):
+        """ Expanding the same macros twice gives the same hidesets """
+        src = r"""#define A(x) B(x)
+        #define B(x) x
+        A(1) A(2)"""
+        self.preprocess(src)
+        self.assertEqual(2, len(self.preprocessor.hidesets))
+
+    def test_shared_string_tokens(self):
+        """ Converting strings must not change the tokens of a macro """
+        src = r"""#define S "ab" "cd"
+        S; S"""
+        f = io.StringIO(src)
+        tokens = self.preprocessor.process_file(f, "dummy.t")
+        tokens = list(prepare_for_parsing(tokens, set()))
+        self.assertEqual(["abcd", ";", "abcd"], [t.val for t in tokens])
+
     def test_macro_arguments(self):
         """ Test the amount of comma's in macro arguments.
 
@@ -577,5 +607,65 @@ class CPreProcessorTestCase(unittest.TestCase):
         self.preprocess(src, expected)
 
 
+class IncludeGuardTestCase(unittest.TestCase):
+    """ Test that guarded headers are included only once """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.preprocessor = CPreProcessor(COptions())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def add_file(self, filename, src):
+        with open(os.path.join(self.directory, filename), "w") as f:
+            f.write(src)
+
+    def preprocess(self, src):
+        filename = os.path.join(self.directory, "main.c")
+        tokens = self.preprocessor.process_file(io.StringIO(src), filename)
+        f = io.StringIO()
+        CTokenPrinter().dump(list(tokens), file=f)
+        return f.getvalue()
+
+    def test_include_guard(self):
+        self.add_file("a.h", "#ifndef A_H\n#define A_H\nint a;\n#endif\n")
+        output = self.preprocess('#include "a.h"\n#include "a.h"\n')
+        self.assertEqual(1, output.count("int a;"))
+        self.assertEqual(1, self.preprocessor.skipped_includes)
+
+    def test_undefined_guard(self):
+        """ The file is included again when the guard is undefined """
+        self.add_file("a.h", "#ifndef A_H\n#define A_H\nint a;\n#endif\n")
+        output = self.preprocess(
+            '#include "a.h"\n#undef A_H\n#include "a.h"\n'
+        )
+        self.assertEqual(2, output.count("int a;"))
+        self.assertEqual(0, self.preprocessor.skipped_includes)
+
+    def test_code_after_guard(self):
+        """ Code outside of the #ifndef means there is no guard """
+        self.add_file(
+            "a.h", "#ifndef A_H\n#define A_H\nint a;\n#endif\nint b;\n"
+        )
+        output = self.preprocess('#include "a.h"\n#include "a.h"\n')
+        self.assertEqual(2, output.count("int b;"))
+        self.assertEqual(0, self.preprocessor.skipped_includes)
+
+    def test_guard_with_else(self):
+        self.add_file(
+            "a.h", "#ifndef A_H\n#define A_H\n#else\nint b;\n#endif\n"
+        )
+        output = self.preprocess('#include "a.h"\n#include "a.h"\n')
+        self.assertEqual(1, output.count("int b;"))
+        self.assertEqual(0, self.preprocessor.skipped_includes)
+
+    def test_pragma_once(self):
+        self.add_file("b.h", "#pragma once\nint b;\n")
+        output = self.preprocess('#include "b.h"\n#include "b.h"\n')
+        self.assertEqual(1, output.count("int b;"))
+        self.assertEqual(1, self.preprocessor.skipped_includes)
+
+
 if __name__ == "__main__":
     unittest.main()
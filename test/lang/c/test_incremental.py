@@ -0,0 +1,152 @@
+import io
+import unittest
+
+from ppci.api import get_arch
+from ppci.common import CompilerError
+from ppci.lang.c import COptions, CBuilder, CPreProcessor
+from ppci.lang.c import IncrementalCBuilder
+from ppci.lang.c.incremental import split_declarations
+from ppci.lang.c.preprocessor import prepare_for_parsing
+from ppci.irutils import Writer
+
+
+SOURCE = """
+struct point { int x; int y; };
+static int counter;
+
+static const char *name(int i)
+{
+    static const char *names[] = { "zero", "one" };
+    return names[i];
+}
+
+int area(struct point a, struct point b)
+{
+    struct point c = a;
+    counter++;
+    return (b.x - c.x) * (b.y - c.y);
+}
+
+int main(void)
+{
+    struct point p = { 1, 2 };
+    const char *s = name(1);
+    return area(p, p) + s[0];
+}
+"""
+
+
+class IncrementalCBuilderTestCase(unittest.TestCase):
+    """ Test the reuse of functions by the incremental C builder """
+
+    def setUp(self):
+        self.arch_info = get_arch("x86_64").info
+        self.builder = IncrementalCBuilder(self.arch_info, COptions())
+
+    def full_build(self, source):
+        builder = CBuilder(self.arch_info, COptions())
+        return self.to_text(builder.build(io.StringIO(source), "main.c"))
+
+    def build(self, source):
+        ir_module = self.builder.build(io.StringIO(source), "main.c")
+        return self.to_text(ir_module)
+
+    @staticmethod
+    def to_text(ir_module):
+        f = io.StringIO()
+        Writer(file=f).write(ir_module)
+        return f.getvalue()
+
+    def test_rebuild_unchanged(self):
+        self.assertEqual(self.full_build(SOURCE), self.build(SOURCE))
+        self.assertEqual((0, 3), (self.builder.reused, self.builder.compiled))
+        self.assertEqual(self.full_build(SOURCE), self.build(SOURCE))
+        self.assertEqual((3, 0), (self.builder.reused, self.builder.compiled))
+
+    def test_change_one_function(self):
+        """ Only the changed function is compiled again """
+        self.build(SOURCE)
+        source = SOURCE.replace('"one"', '"two"')
+        self.assertEqual(self.full_build(source), self.build(source))
+        self.assertEqual((2, 1), (self.builder.reused, self.builder.compiled))
+
+    def test_moved_function(self):
+        """ Functions moved to other lines keep their debug locations """
+        self.build(SOURCE)
+        source = SOURCE.replace("{ int x;", "{\n\n int x;")
+        ir_module = self.builder.build(io.StringIO(source), "main.c")
+        self.assertEqual(3, self.builder.reused)
+        builder = CBuilder(self.arch_info, COptions())
+        expected = builder.build(io.StringIO(source), "main.c")
+        self.assertEqual(self.rows(expected), self.rows(ir_module))
+        function = ir_module.get_function("main")
+        self.assertEqual(20, ir_module.debug_db.get(function).loc.row)
+
+    @staticmethod
+    def rows(ir_module):
+        debug_db = ir_module.debug_db
+        return [
+            debug_db.get(instruction).loc.row
+            for function in ir_module.functions
+            for block in function
+            for instruction in block
+            if debug_db.contains(instruction)
+        ]
+
+    def test_changed_declaration(self):
+        """ A change before a function invalidates the function """
+        self.build(SOURCE)
+        source = SOURCE.replace("int main", "int extra;\nint main")
+        self.assertEqual(self.full_build(source), self.build(source))
+        self.assertEqual((2, 1), (self.builder.reused, self.builder.compiled))
+        source = source.replace("int y;", "int y; int z;")
+        self.assertEqual(self.full_build(source), self.build(source))
+        self.assertEqual((0, 3), (self.builder.reused, self.builder.compiled))
+
+    def test_redefinition(self):
+        """ Errors are reported as in a full build """
+        self.build(SOURCE)
+        source = SOURCE + "int main(void) { return 2; }\n"
+        with self.assertRaises(CompilerError):
+            self.build(source)
+
+
+class SplitDeclarationsTestCase(unittest.TestCase):
+    def tokenize(self, source):
+        preprocessor = CPreProcessor(COptions())
+        tokens = preprocessor.process_file(io.StringIO(source), "a.c")
+        return list(prepare_for_parsing(tokens, ()))
+
+    def split(self, source):
+        tokens = self.tokenize(source)
+        return [
+            (tokens[begin].val, body is not None)
+            for begin, body, _ in split_declarations(tokens)
+        ]
+
+    def test_split(self):
+        source = """
+        int a[] = { 1, 2 };
+        struct __attribute__((packed)) s { int x; } b;
+        struct __attribute__((packed)) { int x; } c;
+        int (*f(void))(int) { return 0; }
+        void g(void) { }
+        """
+        self.assertEqual(
+            [
+                ("int", False),
+                ("struct", False),
+                ("struct", False),
+                ("int", True),
+                ("void", True),
+            ],
+            self.split(source),
+        )
+
+    def test_unbalanced(self):
+        tokens = self.tokenize("int f() {")
+        self.assertIsNone(split_declarations(tokens))
+
+
+if __name__ == "__main__":
+    unittest.main()
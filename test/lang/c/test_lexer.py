@@ -189,5 +189,68 @@ class CLexerTestCase(unittest.TestCase):
             self.assertEqual(src, tokens[0].val)
 
 
+class CharacterLexerTestCase(unittest.TestCase):
+    """ Check that the regular expression based lexer produces the same
+    tokens as the character based lexer.
+    """
+
+    def lex_both(self, src, coptions):
+        results = []
+        for method in ("lex", "lex_characters"):
+            lex_function = getattr(CLexer(coptions), method)
+            tokens = lex_function(io.StringIO(src), SourceFile("a.h"))
+            results.append(
+                [
+                    (
+                        t.typ,
+                        t.val,
+                        t.space,
+                        t.first,
+                        t.loc.filename,
+                        t.loc.row,
+                        t.loc.col,
+                    )
+                    for t in tokens
+                ]
+            )
+        return results
+
+    def test_same_tokens(self):
+        src = (
+            "\n \n#define A(x) \\\n  x ## 1 /* c\nd */ + L'\\0'\n"
+            "int\tx = 08 + 1e5 + .5e-3 + 0x1f.8p2 + 0b101u; // tail\n"
+            '??=if ??/\nA\n"a\\"b??/\n\\x41" \\ a <<= b >>= c ~= ...\f\n'
+            "  /* last */  "
+        )
+        for trigraphs in (True, False):
+            coptions = COptions()
+            if trigraphs:
+                coptions.enable("trigraphs")
+            fast_tokens, tokens = self.lex_both(src, coptions)
+            self.assertTrue(tokens)
+            self.assertEqual(tokens, fast_tokens)
+
+    def test_same_errors(self):
+        coptions = COptions()
+        coptions.set("std", "c89")
+        for src in ["a /* b", "'ab'", 'x "\\q"', "a // b", "L'a"]:
+            messages = []
+            for method in ("lex", "lex_characters"):
+                lex_function = getattr(CLexer(coptions), method)
+                with self.assertRaises(CompilerError) as cm:
+                    list(lex_function(io.StringIO(src), SourceFile("a.h")))
+                messages.append(cm.exception.msg)
+            self.assertEqual(messages[1], messages[0])
+
+    def test_line_directive(self):
+        """ The row of the source file can be changed while lexing """
+        source_file = SourceFile("a.h")
+        tokens = CLexer(COptions()).lex(io.StringIO("a\nb\nc\n"), source_file)
+        self.assertEqual(1, next(tokens).loc.row)
+        source_file.row = 10
+        self.assertEqual(11, next(tokens).loc.row)
+        self.assertEqual(12, next(tokens).loc.row)
+
+
 if __name__ == "__main__":
     unittest.main()
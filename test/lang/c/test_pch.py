@@ -0,0 +1,96 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from ppci.api import get_arch
+from ppci.common import CompilerError
+from ppci.lang.c import COptions, CContext, CBuilder
+from ppci.lang.c.pch import create_pch, load_pch
+from ppci.irutils import Writer
+
+
+HEADER = """
+#ifndef HEADER_H
+#define HEADER_H
+typedef struct point { int x; int y; } point_t;
+enum color { RED, GREEN = 5, BLUE };
+#define SQUARE(x) ((x) * (x))
+static int twice(int a) { return a * 2; }
+extern int counter;
+#endif
+"""
+
+SOURCE = """
+#include "header.h"
+int counter;
+int main(void)
+{
+    point_t p;
+    p.x = SQUARE(3);
+    p.y = BLUE;
+    counter++;
+    return twice(p.x) + p.y;
+}
+"""
+
+
+class PrecompiledHeaderTestCase(unittest.TestCase):
+    """ Test creating and using precompiled headers """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.header = os.path.join(self.directory, "header.h")
+        self.pch = os.path.join(self.directory, "header.pch")
+        with open(self.header, "w") as f:
+            f.write(HEADER)
+        self.arch = get_arch("arm")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def precompile(self, coptions):
+        context = CContext(coptions, self.arch.info)
+        with open(self.header, "r") as f, open(self.pch, "wb") as output:
+            create_pch(f, self.header, context, output)
+
+    def compile(self, source, coptions):
+        """ Compile the source into textual ir """
+        builder = CBuilder(self.arch.info, coptions)
+        filename = os.path.join(self.directory, "main.c")
+        ir_module = builder.build(io.StringIO(source), filename)
+        f = io.StringIO()
+        Writer(file=f).write(ir_module)
+        return f.getvalue()
+
+    def test_same_result(self):
+        """ Using the precompiled header gives the same code """
+        self.precompile(COptions())
+        expected = self.compile(SOURCE, COptions())
+        coptions = COptions()
+        coptions.set("include_pch", self.pch)
+        self.assertEqual(expected, self.compile(SOURCE, coptions))
+
+        # The include of the header is skipped, because of its guard:
+        source = SOURCE.replace('#include "header.h"', "")
+        self.assertEqual(expected, self.compile(source, coptions))
+
+    def test_changed_header(self):
+        self.precompile(COptions())
+        with open(self.header, "a") as f:
+            f.write("int extra;\n")
+        os.utime(self.header, (0, 0))
+        with self.assertRaisesRegex(CompilerError, "out of date"):
+            load_pch(self.pch, CContext(COptions(), self.arch.info))
+
+    def test_other_options(self):
+        self.precompile(COptions())
+        coptions = COptions()
+        coptions.add_define("DEBUG", "1")
+        with self.assertRaisesRegex(CompilerError, "other options"):
+            load_pch(self.pch, CContext(coptions, self.arch.info))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,11 +1,12 @@
 import unittest
 import logging
 import io
+import tempfile
 from ppci.lang.c3 import C3Builder, Lexer, Parser, AstPrinter, Context
 from ppci.lang.c3 import astnodes
 from ppci.arch.example import ExampleArch
 from ppci.common import DiagnosticsManager, CompilerError
-from ppci.irutils import verify_module
+from ppci.irutils import verify_module, Writer
 
 
 class LexerTestCase(unittest.TestCase):
@@ -1394,6 +1395,78 @@ class TypeTestCase(BuildTestCaseBase):
         self.expect_errors(snippet, [11])
 
 
+class IncludeTestCase(BuildTestCaseBase):
+    """ Test includes and their module interfaces """
+    lib = """
+    module lib;
+    type struct { int x, y; } point;
+    const int size = 2;
+    var point origin;
+    var int count;
+    public function int area(int w, int h)
+    {
+        var int a;
+        a = w * h;
+        return a * size;
+    }
+    function int hidden() { return 1; }
+    """
+
+    main = """
+    module main;
+    import lib;
+    function int f()
+    {
+        lib.count = 2;
+        return lib.area(lib.count, 3);
+    }
+    """
+
+    def build_main(self, lib, interfaces=None):
+        builder = C3Builder(self.diag, ExampleArch().info, interfaces)
+        _, ir_module = builder.build(
+            [io.StringIO(self.main)], [io.StringIO(lib)])
+        f = io.StringIO()
+        Writer(file=f).write(ir_module)
+        return builder, f.getvalue()
+
+    def test_include_is_compiled(self):
+        """ Without interfaces, the code of the includes is generated """
+        _, text = self.build_main(self.lib)
+        self.assertNotIn("external", text)
+        self.assertIn("function i32 lib_hidden()", text)
+
+    def test_include_is_external(self):
+        """ With interfaces, includes only provide declarations """
+        with tempfile.TemporaryDirectory() as interfaces:
+            _, text = self.build_main(self.lib, interfaces)
+        self.assertIn("external variable lib_count", text)
+        self.assertIn("external function i32 lib_area(i32, i32)", text)
+        self.assertNotIn("hidden", text)
+
+    def test_interface(self):
+        """ Stored interfaces are used instead of parsing the include """
+        with tempfile.TemporaryDirectory() as interfaces:
+            builder, expected = self.build_main(self.lib, interfaces)
+            self.assertEqual(0, builder.interfaces.hits)
+            builder, text = self.build_main(self.lib, interfaces)
+            self.assertEqual(expected, text)
+            self.assertEqual(1, builder.interfaces.hits)
+
+            # A changed include is parsed again:
+            lib = self.lib.replace("int x, y;", "int y, x;")
+            builder, _ = self.build_main(lib, interfaces)
+            self.assertEqual(0, builder.interfaces.hits)
+
+    def test_private_function(self):
+        """ Private functions are not part of the interface """
+        self.main = self.main.replace("lib.area", "lib.hidden")
+        with tempfile.TemporaryDirectory() as interfaces:
+            for _ in range(2):
+                with self.assertRaises(CompilerError):
+                    self.build_main(self.lib, interfaces)
+
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO)
     unittest.main()
@@ -0,0 +1,39 @@
+#include <stdio.h>
+
+int dense(int x)
+{
+    switch (x)
+    {
+        case 1: return 10;
+        case 2: return 20;
+        case 3: return 30;
+        case 4: return 40;
+        case 6: return 60;
+        case 7: return 70;
+        default: return -1;
+    }
+}
+
+int sparse(int x)
+{
+    switch (x)
+    {
+        case -100: return 1;
+        case 5: return 2;
+        case 1000: return 3;
+        case 7000: return 4;
+        case 12345: return 5;
+        case 9: return 6;
+        default: return 7;
+    }
+}
+
+void main_main()
+{
+    int values[] = {-32767, -100, -1, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 1000, 7000, 12345, 32767};
+    int i;
+    for (i = 0; i < 17; i++)
+    {
+        printf("%d %d %d\n", values[i], dense(values[i]), sparse(values[i]));
+    }
+}
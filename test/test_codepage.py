@@ -4,6 +4,8 @@ import io
 import ctypes
 from helper_util import make_filename
 from ppci.api import cc, get_current_arch, is_platform_supported
+from ppci.api import c_to_ir, ir_to_object
+from ppci.irutils import add_edge_counters
 from ppci.utils.codepage import load_code_as_module
 from ppci.utils.codepage import load_obj
 from ppci.utils.reporting import HtmlReportGenerator
@@ -105,6 +107,91 @@ class CodePageTestCase(unittest.TestCase):
         y = m.x(a, b, 3)
         self.assertEqual(40, y)
 
+    def test_vectorized(self):
+        """ Test code with packed vector operations """
+        source = io.StringIO("""
+        float a[4], b[4], c[4];
+        void init(int v) {
+          int i;
+          for (i = 0; i < 4; i++) {
+            a[i] = v + i;
+            b[i] = 2;
+          }
+        }
+        void kernel(void) {
+          c[0] = a[0] * b[0] + a[0];
+          c[1] = a[1] * b[1] + a[1];
+          c[2] = a[2] * b[2] + a[2];
+          c[3] = a[3] * b[3] + a[3];
+        }
+        int get(int i) {
+          return c[i];
+        }
+        """)
+        arch = get_current_arch()
+        obj = cc(source, arch, opt_level=2, debug=True)
+        m = load_obj(obj)
+        m.init(1)
+        m.kernel()
+        self.assertEqual([3, 6, 9, 12], [m.get(i) for i in range(4)])
+
+    def test_struct_copy(self):
+        """ Test inline copies and clears of small structs """
+        source = io.StringIO("""
+        void *memset(void *dst, int value, int n);
+        struct s { int x; short y; char z[3]; };
+        struct s a, b;
+        void init(void) {
+          memset(&a, 5, sizeof(a));
+          b.x = 7; b.y = 8;
+          b.z[0] = 1; b.z[1] = 2; b.z[2] = 3;
+        }
+        void copy(void) {
+          a = b;
+        }
+        int get(int i) {
+          char *p = (char*)&a;
+          return p[i];
+        }
+        """)
+        arch = get_current_arch()
+        obj = cc(source, arch, debug=True)
+        m = load_obj(obj)
+        m.init()
+        self.assertEqual(5, m.get(0))
+        self.assertEqual(5, m.get(10))
+        m.copy()
+        self.assertEqual(7, m.get(0))
+        self.assertEqual(8, m.get(8))
+        self.assertEqual(3, m.get(12))
+
+    def test_profile(self):
+        """ Test gathering of a profile from instrumented code """
+        source = io.StringIO("""
+        int count_odd(int n) {
+          int i, odd = 0;
+          for (i = 0; i < n; i++)
+            if (i % 2) odd++;
+          return odd;
+        }
+        """)
+        arch = get_current_arch()
+        ir_module = c_to_ir(source, arch)
+        profile = add_edge_counters(ir_module)
+        obj = ir_to_object([ir_module], arch, debug=True)
+        m = load_obj(obj)
+        self.assertEqual(5, m.count_odd(10))
+        profile.read_from_codepage(m)
+
+        # Apply the counts onto freshly generated ir-code:
+        source.seek(0)
+        ir_module = c_to_ir(source, arch)
+        profile.apply(ir_module)
+        counts = [b.execution_count for b in ir_module.functions[0]]
+        self.assertEqual(1, counts[0])
+        self.assertEqual(11, max(counts))
+        self.assertIn(5, counts)
+
 
 @unittest.skipUnless(has_numpy() and is_platform_supported(), 'skipping codepage')
 class NumpyCodePageTestCase(unittest.TestCase):
@@ -3,13 +3,14 @@
 import unittest
 import tempfile
 import io
+import logging
 import os
 from unittest.mock import patch
 
 from ppci.cli.asm import asm
 from ppci.cli.build import build
 from ppci.cli.c3c import c3c
-from ppci.cli.cc import cc
+from ppci.cli.cc import cc, setup_worker
 from ppci.cli.hexdump import hexdump
 from ppci.cli.java import java
 from ppci.cli.link import link
@@ -20,8 +21,10 @@ from ppci.cli.opt import opt
 from ppci.cli.pascal import pascal
 from ppci.cli.yacc import yacc
 from ppci import api
+from ppci.irutils import get_verify_level
 from ppci.common import DiagnosticsManager, SourceLocation
 from ppci.binutils.objectfile import ObjectFile, Section, Image
+from ppci.utils.parallel import run_jobs
 from helper_util import relpath, do_long_tests
 
 
@@ -44,6 +47,29 @@ class BuildTestCase(unittest.TestCase):
             '..', 'examples', 'lm3s6965evb', 'snake', 'build.xml')
         build(['-v', '--report', report_file, '-f', build_file])
 
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_build_ccompile_jobs(self, mock_stdout, mock_stderr):
+        """ Compile C sources in parallel with a build task """
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ('a', 'b', 'c'):
+                c_file = os.path.join(directory, name + '.c')
+                with open(c_file, 'w') as f:
+                    f.write('int {}(int x) {{ return x; }}\n'.format(name))
+            build_file = os.path.join(directory, 'build.xml')
+            with open(build_file, 'w') as f:
+                f.write(
+                    '<project name="p" default="t">\n'
+                    '<import name="ppci.build.buildtasks" />\n'
+                    '<target name="t">\n'
+                    '<ccompile arch="arm" sources="a.c;b.c;c.c" jobs="2"'
+                    ' output="abc.oj" />\n'
+                    '</target>\n'
+                    '</project>\n')
+            build(['-f', build_file])
+            obj = api.get_object(os.path.join(directory, 'abc.oj'))
+            self.assertTrue(all(obj.has_symbol(n) for n in 'abc'))
+
     @patch('sys.stdout', new_callable=io.StringIO)
     def test_help(self, mock_stdout):
         """ Test help function """
@@ -121,6 +147,155 @@ class CcTestCase(unittest.TestCase):
         oj_file = new_temp_file('.oj')
         cc(['-m', 'arm', '--ir', self.c_file, '-o', oj_file])
 
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_verify(self, mock_stdout, mock_stderr):
+        """ The verify level is only changed during the command """
+        oj_file = new_temp_file('.oj')
+        cc(['-m', 'arm', '--verify', 'cheap', self.c_file, '-o', oj_file])
+        self.assertEqual('full', get_verify_level())
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_profile(self, mock_stdout, mock_stderr):
+        """ Generate a profile, and use it again """
+        oj_file = new_temp_file('.oj')
+        profile_file = new_temp_file('.json')
+        cc([
+            '-m', 'arm', '--profile-generate', profile_file,
+            self.c_file, '-o', oj_file])
+        cc([
+            '-m', 'arm', '--profile-use', profile_file,
+            self.c_file, '-o', oj_file])
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_profile_same_basename(self, mock_stdout, mock_stderr):
+        """ Sources with the same name in other directories get their own
+        profile counters """
+        filenames = []
+        for _ in range(2):
+            folder = tempfile.mkdtemp()
+            filename = os.path.join(folder, 'util.c')
+            with open(filename, 'w') as f:
+                f.write('int f{}(int a) {{ return a ? 1 : 2; }}\n'.format(
+                    len(filenames)))
+            filenames.append(filename)
+        oj_file = new_temp_file('.oj')
+        profile_file = new_temp_file('.json')
+        cc(['-m', 'arm', '--profile-generate', profile_file] + filenames + [
+            '-o', oj_file])
+        with open(oj_file) as f:
+            obj = ObjectFile.load(f)
+        names = [s.name for s in obj.symbols if 'profile_counters' in s.name]
+        self.assertEqual(2, len(set(names)))
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_jobs(self, mock_stdout, mock_stderr):
+        """ Compiling in parallel gives the same object """
+        c_file2 = new_temp_file('.c')
+        with open(c_file2, 'w') as f:
+            f.write('int add(int a, int b) { return a + b; }\n')
+        outputs = []
+        for jobs in ('1', '2'):
+            oj_file = new_temp_file('.oj')
+            cc([
+                '-m', 'arm', '-O', '2', '-j', jobs,
+                self.c_file, c_file2, '-o', oj_file])
+            with open(oj_file) as f:
+                outputs.append(f.read())
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn('"add"', outputs[1])
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_jobs_report(self, mock_stderr, mock_stdout):
+        """ The workers cannot write into a report """
+        report_file = new_temp_file('.html')
+        with self.assertRaises(SystemExit) as cm:
+            cc([
+                '-m', 'arm', '-j', '2', '--html-report', report_file,
+                self.c_file, '-o', new_temp_file('.oj')])
+        self.assertEqual(2, cm.exception.code)
+        self.assertIn('--jobs', mock_stderr.getvalue())
+
+    def test_cc_command_jobs_verify_level(self):
+        """ Workers verify the ir like the main process """
+        results = run_jobs(
+            get_verify_level, [(), ()], jobs=2,
+            initializer=setup_worker, initargs=(logging.WARNING, 'cheap'))
+        self.assertEqual(['cheap', 'cheap'], results)
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_pch(self, mock_stdout, mock_stderr):
+        """ Precompile a header, and use it """
+        header_file = new_temp_file('.h')
+        with open(header_file, 'w') as f:
+            f.write('typedef int number;\n#define TWO 2\n')
+        c_file = new_temp_file('.c')
+        with open(c_file, 'w') as f:
+            f.write('number f(void) { return TWO; }\n')
+        pch_file = new_temp_file('.pch')
+        oj_file = new_temp_file('.oj')
+        cc(['-m', 'arm', '--emit-pch', header_file, '-o', pch_file])
+        cc(['-m', 'arm', '-include-pch', pch_file, c_file, '-o', oj_file])
+
+    def make_include_tree(self):
+        """ Create a source with a user header and a system header """
+        folder = os.path.dirname(new_temp_file('.c'))
+        sys_dir = os.path.join(folder, 'sys')
+        os.makedirs(sys_dir, exist_ok=True)
+        with open(os.path.join(sys_dir, 'sys_header.h'), 'w') as f:
+            f.write('#define S 1\n')
+        header_file = new_temp_file('.h')
+        with open(header_file, 'w') as f:
+            f.write('#include <sys_header.h>\n#define A S\n')
+        c_file = new_temp_file('.c')
+        with open(c_file, 'w') as f:
+            f.write('#include "{}"\nint a = A;\n'.format(
+                os.path.basename(header_file)))
+        return c_file, header_file, os.path.join(sys_dir, 'sys_header.h')
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_m(self, mock_stderr, mock_stdout):
+        """ Emit makefile rules instead of compiling """
+        c_file, header_file, sys_header = self.make_include_tree()
+        sys_dir = os.path.dirname(sys_header)
+        cc(['-m', 'arm', '-M', '-I', sys_dir, c_file])
+        rule = mock_stdout.getvalue()
+        object_name = os.path.splitext(os.path.basename(c_file))[0] + '.o'
+        self.assertTrue(rule.startswith(object_name + ': ' + c_file))
+        self.assertIn(header_file, rule)
+        self.assertIn(sys_header, rule)
+
+        dep_file = new_temp_file('.d')
+        cc(['-m', 'arm', '-MM', '-MF', dep_file, '-I', sys_dir, c_file])
+        with open(dep_file) as f:
+            rule = f.read()
+        self.assertIn(header_file, rule)
+        self.assertNotIn(sys_header, rule)
+
+    @patch('sys.stdout', new_callable=io.StringIO)
+    @patch('sys.stderr', new_callable=io.StringIO)
+    def test_cc_command_md(self, mock_stderr, mock_stdout):
+        """ Write the dependencies while compiling """
+        c_file, header_file, sys_header = self.make_include_tree()
+        sys_dir = os.path.dirname(sys_header)
+        for jobs in ('1', '2'):
+            oj_file = new_temp_file('.oj')
+            cc([
+                '-m', 'arm', '-MD', '-j', jobs, '-I', sys_dir,
+                c_file, self.c_file, '-o', oj_file])
+            with open(os.path.splitext(oj_file)[0] + '.d') as f:
+                rule = f.read()
+            self.assertTrue(rule.startswith(oj_file + ': ' + c_file))
+            self.assertIn(self.c_file, rule)
+            self.assertIn(header_file, rule)
+            self.assertIn(sys_header, rule)
+
     @patch('sys.stdout', new_callable=io.StringIO)
     def test_cc_command_help(self, mock_stdout):
         with self.assertRaises(SystemExit) as cm:
@@ -1,5 +1,6 @@
 import unittest
 import io
+import struct
 from ppci import ir
 from ppci import irutils
 from ppci.opt import ConstantFolder
@@ -32,6 +33,20 @@ class IrCodeTestCase(unittest.TestCase):
         self.assertEqual({c3, c4}, add.uses)
         self.assertEqual(c4, add.b)
 
+    def test_use_twice(self):
+        """ Check usage administration when a value is used twice """
+        c1 = ir.Const(1, "one", ir.i32)
+        c2 = ir.Const(2, "two", ir.i32)
+        add = ir.add(c1, c1, "add", ir.i32)
+        self.assertEqual(("a", "b"), ir.Binop.operand_names)
+        self.assertEqual([add], list(c1.used_by))
+        add.a = c2
+        self.assertEqual({c1, c2}, add.uses)
+        add.replace_use(c1, c2)
+        self.assertEqual({c2}, add.uses)
+        self.assertFalse(c1.is_used)
+        self.assertIs(c2, add.b)
+
 
 class IrBuilderTestCase(unittest.TestCase):
     def setUp(self):
@@ -55,6 +70,160 @@ class IrBuilderTestCase(unittest.TestCase):
         # self.assertEqual(3, r)
 
 
+class BlockTestCase(unittest.TestCase):
+    """ Test the instruction list of a block """
+
+    def setUp(self):
+        self.function = ir.Procedure("f", ir.Binding.GLOBAL)
+        self.block = ir.Block("b")
+        self.function.add_block(self.block)
+        self.c1 = ir.Const(1, "c1", ir.i32)
+        self.c2 = ir.Const(2, "c2", ir.i32)
+        self.c3 = ir.Const(3, "c3", ir.i32)
+        self.block.add_instruction(self.c1)
+        self.block.add_instruction(self.c3)
+
+    def test_insert(self):
+        self.block.insert_instruction(self.c2, before_instruction=self.c3)
+        self.assertEqual([self.c1, self.c2, self.c3], list(self.block))
+        self.assertEqual(3, len(self.block))
+        self.assertEqual(1, self.c2.position)
+        self.assertEqual(2, self.c3.position)
+        self.assertTrue(self.c2.comes_before(self.c3))
+        self.assertFalse(self.c3.comes_before(self.c1))
+        self.assertIs(self.c1, self.block.first_instruction)
+        self.assertIs(self.c3, self.block.last_instruction)
+        self.assertIs(self.c2, self.block[1])
+        self.assertIs(self.c3, self.block[-1])
+        self.assertEqual([self.c2, self.c3], self.block.instructions[1:])
+        self.assertIs(self.c1, self.c2.previous_instruction)
+        self.assertIs(self.c3, self.c2.next_instruction)
+
+    def test_remove_while_iterating(self):
+        for instruction in self.block:
+            self.block.remove_instruction(instruction)
+        self.assertTrue(self.block.is_empty)
+        self.assertIsNone(self.block.first_instruction)
+        self.assertNotIn(self.c1, self.block.instructions)
+
+    def test_move(self):
+        """ Adding an instruction to another block moves it """
+        block2 = ir.Block("b2")
+        self.function.add_block(block2)
+        block2.add_instruction(self.c1)
+        self.assertEqual([self.c3], list(self.block))
+        self.assertEqual(0, self.c3.position)
+        self.assertIs(block2, self.c1.block)
+        self.assertIn(self.c1, block2.instructions)
+
+    def test_phi_same_value_twice(self):
+        """ A value can enter a phi through several blocks """
+        block2 = ir.Block("b2")
+        block3 = ir.Block("b3")
+        phi = ir.Phi("p", ir.i32)
+        phi.set_incoming(block2, self.c1)
+        phi.set_incoming(block3, self.c1)
+        phi.del_incoming(block2)
+        self.assertIn(phi, self.c1.used_by)
+        phi.set_incoming(block3, self.c3)
+        self.assertNotIn(phi, self.c1.used_by)
+        self.assertIn(phi, self.c3.used_by)
+
+
+class VerifierTestCase(unittest.TestCase):
+    """ Test the verification levels """
+
+    def make_module(self):
+        """ Create a module where a value is used before its definition """
+        module = ir.Module("mod1")
+        function = ir.Procedure("func1", ir.Binding.GLOBAL)
+        module.add_function(function)
+        entry = ir.Block("entry")
+        function.add_block(entry)
+        function.entry = entry
+        one = ir.Const(1, "one", ir.i32)
+        entry.add_instruction(ir.add(one, one, "two", ir.i32))
+        entry.add_instruction(one)
+        entry.add_instruction(ir.Exit())
+        return module
+
+    def test_levels(self):
+        module = self.make_module()
+        with self.assertRaises(AssertionError):
+            irutils.verify_module(module)
+        irutils.verify_module(module, level="cheap")
+        irutils.verify_module(module, level="off")
+
+    def test_default_level(self):
+        module = self.make_module()
+        previous = irutils.set_verify_level("off")
+        try:
+            irutils.verify_module(module)
+        finally:
+            irutils.set_verify_level(previous)
+        self.assertEqual("full", irutils.get_verify_level())
+        with self.assertRaises(ValueError):
+            irutils.set_verify_level("paranoid")
+
+
+class ProfileTestCase(unittest.TestCase):
+    """ Test edge counter instrumentation and profiles """
+
+    def make_module(self):
+        """ Create a function with a conditional branch """
+        module = ir.Module("mod1")
+        function = ir.Procedure("func1", ir.Binding.GLOBAL)
+        module.add_function(function)
+        entry = ir.Block("entry")
+        yes = ir.Block("yes")
+        no = ir.Block("no")
+        for block in (entry, yes, no):
+            function.add_block(block)
+        function.entry = entry
+        one = ir.Const(1, "one", ir.i32)
+        entry.add_instruction(one)
+        entry.add_instruction(ir.CJump(one, "==", one, yes, no))
+        yes.add_instruction(ir.Exit())
+        no.add_instruction(ir.Exit())
+        return module
+
+    def test_instrument(self):
+        module = self.make_module()
+        profile = irutils.add_edge_counters(module)
+        irutils.verify_module(module)
+        keys, counts, size = profile.counters["__profile_counters"]
+        self.assertEqual(
+            [
+                ("func1", "entry", None),
+                ("func1", "entry", "yes"),
+                ("func1", "entry", "no"),
+                ("func1", "yes", None),
+                ("func1", "no", None),
+            ],
+            keys,
+        )
+        self.assertEqual([0] * 5, counts)
+        self.assertEqual(8, size)
+        self.assertEqual(8 * 5, module.variables[0].amount)
+
+    def test_save_load_apply(self):
+        profile = irutils.add_edge_counters(self.make_module())
+        profile.set_counts(
+            "__profile_counters", struct.pack("<5Q", 10, 7, 3, 7, 3)
+        )
+        f = io.StringIO()
+        profile.save(f)
+        f.seek(0)
+        profile = irutils.Profile.load(f)
+
+        module = self.make_module()
+        profile.apply(module)
+        entry, yes, no = module.functions[0].blocks
+        self.assertEqual(10, entry.execution_count)
+        self.assertEqual({yes: 7, no: 3}, entry.edge_counts)
+        self.assertEqual(3, no.execution_count)
+
+
 class ConstantFolderTestCase(unittest.TestCase):
     def setUp(self):
         self.b = irutils.Builder()
@@ -111,6 +280,63 @@ class TestWriter(unittest.TestCase):
         writer.write(module2)
         self.assertEqual(f3.getvalue(), f.getvalue())
 
+    def test_jump_table(self):
+        """ Check that a jump table survives text and json round trips """
+        module = ir.Module("mod1")
+        function = ir.Procedure("func1", ir.Binding.GLOBAL)
+        module.add_function(function)
+        entry = ir.Block("entry")
+        function.add_block(entry)
+        function.entry = entry
+        exit_block = ir.Block("exit_block")
+        function.add_block(exit_block)
+        exit_block.add_instruction(ir.Exit())
+        other = ir.Block("other")
+        function.add_block(other)
+        other.add_instruction(ir.Jump(exit_block))
+        x = ir.Const(2, "x", ir.i32)
+        entry.add_instruction(x)
+        table = [(-1, other), (2, exit_block), (7, other)]
+        entry.add_instruction(ir.JumpTable(x, table, exit_block))
+        self.assertEqual([other, exit_block], entry.successors)
+        f = io.StringIO()
+        irutils.Writer(file=f).write(module)
+        self.assertIn(
+            "jmp_table x [-1: other, 2: exit_block, 7: other]", f.getvalue()
+        )
+        module2 = irutils.Reader().read(io.StringIO(f.getvalue()))
+        f2 = io.StringIO()
+        irutils.Writer(file=f2).write(module2)
+        self.assertEqual(f.getvalue(), f2.getvalue())
+        module3 = irutils.from_json(irutils.to_json(module))
+        f3 = io.StringIO()
+        irutils.Writer(file=f3).write(module3)
+        self.assertEqual(f.getvalue(), f3.getvalue())
+
+    def test_json_memory_instructions(self):
+        """ Check that volatile accesses and blob copies survive json """
+        module = ir.Module("mod1")
+        function = ir.Procedure("func1", ir.Binding.GLOBAL)
+        module.add_function(function)
+        entry = ir.Block("entry")
+        function.add_block(entry)
+        function.entry = entry
+        a = ir.Parameter("a", ir.ptr)
+        function.add_parameter(a)
+        b = ir.Parameter("b", ir.ptr)
+        function.add_parameter(b)
+        x = ir.Load(a, "x", ir.i32, volatile=True)
+        entry.add_instruction(x)
+        entry.add_instruction(ir.Store(x, b, volatile=True))
+        entry.add_instruction(ir.CopyBlob(b, a, 8, 4))
+        entry.add_instruction(ir.Exit())
+        module2 = irutils.from_json(irutils.to_json(module))
+        load, store, copy, _ = module2.functions[0].entry
+        self.assertTrue(load.volatile)
+        self.assertTrue(store.volatile)
+        self.assertIsInstance(copy, ir.CopyBlob)
+        self.assertEqual((8, 4), (copy.amount, copy.alignment))
+
 
 class TestReader(unittest.TestCase):
     def test_add_example(self):
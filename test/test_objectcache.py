@@ -0,0 +1,121 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ppci.api import cc, c3c, wasmcompile, get_arch
+from ppci.binutils.objectfile import ObjectFile
+from ppci.build.objectcache import ObjectCache, make_key
+from ppci.lang.c import COptions
+from ppci.lang.c.preprocessor import CPreProcessor
+
+
+class ObjectCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ObjectCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_make_key(self):
+        self.assertEqual(make_key("a", 1), make_key("a", 1))
+        self.assertNotEqual(make_key("a", 1), make_key("a", 2))
+        self.assertNotEqual(make_key("ab", "c"), make_key("a", "bc"))
+
+    def test_get_put(self):
+        key = make_key("test")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, ObjectFile(get_arch("arm")))
+        obj = self.cache.get(key)
+        self.assertEqual("arm", obj.arch.name)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        self.assertIn("1 hits, 1 misses", self.cache.statistics())
+
+    def test_evict_least_recently_used(self):
+        keys = [make_key(i) for i in range(3)]
+        for mtime, key in enumerate(keys):
+            self.cache.put(key, ObjectFile(get_arch("arm")))
+            filename = self.cache._filename(key)
+            os.utime(filename, ns=(mtime, mtime))
+        size = self.cache.size()
+        self.assertEqual(3, len(self.cache.entries()))
+
+        # Use the oldest entry, so that the second one is evicted:
+        self.cache.get(keys[0])
+        self.cache.max_size = size - 1
+        self.cache.evict()
+        self.assertEqual(1, self.cache.evictions)
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+
+    def test_corrupt_entry(self):
+        """ A damaged object file is a miss, and is removed """
+        key = make_key("test")
+        self.cache.put(key, ObjectFile(get_arch("arm")))
+        with open(self.cache._filename(key), "w") as f:
+            f.write("{}")
+        self.assertIsNone(self.cache.get(key))
+        self.assertEqual(0, len(self.cache.entries()))
+
+    def test_running_size(self):
+        """ Storing an object does not scan the cache directory """
+        self.cache.put(make_key(0), ObjectFile(get_arch("arm")))
+        with patch.object(self.cache, "entries", side_effect=AssertionError):
+            for i in range(1, 3):
+                self.cache.put(make_key(i), ObjectFile(get_arch("arm")))
+            self.cache.put(make_key(0), ObjectFile(get_arch("arm")))
+        self.assertEqual(self.cache.size(), self.cache._size)
+
+    def test_cc(self):
+        src = "int add(int a, int b) { return a + b; }"
+        obj1 = cc(io.StringIO(src), "arm", cache=self.cache)
+        obj2 = cc(io.StringIO(src), "arm", cache=self.cache)
+        self.assertEqual(obj1, obj2)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+        # Other options give another object:
+        cc(io.StringIO(src), "arm", opt_level=2, cache=self.cache)
+        self.assertEqual(2, self.cache.misses)
+
+    def test_cc_preprocess_once(self):
+        """ A miss compiles the source which was preprocessed for the key """
+        src = "int add(int a, int b) { return a + b; }"
+        with patch.object(
+            CPreProcessor,
+            "process_file",
+            autospec=True,
+            side_effect=CPreProcessor.process_file,
+        ) as process_file:
+            cc(io.StringIO(src), "arm", cache=self.cache)
+        self.assertEqual(1, process_file.call_count)
+
+    def test_cc_header_change(self):
+        """ A changed header must give a cache miss """
+        header = os.path.join(self.directory.name, "a.h")
+        coptions = COptions()
+        coptions.add_include_path(self.directory.name)
+        src = "#include <a.h>\nint b = A;"
+        for value in (1, 2):
+            with open(header, "w") as f:
+                f.write("#define A {}\n".format(value))
+            cc(io.StringIO(src), "arm", coptions=coptions, cache=self.cache)
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+
+    def test_c3c(self):
+        src = "module main; var int a;"
+        c3c([io.StringIO(src)], [], "arm", cache=self.directory.name)
+        c3c([io.StringIO(src)], [], "arm", cache=self.cache)
+        self.assertEqual((1, 0), (self.cache.hits, self.cache.misses))
+
+    def test_wasmcompile(self):
+        src = "(module (func (export \"f\") (result i32) i32.const 1))"
+        for _ in range(2):
+            wasmcompile(src, "x86_64", cache=self.cache)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+
+if __name__ == "__main__":
+    unittest.main()
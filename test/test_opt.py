@@ -8,10 +8,19 @@ from ppci import ir
 from ppci import irutils
 from ppci.binutils.debuginfo import DebugDb
 from ppci.irutils import verify_module
+from ppci.api import optimize
 from ppci.opt import Mem2RegPromotor
 from ppci.opt import CleanPass
+from ppci.opt import ScalarReplacementPass
+from ppci.opt import SlpVectorizerPass
+from ppci.opt import AggressiveDeadCodeEliminationPass
+from ppci.opt import LoadStoreEliminationPass
+from ppci.opt.load_store_elimination import ScopedMemoryTable
+from ppci.opt.alias import AliasAnalysis, get_memory_location
 from ppci.opt.constantfolding import correct
 from ppci.opt.tailcall import TailCallOptimization
+from ppci.opt.interprocedural import DeadFunctionEliminationPass
+from ppci.opt.interprocedural import ConstantArgumentPropagationPass
 
 
 class OptTestCase(unittest.TestCase):
@@ -76,6 +85,111 @@ class CleanTestCase(OptTestCase):
         self.clean_pass.run(self.module)
         self.assertNotIn(block4, self.function)
 
+    def test_thread_over_constant_phi(self):
+        """ Jump directly to the target when a phi value is known """
+        block1 = self.builder.new_block()
+        block2 = self.builder.new_block()
+        block3 = self.builder.new_block()
+        block4 = self.builder.new_block()
+        block5 = self.builder.new_block()
+        param = ir.Parameter('x', ir.i32)
+        self.function.add_parameter(param)
+        zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        self.builder.emit(ir.CJump(param, '==', zero, block1, block2))
+        self.builder.set_block(block1)
+        one = self.builder.emit(ir.Const(1, 'one', ir.i32))
+        self.builder.emit(ir.Jump(block3))
+        self.builder.set_block(block2)
+        two = self.builder.emit(ir.Const(2, 'two', ir.i32))
+        self.builder.emit(ir.Jump(block3))
+        self.builder.set_block(block3)
+        phi = self.builder.emit(ir.Phi('phi', ir.i32))
+        phi.set_incoming(block1, one)
+        phi.set_incoming(block2, two)
+        limit = self.builder.emit(ir.Const(1, 'limit', ir.i32))
+        self.builder.emit(ir.CJump(phi, '==', limit, block4, block5))
+        self.builder.set_block(block4)
+        self.builder.emit(ir.Exit())
+        self.builder.set_block(block5)
+        self.builder.emit(ir.Exit())
+        verify_module(self.module)
+
+        self.clean_pass.run(self.module)
+        self.assertNotIn(block3, self.function)
+        cjumps = [
+            block for block in self.function
+            if isinstance(block.last_instruction, ir.CJump)]
+        self.assertEqual([self.function.entry], cjumps)
+
+    def test_thread_over_same_condition(self):
+        """ A branch on a condition which was already tested is skipped """
+        block1 = self.builder.new_block()
+        block2 = self.builder.new_block()
+        block3 = self.builder.new_block()
+        block4 = self.builder.new_block()
+        param = ir.Parameter('x', ir.i32)
+        self.function.add_parameter(param)
+        zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        self.builder.emit(ir.CJump(param, '<', zero, block1, block2))
+        self.builder.set_block(block1)
+        call = self.builder.emit(ir.ProcedureCall(
+            ir.ExternalProcedure('f', []), []))
+        self.builder.emit(ir.Jump(block2))
+        self.builder.set_block(block2)
+        self.builder.emit(ir.CJump(param, '>=', zero, block3, block4))
+        self.builder.set_block(block3)
+        self.builder.emit(ir.Exit())
+        self.builder.set_block(block4)
+        self.builder.emit(ir.Exit())
+        verify_module(self.module)
+
+        self.clean_pass.run(self.module)
+        self.assertIsInstance(call.block.last_instruction, ir.Exit)
+
+    def test_rotate_loop(self):
+        """ The loop test is copied in front of the loop """
+        header = self.builder.new_block()
+        body = self.builder.new_block()
+        epilog = self.builder.new_block()
+        param = ir.Parameter('n', ir.i32)
+        self.function.add_parameter(param)
+        zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        self.builder.emit(ir.Jump(header))
+        self.builder.set_block(header)
+        phi = self.builder.emit(ir.Phi('i', ir.i32))
+        self.builder.emit(ir.CJump(phi, '<', param, body, epilog))
+        self.builder.set_block(body)
+        one = self.builder.emit(ir.Const(1, 'one', ir.i32))
+        add = self.builder.emit(ir.add(phi, one, 'add', ir.i32))
+        self.builder.emit(ir.Jump(header))
+        phi.set_incoming(self.function.entry, zero)
+        phi.set_incoming(body, add)
+        self.builder.set_block(epilog)
+        self.builder.emit(ir.Exit())
+        verify_module(self.module)
+
+        self.clean_pass.run(self.module)
+        self.assertIsInstance(self.function.entry.last_instruction, ir.CJump)
+        self.assertIsInstance(body.last_instruction, ir.CJump)
+        self.assertEqual(1, len(body.phis))
+        self.assertIs(zero, body.phis[0].get_value(self.function.entry))
+
+    def test_no_tail_duplication(self):
+        """ Tail duplication can be switched off """
+        header = self.builder.new_block()
+        epilog = self.builder.new_block()
+        param = ir.Parameter('n', ir.i32)
+        self.function.add_parameter(param)
+        self.builder.emit(ir.Jump(header))
+        self.builder.set_block(header)
+        zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        self.builder.emit(ir.CJump(param, '<', zero, header, epilog))
+        self.builder.set_block(epilog)
+        self.builder.emit(ir.Exit())
+
+        CleanPass(tail_duplication=False).run(self.module)
+        self.assertIsInstance(self.function.entry.last_instruction, ir.Jump)
+
 
 class Mem2RegTestCase(OptTestCase):
     """ Test the memory to register lifter """
@@ -136,6 +250,443 @@ class Mem2RegTestCase(OptTestCase):
         self.mem2reg.run(self.module)
         self.assertIn(alloc, self.function.entry.instructions)
 
+    def test_promote_variables_in_loop(self):
+        """ Two variables updated in a loop are promoted at once """
+        loop = self.builder.new_block()
+        body = self.builder.new_block()
+        epilog = self.builder.new_block()
+        variables = []
+        for name in ('A', 'B'):
+            alloc = self.builder.emit(ir.Alloc(name, 4, 4))
+            addr = self.builder.emit(ir.AddressOf(alloc, 'addr'))
+            variables.append(addr)
+        zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        one = self.builder.emit(ir.Const(1, 'one', ir.i32))
+        for addr in variables:
+            self.builder.emit(ir.Store(zero, addr))
+        self.builder.emit(ir.Jump(loop))
+        self.builder.set_block(loop)
+        a = self.builder.emit(ir.Load(variables[0], 'a', ir.i32))
+        self.builder.emit(ir.CJump(a, '<', one, body, epilog))
+        self.builder.set_block(body)
+        b = self.builder.emit(ir.Load(variables[1], 'b', ir.i32))
+        self.builder.emit(ir.Store(self.builder.emit(a + one), variables[0]))
+        self.builder.emit(ir.Store(self.builder.emit(b + a), variables[1]))
+        self.builder.emit(ir.Jump(loop))
+        self.builder.set_block(epilog)
+        self.builder.emit(ir.Exit())
+        self.mem2reg.run(self.module)
+        instructions = [i for block in self.function for i in block]
+        self.assertFalse(
+            any(
+                isinstance(i, (ir.Alloc, ir.Load, ir.Store))
+                for i in instructions
+            )
+        )
+        self.assertEqual(2, len(loop.phis))
+        self.assertEqual(
+            {'phi_A_0', 'phi_B_0'}, {phi.name for phi in loop.phis}
+        )
+
+
+class AdceTestCase(OptTestCase):
+    """ Test aggressive dead code elimination """
+    def setUp(self):
+        super().setUp()
+        self.adce = AggressiveDeadCodeEliminationPass()
+
+    def test_dead_loop(self):
+        """ A loop computing an unused value is removed entirely """
+        header = self.builder.new_block()
+        body = self.builder.new_block()
+        epilog = self.builder.new_block()
+        zero = self.builder.emit(ir.Const(0, 'zero', ir.i32))
+        one = self.builder.emit(ir.Const(1, 'one', ir.i32))
+        ten = self.builder.emit(ir.Const(10, 'ten', ir.i32))
+        self.builder.emit(ir.Jump(header))
+        self.builder.set_block(header)
+        phi = self.builder.emit(ir.Phi('i', ir.i32))
+        self.builder.emit(ir.CJump(phi, '<', ten, body, epilog))
+        self.builder.set_block(body)
+        inc = self.builder.emit(ir.add(phi, one, 'inc', ir.i32))
+        self.builder.emit(ir.Jump(header))
+        phi.set_incoming(self.function.entry, zero)
+        phi.set_incoming(body, inc)
+        self.builder.set_block(epilog)
+        self.builder.emit(ir.Exit())
+        self.adce.run(self.module)
+        self.assertNotIn(header, self.function)
+        self.assertNotIn(body, self.function)
+        self.assertEqual(2, self.function.num_instructions())
+
+    def test_live_branch(self):
+        """ A branch guarding a store must be kept """
+        alloc = self.builder.emit(ir.Alloc('A', 4, 4))
+        addr = self.builder.emit(ir.AddressOf(alloc, 'addr'))
+        yes = self.builder.new_block()
+        epilog = self.builder.new_block()
+        one = self.builder.emit(ir.Const(1, 'one', ir.i32))
+        unused = self.builder.emit(ir.add(one, one, 'unused', ir.i32))
+        self.builder.emit(ir.CJump(one, '==', one, yes, epilog))
+        self.builder.set_block(yes)
+        self.builder.emit(ir.Store(one, addr))
+        self.builder.emit(ir.Jump(epilog))
+        self.builder.set_block(epilog)
+        self.builder.emit(ir.Exit())
+        self.adce.run(self.module)
+        self.assertIn(yes, self.function)
+        self.assertNotIn(unused, self.function.entry.instructions)
+
+    def test_infinite_loop(self):
+        """ Loops that never terminate must be kept """
+        loop = self.builder.new_block()
+        self.builder.emit(ir.Jump(loop))
+        self.builder.set_block(loop)
+        self.builder.emit(ir.Jump(loop))
+        self.adce.run(self.module)
+        self.assertIn(loop, self.function)
+
+
+class LoadStoreEliminationTestCase(OptTestCase):
+    """ Test forwarding of stores to loads and dead store removal """
+    def setUp(self):
+        super().setUp()
+        self.pass_ = LoadStoreEliminationPass()
+
+    def emit_alloc(self, name):
+        alloc = self.builder.emit(ir.Alloc(name, 8, 4))
+        return self.builder.emit(ir.AddressOf(alloc, name + '_addr'))
+
+    def test_forward_across_blocks(self):
+        """ Store in one block, load in the next, with an unrelated store
+        to another alloc in between """
+        x = self.emit_alloc('x')
+        y = self.emit_alloc('y')
+        cnst = self.builder.emit(ir.Const(1, 'cnst', ir.i32))
+        self.builder.emit(ir.Store(cnst, x))
+        block2 = self.builder.new_block()
+        self.builder.emit(ir.Jump(block2))
+        self.builder.set_block(block2)
+        self.builder.emit(ir.Store(cnst, y))
+        load = self.builder.emit(ir.Load(x, 'ld', ir.i32))
+        ext = (ir.ExternalProcedure('ext', [ir.i32]))
+        self.module.add_external(ext)
+        self.builder.emit(ir.ProcedureCall(ext, [load]))
+        self.builder.emit(ir.Exit())
+        self.pass_.run(self.module)
+        self.assertNotIn(load, block2.instructions)
+
+    def test_constant_offsets(self):
+        """ Stores at distinct offsets from the same base do not alias """
+        x = self.emit_alloc('x')
+        four = self.builder.emit(ir.Const(4, 'four', ir.ptr))
+        x4 = self.builder.emit(ir.add(x, four, 'x4', ir.ptr))
+        cnst = self.builder.emit(ir.Const(1, 'cnst', ir.i32))
+        cnst2 = self.builder.emit(ir.Const(2, 'cnst2', ir.i32))
+        self.builder.emit(ir.Store(cnst, x))
+        self.builder.emit(ir.Store(cnst2, x4))
+        load = self.builder.emit(ir.Load(x, 'ld', ir.i32))
+        self.builder.emit(ir.Store(load, x4))
+        self.builder.emit(ir.Exit())
+        self.pass_.run(self.module)
+        self.assertNotIn(load, self.function.entry.instructions)
+
+    def test_dead_store(self):
+        """ A store overwritten before being read is removed """
+        x = self.emit_alloc('x')
+        cnst = self.builder.emit(ir.Const(1, 'cnst', ir.i32))
+        cnst2 = self.builder.emit(ir.Const(2, 'cnst2', ir.i32))
+        store1 = self.builder.emit(ir.Store(cnst, x))
+        block2 = self.builder.new_block()
+        self.builder.emit(ir.Jump(block2))
+        self.builder.set_block(block2)
+        store2 = self.builder.emit(ir.Store(cnst2, x))
+        self.builder.emit(ir.Exit())
+        self.pass_.run(self.module)
+        self.assertNotIn(store1, self.function.entry.instructions)
+        self.assertIn(store2, block2.instructions)
+
+    def test_store_read_on_other_path(self):
+        """ Stores visible via another path must remain """
+        x = self.emit_alloc('x')
+        cnst = self.builder.emit(ir.Const(1, 'cnst', ir.i32))
+        store1 = self.builder.emit(ir.Store(cnst, x))
+        block2 = self.builder.new_block()
+        block3 = self.builder.new_block()
+        self.builder.emit(ir.CJump(cnst, '==', cnst, block2, block3))
+        self.builder.set_block(block2)
+        self.builder.emit(ir.Store(cnst, x))
+        self.builder.emit(ir.Exit())
+        self.builder.set_block(block3)
+        load = self.builder.emit(ir.Load(x, 'ld', ir.i32))
+        self.builder.emit(ir.Store(load, x))
+        self.builder.emit(ir.Exit())
+        self.pass_.run(self.module)
+        self.assertIn(store1, self.function.entry.instructions)
+
+    def test_call_clobbers_escaped_alloc(self):
+        """ A call may modify an alloc whose address escaped """
+        x = self.emit_alloc('x')
+        cnst = self.builder.emit(ir.Const(1, 'cnst', ir.i32))
+        self.builder.emit(ir.Store(cnst, x))
+        ext = (ir.ExternalProcedure('ext', [ir.ptr]))
+        self.module.add_external(ext)
+        self.builder.emit(ir.ProcedureCall(ext, [x]))
+        load = self.builder.emit(ir.Load(x, 'ld', ir.i32))
+        self.builder.emit(ir.Store(load, x))
+        self.builder.emit(ir.Exit())
+        self.pass_.run(self.module)
+        self.assertIn(load, self.function.entry.instructions)
+
+    def test_store_through_unknown_pointer(self):
+        """ A store through a pointer parameter may modify globals, but
+        not allocs whose address does not escape """
+        pointer = ir.Parameter('p', ir.ptr)
+        self.function.add_parameter(pointer)
+        variable = ir.Variable('g', ir.Binding.GLOBAL, 4, 4)
+        self.module.add_variable(variable)
+        x = self.emit_alloc('x')
+        cnst = self.builder.emit(ir.Const(1, 'cnst', ir.i32))
+        self.builder.emit(ir.Store(cnst, x))
+        self.builder.emit(ir.Store(cnst, variable))
+        self.builder.emit(ir.Store(cnst, pointer))
+        load_x = self.builder.emit(ir.Load(x, 'ld_x', ir.i32))
+        load_g = self.builder.emit(ir.Load(variable, 'ld_g', ir.i32))
+        self.builder.emit(ir.Store(load_x, pointer))
+        self.builder.emit(ir.Store(load_g, pointer))
+        self.builder.emit(ir.Exit())
+        self.pass_.run(self.module)
+        self.assertNotIn(load_x, self.function.entry.instructions)
+        self.assertIn(load_g, self.function.entry.instructions)
+
+    def test_table_forgets_killed_bases(self):
+        """ Bases without facts are removed from the memory table """
+        self.builder.emit(ir.Exit())
+        variable = ir.Variable('g', ir.Binding.GLOBAL, 4, 4)
+        location = get_memory_location(variable, 4)
+        table = ScopedMemoryTable(AliasAnalysis())
+        marker = table.mark()
+        table.add(location, ir.i32, variable)
+        table.kill_escaping()
+        self.assertEqual({}, table._facts)
+        self.assertEqual({}, table._escaped)
+        table.rollback(marker)
+        self.assertEqual({}, table._facts)
+
+
+class AliasAnalysisTestCase(unittest.TestCase):
+    """ Test the alias analysis """
+    def test_distinct_objects(self):
+        alloc1 = ir.Alloc('a', 4, 4)
+        alloc2 = ir.Alloc('b', 4, 4)
+        addr1 = ir.AddressOf(alloc1, 'a_addr')
+        addr2 = ir.AddressOf(alloc2, 'b_addr')
+        variable = ir.Variable('v', ir.Binding.LOCAL, 4, 4)
+        aa = AliasAnalysis()
+        loc1 = get_memory_location(addr1, 4)
+        loc2 = get_memory_location(addr2, 4)
+        loc3 = get_memory_location(variable, 4)
+        self.assertFalse(aa.may_alias(loc1, loc2))
+        self.assertFalse(aa.may_alias(loc1, loc3))
+        self.assertTrue(aa.may_alias(loc1, loc1))
+
+    def test_offsets(self):
+        alloc = ir.Alloc('a', 8, 4)
+        addr = ir.AddressOf(alloc, 'a_addr')
+        two = ir.Const(2, 'two', ir.ptr)
+        four = ir.Const(4, 'four', ir.ptr)
+        addr2 = ir.add(addr, two, 'a2', ir.ptr)
+        addr4 = ir.add(addr, four, 'a4', ir.ptr)
+        aa = AliasAnalysis()
+        loc0 = get_memory_location(addr, 4)
+        loc2 = get_memory_location(addr2, 4)
+        loc4 = get_memory_location(addr4, 4)
+        self.assertEqual(4, loc4.offset)
+        self.assertFalse(aa.may_alias(loc0, loc4))
+        self.assertTrue(aa.may_alias(loc0, loc2))
+        self.assertTrue(aa.may_alias(loc2, loc4))
+
+
+class InterproceduralTestCase(unittest.TestCase):
+    """ Test the module level optimization passes """
+    def setUp(self):
+        self.builder = irutils.Builder()
+        self.module = ir.Module('test')
+        self.builder.set_module(self.module)
+
+    def new_function(self, name, binding, arguments=()):
+        function = self.builder.new_function(name, binding, ir.i32)
+        for argument in arguments:
+            function.add_parameter(argument)
+        self.builder.set_function(function)
+        function.entry = self.builder.new_block()
+        self.builder.set_block(function.entry)
+        return function
+
+    def test_dead_local_functions(self):
+        """ Local functions which are never called are removed """
+        a = ir.Parameter('a', ir.i32)
+        helper = self.new_function('helper', ir.Binding.LOCAL, [a])
+        self.builder.emit(ir.Return(a))
+        unused = self.new_function('unused', ir.Binding.LOCAL)
+        self.builder.emit(ir.Return(
+            self.builder.emit(ir.FunctionCall(unused, [], 'r', ir.i32))))
+        variable = ir.Variable('v', ir.Binding.LOCAL, 4, 4)
+        self.module.add_variable(variable)
+        self.new_function('main', ir.Binding.GLOBAL)
+        two = self.builder.emit(ir.Const(2, 'two', ir.i32))
+        result = self.builder.emit(
+            ir.FunctionCall(helper, [two], 'res', ir.i32))
+        self.builder.emit(ir.Return(result))
+        verify_module(self.module)
+        DeadFunctionEliminationPass().run(self.module)
+        verify_module(self.module)
+        self.assertEqual(['helper', 'main'],
+                         [f.name for f in self.module.functions])
+        self.assertEqual([], self.module.variables)
+
+    def test_constant_arguments(self):
+        """ An argument which is always the same constant is removed """
+        a = ir.Parameter('a', ir.i32)
+        b = ir.Parameter('b', ir.i32)
+        helper = self.new_function('helper', ir.Binding.LOCAL, [a, b])
+        self.builder.emit(ir.Return(
+            self.builder.emit(ir.add(a, b, 'sum', ir.i32))))
+        self.new_function('main', ir.Binding.GLOBAL)
+        two = self.builder.emit(ir.Const(2, 'two', ir.i32))
+        three = self.builder.emit(ir.Const(3, 'three', ir.i32))
+        two2 = self.builder.emit(ir.Const(2, 'two', ir.i32))
+        call1 = self.builder.emit(
+            ir.FunctionCall(helper, [two, two], 'res', ir.i32))
+        call2 = self.builder.emit(
+            ir.FunctionCall(helper, [two2, three], 'res', ir.i32))
+        self.builder.emit(ir.Return(
+            self.builder.emit(ir.add(call1, call2, 'sum', ir.i32))))
+        ConstantArgumentPropagationPass().run(self.module)
+        verify_module(self.module)
+        self.assertEqual([b], helper.arguments)
+        self.assertEqual(0, b.num)
+        self.assertEqual([two], call1.arguments)
+        self.assertEqual([three], call2.arguments)
+
+
+class ScalarReplacementTestCase(OptTestCase):
+    """ Test splitting of allocs into fields """
+    def setUp(self):
+        super().setUp()
+        self.sroa = ScalarReplacementPass()
+
+    def test_split_struct(self):
+        """ A struct accessed at constant offsets is split and promoted """
+        alloc = self.builder.emit(ir.Alloc('s', 8, 4))
+        addr = self.builder.emit(ir.AddressOf(alloc, 'addr'))
+        four = self.builder.emit(ir.Const(4, 'four', ir.ptr))
+        y_addr = self.builder.emit(ir.add(addr, four, 'y_addr', ir.ptr))
+        cnst = self.builder.emit(ir.Const(1, 'cnst', ir.i32))
+        self.builder.emit(ir.Store(cnst, addr))
+        self.builder.emit(ir.Store(cnst, y_addr))
+        x = self.builder.emit(ir.Load(addr, 'x', ir.i32))
+        y = self.builder.emit(ir.Load(y_addr, 'y', ir.i32))
+        self.builder.emit(ir.Store(x, y_addr))
+        self.builder.emit(ir.Store(y, addr))
+        self.builder.emit(ir.Exit())
+        self.sroa.run(self.module)
+        allocs = [i for i in self.function.entry if isinstance(i, ir.Alloc)]
+        self.assertNotIn(alloc, allocs)
+        self.assertEqual([4, 4], [a.amount for a in allocs])
+        verify_module(self.module)
+        Mem2RegPromotor().run(self.module)
+        allocs = [i for i in self.function.entry if isinstance(i, ir.Alloc)]
+        self.assertEqual([], allocs)
+
+    def test_overlapping_fields(self):
+        """ Accesses which overlap prevent splitting """
+        alloc = self.builder.emit(ir.Alloc('s', 8, 4))
+        addr = self.builder.emit(ir.AddressOf(alloc, 'addr'))
+        two = self.builder.emit(ir.Const(2, 'two', ir.ptr))
+        y_addr = self.builder.emit(ir.add(addr, two, 'y_addr', ir.ptr))
+        cnst = self.builder.emit(ir.Const(1, 'cnst', ir.i32))
+        self.builder.emit(ir.Store(cnst, addr))
+        self.builder.emit(ir.Store(cnst, y_addr))
+        self.builder.emit(ir.Exit())
+        self.sroa.run(self.module)
+        self.assertIn(alloc, self.function.entry.instructions)
+
+    def test_escaping_address(self):
+        """ When the address is used as a value, the alloc is kept """
+        alloc = self.builder.emit(ir.Alloc('s', 8, 4))
+        addr = self.builder.emit(ir.AddressOf(alloc, 'addr'))
+        four = self.builder.emit(ir.Const(4, 'four', ir.ptr))
+        y_addr = self.builder.emit(ir.add(addr, four, 'y_addr', ir.ptr))
+        self.builder.emit(ir.Store(y_addr, addr))
+        self.builder.emit(ir.Exit())
+        self.sroa.run(self.module)
+        self.assertIn(alloc, self.function.entry.instructions)
+
+
+class SlpVectorizerTestCase(OptTestCase):
+    """ Test packing of scalar operations into vector operations """
+    def setUp(self):
+        super().setUp()
+        self.slp = SlpVectorizerPass(['LDRF32X4', 'STRF32X4', 'ADDF32X4'])
+
+    def add_arrays(self, a, b, c, ty=ir.f32):
+        """ Emit a[i] = b[i] + c[i] for four lanes """
+        for lane in range(4):
+            offset = self.builder.emit(
+                ir.Const(lane * ty.size, 'offset', ir.ptr))
+            addresses = [
+                self.builder.emit(ir.add(base, offset, 'address', ir.ptr))
+                for base in (a, b, c)]
+            x = self.builder.emit(ir.Load(addresses[1], 'x', ty))
+            y = self.builder.emit(ir.Load(addresses[2], 'y', ty))
+            z = self.builder.emit(ir.add(x, y, 'z', ty))
+            self.builder.emit(ir.Store(z, addresses[0]))
+        self.builder.emit(ir.Exit())
+
+    def arrays(self):
+        arrays = []
+        for name in 'abc':
+            array = ir.Variable(name, ir.Binding.GLOBAL, 16, 4)
+            self.module.add_variable(array)
+            arrays.append(array)
+        return arrays
+
+    def test_pack_add(self):
+        """ Loads, additions and stores of four lanes are packed """
+        self.add_arrays(*self.arrays())
+        self.slp.run(self.module)
+        types = [i.ty for i in self.function.entry
+                 if isinstance(i, (ir.Load, ir.Binop)) and i.ty is not ir.ptr]
+        self.assertEqual([ir.f32x4, ir.f32x4, ir.f32x4], types)
+        stores = [i for i in self.function.entry if isinstance(i, ir.Store)]
+        self.assertEqual(1, len(stores))
+        self.assertIs(ir.f32x4, stores[0].value.ty)
+
+    def test_optimize_level_3(self):
+        """ Level 3 includes the vectorizer of level 2 """
+        self.add_arrays(*self.arrays())
+        optimize(self.module, level=3, march='x86_64')
+        stores = [i for i in self.function.entry if isinstance(i, ir.Store)]
+        self.assertEqual([ir.f32x4], [s.value.ty for s in stores])
+
+    def test_may_alias(self):
+        """ Loads cannot move across stores to unknown memory """
+        a = ir.Parameter('a', ir.ptr)
+        self.function.add_parameter(a)
+        _, b, c = self.arrays()
+        self.add_arrays(a, b, c)
+        self.slp.run(self.module)
+        stores = [i for i in self.function.entry if isinstance(i, ir.Store)]
+        self.assertEqual(4, len(stores))
+
+    def test_unsupported_operation(self):
+        """ Only operations supported by the target are created """
+        self.add_arrays(*self.arrays(), ty=ir.f64)
+        self.slp.run(self.module)
+        stores = [i for i in self.function.entry if isinstance(i, ir.Store)]
+        self.assertEqual(4, len(stores))
+
 
 class TypedEvalTestCase(unittest.TestCase):
     """ Test various integer values wrapped at bitsizes and signedness """
@@ -25,3 +25,14 @@ class OrderedSetTestCase(unittest.TestCase):
         self.assertEqual(s[1], 'b')
         s -= {'b'}
         self.assertEqual(s[1], 'r')
+
+    def test_large_set(self):
+        """ Large sets keep the insertion order as well """
+        s = OrderedSet(range(20, 0, -1))
+        s.discard(7)
+        s.add(7)
+        self.assertEqual(20, len(s))
+        self.assertEqual([20, 19, 18], list(s)[:3])
+        self.assertEqual([7, 1, 2], list(reversed(s))[:3])
+        self.assertIn(13, s)
+        self.assertNotIn(21, s)
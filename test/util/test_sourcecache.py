@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+
+from ppci.common import DiagnosticsManager
+from ppci.lang.common import SourceLocation
+from ppci.utils.sourcecache import SourceCache, SourceText, source_cache
+
+
+class SourceTextTestCase(unittest.TestCase):
+    def test_get_line(self):
+        source = SourceText("a.c", "int a;\n\nint b;")
+        self.assertEqual("int a;", source.get_line(1))
+        self.assertEqual("", source.get_line(2))
+        self.assertEqual("int b;", source.get_line(3))
+        self.assertEqual([0, 7, 8], source.line_starts)
+
+
+class SourceCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SourceCache(max_files=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_file(self, name, text, mtime=1000):
+        filename = os.path.join(self.directory.name, name)
+        with open(filename, "w") as f:
+            f.write(text)
+        os.utime(filename, ns=(mtime, mtime))
+        return filename
+
+    def test_read_once(self):
+        filename = self.make_file("a.c", "int a;\nint b;\n")
+        self.assertEqual("int b;", self.cache.get_line(filename, 2))
+        self.assertEqual("int a;", self.cache.get_line(filename, 1))
+        self.assertEqual(1, self.cache.reads)
+
+    def test_changed_file(self):
+        filename = self.make_file("a.c", "int a;\n")
+        self.assertEqual("int a;", self.cache.get_line(filename, 1))
+        self.make_file("a.c", "int b;\n", mtime=2000)
+        self.assertEqual("int b;", self.cache.get_line(filename, 1))
+        self.assertEqual(2, self.cache.reads)
+
+    def test_eviction(self):
+        filenames = [
+            self.make_file("{}.c".format(i), "x\n") for i in range(3)
+        ]
+        self.cache.get(filenames[0])
+        self.cache.get(filenames[1])
+        self.cache.get(filenames[0])
+        self.cache.get(filenames[2])
+        self.assertEqual(2, len(self.cache))
+        self.cache.get(filenames[0])
+        self.assertEqual(3, self.cache.reads)
+        self.cache.get(filenames[1])
+        self.assertEqual(4, self.cache.reads)
+
+    def test_no_such_file(self):
+        self.assertIsNone(self.cache.get("no_such_file.c"))
+        self.assertEqual(0, len(self.cache))
+
+    def test_source_location(self):
+        filename = self.make_file("a.c", "int a;\nint b;\n")
+        reads = source_cache.reads
+        for row in (1, 2, 1, 2):
+            loc = SourceLocation(filename, row, 1, 1)
+            self.assertEqual("int ", loc.get_source_line()[:4])
+        self.assertEqual(reads + 1, source_cache.reads)
+        self.assertEqual(
+            "Could not load source",
+            SourceLocation("no_such_file.c", 1, 1, 1).get_source_line(),
+        )
+
+    def test_added_source(self):
+        """ Sources added to diagnostics do not hide files on disk """
+        filename = self.make_file("a.c", "int a;\n")
+        diag = DiagnosticsManager()
+        diag.add_source(filename, "int b;\n")
+        loc = SourceLocation(filename, 1, 1, 1)
+        self.assertEqual("int a;", loc.get_source_line())
+        self.assertEqual("int b;", diag.sources[filename].get_line(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
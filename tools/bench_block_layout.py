@@ -0,0 +1,93 @@
+""" Measure the effect of basic block placement.
+
+Compiles C source files for x86_64 with and without the BlockLayout
+pass. Reports the estimated amount of taken branches as calculated by
+the pass, and the number of jump instructions in the generated assembly.
+Jumps to the next instruction are removed by the peephole optimizer, so
+every remaining unconditional jump is a taken branch.
+
+Usage:
+
+    $ python bench_block_layout.py [source.c ...]
+
+"""
+
+import glob
+import os
+import re
+import sys
+from unittest import mock
+
+from ppci import api
+from ppci.codegen.layout import BlockLayout
+from ppci.lang.c import COptions
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+libc_includes = os.path.join(this_dir, "..", "librt", "libc")
+
+JUMP = re.compile(r"^\s*jmp\s", re.MULTILINE)
+CONDITIONAL_JUMP = re.compile(r"^\s*j(?!mp)[a-z]+\s", re.MULTILINE)
+
+
+def compile_source(filename):
+    """ Compile a source, and count the jumps in the assembly """
+    coptions = COptions()
+    coptions.add_include_path(libc_includes)
+    with open(filename, "r") as f:
+        ir_module = api.c_to_ir(f, "x86_64", coptions=coptions)
+    api.optimize(ir_module, level=2)
+    assembly = api.ir_to_assembly([ir_module], "x86_64")
+    return (
+        len(JUMP.findall(assembly)),
+        len(CONDITIONAL_JUMP.findall(assembly)),
+    )
+
+
+def main(filenames):
+    estimates = []
+    original_run = BlockLayout.run
+
+    def run(self, function):
+        before, after = original_run(self, function)
+        estimates.append((before, after))
+        return before, after
+
+    print(
+        "{:30} {:>18} {:>12} {:>12}".format(
+            "source", "est. taken", "jmp", "jcc"
+        )
+    )
+    for filename in filenames:
+        try:
+            with mock.patch.object(
+                BlockLayout, "run", return_value=(0, 0)
+            ):
+                jumps_before, cjumps_before = compile_source(filename)
+            estimates.clear()
+            with mock.patch.object(BlockLayout, "run", run):
+                jumps_after, cjumps_after = compile_source(filename)
+        except Exception as ex:  # Not all sources compile
+            print("{:30} failed: {}".format(os.path.basename(filename), ex))
+            continue
+        before = sum(e[0] for e in estimates)
+        after = sum(e[1] for e in estimates)
+        print(
+            "{:30} {:8.1f} -> {:6.1f} {:4} -> {:4} {:4} -> {:4}".format(
+                os.path.basename(filename),
+                before,
+                after,
+                jumps_before,
+                jumps_after,
+                cjumps_before,
+                cjumps_after,
+            )
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        filenames = sys.argv[1:]
+    else:
+        samples = os.path.join(this_dir, "..", "test", "samples")
+        filenames = sorted(glob.glob(os.path.join(samples, "*", "*.c")))
+    main(filenames)
@@ -0,0 +1,74 @@
+""" Measure the time to compile a small c3 module against librt.
+
+The module is compiled with the io module of librt and a board support
+package as includes, once by parsing the includes, and once by loading
+their module interfaces. The ir-code of the builds which load the
+interfaces must be the same as that of the build which stored them.
+
+Usage:
+
+    $ python bench_c3_interfaces.py [repeat]
+
+"""
+
+import io
+import os
+import sys
+import tempfile
+import time
+
+from ppci.api import c3_to_ir
+from ppci.irutils import Writer
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+INCLUDES = [
+    os.path.join(ROOT, "librt", "io.c3"),
+    os.path.join(ROOT, "examples", "linux64", "bsp.c3"),
+]
+
+SOURCE = """
+module main;
+import io;
+
+public function void main()
+{
+    io.println("Hello world");
+    io.print_int(42);
+}
+"""
+
+
+def compile_main(interfaces):
+    """ Compile the module, and give its ir-code as text """
+    ir_module = c3_to_ir(
+        [io.StringIO(SOURCE)], INCLUDES, "x86_64", interfaces=interfaces
+    )
+    f = io.StringIO()
+    Writer(file=f).write(ir_module)
+    return f.getvalue()
+
+
+def measure(repeat, interfaces):
+    """ Get the average compile time in seconds """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        text = compile_main(interfaces)
+    return (time.perf_counter() - start) / repeat, text
+
+
+def main(repeat):
+    interfaces = tempfile.mkdtemp()
+
+    # Write the interfaces:
+    expected = compile_main(interfaces)
+
+    parsed, _ = measure(repeat, None)
+    loaded, text = measure(repeat, interfaces)
+    assert text == expected
+    print("parse includes:   {:8.2f} ms".format(parsed * 1000))
+    print("load interfaces:  {:8.2f} ms".format(loaded * 1000))
+    print("speedup:          {:8.2f}x".format(parsed / loaded))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,83 @@
+""" Measure the speed of the C lexer.
+
+Lexes C sources with the character based lexer and with the regular
+expression based lexer, checks that both produce the same tokens and
+reports the speed in megabytes per second.
+
+Usage:
+
+    $ python bench_c_lexer.py [source.c ...]
+
+"""
+
+import glob
+import io
+import os
+import sys
+import time
+
+from ppci.common import CompilerError
+from ppci.lang.c import CLexer, COptions
+from ppci.lang.c.lexer import SourceFile
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+librt = os.path.join(this_dir, "..", "librt")
+
+
+def lex(method, sources):
+    """ Lex all sources, return the tokens and the time it took """
+    tokens = []
+    start = time.perf_counter()
+    for filename, source in sources:
+        lexer = CLexer(COptions())
+        lex_function = getattr(lexer, method)
+        for token in lex_function(io.StringIO(source), SourceFile(filename)):
+            tokens.append(
+                (token.typ, token.val, token.space, token.first, token.loc)
+            )
+    duration = time.perf_counter() - start
+    return tokens, duration
+
+
+def main(filenames):
+    sources = []
+    for filename in filenames:
+        with open(filename, "r", errors="replace") as f:
+            source = f.read()
+        try:
+            lex("lex", [(filename, source)])
+        except (CompilerError, NotImplementedError):
+            print("Skipping {}, it contains lexical errors".format(filename))
+            continue
+        sources.append((filename, source))
+    size = sum(len(source) for _, source in sources) / 1e6
+
+    before, before_time = lex("lex_characters", sources)
+    after, after_time = lex("lex", sources)
+    same = [
+        (t[:4], t[4].filename, t[4].row, t[4].col) for t in before
+    ] == [(t[:4], t[4].filename, t[4].row, t[4].col) for t in after]
+    print("Lexed {} files, {:.2f} MB".format(len(sources), size))
+    print(
+        "characters: {:8.3f} s {:8.3f} MB/s".format(
+            before_time, size / before_time
+        )
+    )
+    print(
+        "regex:      {:8.3f} s {:8.3f} MB/s".format(
+            after_time, size / after_time
+        )
+    )
+    print("Identical tokens: {}".format(same))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        filenames = sys.argv[1:]
+    else:
+        samples = os.path.join(this_dir, "..", "test", "samples")
+        filenames = sorted(
+            glob.glob(os.path.join(librt, "**", "*.[ch]"), recursive=True)
+            + glob.glob(os.path.join(samples, "*", "*.c"))
+        )
+    main(filenames)
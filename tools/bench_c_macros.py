@@ -0,0 +1,79 @@
+""" Measure the speed of macro expansion in the C preprocessor.
+
+Preprocesses generated sources which use nested function like macros,
+X-macros and token pasting, and reports the time taken. The digest of
+the preprocessed output is printed as well, to check that a change to
+the preprocessor gives the same output.
+
+Usage:
+
+    $ python bench_c_macros.py [repeat]
+
+"""
+
+import hashlib
+import io
+import sys
+import time
+
+from ppci.lang.c import COptions, preprocess
+
+NESTED = """
+#define CAT(a, b) a ## b
+#define XCAT(a, b) CAT(a, b)
+#define ADD(a, b) ((a) + (b))
+#define TWICE(x) ADD(x, x)
+#define QUAD(x) TWICE(TWICE(x))
+#define OCT(x) TWICE(QUAD(x))
+#define R2(m, x) m(x) m(XCAT(x, _2))
+#define R4(m, x) R2(m, x) R2(m, XCAT(x, _4))
+#define R16(m, x) R4(m, x) R4(m, XCAT(x, _16)) R4(m, XCAT(x, _32)) \\
+    R4(m, XCAT(x, _48))
+#define DECL(x) int x = OCT(1);
+"""
+
+XMACROS = """
+#define COLORS(X) \\
+    X(red, 1) X(green, 2) X(blue, 3) X(cyan, 4) X(magenta, 5) \\
+    X(yellow, 6) X(black, 7) X(white, 8)
+#define ENUM_ITEM(name, value) CAT(color_, name) = value,
+#define NAME_ITEM(name, value) #name,
+#define CASE_ITEM(name, value) case value: return QUAD(value);
+"""
+
+
+def make_source(count):
+    """ Create a macro heavy source """
+    lines = [NESTED, XMACROS]
+    for i in range(count):
+        lines.append("R16(DECL, v{})".format(i))
+        lines.append("enum e{} {{ COLORS(ENUM_ITEM) }};".format(i))
+        lines.append(
+            "const char *n{}[] = {{ COLORS(NAME_ITEM) }};".format(i)
+        )
+        lines.append(
+            "int f{}(int c) {{ switch (c) {{ COLORS(CASE_ITEM) }} }}".format(i)
+        )
+    return "\n".join(lines) + "\n"
+
+
+def main(count):
+    source = make_source(count)
+    output = io.StringIO()
+    f = io.StringIO(source)
+    f.name = "macros.c"
+    start = time.perf_counter()
+    preprocess(f, output, COptions())
+    duration = time.perf_counter() - start
+    text = output.getvalue()
+    print(
+        "Preprocessed {} lines into {} bytes".format(
+            source.count("\n"), len(text)
+        )
+    )
+    print("time:   {:8.3f} s".format(duration))
+    print("digest: {}".format(hashlib.sha1(text.encode()).hexdigest()))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,99 @@
+""" Measure the speed of post dominator and reachability queries.
+
+Generates random control flow graphs with thousands of nodes, and
+compares the Lengauer Tarjan post dominator tree against the fixed
+point post dominator sets, and reachability via strongly connected
+components against transitive closure by fixed point iteration.
+
+Usage:
+
+    $ python bench_cfg.py [number_of_nodes]
+
+"""
+
+import random
+import sys
+import time
+
+from ppci.graph.cfg import ControlFlowGraph, ControlFlowNode
+from ppci.graph.algorithm.fixed_point_dominator import (
+    calculate_post_dominators,
+)
+
+
+def make_cfg(count, seed=0):
+    """ Create a structured looking control flow graph """
+    rng = random.Random(seed)
+    cfg = ControlFlowGraph()
+    nodes = [ControlFlowNode(cfg, name=str(i)) for i in range(count)]
+    cfg.entry_node = nodes[0]
+    cfg.exit_node = ControlFlowNode(cfg, name="exit")
+    for index, node in enumerate(nodes[:-1]):
+        node.add_edge(nodes[index + 1])
+        choice = rng.random()
+        if choice < 0.3:
+            # Forward branch:
+            target = min(index + rng.randint(2, 20), count - 1)
+            node.add_edge(nodes[target])
+        elif choice < 0.4:
+            # Loop back edge:
+            node.add_edge(nodes[max(index - rng.randint(1, 30), 0)])
+    nodes[-1].add_edge(cfg.exit_node)
+    return cfg
+
+
+def fixed_point_reach(cfg):
+    """ The transitive closure by repeated set unions """
+    reach = {node: set(cfg.successors(node)) for node in cfg.nodes}
+    change = True
+    while change:
+        change = False
+        for node in cfg.nodes:
+            new_reach = set(reach[node])
+            for m in node.successors:
+                new_reach |= reach[m]
+            if new_reach != reach[node]:
+                change = True
+                reach[node] = new_reach
+    return reach
+
+
+def measure(name, function, *args):
+    t0 = time.perf_counter()
+    result = function(*args)
+    t1 = time.perf_counter()
+    print("{:40} {:8.3f} s".format(name, t1 - t0))
+    return result
+
+
+def main(count=2000):
+    print("nodes: {}".format(count))
+    cfg = make_cfg(count)
+    nodes = list(cfg.nodes)
+    pdom = measure(
+        "fixed point post dominators",
+        calculate_post_dominators,
+        nodes,
+        cfg.exit_node,
+    )
+    measure(
+        "lengauer tarjan post dominators",
+        cfg.get_immediate_post_dominator,
+        cfg.entry_node,
+    )
+    for one in nodes[:50]:
+        for other in nodes:
+            assert (one in pdom[other]) == cfg.post_dominates(one, other)
+
+    reach = measure("fixed point reach", fixed_point_reach, cfg)
+    measure("scc reach", cfg.calculate_reach)
+    for one in nodes[:50]:
+        for other in nodes:
+            assert (other in reach[one]) == cfg.can_reach(one, other)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
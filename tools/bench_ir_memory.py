@@ -0,0 +1,78 @@
+""" Measure the memory footprint of the IR of a large wasm module.
+
+Generates a wasm module with many functions, translates it into
+ppci IR and reports the number of IR instructions, the memory
+allocated for the IR module and the time the translation took.
+
+Usage:
+
+    $ python bench_ir_memory.py [number_of_functions]
+
+"""
+
+import sys
+import time
+import tracemalloc
+
+from ppci import ir
+from ppci.api import get_arch
+from ppci.wasm import Module, wasm_to_ir
+
+FUNCTION = """
+(func ${name} (param $a i32) (param $b i32) (result i32)
+  (local $i i32) (local $acc i32)
+  (local.set $acc (local.get $a))
+  (block $done
+    (loop $again
+      (br_if $done (i32.ge_s (local.get $i) (local.get $b)))
+      (local.set $acc
+        (i32.add
+          (i32.mul (local.get $acc) (i32.const 31))
+          (i32.xor (local.get $i) (i32.shr_u (local.get $acc) (i32.const 3)))))
+      (if (i32.eq (i32.and (local.get $acc) (i32.const 1)) (i32.const 0))
+        (then (local.set $acc (i32.sub (local.get $acc) (local.get $a))))
+        (else (local.set $acc (i32.add (local.get $acc) (local.get $b)))))
+      (local.set $i (i32.add (local.get $i) (i32.const 1)))
+      (br $again)))
+  (local.get $acc))
+"""
+
+
+def make_module(count):
+    """ Create a wasm module with count functions """
+    functions = "".join(
+        FUNCTION.format(name="f{}".format(i)) for i in range(count)
+    )
+    return Module("(module {})".format(functions))
+
+
+def count_instructions(ir_module):
+    return sum(
+        len(block) for function in ir_module.functions for block in function
+    )
+
+
+def main(count=2000):
+    wasm_module = make_module(count)
+    ptr_info = get_arch("x86_64").info.get_type_info("ptr")
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    ir_module = wasm_to_ir(wasm_module, ptr_info)
+    t1 = time.perf_counter()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert isinstance(ir_module, ir.Module)
+    instructions = count_instructions(ir_module)
+    print("functions:            {}".format(count))
+    print("ir instructions:      {}".format(instructions))
+    print("ir memory:            {:.1f} MiB".format(current / 2 ** 20))
+    print("peak memory:          {:.1f} MiB".format(peak / 2 ** 20))
+    print("bytes / instruction:  {:.0f}".format(current / instructions))
+    print("translation time:     {:.2f} s".format(t1 - t0))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,151 @@
+""" Measure the effect of jump threading and tail duplication.
+
+Compiles the C and C3 samples in test/samples at optimization level 2,
+with and without jump threading and tail duplication in the CleanPass.
+The samples are run with the python backend, and edge counters count
+how many conditional jumps and unconditional jumps are executed. The
+number of ir instructions shows the code growth.
+
+Usage:
+
+    $ python bench_jump_threading.py [sample.c ...]
+
+"""
+
+import contextlib
+import glob
+import io
+import os
+import sys
+from unittest import mock
+
+from ppci import api, ir
+from ppci.irutils import add_edge_counters
+from ppci.lang.c import COptions
+from ppci.opt import CleanPass
+
+this_dir = os.path.dirname(os.path.abspath(__file__))
+librt = os.path.join(this_dir, "..", "librt")
+
+BSP_C3 = """
+module bsp;
+public function void putc(byte c);
+"""
+
+
+def build_ir(filename):
+    """ Compile a sample into ir-modules, like the sample tests do """
+    with open(filename, "r") as f:
+        src = f.read()
+    if filename.endswith(".c3"):
+        return [
+            api.c3_to_ir(
+                [
+                    io.StringIO(BSP_C3),
+                    os.path.join(librt, "io.c3"),
+                    io.StringIO(src),
+                ],
+                [],
+                "arm",
+            )
+        ]
+    else:
+        coptions = COptions()
+        coptions.add_include_path(os.path.join(librt, "libc"))
+        with open(os.path.join(librt, "libc", "lib.c"), "r") as f:
+            lib = api.c_to_ir(f, "arm", coptions=coptions)
+        return [lib, api.c_to_ir(io.StringIO(src), "arm", coptions=coptions)]
+
+
+def measure(filename):
+    """ Optimize and run a sample, count the executed jumps """
+    ir_modules = build_ir(filename)
+    size = 0
+    kinds = {}
+    profiles = []
+    for index, ir_module in enumerate(ir_modules):
+        api.optimize(ir_module, level=2)
+        for function in ir_module.functions:
+            for block in function:
+                size += len(block.instructions)
+                kinds[(function.name, block.name)] = type(
+                    block.last_instruction
+                )
+        counters_name = "__profile_counters{}".format(index)
+        profile = add_edge_counters(ir_module, counters_name=counters_name)
+        profiles.append((counters_name, profile))
+
+    f = io.StringIO()
+    api.ir_to_python(ir_modules, f)
+    print("def bsp_putc(c):", file=f)
+    print("    pass", file=f)
+    print('_irpy_externals["bsp_putc"] = bsp_putc', file=f)
+    for ir_module in ir_modules:
+        for routine in ir_module.functions:
+            print('_irpy_externals["{0}"] = {0}'.format(routine.name), file=f)
+    namespace = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        exec(f.getvalue(), namespace)
+        namespace["main_main"]()
+
+    jumps = 0
+    cjumps = 0
+    for counters_name, profile in profiles:
+        keys, _, size_of_counter = profile.counters[counters_name]
+        data = namespace["read_mem"](
+            namespace[counters_name], size_of_counter * len(keys)
+        )
+        profile.set_counts(counters_name, bytes(data))
+        _, counts, _ = profile.counters[counters_name]
+        for (function_name, block_name, target), count in zip(keys, counts):
+            if target is not None:
+                continue
+            kind = kinds[(function_name, block_name)]
+            if kind is ir.Jump:
+                jumps += count
+            elif kind is ir.CJump:
+                cjumps += count
+    return size, jumps, cjumps
+
+
+def main(filenames):
+    print(
+        "{:32} {:>14} {:>18} {:>18}".format(
+            "sample", "instructions", "jumps", "cjumps"
+        )
+    )
+    totals = [0] * 6
+    for filename in filenames:
+        try:
+            with mock.patch.object(
+                CleanPass, "thread_jumps", return_value=False
+            ), mock.patch.object(
+                CleanPass, "duplicate_tails", return_value=False
+            ):
+                before = measure(filename)
+            after = measure(filename)
+        except Exception as ex:  # Not all samples compile or run
+            print("{:32} failed: {}".format(os.path.basename(filename), ex))
+            continue
+        results = [v for pair in zip(before, after) for v in pair]
+        totals = [t + v for t, v in zip(totals, results)]
+        print(
+            "{:32} {:6} -> {:5} {:8} -> {:7} {:8} -> {:7}".format(
+                os.path.basename(filename), *results
+            )
+        )
+    print("{:32} {:6} -> {:5} {:8} -> {:7} {:8} -> {:7}".format(
+        "total", *totals
+    ))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        filenames = sys.argv[1:]
+    else:
+        samples = os.path.join(this_dir, "..", "test", "samples")
+        filenames = sorted(
+            glob.glob(os.path.join(samples, "*", "*.c"))
+            + glob.glob(os.path.join(samples, "*", "*.c3"))
+        )
+    main(filenames)
@@ -0,0 +1,72 @@
+""" Measure the time spent in memory to register promotion.
+
+Generates a single wasm function with many locals and a lot of control
+flow, translates it into ppci IR and times the Mem2RegPromotor on it.
+
+Usage:
+
+    $ python bench_mem2reg.py [number_of_locals]
+
+"""
+
+import sys
+import time
+
+from ppci.api import get_arch
+from ppci.opt import Mem2RegPromotor
+from ppci.wasm import Module, wasm_to_ir
+
+STEP = """
+    (if (i32.lt_s (local.get $l{i}) (local.get $n))
+      (then (local.set $l{j} (i32.add (local.get $l{i}) (local.get $l{j}))))
+      (else (local.set $l{i} (i32.sub (local.get $l{j}) (i32.const 1)))))
+"""
+
+
+def make_module(count):
+    """ Create a wasm module with a function with count locals """
+    local_defs = " ".join("(local $l{} i32)".format(i) for i in range(count))
+    steps = "".join(
+        STEP.format(i=i, j=(i * 7 + 1) % count) for i in range(count)
+    )
+    text = """
+    (module
+      (func $big (param $n i32) (result i32)
+        {}
+        (block $done
+          (loop $again
+            (br_if $done (i32.eqz (local.get $n)))
+            {}
+            (local.set $n (i32.sub (local.get $n) (i32.const 1)))
+            (br $again)))
+        (local.get $l0)))
+    """.format(
+        local_defs, steps
+    )
+    return Module(text)
+
+
+def main(count=400):
+    ptr_info = get_arch("x86_64").info.get_type_info("ptr")
+    ir_module = wasm_to_ir(make_module(count), ptr_info)
+    function = ir_module.functions[0]
+    blocks = len(function.blocks)
+    instructions = function.num_instructions()
+    t0 = time.perf_counter()
+    Mem2RegPromotor().run(ir_module)
+    t1 = time.perf_counter()
+    print("locals:           {}".format(count))
+    print("blocks:           {}".format(blocks))
+    print(
+        "instructions:     {} -> {}".format(
+            instructions, function.num_instructions()
+        )
+    )
+    print("mem2reg time:     {:.2f} s".format(t1 - t0))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
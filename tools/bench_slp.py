@@ -0,0 +1,142 @@
+""" Measure the effect of the SLP vectorizer.
+
+Compiles small kernels for x86_64 with and without the
+SlpVectorizerPass. Reports the number of instructions of each kernel,
+and when running on x86_64, the time it takes to run the kernel and
+whether the results are the same.
+
+Usage:
+
+    $ python bench_slp.py [repetitions]
+
+"""
+
+import io
+import re
+import sys
+import time
+from unittest import mock
+
+from ppci import api
+from ppci.opt import SlpVectorizerPass
+from ppci.utils.codepage import load_obj
+
+LOOP = """
+    for (i = 0; i < N; i += {step}) {{
+{body}
+    }}
+"""
+
+KERNELS = [
+    ("add f32", "float", 4, "a[i+{0}] = b[i+{0}] + c[i+{0}];"),
+    ("axpy f32", "float", 4, "a[i+{0}] = a[i+{0}] * b[i+{0}] + c[i+{0}];"),
+    ("mul f64", "double", 2, "a[i+{0}] = b[i+{0}] * c[i+{0}];"),
+    ("add i64", "long long", 2, "a[i+{0}] = b[i+{0}] + c[i+{0}];"),
+    ("sub i16", "short", 8, "a[i+{0}] = b[i+{0}] - c[i+{0}];"),
+    ("xor u8", "unsigned char", 16, "a[i+{0}] = b[i+{0}] ^ c[i+{0}];"),
+    ("copy i32", "int", 4, "a[i+{0}] = b[i+{0}];"),
+]
+
+SOURCE = """
+#define N 1024
+{ty} a[N], b[N], c[N];
+
+void init(void)
+{{
+    int i;
+    for (i = 0; i < N; i++) {{
+        a[i] = i % 7;
+        b[i] = i % 5 + 1;
+        c[i] = i % 3;
+    }}
+}}
+
+void kernel(void)
+{{
+    int i;
+{loop}
+}}
+
+int checksum(void)
+{{
+    int sum = 0;
+    int i;
+    for (i = 0; i < N; i++) {{
+        sum = sum * 31 + (int)a[i];
+    }}
+    return sum;
+}}
+"""
+
+INSTRUCTION = re.compile(r"^\s+[a-z]", re.MULTILINE)
+
+
+def make_source(ty, lanes, statement):
+    body = "\n".join(
+        "        " + statement.format(lane) for lane in range(lanes)
+    )
+    loop = LOOP.format(step=lanes, body=body)
+    return SOURCE.format(ty=ty, loop=loop)
+
+
+def compile_kernel(source):
+    """ Compile the source, and count the instructions of the kernel """
+    ir_module = api.c_to_ir(io.StringIO(source), "x86_64")
+    api.optimize(ir_module, level=2, march="x86_64")
+    assembly = api.ir_to_assembly([ir_module], "x86_64")
+    kernel = assembly.split("kernel:")[1].split("kernel_epilog:")[0]
+    count = len(INSTRUCTION.findall(kernel))
+
+    obj = None
+    if api.get_current_arch().name == "x86_64":
+        ir_module = api.c_to_ir(io.StringIO(source), "x86_64")
+        api.optimize(ir_module, level=2, march="x86_64")
+        obj = api.ir_to_object([ir_module], "x86_64", debug=True)
+    return count, obj
+
+
+def run_kernel(obj, repetitions):
+    """ Run the kernel, return the run time and the checksum """
+    module = load_obj(obj)
+    module.init()
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        module.kernel()
+    duration = time.perf_counter() - start
+    return duration, module.checksum()
+
+
+def main(repetitions):
+    print(
+        "{:12} {:>14} {:>20} {:>8}".format(
+            "kernel", "instructions", "time (ms)", "same"
+        )
+    )
+    for name, ty, lanes, statement in KERNELS:
+        source = make_source(ty, lanes, statement)
+        with mock.patch.object(SlpVectorizerPass, "on_block"):
+            count_before, obj_before = compile_kernel(source)
+        count_after, obj_after = compile_kernel(source)
+        if obj_before is None:
+            timing = "-"
+            same = "-"
+        else:
+            time_before, sum_before = run_kernel(obj_before, repetitions)
+            time_after, sum_after = run_kernel(obj_after, repetitions)
+            timing = "{:8.1f} -> {:8.1f}".format(
+                time_before * 1000, time_after * 1000
+            )
+            same = "yes" if sum_before == sum_after else "NO"
+        print(
+            "{:12} {:5} -> {:5} {:>20} {:>8}".format(
+                name, count_before, count_after, timing, same
+            )
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repetitions = int(sys.argv[1])
+    else:
+        repetitions = 1000
+    main(repetitions)
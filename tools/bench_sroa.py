@@ -0,0 +1,82 @@
+""" Measure the stack traffic reduction of scalar replacement of aggregates.
+
+Compiles some C snippets with small structs and arrays with and without
+the ScalarReplacementPass, and counts the instructions which access the
+stack frame in the generated assembly.
+
+Usage:
+
+    $ python bench_sroa.py
+
+"""
+
+import io
+import re
+from unittest import mock
+
+from ppci import api
+from ppci.opt.sroa import ScalarReplacementPass
+
+SNIPPETS = {
+    "point": """
+    struct point { int x; int y; };
+    int dist(int a, int b) {
+      struct point p;
+      p.x = a; p.y = b;
+      return p.x * p.x + p.y * p.y;
+    }
+    """,
+    "array": """
+    int poly(int x) {
+      int c[4];
+      c[0] = 1; c[1] = x; c[2] = x * x; c[3] = c[2] * x;
+      return c[0] + 2 * c[1] + 3 * c[2] + 4 * c[3];
+    }
+    """,
+    "rect": """
+    struct vec { int x; int y; };
+    struct rect { struct vec lo; struct vec hi; };
+    int area(int x0, int y0, int x1, int y1) {
+      struct rect r;
+      r.lo.x = x0; r.lo.y = y0; r.hi.x = x1; r.hi.y = y1;
+      if (r.hi.x < r.lo.x) { int t = r.hi.x; r.hi.x = r.lo.x; r.lo.x = t; }
+      if (r.hi.y < r.lo.y) { int t = r.hi.y; r.hi.y = r.lo.y; r.lo.y = t; }
+      return (r.hi.x - r.lo.x) * (r.hi.y - r.lo.y);
+    }
+    """,
+}
+
+STACK_ACCESS = {
+    "x86_64": re.compile(r"\[rbp"),
+    "riscv": re.compile(r"\(x8\)"),
+}
+
+
+def stack_accesses(source, arch):
+    """ Compile the source and count stack accessing instructions """
+    ir_module = api.c_to_ir(io.StringIO(source), arch)
+    api.optimize(ir_module, level=2)
+    assembly = api.ir_to_assembly([ir_module], arch)
+    return len(STACK_ACCESS[arch].findall(assembly))
+
+
+def main():
+    print(
+        "{:10} {:8} {:>10} {:>10}".format("snippet", "arch", "without", "with")
+    )
+    for arch in STACK_ACCESS:
+        for name, source in SNIPPETS.items():
+            with mock.patch.object(
+                ScalarReplacementPass, "on_function", lambda s, f: None
+            ):
+                without = stack_accesses(source, arch)
+            with_sroa = stack_accesses(source, arch)
+            print(
+                "{:10} {:8} {:>10} {:>10}".format(
+                    name, arch, without, with_sroa
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+""" Measure the effect of inline memory copies.
+
+Compiles small struct assignment and clearing kernels with and without
+the inline lowering of small memory copies and clears. Reports the
+number of instructions of each kernel for several targets, and when
+running on x86_64, the time it takes to run the kernel and whether the
+results are the same.
+
+Usage:
+
+    $ python bench_struct_copy.py [repetitions]
+
+"""
+
+import io
+import re
+import sys
+import time
+from unittest import mock
+
+from ppci import api
+from ppci.utils.codepage import load_obj
+
+ARCHS = ["x86_64", "arm", "riscv", "msp430"]
+
+KERNELS = [
+    ("copy 8", "char x[8];", "a[i] = b[i];"),
+    ("copy 12", "int x; short y; char z[6];", "a[i] = b[i];"),
+    ("copy 16", "long long x; long long y;", "a[i] = b[i];"),
+    ("copy 32", "long long x[4];", "a[i] = b[i];"),
+    ("memcpy 16", "int x[4];", "memcpy(&a[i], &b[i], sizeof(a[i]));"),
+    ("memset 24", "int x[6];", "memset(&a[i], 0, sizeof(a[i]));"),
+]
+
+SOURCE = """
+void *memcpy(void *dst, const void *src, unsigned int n);
+void *memset(void *dst, int value, unsigned int n);
+
+#define N 64
+struct s {{ {members} }};
+struct s a[N], b[N];
+
+void init(void)
+{{
+    int i;
+    char *p = (char*)b;
+    for (i = 0; i < sizeof(b); i++) {{
+        p[i] = i % 13;
+    }}
+}}
+
+void kernel(void)
+{{
+    int i;
+    for (i = 0; i < N; i++) {{
+        {statement}
+    }}
+}}
+
+int checksum(void)
+{{
+    int sum = 0;
+    int i;
+    char *p = (char*)a;
+    for (i = 0; i < sizeof(a); i++) {{
+        sum = sum * 31 + p[i];
+    }}
+    return sum;
+}}
+"""
+
+# Simple versions of the runtime functions, for the calls which are not
+# inlined:
+RUNTIME = """
+void *memcpy(void *dst, const void *src, unsigned int n)
+{
+    char *d = dst;
+    const char *s = src;
+    while (n--) *d++ = *s++;
+    return dst;
+}
+
+void *memset(void *dst, int value, unsigned int n)
+{
+    char *d = dst;
+    while (n--) *d++ = value;
+    return dst;
+}
+"""
+
+INSTRUCTION = re.compile(r"^\s+[a-z]", re.MULTILINE)
+
+
+def count_instructions(source, arch):
+    """ Compile the source, and count the instructions of the kernel """
+    ir_module = api.c_to_ir(io.StringIO(source), arch)
+    api.optimize(ir_module, level=2)
+    assembly = api.ir_to_assembly([ir_module], arch)
+    kernel = assembly.split("kernel:")[1].split("kernel_epilog:")[0]
+    return len(INSTRUCTION.findall(kernel))
+
+
+def run_kernel(source, repetitions):
+    """ Run the kernel, return the run time and the checksum """
+    obj = api.cc(io.StringIO(source), "x86_64", opt_level=2, debug=True)
+    runtime = api.cc(io.StringIO(RUNTIME), "x86_64", opt_level=2)
+    module = load_obj(api.link([obj, runtime], debug=True))
+    module.init()
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        module.kernel()
+    duration = time.perf_counter() - start
+    return duration, module.checksum()
+
+
+def main(repetitions):
+    native = api.get_current_arch().name == "x86_64"
+    print(
+        "{:10}".format("kernel")
+        + "".join("{:>14}".format(arch) for arch in ARCHS)
+        + "{:>22} {:>6}".format("time (ms)", "same")
+    )
+    for name, members, statement in KERNELS:
+        source = SOURCE.format(members=members, statement=statement)
+        counts = []
+        for arch in ARCHS:
+            with mock.patch("ppci.codegen.irdag.INLINE_MEMORY_LIMIT", 0):
+                before = count_instructions(source, arch)
+            after = count_instructions(source, arch)
+            counts.append("{:>6} -> {:<4}".format(before, after))
+
+        if native:
+            with mock.patch("ppci.codegen.irdag.INLINE_MEMORY_LIMIT", 0):
+                time_before, sum_before = run_kernel(source, repetitions)
+            time_after, sum_after = run_kernel(source, repetitions)
+            timing = "{:8.1f} -> {:8.1f}".format(
+                time_before * 1000, time_after * 1000
+            )
+            same = "yes" if sum_before == sum_after else "NO"
+        else:
+            timing = "-"
+            same = "-"
+        print(
+            "{:10}".format(name)
+            + "".join(counts)
+            + "{:>22} {:>6}".format(timing, same)
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        repetitions = int(sys.argv[1])
+    else:
+        repetitions = 10000
+    main(repetitions)
@@ -3,23 +3,42 @@
 
 See for the musl library:
 https://www.musl-libc.org/
+
+Usage:
+
+    $ python compile_musl_libc.py [--pch] [--cache]
+
+With --pch, the common headers are precompiled first, and each source
+file starts from the precompiled header.
+
+With --cache, compiled objects are kept in an object cache, so that
+compiling the library again only compiles the changed sources.
 """
 
 import os
+import sys
 import logging
 import glob
 import time
 import traceback
-from ppci.api import cc
-from ppci.lang.c import COptions
+from ppci.api import cc, get_arch
+from ppci.build.objectcache import ObjectCache
+from ppci.lang.c import COptions, CContext
+from ppci.lang.c.pch import create_pch
 from ppci.common import CompilerError, logformat
 
 home = os.environ['HOME']
 musl_folder = os.path.join(home, 'GIT', 'musl')
-cache_filename = os.path.join(musl_folder, 'ppci_build.cache')
+cache_folder = os.path.join(musl_folder, 'ppci_build_cache')
+pch_header = os.path.join(musl_folder, 'ppci_common.h')
+pch_filename = os.path.join(musl_folder, 'ppci_common.pch')
+common_headers = [
+    'stdlib.h', 'string.h', 'stdio.h', 'limits.h', 'errno.h', 'ctype.h',
+    'regex.h', 'wchar.h', 'locale_impl.h',
+]
 
 
-def do_compile(filename):
+def make_coptions():
     include_paths = [
         os.path.join(musl_folder, 'include'),
         os.path.join(musl_folder, 'src', 'internal'),
@@ -29,14 +48,34 @@ def do_compile(filename):
         ]
     coptions = COptions()
     coptions.add_include_paths(include_paths)
+    return coptions
+
+
+def make_pch():
+    """ Precompile the headers used by most source files """
+    with open(pch_header, 'w') as f:
+        for header in common_headers:
+            print('#include <{}>'.format(header), file=f)
+    context = CContext(make_coptions(), get_arch('x86_64').info)
+    with open(pch_header, 'r') as f, open(pch_filename, 'wb') as output:
+        create_pch(f, pch_header, context, output)
+
+
+def do_compile(filename, use_pch=False, cache=None):
+    coptions = make_coptions()
+    if use_pch:
+        coptions.set('include_pch', pch_filename)
     with open(filename, 'r') as f:
-        obj = cc(f, 'x86_64', coptions=coptions)
+        obj = cc(f, 'x86_64', coptions=coptions, cache=cache)
     return obj
 
 
-def main():
+def main(use_pch=False, use_cache=False):
     t1 = time.time()
     print('Using musl folder:', musl_folder)
+    if use_pch:
+        make_pch()
+    cache = ObjectCache(cache_folder) if use_cache else None
     crypt_md5_c = os.path.join(musl_folder, 'src', 'crypt', 'crypt_md5.c')
     failed = 0
     passed = 0
@@ -46,7 +85,7 @@ def main():
     for filename in glob.iglob(file_pattern):
         print('==> Compiling', filename)
         try:
-            do_compile(filename)
+            do_compile(filename, use_pch=use_pch, cache=cache)
         except CompilerError as ex:
             print('Error:', ex.msg, ex.loc)
             ex.print()
@@ -65,8 +104,10 @@ def main():
     t2 = time.time()
     elapsed = t2 - t1
     print('Passed:', passed, 'failed:', failed, 'in', elapsed, 'seconds')
+    if cache:
+        print('Object cache:', cache.statistics())
 
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO, format=logformat)
-    main()
+    main(use_pch='--pch' in sys.argv, use_cache='--cache' in sys.argv)